@@ -3,20 +3,12 @@
 from dataclasses import dataclass
 from pathlib import Path
 
-import yaml
-
 from sophios import input_output
 from sophios.wic_types import Json
 
 
 def _yaml(document: Json) -> str:
-    return yaml.dump(
-        document,
-        sort_keys=False,
-        line_break="\n",
-        indent=2,
-        Dumper=input_output.NoAliasDumper,
-    )
+    return input_output.dump_yaml(document)
 
 
 def _artifact_path(
@@ -4,9 +4,9 @@ import keyword
 from pathlib import Path
 from typing import Any
 
-import yaml
 
 from sophios import utils_cwl
+from sophios.utils_yaml import safe_load
 
 from ._errors import InvalidInputValueError
 from ._types import CWLAtomicType
@@ -162,5 +162,5 @@ def get_value_from_cfg(value: Any) -> Any:
 
 def load_yaml(path: Path) -> dict[str, Any]:
     with path.open("r", encoding="utf-8") as file_handle:
-        loaded = yaml.safe_load(file_handle)
+        loaded = safe_load(file_handle)
     return loaded or {}
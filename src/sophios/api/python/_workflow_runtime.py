@@ -22,6 +22,7 @@ from sophios.cli import get_dicts_for_compilation, get_known_and_unknown_args
 from sophios.runtime_inputs import normalize_rose_tree_cwl, normalize_rose_tree_job_inputs
 from sophios.utils import convert_args_dict_to_args_list, step_name_str
 from sophios.utils_graphs import get_graph_reps
+from sophios.utils_yaml import FastSafeDumper, safe_load
 from sophios.wic_types import CompilerInfo, RoseTree, StepId, Tool, Tools, YamlTree
 
 from ._errors import InvalidCLTError, InvalidStepError
@@ -269,7 +270,7 @@ def load_clt_document(
     Returns:
         tuple[CWLCommandLineTool, dict[str, Any]]: Parsed CWL object and normalized YAML.
     """
-    match yaml.safe_load(yaml.safe_dump(dict(document), sort_keys=False)):
+    match safe_load(yaml.dump(dict(document), sort_keys=False, Dumper=FastSafeDumper)):
         case dict() as yaml_file:
             pass
         case _:
@@ -356,13 +357,7 @@ def _wic_output_path(workflow: "Workflow", path: str | Path | None) -> Path:
 
 
 def _dump_yaml(document: Mapping[str, Any]) -> str:
-    return yaml.dump(
-        document,
-        sort_keys=False,
-        line_break="\n",
-        indent=2,
-        Dumper=input_output.NoAliasDumper,
-    )
+    return input_output.dump_yaml(document)
 
 
 def workflow_wic_yaml(workflow: "Workflow", *, inline_subworkflows: bool = True) -> str:
@@ -454,6 +449,7 @@ def compile_workflow(
     *,
     write_to_disk: bool = False,
     tool_registry: Tools | None = None,
+    graph_mode: str = "none",
 ) -> CompilerInfo:
     """Compile a Python API workflow into CWL.
 
@@ -461,6 +457,7 @@ def compile_workflow(
         workflow (Workflow): Workflow to compile.
         write_to_disk (bool): Whether to also emit generated files under `autogenerated/`.
         tool_registry (Tools | None): Optional tool registry override.
+        graph_mode (str): Which graph representations to build (full, graphdata, or none).
 
     Returns:
         CompilerInfo: The compiler output for the workflow.
@@ -475,6 +472,7 @@ def compile_workflow(
     merged_tools = _merged_known_tools(workflow._flatten_steps(), tool_registry)
 
     compiler_options, graph_settings, yaml_tag_paths = get_dicts_for_compilation()
+    graph_settings["graph_mode"] = graph_mode
     compiler_info = compiler.compile_workflow(
         yaml_tree,
         compiler_options,
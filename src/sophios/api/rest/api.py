@@ -1,13 +1,16 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
-import copy
+import threading
+from typing import AsyncIterator
 
 
 import uvicorn
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
 from sophios import compiler
-from sophios import input_output
+from sophios.compiler_context import CompilerContext
 from sophios.utils_graphs import get_graph_reps
 from sophios import utils_cwl
 from sophios.post_compile import cwl_inline_runtag
@@ -15,10 +18,45 @@ from sophios.cli import get_args, get_dicts_for_compilation
 from sophios.runtime_inputs import normalize_rose_tree_cwl, normalize_rose_tree_job_inputs
 from sophios.wic_types import CompilerInfo, Json, Tool, Tools, StepId, YamlTree, NodeData
 from sophios.api.utils import converter
-import sophios.plugins as plugins
 
 
-app = FastAPI()
+compiler_context_lock = threading.Lock()
+# NOTE: The compiler is initialized via mutating global variables (i.e. compiler.inference_rules),
+# so concurrent requests must not interleave (nor race against a refresh of the compiler context).
+compile_lock = threading.Lock()
+
+
+def get_compiler_context() -> CompilerContext:
+    """Returns the warm compiler context shared by all requests, creating it on first use.
+
+    Returns:
+        CompilerContext: The config, tools, yml paths, inference rules, and validator
+    """
+    with compiler_context_lock:
+        context: CompilerContext | None = getattr(app.state, 'compiler_context', None)
+        if context is None:
+            args = get_args()  # Mock CLI args
+            # NOTE: compile_wf() receives canonical (i.e. already validated) workflows, so skip the validator.
+            context = CompilerContext(Path(args.config_file), Path(args.homedir)/'wic'/'global_config.json',
+                                      args.validate_plugins, args.quiet, use_tools_cache=not args.no_tools_cache,
+                                      with_validator=False)
+            app.state.compiler_context = context
+        return context
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """Initializes the compiler context once at startup, so the first request is also warm,
+    and watches for plugin changes in the background, so requests never rescan the plugins."""
+    context = get_compiler_context()
+    context.start_watcher()
+    try:
+        yield
+    finally:
+        context.stop_watcher()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["*"]
 
@@ -56,6 +94,20 @@ async def compile_wf(request: Request) -> Json:
     print('---------- Compile Workflow! ---------')
     # ========= PROCESS REQUEST OBJECT ==========
     req: Json = await request.json()
+    # The compiler is synchronous, so run it in a worker thread to avoid blocking the event loop.
+    compute_workflow: Json = await run_in_threadpool(compile_payload, req)
+    return compute_workflow
+
+
+def compile_payload(req: Json) -> Json:
+    """Compiles the (raw) workflow builder payload of a compile request
+
+    Args:
+        req (Json): The json object of the http request
+
+    Returns:
+        compute_workflow (JSON): workflow json object ready to submit to compute
+    """
     # clean up and convert the incoming object
     # schema preserving
     req = converter.update_payload_missing_inputs_outputs(req)
@@ -63,35 +115,34 @@ async def compile_wf(request: Request) -> Json:
     # schema non-preserving
     workflow_temp = converter.wfb_to_wic(wfb_payload, req["plugins"])
     wkflw_name = "workflow_"
-    args = get_args(wkflw_name)  # Mock CLI args
 
     # Build canonical workflow object
     workflow_can = utils_cwl.desugar_into_canonical_normal_form(workflow_temp)
 
-    # ========= BUILD WIC COMPILE INPUT =========
-    # Build a list of CLTs
-    # The default list
-    tools_cwl: Tools = {}
-    global_config = input_output.get_config(Path(args.config_file), Path(args.homedir)/'wic'/'global_config.json')
-    tools_cwl = plugins.get_tools_cwl(global_config, args.validate_plugins, args.quiet)
-    # Add to the default list if the tool is 'inline' in run tag
-    # run tag will have the actual CommandLineTool
-    for can_step in workflow_can["steps"]:
-        if can_step.get("run", None):
-            # add a new tool
-            tools_cwl[StepId(can_step["id"], "global")] = Tool(".", can_step["run"])
-    wic_obj = {'wic': workflow_can.get('wic', {})}
-    plugin_ns = wic_obj['wic'].get('namespace', 'global')
-
-    graph = get_graph_reps(wkflw_name)
-    yaml_tree: YamlTree = YamlTree(StepId(wkflw_name, plugin_ns), workflow_can)
-
-    compiler_options, graph_settings, yaml_tag_paths = get_dicts_for_compilation()
-
-    # ========= COMPILE WORKFLOW ================
-    compiler_info: CompilerInfo = compiler.compile_workflow(yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
-                                                            [], [graph], {}, {}, {}, {},
-                                                            tools_cwl, True, relative_run_path=True, testing=False)
+    with compile_lock:
+        # ========= BUILD WIC COMPILE INPUT =========
+        # Build a list of CLTs
+        # The default list (copied, so inline tools do not leak into other requests)
+        tools_cwl: Tools = get_compiler_context().tools_copy()
+        # Add to the default list if the tool is 'inline' in run tag
+        # run tag will have the actual CommandLineTool
+        for can_step in workflow_can["steps"]:
+            if can_step.get("run", None):
+                # add a new tool
+                tools_cwl[StepId(can_step["id"], "global")] = Tool(".", can_step["run"])
+        wic_obj = {'wic': workflow_can.get('wic', {})}
+        plugin_ns = wic_obj['wic'].get('namespace', 'global')
+
+        graph = get_graph_reps(wkflw_name)
+        yaml_tree: YamlTree = YamlTree(StepId(wkflw_name, plugin_ns), workflow_can)
+
+        compiler_options, graph_settings, yaml_tag_paths = get_dicts_for_compilation()
+        graph_settings['graph_mode'] = 'none'  # The graphs are never rendered
+
+        # ========= COMPILE WORKFLOW ================
+        compiler_info: CompilerInfo = compiler.compile_workflow(yaml_tree, compiler_options, graph_settings,
+                                                                yaml_tag_paths, [], [graph], {}, {}, {}, {},
+                                                                tools_cwl, True, relative_run_path=True, testing=False)
 
     rose_tree = compiler_info.rose
     # generating cwl inline within the 'run' tag is post compile
@@ -105,14 +156,14 @@ async def compile_wf(request: Request) -> Json:
     yaml_inputs = normalize_rose_tree_job_inputs(rose_tree, sub_node_data.workflow_inputs_file)
 
     # Convert the compiled yaml file to json for Compute API.
-    cwl_tree_run = copy.deepcopy(cwl_tree)
+    # NOTE: cwl_tree is already a private (normalized, i.e. deep) copy of the compiled CWL,
+    # and it is not used below, so it can be modified in-place.
+    cwl_tree_run = cwl_tree
     cwl_tree_run['steps_dict'] = {}
     for step in cwl_tree_run['steps']:
         node_name = step['id']
         step.pop('id', None)
-        step = {node_name: step}
-        step_copy = copy.deepcopy(step)
-        cwl_tree_run['steps_dict'].update(step_copy)
+        cwl_tree_run['steps_dict'].update({node_name: step})
 
     cwl_tree_run.pop('steps', None)
     cwl_tree_run['steps'] = cwl_tree_run.pop('steps_dict', None)
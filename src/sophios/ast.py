@@ -1,28 +1,185 @@
-import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 import copy
+import os
 from pathlib import Path
 import sys
+import tempfile
 import traceback
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 from mergedeep import merge, Strategy
 from jsonschema import Draft202012Validator
 import yaml
 
-from sophios.utils_yaml import wic_loader
-from . import python_cwl_adapter, utils, utils_cwl
+from sophios.utils_yaml import FastDumper, wic_loader
+from . import python_cwl_adapter, utils, utils_cwl, utils_yaml
 from .wic_types import Yaml, Tools, YamlTree, YamlForest, StepId, Tool
 
 # NOTE: AST = Abstract Syntax Tree
 
 
+def load_wic_file(yaml_path: Path,
+                  validator: Draft202012Validator,
+                  ignore_validation_errors: bool) -> Tuple[Yaml, Optional[Exception]]:
+    """Reads, desugars, and validates a single yml workflow definition file.\n
+    NOTE: This is called from a thread pool, so it must not have any side effects.
+
+    Args:
+        yaml_path (Path): The path to the .wic file
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+        ignore_validation_errors (bool): Temporarily ignore validation errors. Do not use this permanently!
+
+    Returns:
+        Tuple[Yaml, Optional[Exception]]: The yml file contents and the validation error, if any.
+    """
+    with open(yaml_path, mode='r', encoding='utf-8') as y:
+        yaml_tree: Yaml = yaml.load(y.read(), Loader=wic_loader())
+    yaml_tree = utils_cwl.desugar_into_canonical_normal_form(yaml_tree)
+    return (yaml_tree, validate_yml(yaml_tree, validator, ignore_validation_errors))
+
+
+def validate_yml(yaml_tree: Yaml,
+                 validator: Draft202012Validator,
+                 ignore_validation_errors: bool) -> Optional[Exception]:
+    """Validates the given yml file contents, but returns (rather than raises) the validation error, if any.
+
+    Args:
+        yaml_tree (Yaml): The (desugared) yml file contents
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+        ignore_validation_errors (bool): Temporarily ignore validation errors. Do not use this permanently!
+
+    Returns:
+        Optional[Exception]: The validation error, if any.
+    """
+    try:
+        if not ignore_validation_errors:
+            validator.validate(yaml_tree)
+    except Exception as e:
+        return e
+    return None
+
+
+def get_subworkflow_path(step_id: StepId,
+                         yaml_tree: Yaml,
+                         i: int,
+                         step_key: str,
+                         yml_paths: Dict[str, Dict[str, Path]]) -> Path:
+    """Finds the .wic file of the i-th step of the given workflow.
+
+    Args:
+        step_id (StepId): The name of the (parent) workflow
+        yaml_tree (Yaml): The (parent) workflow
+        i (int): The (zero-based) index of the subworkflow step
+        step_key (str): The name of the subworkflow step
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+
+    Raises:
+        Exception: If the yml file cannot be found
+
+    Returns:
+        Path: The path to the .wic file
+    """
+    # Check for namespaceing; otherwise use the namespace 'global'.
+    # NOTE: For now, do not support overloading / parameter passing for
+    # namespaces, because we would have to call merge_yml_trees here.
+    # It could (easily?) be done, but right now we have excellent
+    # separation of concerns between simply reading yml files from disk
+    # and then performing AST transformations in-memory.
+    wic_steps = yaml_tree.get('wic', {}).get('steps', {})
+    sub_wic = wic_steps.get(f'({i+1}, {step_key})', {})
+    plugin_ns = sub_wic.get('wic', {}).get('namespace', 'global')
+    return find_subworkflow_path(step_id, plugin_ns, step_key, yml_paths)
+
+
+def find_subworkflow_path(step_id: StepId,
+                          plugin_ns: str,
+                          step_key: str,
+                          yml_paths: Dict[str, Dict[str, Path]]) -> Path:
+    """Finds the .wic file of the given subworkflow step in the given namespace.
+
+    Args:
+        step_id (StepId): The name of the (parent) workflow
+        plugin_ns (str): The namespace of the subworkflow step
+        step_key (str): The name of the subworkflow step
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+
+    Raises:
+        Exception: If the yml file cannot be found
+
+    Returns:
+        Path: The path to the .wic file
+    """
+    paths_ns_i = yml_paths.get(plugin_ns, {})
+    if paths_ns_i == {}:
+        raise Exception(
+            f"Error! namespace {plugin_ns} not found in yaml paths. Check 'search_paths_wic' in your config file")
+    stem = Path(step_key).stem
+    if stem not in paths_ns_i:
+        msg = f'Error! {stem} not found in namespace {plugin_ns} when attempting to read {step_id.stem}.wic'
+        if stem == 'in':
+            msg += f'\n(Check that you have properly indented the `in` tag in {step_id.stem})'
+        raise Exception(msg)
+    return paths_ns_i[stem]
+
+
+def prefetch_subworkflows(executor: ThreadPoolExecutor,
+                          wic_files: Dict[Path, Future],
+                          yaml_tree: Yaml,
+                          yml_paths: Dict[str, Dict[str, Path]],
+                          validator: Draft202012Validator,
+                          ignore_validation_errors: bool) -> List[Future]:
+    """Starts loading each (distinct) subworkflow of the given workflow which is not already being loaded.\n
+    NOTE: This is only an optimization; any errors (i.e. missing files) are ignored here
+    so that they can be reported in the usual order by read_ast_from_cache().
+
+    Args:
+        executor (ThreadPoolExecutor): The thread pool used to load the .wic files
+        wic_files (Dict[Path, Future]): The per-run cache of the .wic files, which is mutably updated.
+        yaml_tree (Yaml): The (desugared) yml file contents
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+        ignore_validation_errors (bool): Temporarily ignore validation errors. Do not use this permanently!
+
+    Returns:
+        List[Future]: The newly submitted .wic files
+    """
+    futures: List[Future] = []
+    wic = yaml_tree.get('wic', {}) if isinstance(yaml_tree, dict) else {}
+    if not isinstance(wic, dict):
+        return futures
+    if isinstance(wic.get('implementations'), dict):
+        for back in wic['implementations'].values():
+            futures += prefetch_subworkflows(executor, wic_files, back, yml_paths,
+                                             validator, ignore_validation_errors)
+        return futures
+
+    steps = yaml_tree.get('steps', [])
+    if not isinstance(steps, list):
+        return futures  # Not (yet) desugared; it will be loaded synchronously.
+    steps_keys = utils.get_steps_keys(steps)
+    subkeys = utils.get_subkeys(steps_keys)
+    for i, step_key in enumerate(steps_keys):
+        if step_key in subkeys:
+            try:
+                yaml_path = get_subworkflow_path(StepId('', ''), yaml_tree, i, step_key, yml_paths)
+            except Exception:
+                continue
+            if yaml_path.suffix == '.wic' and yaml_path not in wic_files:
+                future = executor.submit(load_wic_file, yaml_path, validator, ignore_validation_errors)
+                wic_files[yaml_path] = future
+                futures.append(future)
+    return futures
+
+
 def read_ast_from_disk(homedir: str,
                        yaml_tree_tuple: YamlTree,
                        yml_paths: Dict[str, Dict[str, Path]],
                        tools: Tools,
                        validator: Draft202012Validator,
                        ignore_validation_errors: bool) -> YamlTree:
-    """Reads the yml workflow definition files from disk (recursively) and inlines them into an AST
+    """Reads the yml workflow definition files from disk (recursively) and inlines them into an AST\n
+    Each distinct subworkflow file is read and validated exactly once (concurrently, in a thread pool)
+    no matter how many times it is referenced.
 
     Args:
         homedir (str): The users home directory
@@ -41,20 +198,79 @@ def read_ast_from_disk(homedir: str,
     (step_id, yaml_tree) = yaml_tree_tuple
 
     yaml_tree = utils_cwl.desugar_into_canonical_normal_form(yaml_tree)
+    validation_error = validate_yml(yaml_tree, validator, ignore_validation_errors)
 
-    try:
-        if not ignore_validation_errors:
-            validator.validate(yaml_tree)
-    except Exception as e:
-        yaml_path = Path(step_id.stem)
-        print('Failed to validate', yaml_path)
-        print(
-            f'See validation_{yaml_path.stem}.txt for detailed technical information.')
-        # Do not display a nasty stack trace to the user; hide it in a file.
-        with open(f'validation_{yaml_path.stem}.txt', mode='w', encoding='utf-8') as f:
-            # https://mypy.readthedocs.io/en/stable/common_issues.html#python-version-and-system-platform-checks
-            traceback.print_exception(type(e), value=e, tb=None, file=f)
-        sys.exit(1)
+    wic_files = load_subworkflows(yaml_tree, validation_error, yml_paths, validator, ignore_validation_errors)
+    return read_ast_from_cache(homedir, YamlTree(step_id, yaml_tree), validation_error,
+                               yml_paths, tools, validator, ignore_validation_errors, wic_files, {})
+
+
+def load_subworkflows(yaml_tree: Yaml,
+                      validation_error: Optional[Exception],
+                      yml_paths: Dict[str, Dict[str, Path]],
+                      validator: Draft202012Validator,
+                      ignore_validation_errors: bool) -> Dict[Path, Future]:
+    """Loads and validates each distinct (transitive) subworkflow .wic file of the given workflow,
+    concurrently in a thread pool.
+
+    Args:
+        yaml_tree (Yaml): The (desugared) root yml file contents
+        validation_error (Optional[Exception]): The validation error of the root yml file contents, if any.
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+        ignore_validation_errors (bool): Temporarily ignore validation errors. Do not use this permanently!
+
+    Returns:
+        Dict[Path, Future]: The per-run cache of the .wic files.
+    """
+    wic_files: Dict[Path, Future] = {}
+    if validation_error is None:
+        with ThreadPoolExecutor() as executor:
+            pending = set(prefetch_subworkflows(executor, wic_files, yaml_tree, yml_paths,
+                                                validator, ignore_validation_errors))
+            # Breadth-first, but start loading each subworkflow as soon as its parent has been loaded.
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        (sub_yaml_tree, sub_validation_error) = future.result()
+                        if sub_validation_error is None:
+                            pending.update(prefetch_subworkflows(executor, wic_files, sub_yaml_tree, yml_paths,
+                                                                 validator, ignore_validation_errors))
+    return wic_files
+
+
+def read_ast_from_cache(homedir: str,
+                        yaml_tree_tuple: YamlTree,
+                        validation_error: Optional[Exception],
+                        yml_paths: Dict[str, Dict[str, Path]],
+                        tools: Tools,
+                        validator: Draft202012Validator,
+                        ignore_validation_errors: bool,
+                        wic_files: Dict[Path, Future],
+                        sub_trees: Dict[Path, Yaml]) -> YamlTree:
+    """Recursively inlines the subworkflows (which have been loaded by read_ast_from_disk) into an AST
+
+    Args:
+        homedir (str): The users home directory
+        yaml_tree_tuple (YamlTree): A tuple of a filepath and its (desugared) Yaml file contents.
+        validation_error (Optional[Exception]): The validation error of the Yaml file contents, if any.
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        tools (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+        ignore_validation_errors (bool): Temporarily ignore validation errors. Do not use this permanently!
+        wic_files (Dict[Path, Future]): The per-run cache of the .wic files.
+        sub_trees (Dict[Path, Yaml]): The per-run cache of the (inlined) subworkflow ASTs.
+
+    Raises:
+        Exception: If the yml file(s) do not exist
+
+    Returns:
+        YamlTree: A tuple of the root filepath and the associated yml AST
+    """
+    (step_id, yaml_tree) = yaml_tree_tuple
+
+    exit_if_validation_error(step_id, validation_error)
 
     wic = {'wic': yaml_tree.get('wic', {})}
     if 'implementations' in wic['wic']:
@@ -64,8 +280,11 @@ def read_ast_from_disk(homedir: str,
         for back_name, back in wic['wic']['implementations'].items():
             plugin_ns = wic['wic'].get('namespace', 'global')
             stepid = StepId(back_name, plugin_ns)
-            implementations_tree = read_ast_from_disk(homedir, YamlTree(stepid, back), yml_paths, tools, validator,
-                                                      ignore_validation_errors)
+            back = utils_cwl.desugar_into_canonical_normal_form(back)
+            implementations_tree = read_ast_from_cache(homedir, YamlTree(stepid, back),
+                                                       validate_yml(back, validator, ignore_validation_errors),
+                                                       yml_paths, tools, validator, ignore_validation_errors,
+                                                       wic_files, sub_trees)
             implementations_trees.append(implementations_tree)
         yaml_tree['wic']['implementations'] = dict(implementations_trees)
         return YamlTree(step_id, yaml_tree)
@@ -76,42 +295,30 @@ def read_ast_from_disk(homedir: str,
     subkeys = utils.get_subkeys(steps_keys)
 
     for i, step_key in enumerate(steps_keys):
-        stem = Path(step_key).stem
-
         # Recursively read subworkflows, adding yml file contents
         if step_key in subkeys:
-            # Check for namespaceing; otherwise use the namespace 'global'.
-            # NOTE: For now, do not support overloading / parameter passing for
-            # namespaces, because we would have to call merge_yml_trees here.
-            # It could (easily?) be done, but right now we have excellent
-            # separation of concerns between simply reading yml files from disk
-            # and then performing AST transformations in-memory.
             sub_wic = wic_steps.get(f'({i+1}, {step_key})', {})
             plugin_ns = sub_wic.get('wic', {}).get('namespace', 'global')
-
-            paths_ns_i = yml_paths.get(plugin_ns, {})
-            if paths_ns_i == {}:
-                raise Exception(
-                    f"Error! namespace {plugin_ns} not found in yaml paths. Check 'search_paths_wic' in your config file")
-            if stem not in paths_ns_i:
-                msg = f'Error! {stem} not found in namespace {plugin_ns} when attempting to read {step_id.stem}.wic'
-                if stem == 'in':
-                    msg += f'\n(Check that you have properly indented the `in` tag in {step_id.stem})'
-                raise Exception(msg)
-            yaml_path = paths_ns_i[stem]
-
-            if not (yaml_path.exists() and yaml_path.suffix == '.wic'):
-                raise Exception(
-                    f'Error! {yaml_path} does not exist or is not a .wic file.')
-
-            # Load the high-level yaml sub workflow file.
-            with open(yaml_path, mode='r', encoding='utf-8') as y:
-                sub_yaml_tree_raw: Yaml = yaml.load(
-                    y.read(), Loader=wic_loader())
-
-            y_t = YamlTree(StepId(step_key, plugin_ns), sub_yaml_tree_raw)
-            (_, sub_yml_tree) = read_ast_from_disk(homedir, y_t, yml_paths, tools, validator,
-                                                   ignore_validation_errors)
+            yaml_path = get_subworkflow_path(step_id, yaml_tree, i, step_key, yml_paths)
+
+            if yaml_path in sub_trees:
+                # Each reference needs its own copy, because later AST transformations mutate the subtrees.
+                sub_yml_tree = copy.deepcopy(sub_trees[yaml_path])
+            else:
+                if yaml_path.suffix != '.wic':
+                    raise Exception(
+                        f'Error! {yaml_path} does not exist or is not a .wic file.')
+                try:
+                    (sub_yaml_tree_raw, sub_validation_error) = get_wic_file(yaml_path, wic_files, validator,
+                                                                             ignore_validation_errors)
+                except FileNotFoundError as e:
+                    raise Exception(
+                        f'Error! {yaml_path} does not exist or is not a .wic file.') from e
+
+                y_t = YamlTree(StepId(step_key, plugin_ns), sub_yaml_tree_raw)
+                (_, sub_yml_tree) = read_ast_from_cache(homedir, y_t, sub_validation_error, yml_paths, tools,
+                                                        validator, ignore_validation_errors, wic_files, sub_trees)
+                sub_trees[yaml_path] = sub_yml_tree
 
             steps_i_copy = {**steps[i]}
             step_i_id = utils.require_step_id(steps[i])
@@ -124,6 +331,48 @@ def read_ast_from_disk(homedir: str,
     return YamlTree(step_id, yaml_tree)
 
 
+def exit_if_validation_error(step_id: StepId, validation_error: Optional[Exception]) -> None:
+    """Reports the validation error of the given yml file (if any) and exits.
+
+    Args:
+        step_id (StepId): The name of the yml file
+        validation_error (Optional[Exception]): The validation error of the yml file contents, if any.
+    """
+    if validation_error is not None:
+        yaml_path = Path(step_id.stem)
+        print('Failed to validate', yaml_path)
+        print(
+            f'See validation_{yaml_path.stem}.txt for detailed technical information.')
+        # Do not display a nasty stack trace to the user; hide it in a file.
+        with open(f'validation_{yaml_path.stem}.txt', mode='w', encoding='utf-8') as f:
+            # https://mypy.readthedocs.io/en/stable/common_issues.html#python-version-and-system-platform-checks
+            traceback.print_exception(type(validation_error), value=validation_error, tb=None, file=f)
+        sys.exit(1)
+
+
+def get_wic_file(yaml_path: Path,
+                 wic_files: Dict[Path, Future],
+                 validator: Draft202012Validator,
+                 ignore_validation_errors: bool) -> Tuple[Yaml, Optional[Exception]]:
+    """Gets the given .wic file from the per-run cache, or loads it synchronously if it was not prefetched.
+
+    Args:
+        yaml_path (Path): The path to the .wic file
+        wic_files (Dict[Path, Future]): The per-run cache of the .wic files.
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+        ignore_validation_errors (bool): Temporarily ignore validation errors. Do not use this permanently!
+
+    Returns:
+        Tuple[Yaml, Optional[Exception]]: The yml file contents and the validation error, if any.
+    """
+    future = wic_files.get(yaml_path)
+    if future is None:
+        # i.e. subworkflows of sugared (dict form) implementations
+        return load_wic_file(yaml_path, validator, ignore_validation_errors)
+    result: Tuple[Yaml, Optional[Exception]] = future.result()
+    return result
+
+
 def merge_yml_trees(yaml_tree_tuple: YamlTree,
                     wic_parent: Yaml,
                     tools: Tools) -> YamlTree:
@@ -185,25 +434,34 @@ def merge_yml_trees(yaml_tree_tuple: YamlTree,
         # (At this point, any DSL args provided from the parent(s) should have
         # all of the initial yml tags removed, leaving only CWL tags remaining.)
         if step_key not in subkeys:
-            clt_args = wic_steps.get(f'({i+1}, {step_key})', {})
-            if 'wic' in clt_args:
-                # Do NOT add yml tags to the raw CWL!
-                # We can simply leave any step-specific wic: tags at top-level.
-                # Copy so we only delete from the step, not also the top-level.
-                clt_args = copy.deepcopy(clt_args)
-                del clt_args['wic']
-            sub_yml_tree = clt_args
-            args_provided_dict_self = steps[i]
-            steps_i_id = utils.require_step_id(steps[i])
-            # NOTE: To support overloading, the parent args must overwrite the child args!
-            args_provided_dict = merge(args_provided_dict_self, sub_yml_tree,
-                                       strategy=Strategy.TYPESAFE_REPLACE)  # TYPESAFE_ADDITIVE ?
             # Now mutably overwrite the self args with the merged args
-            steps[i] = {**args_provided_dict, 'id': steps_i_id}
+            steps[i] = merge_step_args(steps[i], wic_steps.get(f'({i+1}, {step_key})', {}))
 
     return YamlTree(step_id, yaml_tree)
 
 
+def merge_step_args(step: Yaml, clt_args: Yaml) -> Yaml:
+    """Merges the CWL args of a (CommandLineTool) step with the args passed in from the parent workflow.
+
+    Args:
+        step (Yaml): The step
+        clt_args (Yaml): The wic: steps: tag for this step from the (merged) parent workflow
+
+    Returns:
+        Yaml: The step with the merged args
+    """
+    if 'wic' in clt_args:
+        # Do NOT add yml tags to the raw CWL!
+        # We can simply leave any step-specific wic: tags at top-level.
+        # Copy so we only delete from the step, not also the top-level.
+        clt_args = copy.deepcopy(clt_args)
+        del clt_args['wic']
+    step_id = utils.require_step_id(step)
+    # NOTE: To support overloading, the parent args must overwrite the child args!
+    args_provided_dict = merge(step, clt_args, strategy=Strategy.TYPESAFE_REPLACE)  # TYPESAFE_ADDITIVE ?
+    return {**args_provided_dict, 'id': step_id}
+
+
 def tree_to_forest(yaml_tree_tuple: YamlTree, tools: Tools) -> YamlForest:
     """The purpose of this function is to abstract away the process of traversing an AST.
 
@@ -247,11 +505,21 @@ def tree_to_forest(yaml_tree_tuple: YamlTree, tools: Tools) -> YamlForest:
     return YamlForest(YamlTree(step_id, yaml_tree), yaml_forest_list)
 
 
+# The CWL CommandLineTools generated by python_script_generate_cwl, keyed by python_script_digest.
+# NOTE: The tools are never mutated after they are generated, so they can be shared between compiles.
+# The oldest tools are evicted beyond PYTHON_SCRIPT_TOOLS_MAXSIZE (i.e. so long running processes which
+# compile many edited scripts do not grow without bound); evicted tools are simply re-read from autogenerated/.
+PYTHON_SCRIPT_TOOLS_MAXSIZE = 256
+python_script_tools: Dict[str, Tool] = {}
+
+
 def python_script_generate_cwl(yaml_tree_tuple: YamlTree,
                                root_yml_dir_abs: Path,
                                tools: Tools) -> YamlTree:
     """Generates a CWL CommandLineTool for each python_script: tag,
-    mutably adds them to tools, and updates the call sites in yaml_tree.
+    mutably adds them to tools, and updates the call sites in yaml_tree.\n
+    The generated CommandLineTools are cached by content hash (in-memory and in autogenerated/),
+    so each python script is only imported when it (or workflow_types.py) changes.
 
     Args:
         yaml_tree_tuple (YamlTree): A tuple of a name and a yml AST
@@ -289,48 +557,229 @@ def python_script_generate_cwl(yaml_tree_tuple: YamlTree,
 
         if step_key not in subkeys:
             if 'python_script' == step_key:
-                # This generates a CWL CommandLineTool for an arbitrary python script.
-                yml_args = copy.deepcopy(steps[i]['in'])
-                python_script_path = yml_args.get('script', '')
-                if isinstance(python_script_path, dict) and 'wic_inline_input' in python_script_path:
-                    python_script_path = python_script_path['wic_inline_input']
-                # NOTE: The existence of the script: tag should now be guaranteed in the schema
-                del yml_args['script']
-                python_script_docker_pull = yml_args.get(
-                    'dockerPull', '')  # Optional
-                if isinstance(python_script_docker_pull, dict) and 'wic_inline_input' in python_script_docker_pull:
-                    python_script_docker_pull = python_script_docker_pull['wic_inline_input']
-                if 'dockerPull' in yml_args:
-                    del yml_args['dockerPull']
-                    del steps[i]['in']['dockerPull']
-                python_script_path = root_yml_dir_abs / \
-                    Path(python_script_path)
-                python_script_mod = Path(python_script_path).name[:-3]
-                module = python_cwl_adapter.get_module(
-                    python_script_mod, python_script_path, yml_args)
-                generated_cwl = python_cwl_adapter.generate_CWL_CommandLineTool(
-                    module.inputs, module.outputs, python_script_docker_pull)
-                # See https://docs.python.org/3/library/uuid.html#uuid.uuid4
-                # "If all you want is a unique ID, you should probably call uuid1() or uuid4()"
-                unique_id = 'python_script_' + str(uuid.uuid4())
-                # TODO: use the trick from the copy_cwl_tools branch to keep
-                # programmatically modified (and in this case, generated from scratch)
-                # CWL CommandLineTools in-memory so we can defer writing to disk
-                filepath = 'autogenerated/' + unique_id + '.cwl'
-                with open(filepath, mode='w', encoding='utf-8') as f:
-                    f.write(yaml.dump(generated_cwl, sort_keys=False,
-                            line_break='\n', indent=2))
-
-                # Now replace step_key with unique_id in the workflow
-                # NOTE: In addition to duplicate keys,
-                # this is why we are forced to use canonicalize_steps_list
-                # (We can replace a list element in-place, but if we delete a
-                # dict key and add another key, the second key gets added to the
-                # end of the dict...)
-                steps[i] = {**steps[i], 'id': unique_id}
-                # and add the auto-generated CWL CommandLineTool to tools
-                step_id_ = StepId(unique_id, 'global')
-                tool_i = Tool(filepath, generated_cwl)
-                tools[step_id_] = tool_i
+                steps[i] = python_script_generate_step(steps[i], root_yml_dir_abs, tools)
+
+    return YamlTree(step_id, yaml_tree)
+
+
+def python_script_generate_step(step: Yaml, root_yml_dir_abs: Path, tools: Tools) -> Yaml:
+    """Generates a CWL CommandLineTool for a single python_script: step,
+    mutably adds it to tools, and returns the updated step.
+
+    Args:
+        step (Yaml): The python_script: step
+        root_yml_dir_abs (Path): The absolute path to the directory containing the root workflow yml file
+        tools (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+
+    Returns:
+        Yaml: The step, which now refers to the auto-generated CWL.
+    """
+    # This generates a CWL CommandLineTool for an arbitrary python script.
+    yml_args = copy.deepcopy(step['in'])
+    python_script_path = yml_args.get('script', '')
+    if isinstance(python_script_path, dict) and 'wic_inline_input' in python_script_path:
+        python_script_path = python_script_path['wic_inline_input']
+    # NOTE: The existence of the script: tag should now be guaranteed in the schema
+    del yml_args['script']
+    python_script_docker_pull = yml_args.get(
+        'dockerPull', '')  # Optional
+    if isinstance(python_script_docker_pull, dict) and 'wic_inline_input' in python_script_docker_pull:
+        python_script_docker_pull = python_script_docker_pull['wic_inline_input']
+    if 'dockerPull' in yml_args:
+        del yml_args['dockerPull']
+        del step['in']['dockerPull']
+    python_script_path = root_yml_dir_abs / \
+        Path(python_script_path)
+    python_script_mod = Path(python_script_path).name[:-3]
+    # NOTE: The generated CommandLineTool only depends on the contents of the script
+    # (and workflow_types.py, etc), so use a deterministic id derived from a content hash.
+    # This lets repeated compiles reuse the generated file and the in-memory Tool
+    # instead of importing the script (i.e. executing all of its top-level imports) every time.
+    digest = python_cwl_adapter.python_script_digest(python_script_path, python_script_docker_pull)
+    unique_id = 'python_script_' + digest[:32]
+    filepath = 'autogenerated/' + unique_id + '.cwl'
+    tool_i = python_script_tools.get(digest)
+    if tool_i is None and Path(filepath).exists():
+        with open(filepath, mode='r', encoding='utf-8') as f:
+            tool_i = Tool(filepath, utils_yaml.safe_load(f.read()))
+    if tool_i is None:
+        interface = python_cwl_adapter.get_script_interface(
+            python_script_mod, python_script_path, yml_args)
+        generated_cwl = python_cwl_adapter.generate_CWL_CommandLineTool(
+            interface.inputs, interface.outputs, python_script_docker_pull)
+        tool_i = Tool(filepath, generated_cwl)
+    else:
+        module_inputs = {key: val for key, val in tool_i.cwl['inputs'].items()
+                         if key not in python_cwl_adapter.GENERATED_INPUTS}
+        python_cwl_adapter.check_args_match_module_inputs(module_inputs, yml_args)
+    if not Path(filepath).exists():
+        # TODO: use the trick from the copy_cwl_tools branch to keep
+        # programmatically modified (and in this case, generated from scratch)
+        # CWL CommandLineTools in-memory so we can defer writing to disk
+        # NOTE: Write to a temporary file and then rename it, so concurrent compiles
+        # (which share autogenerated/) never read a partially written file.
+        Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=Path(filepath).parent, prefix=unique_id, suffix='.tmp')
+        try:
+            with os.fdopen(fd, mode='w', encoding='utf-8') as f:
+                f.write(utils_yaml.dump(tool_i.cwl, yaml.Dumper, FastDumper, sort_keys=False,
+                                        line_break='\n', indent=2))
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+    if digest not in python_script_tools and len(python_script_tools) >= PYTHON_SCRIPT_TOOLS_MAXSIZE:
+        del python_script_tools[next(iter(python_script_tools))]
+    python_script_tools[digest] = tool_i
+
+    # Now replace step_key with unique_id in the workflow
+    # NOTE: In addition to duplicate keys,
+    # this is why we are forced to use canonicalize_steps_list
+    # (We can replace a list element in-place, but if we delete a
+    # dict key and add another key, the second key gets added to the
+    # end of the dict...)
+    step = {**step, 'id': unique_id}
+    # and add the auto-generated CWL CommandLineTool to tools
+    step_id_ = StepId(unique_id, 'global')
+    tools[step_id_] = tool_i
+    return step
+
+
+def read_ast_fused(homedir: str,
+                   yaml_tree_tuple: YamlTree,
+                   yml_paths: Dict[str, Dict[str, Path]],
+                   tools: Tools,
+                   validator: Draft202012Validator,
+                   ignore_validation_errors: bool,
+                   root_yml_dir_abs: Path) -> YamlTree:
+    """Reads the yml workflow definition files from disk, merges the wic: tags, and generates CWL for the
+    python_script: tags in a single recursive walk of the AST.\n
+    This is equivalent to read_ast_from_disk, merge_yml_trees, and then python_script_generate_cwl,
+    except that each node is only visited once. (Use the separate passes to inspect the intermediate trees.)
+
+    Args:
+        homedir (str): The users home directory
+        yaml_tree_tuple (YamlTree): A tuple of a filepath and its Yaml file contents.
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        tools (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+        ignore_validation_errors (bool): Temporarily ignore validation errors. Do not use this permanently!
+        root_yml_dir_abs (Path): The absolute path to the directory containing the root workflow yml file
+
+    Returns:
+        YamlTree: A tuple of the root filepath and the associated (merged) yml AST
+    """
+    (step_id, yaml_tree) = yaml_tree_tuple
+
+    yaml_tree = utils_cwl.desugar_into_canonical_normal_form(yaml_tree)
+    validation_error = validate_yml(yaml_tree, validator, ignore_validation_errors)
+    wic_files = load_subworkflows(yaml_tree, validation_error, yml_paths, validator, ignore_validation_errors)
+    return read_ast_fused_from_cache(homedir, YamlTree(step_id, yaml_tree), validation_error, {}, yml_paths, tools,
+                                     validator, ignore_validation_errors, root_yml_dir_abs, wic_files, {})
+
+
+def read_ast_fused_from_cache(homedir: str,
+                              yaml_tree_tuple: YamlTree,
+                              validation_error: Optional[Exception],
+                              wic_parent: Yaml,
+                              yml_paths: Dict[str, Dict[str, Path]],
+                              tools: Tools,
+                              validator: Draft202012Validator,
+                              ignore_validation_errors: bool,
+                              root_yml_dir_abs: Path,
+                              wic_files: Dict[Path, Future],
+                              sub_trees: Dict[Path, Yaml]) -> YamlTree:
+    """Recursively inlines the subworkflows (which have been loaded by read_ast_fused) into an AST,
+    merging the wic: tags and generating CWL for the python_script: tags along the way.
+
+    Args:
+        homedir (str): The users home directory
+        yaml_tree_tuple (YamlTree): A tuple of a filepath and its (desugared) Yaml file contents.
+        validation_error (Optional[Exception]): The validation error of the Yaml file contents, if any.
+        wic_parent (Yaml): The wic: yml dict from the parent workflow
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        tools (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+        ignore_validation_errors (bool): Temporarily ignore validation errors. Do not use this permanently!
+        root_yml_dir_abs (Path): The absolute path to the directory containing the root workflow yml file
+        wic_files (Dict[Path, Future]): The per-run cache of the .wic files.
+        sub_trees (Dict[Path, Yaml]): The per-run cache of the subworkflow ASTs (without parameter passing).
+
+    Raises:
+        Exception: If the yml file(s) do not exist
+
+    Returns:
+        YamlTree: A tuple of the root filepath and the associated (merged) yml AST
+    """
+    (step_id, yaml_tree) = yaml_tree_tuple
+    exit_if_validation_error(step_id, validation_error)
+
+    wic_self = yaml_tree.get('wic', {})
+    if 'implementations' in wic_self:
+        # Recursively expand each implementation, but do NOT choose a specific implementation.
+        plugin_ns = wic_self.get('namespace', 'global')
+        implementations_trees = []
+        for back_name, back in wic_self['implementations'].items():
+            back = utils_cwl.desugar_into_canonical_normal_form(back)
+            implementations_tree = read_ast_fused_from_cache(
+                homedir, YamlTree(StepId(back_name, plugin_ns), back),
+                validate_yml(back, validator, ignore_validation_errors), wic_parent, yml_paths, tools,
+                validator, ignore_validation_errors, root_yml_dir_abs, wic_files, sub_trees)
+            implementations_trees.append(implementations_tree)
+        wic_self['implementations'] = dict(implementations_trees)
+        wic = merge({'wic': wic_self}, wic_parent, strategy=Strategy.TYPESAFE_REPLACE)
+        yaml_tree['wic'] = wic['wic']
+        return YamlTree(step_id, yaml_tree)
+
+    # Cache the metadata of each step, which is needed by each of the (formerly separate) passes.
+    steps: List[Yaml] = yaml_tree['steps']
+    steps_keys = utils.get_steps_keys(steps)
+    subkeys = utils.get_subkeys(steps_keys)
+    wic_steps_keys = [f'({i+1}, {step_key})' for i, step_key in enumerate(steps_keys)]
+    # NOTE: The namespaces must be determined before merging, i.e. they cannot be overridden by the parent.
+    wic_steps_self = wic_self.get('steps', {})
+    plugin_nss = [wic_steps_self.get(key, {}).get('wic', {}).get('namespace', 'global') for key in wic_steps_keys]
+
+    # Implement 'parameter passing' by merging the wic: tag from the parent workflow.
+    wic = merge({'wic': wic_self}, wic_parent, strategy=Strategy.TYPESAFE_REPLACE)
+    yaml_tree['wic'] = wic['wic']
+    wic_steps = wic['wic'].get('steps', {})
+
+    for i, step_key in enumerate(steps_keys):
+        wic_step = wic_steps.get(wic_steps_keys[i], {})
+        if step_key in subkeys:
+            yaml_path = find_subworkflow_path(step_id, plugin_nss[i], step_key, yml_paths)
+            if yaml_path in sub_trees and not wic_step:
+                # Each reference needs its own copy, because later AST transformations mutate the subtrees.
+                sub_yml_tree = copy.deepcopy(sub_trees[yaml_path])
+            else:
+                if yaml_path.suffix != '.wic':
+                    raise Exception(
+                        f'Error! {yaml_path} does not exist or is not a .wic file.')
+                try:
+                    (sub_yaml_tree_raw, sub_validation_error) = get_wic_file(yaml_path, wic_files, validator,
+                                                                             ignore_validation_errors)
+                except FileNotFoundError as e:
+                    raise Exception(
+                        f'Error! {yaml_path} does not exist or is not a .wic file.') from e
+
+                # The subtrees are merged (etc) in-place, so we cannot modify the cached .wic file.
+                y_t = YamlTree(StepId(step_key, plugin_nss[i]), copy.deepcopy(sub_yaml_tree_raw))
+                (_, sub_yml_tree) = read_ast_fused_from_cache(homedir, y_t, sub_validation_error, wic_step,
+                                                              yml_paths, tools, validator, ignore_validation_errors,
+                                                              root_yml_dir_abs, wic_files, sub_trees)
+                # NOTE: Only subtrees without parameter passing from the parent are the same for every reference.
+                if not wic_step:
+                    sub_trees[yaml_path] = sub_yml_tree
+            steps_i_copy = {**steps[i]}
+            step_i_id = utils.require_step_id(steps[i])
+            del steps_i_copy['id']
+            # Do not merge these two dicts; use subtree and parentargs so we can
+            # apply subtree before compilation and parentargs after compilation.
+            steps[i] = {'id': step_i_id, 'subtree': sub_yml_tree, 'parentargs': steps_i_copy}
+        else:
+            steps[i] = merge_step_args(steps[i], wic_step)
+            if 'python_script' == step_key:
+                steps[i] = python_script_generate_step(steps[i], root_yml_dir_abs, tools)
 
     return YamlTree(step_id, yaml_tree)
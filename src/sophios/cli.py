@@ -4,12 +4,13 @@ from pathlib import Path
 from typing import Any
 from unittest.mock import patch
 
-from . import __version__
+from . import __version__, utils
 
 parser = argparse.ArgumentParser(prog='main', description='Convert a high-level yaml workflow file to CWL.')
 
 parser.add_argument('--yaml', type=str,
-                    required=(not ('--generate_config' in sys.argv or '--generate_schemas' in sys.argv)),
+                    required=(not ('--generate_config' in sys.argv or '--generate_schemas' in sys.argv
+                                   or '--compile_batch' in sys.argv)),
                     help='Yaml workflow file')
 group_gen = parser.add_mutually_exclusive_group()
 group_gen.add_argument('--generate_schemas', default=False, action="store_true",
@@ -39,6 +40,14 @@ parser.add_argument('--no_provenance', default=False, action="store_true",
                     (You should only disable provenance if absolutely necessary.)''')
 parser.add_argument('--copy_output_files', default=False, action="store_true",
                     help='Copy primary outputs into the legacy outdir/ layout after a successful cwltool run.')
+parser.add_argument('--output_files_strategy', type=str, default='copy',
+                    choices=utils.FILE_STRATEGIES,
+                    help='''How --copy_output_files places the outputs into outdir/
+                    (The link strategies fallback to copying when the file system does not support them.)''')
+parser.add_argument('--input_files_strategy', type=str, default='copy',
+                    choices=utils.FILE_STRATEGIES,
+                    help='''How the input files (and directories) are staged into the working directory.
+                    (Unchanged files are skipped. Use symlink or hardlink to avoid copying large inputs.)''')
 parser.add_argument('--cwl_inline_runtag', default=False, action="store_true",
                     help='Copies cwl adapter file contents inline into the final .cwl in autogenerated/')
 
@@ -86,18 +95,48 @@ group_run.add_argument('--generate_run_script', default=False, action="store_tru
                        help='Just generates run.sh and exits. Does not actually invoke ./run.sh')
 group_run.add_argument('--run_local', default=False, action="store_true",
                        help='After generating the cwl file(s), run it on your local machine.')
+group_run.add_argument('--compute_url', type=str, required=False, default='',
+                       help='After generating the cwl file(s), submit it to Compute at this URL.')
 group_run.add_argument('--generate_cwl_workflow', required=False, default=False, action="store_true",
                        help='Compile the workflow without pulling the docker image')
+parser.add_argument('--compute_inputs', nargs='*', type=str, required=False, default=[],
+                    help='''With --compute_url, submit one job per yml file, each of which
+                    overrides (some of) the workflow inputs. (i.e. a parameter sweep)''')
+parser.add_argument('--compute_max_concurrency', type=int, required=False, default=16,
+                    help='With --compute_url, the maximum number of concurrent HTTP requests to Compute.')
+parser.add_argument('--compute_retries', type=int, required=False, default=3,
+                    help='With --compute_url, the number of times to retry transient HTTP failures.')
+parser.add_argument('--compile_batch', nargs='+', type=str, required=False, default=[],
+                    help='''Compile many yml workflow files (and/or directories of .wic files, and/or glob patterns)
+                    sharing one compiler context, and write a per-workflow report to
+                    autogenerated/compile_batch_report.json''')
+parser.add_argument('--compile_max_workers', type=int, required=False, default=None,
+                    help='''With --compile_batch and/or --parallel_subworkflows, the number of worker processes.
+                    Defaults to the number of cpus.''')
+parser.add_argument('--parallel_subworkflows', default=False, action="store_true",
+                    help='''Compile independent sibling subworkflows concurrently, in worker processes.
+                    (Subworkflows which are connected by explicit edges are still compiled sequentially.)''')
 parser.add_argument('--cwl_inline_subworkflows', default=False, action="store_true",
                     help='Before generating the cwl file, inline all subworkflows.')
 parser.add_argument('--write_intermediate_wic', default=False, action="store_true",
                     help='Write intermediate compiler .wic trees under autogenerated/ for debugging.')
+parser.add_argument('--write_manifest', default=False, action="store_true",
+                    help='''Also write the sha256 content hashes of the compiled cwl files (and yml inputs files)
+                    to autogenerated/{yaml_stem}_manifest.json''')
+parser.add_argument('--rewrite_unchanged', default=False, action="store_true",
+                    help='Rewrite the compiled cwl files (and yml inputs files) even if they have not changed.')
 parser.add_argument('--inference_disable', default=False, action="store_true",
                     help='Disables use of the inference algorithm when compiling.')
 parser.add_argument('--inference_use_naming_conventions', default=False, action="store_true",
                     help='Enables the use of naming conventions in the inference algorithm')
+parser.add_argument('--no_memoize_subworkflows', default=False, action="store_true",
+                    help='''Do not reuse the compilation results of identical subworkflows.
+                    (By default, each distinct subworkflow is only compiled once.)''')
 parser.add_argument('--validate_plugins', default=False, action="store_true",
                     help='Validate all CWL CommandLineTools')
+parser.add_argument('--no_tools_cache', default=False, action="store_true",
+                    help='''Do not use the on-disk cache of canonicalized CWL CommandLineTools.
+                    (By default, only new or modified files in search_paths_cwl are re-parsed.)''')
 parser.add_argument('--ignore_validation_errors', default=False, action="store_true",
                     help='Temporarily ignore validation errors. Do not use this permanently!')
 parser.add_argument('--no_skip_dollar_schemas', default=False, action="store_true",
@@ -123,6 +162,10 @@ parser.add_argument('--graph_inline_depth', type=int, required=False, default=sy
                     help='Controls the depth of subgraphs which are displayed.')
 parser.add_argument('--graph_dark_theme', default=False, action="store_true",
                     help='Changees the color of the fonts and edges from white to black.')
+parser.add_argument('--graph_mode', type=str, required=False, default=None, choices=['full', 'graphdata', 'none'],
+                    help='''Which graph representations to build during compilation: full (graphviz, networkx,
+                    and GraphData), graphdata (GraphData only), or none. Building the graphs can be a significant
+                    fraction of the compile time of large workflows. (default: full with --graphviz, otherwise none)''')
 parser.add_argument('--custom_net', type=str, required=False,
                     help='Passes --custom-net flag to cwltool.')
 parser.add_argument('--passthrough_flags', type=str, default='no', required=False,
@@ -173,6 +216,8 @@ def get_dicts_for_compilation() -> tuple[dict[str, bool], dict[str, Any], dict[s
     compiler_options['insert_steps_automatically'] = args.insert_steps_automatically
     compiler_options['inference_disable'] = args.inference_disable
     compiler_options['allow_raw_cwl'] = args.allow_raw_cwl
+    compiler_options['memoize_subworkflows'] = not args.no_memoize_subworkflows
+    compiler_options['parallel_subworkflows'] = args.parallel_subworkflows
 
     # to be given to graph util functions
     graph_settings: dict[str, Any] = {}
@@ -182,6 +227,8 @@ def get_dicts_for_compilation() -> tuple[dict[str, bool], dict[str, Any], dict[s
     graph_settings['graph_label_stepname'] = args.graph_label_stepname
     graph_settings['graph_show_outputs'] = args.graph_show_outputs
     graph_settings['graph_show_inputs'] = args.graph_show_inputs
+    # NOTE: main() and the APIs do not build any graphs (by default) unless the graphs are rendered.
+    graph_settings['graph_mode'] = 'full' if args.graph_mode is None else args.graph_mode
 
     # to be given to io absolute_yaml_tags function
     yaml_tag_paths: dict[str, str] = {}
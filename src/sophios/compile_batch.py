@@ -0,0 +1,248 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import time
+import traceback
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import yaml
+
+from . import input_output as io
+from . import post_compile as pc
+from . import ast, cli, compiler, inference, inlineing, plugins
+from .compiler_context import CompilerContext, CompilerContextData
+from .utils_graphs import get_graph_reps
+from .utils_yaml import wic_loader
+from .wic_types import RoseTree, StepId, Yaml, YamlTree
+
+
+class CompileResult(NamedTuple):
+    yaml_path: str
+    ok: bool
+    seconds: float
+    error: str = ''
+
+
+class CompileBatchReport(NamedTuple):
+    results: List[CompileResult]
+    elapsed_seconds: float
+
+    @property
+    def ok(self) -> bool:
+        return all(result.ok for result in self.results)
+
+    @property
+    def failed(self) -> List[str]:
+        return [result.yaml_path for result in self.results if not result.ok]
+
+    @property
+    def compile_seconds(self) -> float:
+        """The total time spent compiling the workflows (i.e. excluding loading the shared context)"""
+        return sum(result.seconds for result in self.results)
+
+    def summary(self) -> str:
+        """A human-readable report, with one line per workflow.
+
+        Returns:
+            str: The report
+        """
+        lines = [f"{'ok' if result.ok else 'FAILED':6} {result.seconds:8.3f}s  {result.yaml_path}"
+                 + (f'  ({result.error})' if result.error else '') for result in self.results]
+        lines.append(f'Compiled {len(self.results) - len(self.failed)}/{len(self.results)} workflows '
+                     f'in {self.elapsed_seconds:.3f}s (sum of compile times {self.compile_seconds:.3f}s)')
+        return '\n'.join(lines)
+
+
+def find_yaml_files(patterns: List[str]) -> List[Path]:
+    """Expands the given yml workflow files, directories (recursively), and glob patterns.
+
+    Args:
+        patterns (List[str]): The yml workflow files, directories, and/or glob patterns
+
+    Raises:
+        ValueError: If two of the workflows have the same stem, since they would overwrite each others files.
+
+    Returns:
+        List[Path]: The (distinct) yml workflow files, in order
+    """
+    yaml_paths: Dict[Path, None] = {}
+    for pattern in patterns:
+        if Path(pattern).is_dir():
+            matches = sorted(Path(pattern).rglob('*.wic'))
+        elif Path(pattern).is_file():
+            matches = [Path(pattern)]
+        else:
+            matches = sorted(Path(match) for match in glob.glob(pattern, recursive=True))
+        for match in matches:
+            yaml_paths.setdefault(match, None)
+
+    stems: Dict[str, Path] = {}
+    for yaml_path in yaml_paths:
+        if yaml_path.stem in stems:
+            raise ValueError(f'Error! {stems[yaml_path.stem]} and {yaml_path} would both be compiled to '
+                             f'autogenerated/{yaml_path.stem}.cwl')
+        stems[yaml_path.stem] = yaml_path
+    return list(yaml_paths)
+
+
+def compile_yaml_file(yaml_path: Path, context: CompilerContextData, args: argparse.Namespace) -> RoseTree:
+    """Compiles the given yml workflow file and writes the CWL to autogenerated/, as in main()
+
+    Args:
+        yaml_path (Path): The yml workflow file
+        context (CompilerContextData): The shared compiler state (config, tools, yml paths, validator, etc)
+        args (argparse.Namespace): The command line arguments
+
+    Returns:
+        RoseTree: The compiled workflow
+    """
+    # Each workflow may add tools (i.e. python_script steps), so do not share them.
+    tools_cwl = dict(context.tools)
+    assert context.validator is not None
+    with open(yaml_path, mode='r', encoding='utf-8') as y:
+        root_yaml_tree: Yaml = yaml.load(y.read(), Loader=wic_loader())
+    plugin_ns = root_yaml_tree.get('wic', {}).get('namespace', 'global')
+    y_t = YamlTree(StepId(str(yaml_path), plugin_ns), root_yaml_tree)
+    yaml_tree = ast.read_ast_fused(args.homedir, y_t, context.yml_paths, tools_cwl, context.validator,
+                                   args.ignore_validation_errors, yaml_path.parent.absolute())
+
+    if args.cwl_inline_subworkflows:
+        yaml_tree = inlineing.inline_subworkflows(yaml_tree, tools_cwl)
+        step_id = StepId(yaml_tree.step_id.stem + '_inline', yaml_tree.step_id.plugin_ns)
+        yaml_tree = YamlTree(step_id, yaml_tree.yml)
+
+    compiler_options, graph_settings, yaml_tag_paths = cli.get_dicts_for_compilation()
+    graph_settings['graph_mode'] = 'none'  # The graphs are never rendered
+    # NOTE: The workflows are already compiled in parallel (i.e. in forked worker processes),
+    # so do not fork yet another (nested) process pool per workflow.
+    compiler_options['parallel_subworkflows'] = False
+    compiler_info = compiler.compile_workflow(yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
+                                              [], [get_graph_reps(str(yaml_path))], {}, {}, {}, {},
+                                              tools_cwl, True, relative_run_path=True, testing=False)
+    rose_tree = plugins.cwl_prepend_dockerFile_include_path_rosetree(compiler_info.rose)
+    if args.partial_failure_enable:
+        rose_tree = plugins.cwl_update_outputs_optional_rosetree(
+            rose_tree, args.partial_failure_success_codes_range, args.partial_failure_success_codes)
+    if args.cwl_inline_runtag:
+        rose_tree = pc.cwl_inline_runtag(rose_tree)
+
+    io.write_to_disk(rose_tree, Path('autogenerated/'), True, args.inputs_file,
+                     not args.rewrite_unchanged, args.write_manifest)
+    return rose_tree
+
+
+# The shared compiler state of each worker process. See init_worker()
+worker_context: Optional[CompilerContextData] = None
+
+
+def init_worker(context: Optional[CompilerContextData], config_file: Path, default_config_file: Path) -> None:
+    """Initializes the shared compiler state of a worker process.
+
+    Args:
+        context (Optional[CompilerContextData]): The shared compiler state, if it can be inherited (i.e. fork)
+        config_file (Path): The config file, for reloading the shared compiler state otherwise (i.e. spawn)
+        default_config_file (Path): The default config file
+    """
+    global worker_context  # pylint: disable=global-statement
+    if context is None:
+        context = CompilerContext(config_file, default_config_file, quiet=True).get()
+    worker_context = context
+    # Perform initialization via mutating global variables (This is not ideal)
+    compiler.inference_rules = context.inference_rules
+    inference.renaming_conventions = context.renaming_conventions
+
+
+def compile_worker(yaml_path: Path, args: argparse.Namespace) -> CompileResult:
+    """Compiles the given yml workflow file using the shared compiler state of this (worker) process.
+
+    Args:
+        yaml_path (Path): The yml workflow file
+        args (argparse.Namespace): The command line arguments
+
+    Returns:
+        CompileResult: Whether the workflow compiled, and how long it took
+    """
+    assert worker_context is not None
+    start = time.perf_counter()
+    try:
+        compile_yaml_file(yaml_path, worker_context, args)
+        return CompileResult(str(yaml_path), True, time.perf_counter() - start)
+    except SystemExit:
+        # i.e. validation errors, which have already been reported.
+        return CompileResult(str(yaml_path), False, time.perf_counter() - start, 'Failed to validate')
+    except Exception as e:
+        # Do not display a nasty stack trace to the user; hide it in a file (next to the report).
+        error_path = f'autogenerated/error_{yaml_path.stem}.txt'
+        with open(error_path, mode='w', encoding='utf-8') as f:
+            traceback.print_exception(type(e), value=e, tb=None, file=f)
+        return CompileResult(str(yaml_path), False, time.perf_counter() - start, f'See {error_path}')
+
+
+def compile_batch(yaml_paths: List[Path],
+                  context: CompilerContextData,
+                  args: argparse.Namespace,
+                  max_workers: Optional[int] = None) -> CompileBatchReport:
+    """Compiles many yml workflow files across a process pool, sharing one compiler state
+    (config, tools, yml paths, validator), which is loaded only once.
+
+    Args:
+        yaml_paths (List[Path]): The yml workflow files
+        context (CompilerContextData): The shared compiler state
+        args (argparse.Namespace): The command line arguments
+        max_workers (Optional[int]): The number of worker processes. Defaults to the number of cpus.\n
+        If 1, the workflows are compiled sequentially in this process.
+
+    Returns:
+        CompileBatchReport: Whether each workflow compiled, and how long it took
+    """
+    start = time.perf_counter()
+    Path('autogenerated/').mkdir(parents=True, exist_ok=True)
+    config_file = Path(args.config_file)
+    default_config_file = Path(args.homedir)/'wic'/'global_config.json'
+    max_workers = min(max_workers or os.cpu_count() or 1, len(yaml_paths) or 1)
+    if max_workers == 1:
+        init_worker(context, config_file, default_config_file)
+        results = [compile_worker(yaml_path, args) for yaml_path in yaml_paths]
+        return CompileBatchReport(results, time.perf_counter() - start)
+
+    # NOTE: Forked workers inherit the shared compiler state (without pickling);
+    # otherwise, each worker needs to load it once.
+    fork = 'fork' in multiprocessing.get_all_start_methods()
+    mp_context = multiprocessing.get_context('fork' if fork else None)
+    initargs: Tuple[Optional[CompilerContextData], Path, Path] = (context if fork else None,
+                                                                  config_file, default_config_file)
+    with ProcessPoolExecutor(max_workers, mp_context, init_worker, initargs) as executor:
+        results = list(executor.map(compile_worker, yaml_paths, [args] * len(yaml_paths)))
+    return CompileBatchReport(results, time.perf_counter() - start)
+
+
+def run_compile_batch(patterns: List[str],
+                      context: CompilerContextData,
+                      args: argparse.Namespace,
+                      max_workers: Optional[int] = None) -> int:
+    """Compiles the given yml workflow files, directories, and/or glob patterns,
+    and writes the per-workflow report to autogenerated/compile_batch_report.json
+
+    Args:
+        patterns (List[str]): The yml workflow files, directories, and/or glob patterns
+        context (CompilerContextData): The shared compiler state
+        args (argparse.Namespace): The command line arguments
+        max_workers (Optional[int]): The number of worker processes. Defaults to the number of cpus.
+
+    Returns:
+        int: The exit code, i.e. 0 if every workflow compiled and 1 otherwise.
+    """
+    yaml_paths = find_yaml_files(patterns)
+    if not yaml_paths:
+        print(f'Error! No yml workflow files found in {patterns}')
+        return 1
+    report = compile_batch(yaml_paths, context, args, max_workers)
+    print(report.summary())
+    with open('autogenerated/compile_batch_report.json', mode='w', encoding='utf-8') as f:
+        json.dump({'elapsed_seconds': report.elapsed_seconds,
+                   'results': [result._asdict() for result in report.results]}, f, indent=2)
+    return 0 if report.ok else 1
@@ -1,9 +1,18 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+import contextlib
 import copy
+import hashlib
+import contextvars
+import itertools
 import json
+import logging
+import multiprocessing
 import os
 from pathlib import Path
+import pickle
 import sys
-from typing import Dict, List, Any
+import threading
+from typing import Dict, List, Any, NamedTuple, Optional, Set, Tuple
 
 import graphviz
 from mergedeep import merge, Strategy
@@ -14,12 +23,278 @@ from . import input_output as io
 from . import inference, utils, utils_cwl, utils_graphs
 from .wic_types import (CompilerInfo, EnvData, ExplicitEdgeCalls,
                         ExplicitEdgeDefs, GraphData, GraphReps, Namespaces,
-                        NodeData, RoseTree, Tool, Tools, WorkflowInputsFile,
+                        NodeData, RoseTree, Tool, Tools, WorkflowInputs, WorkflowInputsFile,
                         Yaml, YamlTree, StepId)
 
 # NOTE: This must be initialized in main.py and/or cwl_subinterpreter.py
 inference_rules: Dict[str, str] = {}
 
+# Memoized subworkflow compilation results, keyed by a structural hash of
+# everything that compile_workflow observes. See get_memo_key()
+# NOTE: The memo is scoped to a single (root) call of compile_workflow, since the
+# tools can change between compilations (i.e. CompilerContext's file watcher).
+# A context variable (instead of a global) also isolates concurrent compilations
+# in different threads (i.e. REST API requests).
+Memo = Dict[str, Tuple[CompilerInfo, Namespaces]]
+memoized_subworkflows: contextvars.ContextVar[Optional[Memo]] = contextvars.ContextVar('memoized_subworkflows',
+                                                                                       default=None)
+MEMO_MAXSIZE = 256
+logger_memo = logging.getLogger('sophios.compiler.memo')
+
+# The number of worker processes for compiler_options['parallel_subworkflows'].
+# Defaults to the number of cpus.
+max_workers_subworkflows: Optional[int] = None
+
+
+def get_memo_key(yaml_tree_ast: YamlTree,
+                 compiler_options: Dict[str, bool],
+                 graph_settings: Dict[str, Any],
+                 yaml_tag_paths: Dict[str, str],
+                 namespaces: Namespaces,
+                 subgraph: GraphReps,
+                 explicit_edge_defs: ExplicitEdgeDefs,
+                 explicit_edge_calls: ExplicitEdgeCalls,
+                 input_mapping: Dict[str, List[str]],
+                 output_mapping: Dict[str, str],
+                 tools: Tools,
+                 relative_run_path: bool,
+                 testing: bool) -> Optional[str]:
+    """Computes a structural hash of a subworkflow and of its compilation environment.
+
+    Unless the graphviz graphs are built (i.e. graph_mode 'full'), the absolute
+    namespaces are deliberately NOT part of the key (only their length is), so
+    that identical subworkflows which are embedded at different locations can
+    share a single compilation. This is only correct when the namespaces enter
+    the results solely as a prefix of the (graph) names; see
+    renamespace_compiler_info(). Thus, we only memoize subworkflows which do not
+    contain any explicit edges (!& / !*) or cwl_subinterpreter steps, which do
+    not inherit any explicit edges, and which are not flattened into one of
+    their ancestors' namespaces (i.e. via --graph_inline_depth).\n
+    NOTE: The key only identifies the tools by their step ids, so it is only
+    valid within a single compilation. See memoized_subworkflows
+
+    Returns:
+        Optional[str]: The key, or None if the subworkflow cannot be memoized.
+    """
+    if not relative_run_path or explicit_edge_defs or explicit_edge_calls:
+        return None
+    if len(namespaces) > 1 + graph_settings['graph_inline_depth']:
+        return None
+    try:
+        yml_str = json.dumps(yaml_tree_ast.yml, sort_keys=True, default=str)
+    except TypeError:
+        return None  # i.e. non-string keys cannot be sorted
+    if any(f'"{tag}"' in yml_str for tag in ['wic_alias', 'wic_anchor', 'cwl_subinterpreter']):
+        return None
+
+    # Include the tools of every step in the subtree.
+    # (Automatically inserted steps can come from anywhere in the whitelist.)
+    stems = get_step_stems(yaml_tree_ast.yml)
+    insert = compiler_options['insert_steps_automatically']
+    tools_used = sorted([list(stepid) for stepid in tools
+                         if stepid.stem in stems
+                         or (insert and stepid.stem.startswith('insert_steps_automatically_'))])
+
+    # The graphviz graphs are opaque DOT text, so we cannot move them to other namespaces.
+    namespaces_key = namespaces if utils_graphs.graph_mode_full(graph_settings) else len(namespaces)
+    payload = [list(yaml_tree_ast.step_id), yml_str, namespaces_key,
+               compiler_options, graph_settings, yaml_tag_paths,
+               input_mapping, output_mapping, tools_used, testing,
+               inference_rules, inference.renaming_conventions,
+               subgraph.graphviz.body, subgraph.graphdata.name]
+    try:
+        payload_str = json.dumps(payload, sort_keys=True, default=str)
+    except TypeError:
+        return None
+    return hashlib.sha256(payload_str.encode('utf-8')).hexdigest()
+
+
+def get_step_stems(yml: Yaml) -> List[str]:
+    """Recursively collects the stems of the ids of all of the steps in the given (fused) subtree.
+
+    Args:
+        yml (Yaml): The yml AST of a subworkflow
+
+    Returns:
+        List[str]: The stems of the step ids, i.e. the keys of tools
+    """
+    stems = []
+    for step in yml.get('steps', []):
+        if isinstance(step, dict) and 'id' in step:
+            stems.append(Path(str(step['id'])).stem)
+            if isinstance(step.get('subtree'), dict):
+                stems += get_step_stems(step['subtree'])
+    return stems
+
+
+def renamespace_str(name: str, old: str, new: str) -> str:
+    """Replaces the namespace prefix old with new in the given (possibly quoted) graph node name.
+
+    Args:
+        name (str): A graph node name, i.e. '___'.join(namespaces), possibly enclosed in double quotes.
+        old (str): The old namespace prefix
+        new (str): The new namespace prefix
+
+    Returns:
+        str: The renamed node name, or name if it does not start with old
+    """
+    for quote in ['', '"']:
+        if name.startswith(quote + old):
+            rest = name[len(quote + old):]
+            if rest in ['', quote] or rest.startswith('___'):
+                return quote + new + rest
+    return name
+
+
+def renamespace_graphdata(graphdata: GraphData, old: str, new: str) -> None:
+    """Recursively (and mutably) replaces the namespace prefix old with new in graphdata.
+
+    Args:
+        graphdata (GraphData): The graph data of a compiled subworkflow
+        old (str): The old namespace prefix
+        new (str): The new namespace prefix
+    """
+    graphdata.nodes = [(renamespace_str(n, old, new), attrs) for n, attrs in graphdata.nodes]
+    graphdata.edges = [(renamespace_str(n1, old, new), renamespace_str(n2, old, new), attrs)
+                       for n1, n2, attrs in graphdata.edges]
+    graphdata.ranksame = [renamespace_str(n, old, new) for n in graphdata.ranksame]
+    for subgraph in graphdata.subgraphs:
+        renamespace_graphdata(subgraph, old, new)
+
+
+def is_renamespaceable(compiler_info: CompilerInfo, namespaces: Namespaces) -> bool:
+    """Checks that all of the graph node names of a compiled subworkflow start with its namespaces.
+
+    Args:
+        compiler_info (CompilerInfo): The result of compile_workflow
+        namespaces (Namespaces): The namespaces of the subworkflow
+
+    Returns:
+        bool: True if renamespace_compiler_info() will rename every node.
+    """
+    old = '___'.join(namespaces)
+
+    def check(graphdata: GraphData) -> bool:
+        names = [n for n, _ in graphdata.nodes] + [n for n1, n2, _ in graphdata.edges for n in [n1, n2]]
+        names += graphdata.ranksame
+        return (all(renamespace_str(n, old, '') != n for n in names)
+                and all(check(subgraph) for subgraph in graphdata.subgraphs))
+
+    node_data = compiler_info.rose.data
+    return (all(renamespace_str(str(n), old, '') != n for n in node_data.graph.networkx.nodes)
+            and renamespace_str(node_data.step_name_1, old, '') != node_data.step_name_1
+            and check(node_data.graph.graphdata))
+
+
+def renamespace_compiler_info(compiler_info: CompilerInfo, old_ns: Namespaces, new_ns: Namespaces) -> CompilerInfo:
+    """Moves a (copy of a) memoized compilation result from namespaces old_ns to new_ns.\n
+    NOTE: This mutates the graphs in compiler_info, so make a copy first!\n
+    NOTE: The graphviz graphs are not renamed. They only contain (namespaced)
+    node names in graph_mode 'full', in which case old_ns == new_ns. See get_memo_key()
+
+    Args:
+        compiler_info (CompilerInfo): The result of compile_workflow
+        old_ns (Namespaces): The namespaces at which compiler_info was compiled
+        new_ns (Namespaces): The namespaces at which compiler_info will be used
+
+    Returns:
+        CompilerInfo: The renamed compiler_info
+    """
+    old = '___'.join(old_ns)
+    new = '___'.join(new_ns)
+    graphs_seen = set()
+
+    def rename_graph(graph: GraphReps) -> None:
+        if id(graph) in graphs_seen:
+            return
+        graphs_seen.add(id(graph))
+        nx.relabel_nodes(graph.networkx, lambda n: renamespace_str(n, old, new), copy=False)
+        renamespace_graphdata(graph.graphdata, old, new)
+
+    def rename_rose_tree(rose_tree: RoseTree) -> RoseTree:
+        n_d: NodeData = rose_tree.data
+        namespaces = n_d.namespaces
+        if namespaces[:len(old_ns)] == old_ns:
+            namespaces = new_ns + namespaces[len(old_ns):]
+        rename_graph(n_d.graph)
+        node_data = NodeData(namespaces, n_d.name, n_d.yml, n_d.compiled_cwl, n_d.tool,
+                             n_d.workflow_inputs_file, n_d.explicit_edge_defs, n_d.explicit_edge_calls,
+                             n_d.graph, n_d.inputs_workflow, renamespace_str(n_d.step_name_1, old, new))
+        return RoseTree(node_data, [rename_rose_tree(r) for r in rose_tree.sub_trees])
+
+    return CompilerInfo(rename_rose_tree(compiler_info.rose), compiler_info.env)
+
+
+class GraphCheckpoint(NamedTuple):
+    body_len: int
+    nodes_len: int
+    edges_len: int
+    subgraphs_len: int
+    networkx_nodes_len: int
+
+
+class CompilerCheckpoint(NamedTuple):
+    """The state of compile_workflow_once just before compiling step i.\n
+    If step i causes an automatic insertion, compilation resumes from here."""
+    i: int
+    steps: List[Yaml]  # NOTE: Only steps[:i] are used
+    wic_steps: Yaml
+    inputs_undo: Yaml  # The original values of the workflow inputs: which step i modified in-place
+    inputs: Optional[Yaml]  # The workflow inputs: as modified by steps[:i] (set when rolling back)
+    inputs_workflow: WorkflowInputs
+    inputs_file_workflow: WorkflowInputsFile
+    input_mapping: Dict[str, List[str]]
+    output_mapping: Dict[str, str]
+    explicit_edge_defs: ExplicitEdgeDefs
+    explicit_edge_calls: ExplicitEdgeCalls
+    outputs_workflow: List[Any]
+    vars_workflow_output_internal: List[str]
+    step_1_names: List[str]
+    sibling_subgraphs: List[GraphReps]
+    rose_tree_list: List[RoseTree]
+    tools_lst: List[Tool]
+    graphs: List[GraphCheckpoint]
+
+
+def checkpoint_graphs(subgraphs: List[GraphReps]) -> List[GraphCheckpoint]:
+    """Records the current state of the given graphs, so that we can rollback_graphs() later.
+
+    Args:
+        subgraphs (List[GraphReps]): The graphs associated with the current workflow and its parents
+
+    Returns:
+        List[GraphCheckpoint]: The current state of each graph
+    """
+    # NOTE: The graphviz body and the GraphData lists are append-only during
+    # compilation, so we only need their lengths. See rollback_graphs()
+    return [GraphCheckpoint(len(graph.graphviz.body), len(graph.graphdata.nodes), len(graph.graphdata.edges),
+                            len(graph.graphdata.subgraphs), len(graph.networkx))
+            for graph in subgraphs]
+
+
+def rollback_graphs(subgraphs: List[GraphReps], checkpoints: List[GraphCheckpoint]) -> None:
+    """Mutably discards all additions to the given graphs since checkpoint_graphs() was called.
+
+    Args:
+        subgraphs (List[GraphReps]): The graphs associated with the current workflow and its parents
+        checkpoints (List[GraphCheckpoint]): The return value of checkpoint_graphs(subgraphs)
+    """
+    for graph, checkpoint in zip(subgraphs, checkpoints):
+        # NOTE: While compiling a step, every networkx node / edge is added together with
+        # a GraphData node / edge (add_subgraphs() is only called after all of the steps).
+        # networkx graphs are also insertion-ordered, so the new nodes are at the end,
+        # and the new edges (between existing nodes) are among the new GraphData edges.
+        graph_nx = graph.networkx
+        graph_nx.remove_nodes_from(list(itertools.islice(graph_nx.nodes, checkpoint.networkx_nodes_len, None)))
+        edges_new = [(u, v) for u, v, _ in graph.graphdata.edges[checkpoint.edges_len:] if graph_nx.has_edge(u, v)]
+        if edges_new:
+            edges_old = set((u, v) for u, v, _ in graph.graphdata.edges[:checkpoint.edges_len])
+            graph_nx.remove_edges_from([edge for edge in edges_new if edge not in edges_old])
+        del graph.graphviz.body[checkpoint.body_len:]
+        del graph.graphdata.nodes[checkpoint.nodes_len:]
+        del graph.graphdata.edges[checkpoint.edges_len:]
+        del graph.graphdata.subgraphs[checkpoint.subgraphs_len:]
+
 
 def compile_workflow(yaml_tree_ast: YamlTree,
                      compiler_options: Dict[str, bool],
@@ -35,6 +310,46 @@ def compile_workflow(yaml_tree_ast: YamlTree,
                      is_root: bool,
                      relative_run_path: bool,
                      testing: bool) -> CompilerInfo:
+    """Compiles a workflow. Each root workflow gets its own memo; see memoized_subworkflows
+
+    Args:
+        yaml_tree_ast (YamlTree): A tuple of name and yml AST
+        compiler_options (Dict[str, bool]): The core flags needed for compilation and transformation into CWL
+        graph_settings (Dict[str, Any]): The settings dict for graphpviz graphs
+        yaml_tag_paths (Dict[str,str]): The paths that need to be included in (generated) yaml tags
+        kwargs (Any): all of the other keyword arguments for compile_workflow_once
+
+    Returns:
+        CompilerInfo: Contains the data associated with compiled subworkflows\n
+        (in the Rose Tree) together with mutable cumulative environment\n
+        information which needs to be passed through the recursion.
+    """
+    args = (yaml_tree_ast, compiler_options, graph_settings, yaml_tag_paths, namespaces, subgraphs_,
+            explicit_edge_defs, explicit_edge_calls, input_mapping, output_mapping, tools, is_root,
+            relative_run_path, testing)
+    if not is_root:
+        return compile_workflow_fixed_point(*args)
+    token = memoized_subworkflows.set({})
+    try:
+        return compile_workflow_fixed_point(*args)
+    finally:
+        memoized_subworkflows.reset(token)
+
+
+def compile_workflow_fixed_point(yaml_tree_ast: YamlTree,
+                                 compiler_options: Dict[str, bool],
+                                 graph_settings: Dict[str, Any],
+                                 yaml_tag_paths: Dict[str, str],
+                                 namespaces: Namespaces,
+                                 subgraphs_: List[GraphReps],
+                                 explicit_edge_defs: ExplicitEdgeDefs,
+                                 explicit_edge_calls: ExplicitEdgeCalls,
+                                 input_mapping: Dict[str, List[str]],
+                                 output_mapping: Dict[str, str],
+                                 tools: Tools,
+                                 is_root: bool,
+                                 relative_run_path: bool,
+                                 testing: bool) -> CompilerInfo:
     """fixed-point wrapper around compile_workflow_once\n
     See https://en.wikipedia.org/wiki/Fixed_point_(mathematics)
 
@@ -50,57 +365,308 @@ def compile_workflow(yaml_tree_ast: YamlTree,
         (in the Rose Tree) together with mutable cumulative environment\n
         information which needs to be passed through the recursion.
     """
+    # Identical subworkflows (i.e. the same .wic file used multiple times, or
+    # recompiled by each fixed-point iteration of the parent) compile to
+    # identical results, modulo namespaces. See get_memo_key()
+    memo = memoized_subworkflows.get()
+    memo_key = None
+    if compiler_options['memoize_subworkflows'] and memo is not None and not is_root:
+        memo_key = get_memo_key(yaml_tree_ast, compiler_options, graph_settings, yaml_tag_paths,
+                                namespaces, subgraphs_[-1], explicit_edge_defs, explicit_edge_calls,
+                                input_mapping, output_mapping, tools, relative_run_path, testing)
+    if memo is not None and memo_key is not None and memo_key in memo:
+        (compiler_info_memo, namespaces_memo) = memo[memo_key]
+        logger_memo.debug('reusing compilation of %s', '.'.join(namespaces + [yaml_tree_ast.step_id.stem]))
+        compiler_info = renamespace_compiler_info(copy.deepcopy(compiler_info_memo), namespaces_memo, namespaces)
+        overwrite_subgraph(subgraphs_[-1], compiler_info.rose.data.graph)
+        return compiler_info
+
     ast_modified = True
     yaml_tree = yaml_tree_ast
-    # There ought to be at most one insertion between each step.
-    # If everything is working correctly, we should thus reach the fixed point
-    # in at most n-1 iterations. However, due to the possibility of bugs in the
-    # implementation and/or spurious inputs, we should guarantee termination.
-    max_iters = 100  # 100 ought to be plenty. TODO: calculate n-1 from steps:
+    # Each iteration inserts (at most) one step. Each step can require a chain
+    # of insertions before it, which is at most as long as the number of
+    # insertion candidates. If everything is working correctly, we should thus
+    # reach the fixed point within steps * (candidates + 1) iterations
+    # (plus one to observe the fixed point). However, due to the possibility of
+    # bugs in the implementation and/or spurious inputs, we should guarantee termination.
+    num_steps = len(yaml_tree_ast.yml.get('steps', []))
+    num_candidates = 0
+    if compiler_options['insert_steps_automatically']:
+        num_candidates = sum(1 for stepid in tools if stepid.stem.startswith('insert_steps_automatically_'))
+    max_iters = num_steps * (num_candidates + 1) + 2
     i = 0
-    while ast_modified and i < max_iters:
-        subgraphs = copy.deepcopy(subgraphs_)  # See comment below!
-        compiler_info = compile_workflow_once(yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
-                                              namespaces, subgraphs, explicit_edge_defs, explicit_edge_calls,
-                                              input_mapping, output_mapping,
-                                              tools, is_root, relative_run_path, testing)
-        node_data: NodeData = compiler_info.rose.data
-        ast_modified = not yaml_tree.yml == node_data.yml
-        if ast_modified:
-            yaml_tree = YamlTree(yaml_tree_ast.step_id, node_data.yml)
-        i += 1
-
-    # Overwrite subgraphs_ element-wise
-    # This is a terrible hack due to the fact that the graphviz library API
-    # only allows appending to the body. This introduces mutable state, so each
-    # time we speculatively compile we accumulate duplicate nodes and edges.
-    # The 'correct' solution is to store the nodes and edges that you want to
-    # add in a separate data structure, return them from compile_workflow_once,
-    # and only once we have reached the fixed point then add them here. Due to
-    # labeling and styling and other graphviz metadata that is not trivial, so
-    # instead we simply deepcopy and overwrite the bodies here.
-    # (NOTE: We now have a separate GraphData structure, so the graphviz and
-    # networkx representations can probably be removed from the recursion.)
-    # (Also note that you have to do this element-wise; you cannot simply write
-    # subgraphs_ = subgraphs because that will only overwrite the local binding
-    # and thus it will not affect the call site of compile_workflow!)
-    for i, subgraph_ in enumerate(subgraphs_):
-        subgraph_.graphviz.body = subgraphs[i].graphviz.body
-        subgraph_.graphdata.name = subgraphs[i].graphdata.name
-        subgraph_.graphdata.nodes = subgraphs[i].graphdata.nodes
-        subgraph_.graphdata.edges = subgraphs[i].graphdata.edges
-        subgraph_.graphdata.subgraphs = subgraphs[i].graphdata.subgraphs
-        subgraph_.networkx.clear()
-        subgraph_.networkx.update(
-            subgraphs[i].networkx.edges, subgraphs[i].networkx.nodes)
-
-    if i == max_iters:
+    # Each time we speculatively compile and then insert a step, the steps
+    # before the insertion are unaffected. So instead of recompiling the entire
+    # workflow from scratch, compile_workflow_once rolls back only the partially
+    # compiled step (including its additions to subgraphs_) and stores a
+    # checkpoint here, and the next iteration resumes from the checkpoint.
+    # (Previously, this deepcopied and overwrote subgraphs_ on each iteration
+    # to discard the duplicate nodes and edges from the speculative passes.)
+    checkpoints: List[CompilerCheckpoint] = []
+    # NOTE: The process pools of precompile_subworkflows() (if any) are shut down when this exits,
+    # cancelling any pending compilations if an error occurs, so no worker processes are orphaned.
+    with contextlib.ExitStack() as exit_stack:
+        while ast_modified and i < max_iters:
+            compiler_info = compile_workflow_once(yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
+                                                  namespaces, subgraphs_, explicit_edge_defs, explicit_edge_calls,
+                                                  input_mapping, output_mapping,
+                                                  tools, is_root, relative_run_path, testing, checkpoints,
+                                                  exit_stack)
+            node_data: NodeData = compiler_info.rose.data
+            ast_modified = not yaml_tree.yml == node_data.yml
+            if ast_modified:
+                yaml_tree = YamlTree(yaml_tree_ast.step_id, node_data.yml)
+            i += 1
+
+    if ast_modified:
         print(yaml.dump(node_data.yml))
         raise Exception(
             f'Error! Maximum number of iterations ({max_iters}) reached in compile_workflow!')
+
+    if memo is not None and memo_key is not None and is_renamespaceable(compiler_info, namespaces):
+        if len(memo) >= MEMO_MAXSIZE:
+            del memo[next(iter(memo))]
+        memo[memo_key] = (copy.deepcopy(compiler_info), list(namespaces))
     return compiler_info
 
 
+def overwrite_subgraph(subgraph_: GraphReps, subgraph: GraphReps) -> None:
+    """Overwrites the contents of subgraph_ with the contents of subgraph.\n
+    NOTE: You have to do this element-wise; you cannot simply write
+    subgraph_ = subgraph because that will only overwrite the local binding
+    and thus it will not affect the call site of compile_workflow!
+
+    Args:
+        subgraph_ (GraphReps): The graph at the call site of compile_workflow
+        subgraph (GraphReps): The graph which was actually compiled into
+    """
+    subgraph_.graphviz.body = subgraph.graphviz.body
+    subgraph_.graphdata.name = subgraph.graphdata.name
+    subgraph_.graphdata.nodes = subgraph.graphdata.nodes
+    subgraph_.graphdata.edges = subgraph.graphdata.edges
+    subgraph_.graphdata.subgraphs = subgraph.graphdata.subgraphs
+    subgraph_.networkx.clear()
+    subgraph_.networkx.update(subgraph.networkx.edges, subgraph.networkx.nodes)
+
+
+def get_subworkflow_graph(step_key: str, sub_yml: Yaml) -> GraphReps:
+    """Initializes the graph of the given subworkflow step.
+
+    Args:
+        step_key (str): The name of the subworkflow step
+        sub_yml (Yaml): The yml AST of the subworkflow
+
+    Returns:
+        GraphReps: The (empty) graph of the subworkflow
+    """
+    # get the label (if any) from the subworkflow
+    step_i_wic_graphviz = sub_yml.get('wic', {}).get('graphviz', {})
+    label = step_i_wic_graphviz.get('label', step_key)
+    style = step_i_wic_graphviz.get('style', '')
+
+    subgraph_gv = graphviz.Digraph(name=f'cluster_{step_key}')
+    subgraph_gv.attr(label=label)  # str(path)
+    subgraph_gv.attr(color='lightblue')  # color of outline
+    if style != '':
+        subgraph_gv.attr(style=style)
+    subgraph_nx = nx.DiGraph()
+    graphdata = GraphData(step_key)
+    return GraphReps(subgraph_gv, subgraph_nx, graphdata)
+
+
+def get_edge_references(yml: Any) -> Tuple[Set[str], Set[str], Set[str]]:
+    """Recursively collects the edges of the given yml AST (i.e. a step, including its subtree and wic: tags).
+
+    Args:
+        yml (Any): The yml AST
+
+    Returns:
+        Tuple[Set[str], Set[str], Set[str]]: The variables referenced by the in: tags,
+        and the names of the explicit edge definitions (!&) and call sites (!*)
+    """
+    in_refs: Set[str] = set()
+    anchors: Set[str] = set()
+    aliases: Set[str] = set()
+
+    def collect(val: Any, is_in: bool) -> None:
+        if isinstance(val, dict):
+            for key, sub_val in val.items():
+                if key == 'wic_inline_input':
+                    continue  # i.e. literal values, not references
+                if key == 'wic_anchor' and isinstance(sub_val, str):
+                    anchors.add(sub_val)
+                if key == 'wic_alias' and isinstance(sub_val, str):
+                    aliases.add(sub_val)
+                collect(sub_val, is_in or key == 'in')
+        elif isinstance(val, list):
+            for sub_val in val:
+                collect(sub_val, is_in)
+        elif is_in and isinstance(val, str):
+            in_refs.add(val)
+
+    collect(yml, False)
+    return (in_refs, anchors, aliases)
+
+
+def get_independent_subworkflows(yaml_tree: Yaml,
+                                 steps_keys: List[str],
+                                 subkeys: List[str],
+                                 wic_steps: Yaml,
+                                 yaml_stem: str,
+                                 compiler_options: Dict[str, bool],
+                                 explicit_edge_defs: ExplicitEdgeDefs,
+                                 explicit_edge_calls: ExplicitEdgeCalls) -> List[int]:
+    """Finds the subworkflow steps whose compilation does not depend on their sibling steps.
+
+    Each subworkflow step is compiled with the explicit edges and the input / output
+    mappings accumulated from the previous steps. The explicit edges (!& / !*) of each
+    step are passed to all of the later steps, and otherwise the only additions to the
+    mappings are the workflow inputs of this workflow and variables namespaced by the
+    step names of this workflow. If no previous step has explicit edges, and none of
+    the in: edges of the subworkflow (recursively) reference these variables, then it
+    cannot observe the additions, and it compiles to the same result as if it were
+    the first step (see rebase_compiler_info()).
+    This is conservative; anything else is compiled sequentially, as usual.
+
+    Args:
+        yaml_tree (Yaml): The yml AST of the (parent) workflow
+        steps_keys (List[str]): The name of each step of the workflow
+        subkeys (List[str]): The names of the subworkflow steps
+        wic_steps (Yaml): The wic: steps: tag of the workflow
+        yaml_stem (str): The name of the workflow
+        compiler_options (Dict[str, bool]): The core flags needed for compilation and transformation into CWL
+        explicit_edge_defs (ExplicitEdgeDefs): The explicit edge definition sites from the parent workflows
+        explicit_edge_calls (ExplicitEdgeCalls): The explicit edge call sites from the parent workflows
+
+    Returns:
+        List[int]: The indices of the independent subworkflow steps
+    """
+    # Automatic insertions roll back all of the graphs, and raw CWL can add arbitrary variables.
+    if compiler_options['insert_steps_automatically'] or compiler_options['allow_raw_cwl']:
+        return []
+    if explicit_edge_defs or explicit_edge_calls:
+        return []
+    if 'cwl_subinterpreter' in get_step_stems(yaml_tree):
+        return []
+
+    inputs_workflow = set(yaml_tree.get('inputs', {}))
+    independent = []
+    explicit_edges = False  # i.e. in any of the previous steps
+    for i, step_key in enumerate(steps_keys):
+        (in_refs, anchors, aliases) = get_edge_references([yaml_tree['steps'][i],
+                                                          wic_steps.get(f'({i+1}, {step_key})', {})])
+        # NOTE: The !* call sites within the subworkflow must also be defined within the subworkflow.
+        if (step_key in subkeys and not explicit_edges and not aliases - anchors
+                and not in_refs & inputs_workflow
+                and not any(ref.startswith(f'{yaml_stem}__step__') for ref in in_refs)
+                and yaml_stem not in [Path(step_key).stem] + get_step_stems(yaml_tree['steps'][i]['subtree'])):
+            independent.append(i)
+        explicit_edges = explicit_edges or bool(anchors or aliases)
+    return independent
+
+
+def compile_subworkflow_worker(args_pickle: bytes) -> CompilerInfo:
+    """Compiles a subworkflow in a worker process. See precompile_subworkflows()
+
+    Args:
+        args_pickle (bytes): The (pickled) global variables, and the arguments of compile_workflow
+
+    Returns:
+        CompilerInfo: The compiled subworkflow
+    """
+    global inference_rules  # pylint: disable=global-statement
+    (inference_rules, inference.renaming_conventions, *compile_args) = pickle.loads(args_pickle)
+    return compile_workflow(*compile_args)
+
+
+def precompile_subworkflows(independent: List[int],
+                            steps: List[Yaml],
+                            steps_keys: List[str],
+                            wic_steps: Yaml,
+                            yaml_stem: str,
+                            compiler_options: Dict[str, bool],
+                            graph_settings: Dict[str, Any],
+                            yaml_tag_paths: Dict[str, str],
+                            namespaces: Namespaces,
+                            subgraphs: List[GraphReps],
+                            input_mapping: Dict[str, List[str]],
+                            output_mapping: Dict[str, str],
+                            tools: Tools,
+                            relative_run_path: bool,
+                            testing: bool,
+                            exit_stack: contextlib.ExitStack) -> Dict[int, Future]:
+    """Starts compiling the given independent subworkflow steps concurrently, on a process pool.
+
+    Args:
+        independent (List[int]): The indices of the independent subworkflow steps
+        steps (List[Yaml]): The steps of the (parent) workflow
+        steps_keys (List[str]): The name of each step of the workflow
+        wic_steps (Yaml): The wic: steps: tag of the workflow
+        yaml_stem (str): The name of the workflow
+        input_mapping (Dict[str, List[str]]): The input mapping before the first step
+        output_mapping (Dict[str, str]): The output mapping before the first step
+        exit_stack (contextlib.ExitStack): Shuts down the process pool (once the caller has used the results)
+        (See compile_workflow_once() for the other arguments.)
+
+    Returns:
+        Dict[int, Future]: The compilation result of each subworkflow step
+    """
+    # NOTE: Only parallelize the outermost level; the subworkflows are compiled sequentially within each worker.
+    compiler_options_worker = {**compiler_options, 'parallel_subworkflows': False}
+    # Forked workers do not need to re-import everything.
+    fork = 'fork' in multiprocessing.get_all_start_methods()
+    max_workers = min(max_workers_subworkflows or os.cpu_count() or 1, len(independent))
+    executor = ProcessPoolExecutor(max_workers, multiprocessing.get_context('fork' if fork else None))
+    # NOTE: If compilation fails, do not wait for the pending compilations.
+    exit_stack.callback(executor.shutdown, wait=True, cancel_futures=True)
+    precompiled: Dict[int, Future] = {}
+    for i in independent:
+        step_key = steps_keys[i]
+        plugin_ns_i = wic_steps.get(f'({i+1}, {step_key})', {}).get('wic', {}).get('namespace', 'global')
+        sub_yml = steps[i]['subtree']
+        step_name_i = utils.step_name_str(yaml_stem, i, step_key)
+        args: Tuple[Any, ...] = (inference_rules, inference.renaming_conventions,
+                                 YamlTree(StepId(step_key, plugin_ns_i), sub_yml), compiler_options_worker,
+                                 graph_settings, yaml_tag_paths, namespaces + [step_name_i],
+                                 subgraphs + [get_subworkflow_graph(step_key, sub_yml)],
+                                 {}, {}, input_mapping, output_mapping, tools, False, relative_run_path, testing)
+        # NOTE: Pickle the arguments now, because the parent workflow mutates (some of) them while compiling.
+        precompiled[i] = executor.submit(compile_subworkflow_worker, pickle.dumps(args))
+    return precompiled
+
+
+def rebase_compiler_info(compiler_info: CompilerInfo,
+                         input_mapping_init: Dict[str, List[str]],
+                         output_mapping_init: Dict[str, str],
+                         input_mapping: Dict[str, List[str]],
+                         output_mapping: Dict[str, str]) -> CompilerInfo:
+    """Adds the additions to the input / output mappings by the previous sibling steps
+    to the environment of an independent subworkflow, exactly as if it had been
+    compiled sequentially with them. See get_independent_subworkflows()
+
+    Args:
+        compiler_info (CompilerInfo): The subworkflow, compiled with the initial mappings
+        input_mapping_init (Dict[str, List[str]]): The input mapping before the first step
+        output_mapping_init (Dict[str, str]): The output mapping before the first step
+        input_mapping (Dict[str, List[str]]): The current input mapping
+        output_mapping (Dict[str, str]): The current output mapping
+
+    Returns:
+        CompilerInfo: The subworkflow, as if compiled with the current mappings
+    """
+    env = compiler_info.env
+    # NOTE: The subworkflow can only append to the initial values.
+    input_mapping_env = {k: input_mapping[k] + env.input_mapping[k][len(v):] for k, v in input_mapping_init.items()}
+    input_mapping_env.update({k: list(v) for k, v in input_mapping.items() if k not in input_mapping_init})
+    input_mapping_env.update({k: v for k, v in env.input_mapping.items() if k not in input_mapping_init})
+    output_mapping_env = {k: env.output_mapping[k] for k in output_mapping_init}
+    output_mapping_env.update({k: v for k, v in output_mapping.items() if k not in output_mapping_init})
+    output_mapping_env.update({k: v for k, v in env.output_mapping.items() if k not in output_mapping_init})
+    env = EnvData(input_mapping_env, output_mapping_env, env.inputs_file_workflow,
+                  env.vars_workflow_output_internal, env.explicit_edge_defs, env.explicit_edge_calls)
+    return CompilerInfo(compiler_info.rose, env)
+
+
 def compile_workflow_once(yaml_tree_ast: YamlTree,
                           compiler_options: Dict[str, bool],
                           graph_settings: Dict[str, Any],
@@ -114,7 +680,9 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                           tools: Tools,
                           is_root: bool,
                           relative_run_path: bool,
-                          testing: bool) -> CompilerInfo:
+                          testing: bool,
+                          checkpoints: Optional[List[CompilerCheckpoint]] = None,
+                          exit_stack: Optional[contextlib.ExitStack] = None) -> CompilerInfo:
     """STOP: Have you read the Developer's Guide?? docs/devguide.md\n
     Recursively compiles yml workflow definition ASTs to CWL file contents
 
@@ -133,6 +701,11 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
         relative_run_path (bool): Controls whether to use subdirectories or\n
         just one directory when writing the compiled CWL files to disk
         testing: Used to disable some optional features which are unnecessary for testing.
+        checkpoints (Optional[List[CompilerCheckpoint]]): If not None, and if a step is automatically\n
+        inserted, the state just before the insertion is appended, after rolling back subgraphs.\n
+        If non-empty, compilation resumes from the (popped) checkpoint. See compile_workflow()
+        exit_stack (Optional[contextlib.ExitStack]): If not None, and if compiler_options['parallel_subworkflows'],\n
+        the independent subworkflows are compiled concurrently, on a process pool which is shut down by exit_stack.
 
     Raises:
         Exception: If any errors occur
@@ -143,11 +716,17 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
         information which needs to be passed through the recursion.
     """
     # NOTE: Use deepcopy so that when we delete wic: we don't modify any call sites
-    (step_id, yaml_tree) = copy.deepcopy(yaml_tree_ast)
+    # However, the pre-loaded subtrees are never modified here (the recursive
+    # calls make their own copies), so share them instead of copying them at
+    # every level of the recursion, which is quadratic in the depth.
+    (step_id, yaml_tree_orig) = yaml_tree_ast
+    memo = {id(step['subtree']): step['subtree']
+            for step in yaml_tree_orig.get('steps', []) if isinstance(step, dict) and 'subtree' in step}
+    yaml_tree = copy.deepcopy(yaml_tree_orig, memo)
     yaml_path = step_id.stem
-    # We also want another copy of the original AST so that if we need to modify it,
-    # we can return the modified AST to the call site and re-compile.
-    (_, yaml_tree_orig) = copy.deepcopy(yaml_tree_ast)
+    # We also want the original AST so that if we need to modify it, we can
+    # return the modified AST to the call site and re-compile. It is only
+    # copied (see insert_step_into_workflow below) if it actually needs to be modified.
 
     if not testing:
         print(' starting compilation of', ('  ' * len(namespaces)) + yaml_path)
@@ -199,20 +778,23 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
     inputs_file_workflow = {}
 
     # Collect workflow input/output to workflow step input/output mappings
-    input_mapping_copy = copy.deepcopy(input_mapping)
-    output_mapping_copy = copy.deepcopy(output_mapping)
+    # NOTE: The values (lists of strings) are replaced, never mutated in-place,
+    # so shallow copies suffice.
+    input_mapping_copy = {key: list(val) for key, val in input_mapping.items()}
+    output_mapping_copy = dict(output_mapping)
 
     # Collect the internal workflow output variables
     outputs_workflow = []
     vars_workflow_output_internal = []
 
     # Copy recursive explicit edge variable definitions and call sites.
-    explicit_edge_defs_copy = copy.deepcopy(explicit_edge_defs)
-    explicit_edge_calls_copy = copy.deepcopy(explicit_edge_calls)
+    # NOTE: The values are immutable (namespaces, name) tuples, so shallow copies suffice.
+    explicit_edge_defs_copy = dict(explicit_edge_defs)
+    explicit_edge_calls_copy = dict(explicit_edge_calls)
     # Unlike the first copies which are mutably updated, these are returned
     # unmodified so that we can test that compilation is embedding independent.
-    explicit_edge_defs_copy2 = copy.deepcopy(explicit_edge_defs)
-    explicit_edge_calls_copy2 = copy.deepcopy(explicit_edge_calls)
+    explicit_edge_defs_copy2 = dict(explicit_edge_defs)
+    explicit_edge_calls_copy2 = dict(explicit_edge_calls)
 
     # Collect recursive subworkflow data
     step_1_names = []
@@ -227,7 +809,64 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
 
     tools_lst: List[Tool] = []
 
+    # Resume from just before the step which caused the previous insertion.
+    # NOTE: insert_step_into_workflow() does not modify steps[:i] nor the
+    # corresponding wic: steps: tags, so their compiled state is still valid.
+    i_resume = 0
+    if checkpoints:
+        checkpoint = checkpoints.pop()
+        i_resume = checkpoint.i
+        steps[:i_resume] = checkpoint.steps[:i_resume]
+        wic_steps.update({key: val for key, val in checkpoint.wic_steps.items()
+                          if utils.parse_int_string_tuple(key)[0] <= i_resume})
+        if checkpoint.inputs is not None:
+            yaml_tree['inputs'] = checkpoint.inputs
+        inputs_workflow = checkpoint.inputs_workflow
+        inputs_file_workflow = checkpoint.inputs_file_workflow
+        input_mapping_copy = checkpoint.input_mapping
+        output_mapping_copy = checkpoint.output_mapping
+        explicit_edge_defs_copy = checkpoint.explicit_edge_defs
+        explicit_edge_calls_copy = checkpoint.explicit_edge_calls
+        outputs_workflow = checkpoint.outputs_workflow
+        vars_workflow_output_internal = checkpoint.vars_workflow_output_internal
+        step_1_names = checkpoint.step_1_names
+        sibling_subgraphs = checkpoint.sibling_subgraphs
+        rose_tree_list = checkpoint.rose_tree_list
+        tools_lst = checkpoint.tools_lst
+
+    # NOTE: The index of the outputs of steps[:i] is updated incrementally during inference.
+    output_index = inference.OutputIndex()
+
+    # Start compiling the independent subworkflows concurrently; the results are
+    # used (in order) below. See get_independent_subworkflows()
+    precompiled: Dict[int, Future] = {}
+    # NOTE: The worker processes are forked, which is only safe if this process has no other threads.
+    if (compiler_options.get('parallel_subworkflows', False) and i_resume == 0 and exit_stack is not None
+            and threading.active_count() == 1):
+        independent = get_independent_subworkflows(yaml_tree, steps_keys, subkeys, wic_steps, yaml_stem,
+                                                   compiler_options, explicit_edge_defs, explicit_edge_calls)
+        if len(independent) > 1:
+            precompiled = precompile_subworkflows(independent, steps, steps_keys, wic_steps, yaml_stem,
+                                                  compiler_options, graph_settings, yaml_tag_paths,
+                                                  namespaces, subgraphs, input_mapping_copy, output_mapping_copy,
+                                                  tools, relative_run_path, testing, exit_stack)
+
     for i, step_key in enumerate(steps_keys):
+        if i < i_resume:
+            continue
+        checkpoint_i: Optional[CompilerCheckpoint] = None
+        if checkpoints is not None and compiler_options['insert_steps_automatically']:
+            # NOTE: Make (shallow) copies of everything which step i can mutate.
+            # The workflow inputs: are only modified in-place (rarely), so they are copied on write.
+            checkpoint_i = CompilerCheckpoint(i, steps, dict(wic_steps), {}, None,
+                                              dict(inputs_workflow), dict(inputs_file_workflow),
+                                              {k: list(v) for k, v in input_mapping_copy.items()},
+                                              dict(output_mapping_copy),
+                                              dict(explicit_edge_defs_copy), dict(explicit_edge_calls_copy),
+                                              list(outputs_workflow), list(vars_workflow_output_internal),
+                                              list(step_1_names), list(sibling_subgraphs),
+                                              list(rose_tree_list), list(tools_lst),
+                                              checkpoint_graphs(subgraphs))
         step_name_i = utils.step_name_str(yaml_stem, i, step_key)
         stem = Path(step_key).stem
         wic_step_i = wic_steps.get(f'({i+1}, {step_key})', {})
@@ -247,27 +886,20 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
             sub_yml = steps[i]['subtree']
             sub_yaml_tree = YamlTree(StepId(step_key, plugin_ns_i), sub_yml)
 
-            # get the label (if any) from the subworkflow
-            step_i_wic_graphviz = sub_yml.get('wic', {}).get('graphviz', {})
-            label = step_i_wic_graphviz.get('label', step_key)
-            style = step_i_wic_graphviz.get('style', '')
-
-            subgraph_gv = graphviz.Digraph(name=f'cluster_{step_key}')
-            subgraph_gv.attr(label=label)  # str(path)
-            subgraph_gv.attr(color='lightblue')  # color of outline
-            if style != '':
-                subgraph_gv.attr(style=style)
-            subgraph_nx = nx.DiGraph()
-            graphdata = GraphData(step_key)
-            subgraph = GraphReps(subgraph_gv, subgraph_nx, graphdata)
-
-            sub_compiler_info = compile_workflow(sub_yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
-                                                 namespaces +
-                                                 [step_name_or_key], subgraphs +
-                                                 [subgraph],
-                                                 explicit_edge_defs_copy, explicit_edge_calls_copy,
-                                                 input_mapping_copy, output_mapping_copy,
-                                                 tools, False, relative_run_path, testing)
+            subgraph = get_subworkflow_graph(step_key, sub_yml)
+            graphdata = subgraph.graphdata
+
+            if i in precompiled:
+                sub_compiler_info = rebase_compiler_info(precompiled[i].result(), input_mapping, output_mapping,
+                                                         input_mapping_copy, output_mapping_copy)
+            else:
+                sub_compiler_info = compile_workflow(sub_yaml_tree, compiler_options, graph_settings,
+                                                     yaml_tag_paths, namespaces +
+                                                     [step_name_or_key], subgraphs +
+                                                     [subgraph],
+                                                     explicit_edge_defs_copy, explicit_edge_calls_copy,
+                                                     input_mapping_copy, output_mapping_copy,
+                                                     tools, False, relative_run_path, testing)
 
             sub_rose_tree = sub_compiler_info.rose
             rose_tree_list.append(sub_rose_tree)
@@ -291,9 +923,9 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
             # Add arguments to the compiled subworkflow (if any), being careful
             # to remove any child wic: metadata annotations. Post-compilation
             # arguments can now be added either directly inline or as metadata.
-            wic_step_i_copy = copy.deepcopy(wic_step_i)
-            if 'wic' in wic_step_i_copy:
-                del wic_step_i_copy['wic']
+            # NOTE: merge() deep copies the values from its sources, so there is
+            # no need to deep copy wic_step_i here.
+            wic_step_i_copy = {key: val for key, val in wic_step_i.items() if key != 'wic'}
             # NOTE: To support overloading, the metadata args must overwrite the parent args!
             steps_i_id = utils.require_step_id(steps[i])
             args_provided_dict = merge(steps[i]['parentargs'], wic_step_i_copy,
@@ -440,9 +1072,7 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
             style = default_style if style == '' else default_style + ', ' + style
             attrs = {'label': label, 'shape': 'box',
                      'style': style, 'fillcolor': 'lightblue'}
-            graph_gv.node(step_node_name, **attrs)
-            graph_nx.add_node(step_node_name)
-            graphdata.nodes.append((step_node_name, attrs))
+            utils_graphs.add_graph_node(graph_settings, graph, step_node_name, attrs)
         elif not (step_key in subkeys and len(namespaces) < graph_settings['graph_inline_depth']):
             nssnode = namespaces + [step_name_or_key]
             # Just like in add_graph_edge(), here we can hide all of the details
@@ -462,9 +1092,7 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
             style = default_style if style == '' else default_style + ', ' + style
             attrs = {'label': label, 'shape': 'box',
                      'style': style, 'fillcolor': 'lightblue'}
-            graph_gv.node(step_node_name, **attrs)
-            graph_nx.add_node(step_node_name)
-            graphdata.nodes.append((step_node_name, attrs))
+            utils_graphs.add_graph_node(graph_settings, graph, step_node_name, attrs)
 
         if 'out' not in steps[i]:
             steps[i]['out'] = []
@@ -663,15 +1291,15 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                         namespaces + [step_name_or_key, arg_key])
                     attrs = {'label': arg_key, 'shape': 'box',
                              'style': 'rounded, filled', 'fillcolor': 'lightgreen'}
-                    graph_gv.node(input_node_name, **attrs)
-                    font_edge_color = 'black' if graph_settings['graph_dark_theme'] else 'white'
-                    graph_gv.edge(input_node_name, step_node_name,
-                                  color=font_edge_color)
-                    graph_nx.add_node(input_node_name)
-                    graph_nx.add_edge(input_node_name, step_node_name)
-                    graphdata.nodes.append((input_node_name, attrs))
-                    graphdata.edges.append(
-                        (input_node_name, step_node_name, {}))
+                    utils_graphs.add_graph_node(graph_settings, graph, input_node_name, attrs)
+                    if utils_graphs.graph_mode_full(graph_settings):
+                        font_edge_color = 'black' if graph_settings['graph_dark_theme'] else 'white'
+                        graph_gv.edge(input_node_name, step_node_name,
+                                      color=font_edge_color)
+                        graph_nx.add_edge(input_node_name, step_node_name)
+                    if utils_graphs.graph_mode_graphdata(graph_settings):
+                        graphdata.edges.append(
+                            (input_node_name, step_node_name, {}))
             else:
                 arg_var: str = arg_val
                 # Leave un-evaluated, i.e. allow the user to inject raw CWL.
@@ -704,6 +1332,8 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                         'If you want to compile the workflow anyway, use --allow_raw_cwl')
                     sys.exit(1)
 
+                if checkpoint_i is not None and hashable and arg_var in yaml_tree.get('inputs', {}):
+                    checkpoint_i.inputs_undo.setdefault(arg_var, copy.deepcopy(inputs_key_dict))
                 if 'doc' in inputs_key_dict:
                     inputs_key_dict['doc'] += '\\n' + in_dict.get('doc', '')
                 else:
@@ -801,7 +1431,8 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                                                             is_root, namespaces, vars_workflow_output_internal,
                                                             input_mapping_copy, output_mapping_copy, inputs_workflow,
                                                             in_name, in_name_in_inputs_file_workflow,
-                                                            arg_key_in_yaml_tree_inputs, insertions, wic_steps, testing)
+                                                            arg_key_in_yaml_tree_inputs, insertions, wic_steps, testing,
+                                                            output_index)
                 # NOTE: For now, perform_edge_inference mutably appends to
                 # inputs_workflow and vars_workflow_output_internal.
 
@@ -814,7 +1445,14 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                         print('Warning! More than one step! Choosing', insertion)
 
                     yaml_tree_mod = insert_step_into_workflow(
-                        yaml_tree_orig, insertion, tools, i)
+                        copy.deepcopy(yaml_tree_orig), insertion, tools, i)
+                    if checkpoints is not None and checkpoint_i is not None:
+                        rollback_graphs(subgraphs, checkpoint_i.graphs)
+                        # NOTE: yaml_tree is discarded, so its inputs: can be reused (after undoing step i).
+                        inputs = yaml_tree.get('inputs')
+                        if inputs is not None:
+                            inputs.update(checkpoint_i.inputs_undo)
+                        checkpoints.append(checkpoint_i._replace(inputs=inputs))
 
                     node_data = NodeData(namespaces, yaml_stem, yaml_tree_mod, yaml_tree, tool_i, {},
                                          explicit_edge_defs_copy2, explicit_edge_calls_copy2,
@@ -1053,7 +1691,7 @@ def insert_step_into_workflow(yaml_tree_orig: Yaml, stepid: StepId, tools: Tools
     """
     yaml_tree_mod = yaml_tree_orig
     steps_mod: List[Yaml] = yaml_tree_mod['steps']
-    steps_mod.insert(i, {stepid.stem: None})
+    steps_mod.insert(i, {'id': stepid.stem})
 
     # Add inference rules annotations (i.e. for insertions)
     tool = tools[stepid]
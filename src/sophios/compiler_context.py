@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from jsonschema import Draft202012Validator
+
+from . import input_output as io
+from . import compiler, inference, plugins, utils
+from .schemas import wic_schema
+from .wic_types import Json, Tools
+
+logger = logging.getLogger('sophios.compiler_context')
+
+
+class CompilerContextData(NamedTuple):
+    config: Json
+    tools: Tools
+    yml_paths: Dict[str, Dict[str, Path]]
+    inference_rules: Dict[str, str]
+    renaming_conventions: List[Tuple[str, str]]
+    validator: Optional[Draft202012Validator]
+    fingerprint: str
+
+
+class CompilerContext():
+    """Warm, long-lived compiler state (config, tools, yml paths, inference rules, validator)
+
+    This is intended for long-lived processes (i.e. the REST API) which compile
+    many workflows, so that each compilation does not pay for reloading the
+    config and the entire CWL plugin tree from disk. The state is reloaded
+    (at most once every refresh_interval seconds) only when the config file or
+    any of the files in search_paths_cwl / search_paths_wic change.
+    Long-lived servers should call start_watcher(), which checks for changes
+    in a background thread, so that get() never touches the filesystem.
+
+    NOTE: The data returned by get() is never mutated in-place; refreshing
+    atomically swaps in a new instance. Callers which need to add tools
+    (i.e. inline run: tags) must do so on a copy. See tools_copy().
+    """
+
+    def __init__(self, config_file: Path, default_config_file: Path,
+                 validate_plugins: bool = False, quiet: bool = False,
+                 use_tools_cache: bool = True, refresh_interval: float = 2.0,
+                 with_validator: bool = True) -> None:
+        self.config_file = config_file
+        self.default_config_file = default_config_file
+        self.validate_plugins = validate_plugins
+        self.quiet = quiet
+        self.use_tools_cache = use_tools_cache
+        self.refresh_interval = refresh_interval
+        self.with_validator = with_validator
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watcher = threading.Event()
+        self._data = self._load(*self._fingerprint())
+
+    def _fingerprint(self) -> Tuple[Json, str]:
+        config = io.get_config(self.config_file, self.default_config_file)
+        config_stat = ''
+        if self.config_file.exists():
+            stat = self.config_file.stat()
+            config_stat = f'{stat.st_mtime_ns}:{stat.st_size}'
+        return config, config_stat + ':' + plugins.get_search_paths_fingerprint(config)
+
+    def _load(self, config: Json, fingerprint: str) -> CompilerContextData:
+        tools = plugins.get_tools_cwl(config, self.validate_plugins, self.quiet, use_cache=self.use_tools_cache)
+        yml_paths = plugins.get_yml_paths(config)
+        validator = None
+        if self.with_validator:
+            yaml_stems = utils.flatten([list(p) for p in yml_paths.values()])
+            validator = wic_schema.get_validator(tools, yaml_stems, wic_schema.get_cached_schemas(yml_paths),
+                                                 write_to_disk=False)
+        data = CompilerContextData(config, tools, yml_paths,
+                                   config.get('inference_rules', {}),
+                                   config.get('renaming_conventions', []),
+                                   validator, fingerprint)
+        self._last_check = time.monotonic()
+        return data
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reloads the compiler state if the config file or any plugin / workflow files changed.
+
+        Args:
+            force (bool, optional): Check for changes even if refresh_interval has not elapsed. Defaults to False.
+
+        Returns:
+            bool: True if the compiler state was reloaded.
+        """
+        if not force and time.monotonic() - self._last_check < self.refresh_interval:
+            return False
+        # Only one thread needs to reload; all other threads keep using the current data.
+        if not self._lock.acquire(blocking=force):
+            return False
+        try:
+            config, fingerprint = self._fingerprint()
+            self._last_check = time.monotonic()
+            if fingerprint == self._data.fingerprint:
+                return False
+            self._data = self._load(config, fingerprint)
+            return True
+        finally:
+            self._lock.release()
+
+    def start_watcher(self) -> None:
+        """Starts checking for changes every refresh_interval seconds in a background thread.
+
+        While the watcher is running, get() only returns the current state, i.e. the
+        filesystem scan (and any reloading) never happens on the caller's thread.
+        """
+        if self._watcher is not None:
+            return
+        self._stop_watcher.clear()
+        self._watcher = threading.Thread(target=self._watch, name='compiler-context-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        """Stops the background thread started by start_watcher() (if any)"""
+        if self._watcher is None:
+            return
+        self._stop_watcher.set()
+        self._watcher.join()
+        self._watcher = None
+
+    def _watch(self) -> None:
+        while not self._stop_watcher.wait(self.refresh_interval):
+            try:
+                self.refresh(force=True)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # i.e. a plugin which is still being written; keep the current state and try again later.
+                logger.warning('Failed to reload the compiler context: %s', e)
+
+    def get(self) -> CompilerContextData:
+        """Returns the current compiler state, refreshing it first if necessary
+        (unless the background watcher is running).
+
+        This also performs the initialization of the compiler global variables.
+
+        Returns:
+            CompilerContextData: The current (immutable) compiler state
+        """
+        if self._watcher is None:
+            self.refresh()
+        data = self._data
+        # Perform initialization via mutating global variables (This is not ideal)
+        compiler.inference_rules = data.inference_rules
+        inference.renaming_conventions = data.renaming_conventions
+        return data
+
+    def tools_copy(self) -> Tools:
+        """Returns a shallow copy of the current tools, which can be safely extended per compilation.
+
+        Returns:
+            Tools: A copy of the CWL CommandLineTool definitions found using get_tools_cwl()
+        """
+        return dict(self.get().tools)
@@ -1,14 +1,20 @@
 """Schema-backed compute request objects."""
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field, fields as dataclass_fields
-from functools import lru_cache
+from functools import lru_cache, partial
 import json
 from pathlib import Path
+import random
 import time
-from typing import Any, Mapping, Protocol, cast
+from types import TracebackType
+from typing import Any, Callable, Iterable, Mapping, Protocol, TypeVar, cast
 
+import aiofiles
 from jsonschema import Draft202012Validator
 import requests
+from requests.adapters import HTTPAdapter
 
 from .wic_types import Json, RawJson
 
@@ -18,6 +24,7 @@ _STARTED = frozenset({"RUNNING", "COMPLETED", "ERROR", "CANCELLED"})
 _ACCEPTED = frozenset({"RUNNING", "COMPLETED"})
 _BODY_HEADERS = {"Content-Type": "application/json"}
 _Body = Json | list[Any] | str
+_T = TypeVar("_T")
 
 
 class ComputeRequestValidationError(ValueError):
@@ -75,6 +82,7 @@ class ComputeSubmission:
     submit_response: _Body | None = None
     status_response: _Body | None = None
     logs: _Body | None = None
+    timed_out: bool = False
 
     @property
     def ok(self) -> bool:
@@ -156,6 +164,376 @@ def _poll_status(
         time.sleep(poll_interval_seconds)
 
 
+@dataclass(frozen=True, slots=True)
+class PollingPolicy:
+    """Exponential backoff schedule for Compute status polling."""
+
+    initial_interval_seconds: float = 1.0
+    max_interval_seconds: float = 30.0
+    multiplier: float = 2.0
+    jitter: float = 0.1
+    deadline_seconds: float | None = 3600.0
+
+    def next_interval(self, interval_seconds: float) -> float:
+        """Return the (un-jittered) interval which follows the given interval."""
+        return min(interval_seconds * self.multiplier, self.max_interval_seconds)
+
+    def jittered(self, interval_seconds: float) -> float:
+        """Spread out the polls of workflows which were submitted at the same time."""
+        return interval_seconds * (1.0 + random.uniform(-self.jitter, self.jitter))
+
+
+@dataclass(frozen=True, slots=True)
+class RetryPolicy:
+    """Exponential backoff schedule for retrying transient Compute HTTP failures.
+
+    Connection errors, timeouts, and the given status codes (i.e. rate limiting and
+    gateway / service unavailable errors) are retried; all other responses are returned.
+    """
+
+    max_attempts: int = 4
+    initial_backoff_seconds: float = 0.5
+    max_backoff_seconds: float = 30.0
+    multiplier: float = 2.0
+    jitter: float = 0.1
+    status_codes: frozenset[int] = frozenset({408, 429, 500, 502, 503, 504})
+
+    def backoff(self, attempt: int) -> float:
+        """Return the (jittered) delay before the given retry attempt (starting from 1)."""
+        backoff_seconds = min(self.initial_backoff_seconds * self.multiplier ** (attempt - 1),
+                              self.max_backoff_seconds)
+        return backoff_seconds * (1.0 + random.uniform(-self.jitter, self.jitter))
+
+
+@dataclass(slots=True)
+class _InFlight:
+    future: "asyncio.Future[tuple[str | None, _HttpResult | None, bool]]"
+    deadline: float | None
+    next_poll: float
+    interval_seconds: float
+    phase: str | None = None
+    result: _HttpResult | None = None
+    errors: int = 0
+
+
+class ThreadedComputeClient:
+    """Shared client (with an asyncio interface) for submitting many compute requests to one Compute service.
+
+    NOTE: This is a threaded client, not a native async HTTP client. The HTTP calls are
+    made with (blocking) `requests` on a bounded thread pool whose size matches the
+    connection pool, so at most `max_connections` calls are in progress at once.
+
+    All requests share one pool of keep-alive connections, and all in-flight workflow ids
+    are tracked by a single status polling loop (with exponential backoff and a deadline)
+    instead of one blocking loop per submission.
+    Transient HTTP failures (see `RetryPolicy`) are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        submit_url: str,
+        *,
+        timeout: tuple[int, int] = _TIMEOUT,
+        max_connections: int = 16,
+        polling: PollingPolicy | None = None,
+        retry: RetryPolicy | None = None,
+        fetch_logs: bool = True,
+    ) -> None:
+        """Create a client; use it as an async context manager (or call `close`)."""
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._client = _ComputeClient(submit_url, self._session, timeout)
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="compute")
+        self.polling = polling or PollingPolicy()
+        self.retry = retry or RetryPolicy()
+        self.fetch_logs = fetch_logs
+        self._in_flight: dict[str, _InFlight] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._poller: "asyncio.Task[None] | None" = None
+
+    async def __aenter__(self) -> "ThreadedComputeClient":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        await self.close()
+
+    @property
+    def in_flight(self) -> list[str]:
+        """Return the workflow ids which are waiting to start."""
+        return list(self._in_flight)
+
+    async def close(self) -> None:
+        """Stop polling and close the pooled connections."""
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+        for in_flight in self._in_flight.values():
+            in_flight.future.cancel()
+        self._in_flight.clear()
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
+    async def submit(self, request: "ComputeRequest", *, log_path: str | Path | None = None) -> ComputeSubmission:
+        """Submit a request and wait (without blocking the event loop) until Compute starts it."""
+        workflow_id = request.require_workflow_id()
+        request_json = request.to_json()
+        loop = asyncio.get_running_loop()
+        sent_at: list[float] = []
+
+        def post(request_json: RawJson) -> _HttpResult:
+            # NOTE: This runs in the executor, i.e. only once a connection is free, so the polling
+            # deadline does not include the time spent waiting behind the rest of the batch.
+            if not sent_at:
+                sent_at.append(loop.time())
+            return self._client.post(request_json)
+
+        submit_result = await self._request(post, request_json)
+        if not submit_result.ok:
+            return ComputeSubmission(
+                workflow_id,
+                None,
+                False,
+                submit_response=submit_result.body,
+            )
+
+        phase, status_result, timed_out = await self.wait_started(workflow_id, sent_at=sent_at[0])
+        logs = None
+        if self.fetch_logs and phase == "RUNNING":
+            logs = (await self._request(self._client.logs, workflow_id)).body
+        if log_path is not None and logs is not None:
+            async with aiofiles.open(log_path, mode="w", encoding="utf-8") as f:
+                await f.write(str(logs))
+
+        return ComputeSubmission(
+            workflow_id,
+            phase,
+            phase in _ACCEPTED,
+            submit_response=submit_result.body,
+            status_response=None if status_result is None else status_result.body,
+            logs=logs,
+            timed_out=timed_out,
+        )
+
+    async def wait_started(
+        self,
+        workflow_id: str,
+        *,
+        sent_at: float | None = None,
+    ) -> tuple[str | None, _HttpResult | None, bool]:
+        """Wait until Compute reports that the workflow has started, or until the polling deadline.
+
+        The deadline is measured from `sent_at` (i.e. the event loop time at which the workflow
+        was actually sent to Compute) if given, and otherwise from now.
+        Returns the last phase, the last status result, and whether the deadline was reached.
+        """
+        if workflow_id in self._in_flight:
+            return await asyncio.shield(self._in_flight[workflow_id].future)
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        deadline = self.polling.deadline_seconds
+        in_flight = _InFlight(
+            loop.create_future(),
+            None if deadline is None else (now if sent_at is None else sent_at) + deadline,
+            now,
+            self.polling.initial_interval_seconds,
+        )
+        self._in_flight[workflow_id] = in_flight
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll_loop())
+        return await asyncio.shield(in_flight.future)
+
+    async def _call(self, function: Callable[..., _T], *args: Any) -> _T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(function, *args))
+
+    async def _request(self, function: Callable[..., _HttpResult], *args: Any) -> _HttpResult:
+        attempt = 1
+        while True:
+            try:
+                result = await self._call(function, *args)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retry.max_attempts:
+                    raise
+            else:
+                if result.status_code not in self.retry.status_codes or attempt >= self.retry.max_attempts:
+                    return result
+            await asyncio.sleep(self.retry.backoff(attempt))
+            attempt += 1
+
+    async def _poll_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        assert self._wakeup is not None
+        while self._in_flight:
+            self._wakeup.clear()
+            now = loop.time()
+            due = [workflow_id for workflow_id, in_flight in self._in_flight.items() if in_flight.next_poll <= now]
+            await asyncio.gather(*(self._poll_once(workflow_id) for workflow_id in due))
+            if not self._in_flight:
+                break
+            delay = min(in_flight.next_poll for in_flight in self._in_flight.values()) - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _poll_once(self, workflow_id: str) -> None:
+        in_flight = self._in_flight[workflow_id]
+        try:
+            result = await self._call(self._client.status, workflow_id)
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            # NOTE: Transient failures are simply polled again (on the usual backoff schedule),
+            # instead of retried in place, so they do not hold up the other in-flight workflows.
+            in_flight.errors += 1
+            if in_flight.errors >= self.retry.max_attempts:
+                del self._in_flight[workflow_id]
+                in_flight.future.set_exception(exc)
+                return
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            del self._in_flight[workflow_id]
+            in_flight.future.set_exception(exc)
+            return
+        else:
+            in_flight.errors = 0
+            in_flight.phase, in_flight.result = _phase(result.body), result
+        phase, last_result = in_flight.phase, in_flight.result
+        now = asyncio.get_running_loop().time()
+        if last_result is not None and last_result.ok and phase in _STARTED:
+            del self._in_flight[workflow_id]
+            in_flight.future.set_result((phase, last_result, False))
+        elif in_flight.deadline is not None and now >= in_flight.deadline:
+            del self._in_flight[workflow_id]
+            in_flight.future.set_result((phase, last_result, True))
+        else:
+            in_flight.next_poll = now + self.polling.jittered(in_flight.interval_seconds)
+            if in_flight.deadline is not None:
+                in_flight.next_poll = min(in_flight.next_poll, in_flight.deadline)
+            in_flight.interval_seconds = self.polling.next_interval(in_flight.interval_seconds)
+
+
+@dataclass(frozen=True, slots=True)
+class ComputeBatchReport:
+    """Aggregated result of submitting a batch of compute requests."""
+
+    submissions: tuple[ComputeSubmission, ...]
+    elapsed_seconds: float = 0.0
+
+    @property
+    def accepted(self) -> list[str]:
+        """Return the workflow ids which Compute accepted."""
+        return [submission.workflow_id for submission in self.submissions if submission.accepted]
+
+    @property
+    def timed_out(self) -> list[str]:
+        """Return the workflow ids which had not started by the polling deadline."""
+        return [submission.workflow_id for submission in self.submissions if submission.timed_out]
+
+    @property
+    def failed(self) -> list[str]:
+        """Return the workflow ids which were rejected, failed, or could not be submitted."""
+        return [submission.workflow_id for submission in self.submissions
+                if not submission.accepted and not submission.timed_out]
+
+    @property
+    def ok(self) -> bool:
+        """Return whether Compute accepted every request in the batch."""
+        return all(submission.accepted for submission in self.submissions)
+
+    @property
+    def exit_code(self) -> int:
+        """Return a process-style status code for CLI callers."""
+        return 0 if self.ok else 1
+
+    def summary(self) -> str:
+        """Return a one-line human-readable summary of the batch."""
+        return (
+            f"{len(self.submissions)} submitted, {len(self.accepted)} accepted, "
+            f"{len(self.failed)} failed, {len(self.timed_out)} timed out in {self.elapsed_seconds:.1f}s"
+        )
+
+
+async def submit_batch_async(
+    compute_requests: Iterable["ComputeRequest"],
+    submit_url: str,
+    *,
+    max_concurrency: int = 16,
+    timeout: tuple[int, int] = _TIMEOUT,
+    polling: PollingPolicy | None = None,
+    retry: RetryPolicy | None = None,
+    fetch_logs: bool = True,
+    log_dir: str | Path | None = None,
+) -> ComputeBatchReport:
+    """Submit many compute requests concurrently with one shared `ThreadedComputeClient`.
+
+    At most `max_concurrency` HTTP requests are in flight at any time (regardless of
+    the size of the batch), and transient HTTP failures are retried per `retry`.
+    A request which cannot be submitted is reported as a failed submission; it does
+    not abort the rest of the batch.
+    """
+    compute_requests = list(compute_requests)
+    workflow_ids = [request.require_workflow_id() for request in compute_requests]
+    duplicates = sorted({workflow_id for workflow_id in workflow_ids if workflow_ids.count(workflow_id) > 1})
+    if duplicates:
+        raise ValueError(f"Batch compute requests require unique workflow ids; duplicated: {duplicates}")
+
+    async def submit(client: ThreadedComputeClient, request: "ComputeRequest", workflow_id: str) -> ComputeSubmission:
+        log_path = None if log_dir is None else Path(log_dir) / f"compute_logs_{workflow_id}.txt"
+        try:
+            return await client.submit(request, log_path=log_path)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            return ComputeSubmission(workflow_id, None, False, submit_response=f"{type(exc).__name__}: {exc}")
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    if log_dir is not None:
+        Path(log_dir).mkdir(parents=True, exist_ok=True)
+    async with ThreadedComputeClient(
+        submit_url,
+        timeout=timeout,
+        max_connections=max_concurrency,
+        polling=polling,
+        retry=retry,
+        fetch_logs=fetch_logs,
+    ) as client:
+        submissions = await asyncio.gather(*(
+            submit(client, request, workflow_id) for request, workflow_id in zip(compute_requests, workflow_ids)
+        ))
+    return ComputeBatchReport(tuple(submissions), loop.time() - start)
+
+
+def submit_batch(
+    compute_requests: Iterable["ComputeRequest"],
+    submit_url: str,
+    **kwargs: Any,
+) -> ComputeBatchReport:
+    """Blocking wrapper for `submit_batch_async`; see that function for the keyword arguments.
+
+    Callers which are already running an event loop must `await submit_batch_async(...)` instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("submit_batch() cannot be called from a running event loop; "
+                           "await submit_batch_async() instead")
+    return asyncio.run(submit_batch_async(compute_requests, submit_url, **kwargs))
+
+
 @dataclass(frozen=True, slots=True)
 class ToilRuntimeConfig:
     """Schema mirror for `computeConfig.toilConfig`."""
@@ -363,6 +741,15 @@ class ComputeRequest:
             logs=logs,
         )
 
+    async def submit_async(
+        self,
+        client: ThreadedComputeClient,
+        *,
+        log_path: str | Path | None = None,
+    ) -> ComputeSubmission:
+        """Submit this request using a shared client; see `ThreadedComputeClient`."""
+        return await client.submit(self, log_path=log_path)
+
 
 def _validate_compute_request(request: Mapping[str, Any]) -> Json:
     """Validate a compute request mapping against the checked-in schema."""
@@ -384,12 +771,18 @@ def _validator() -> Draft202012Validator:
 
 __all__ = [
     "CompiledWorkflowLike",
+    "ComputeBatchReport",
     "ComputeExecutionConfig",
     "ComputeOutputConfig",
     "ComputeRequest",
     "ComputeRequestValidationError",
     "ComputeSubmission",
+    "PollingPolicy",
     "RawJson",
+    "RetryPolicy",
     "SlurmJobConfig",
+    "ThreadedComputeClient",
     "ToilRuntimeConfig",
+    "submit_batch",
+    "submit_batch_async",
 ]
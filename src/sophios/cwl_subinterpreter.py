@@ -1,105 +1,169 @@
 import argparse
-import glob
 import json
-import os
-import subprocess as sub
 import sys
 import time
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, Optional
 
+import cwltool.factory
+from cwltool.context import LoadingContext, RuntimeContext
+from cwltool.errors import WorkflowException
+from cwltool.factory import WorkflowStatus
 import graphviz
 import networkx as nx
 from jsonschema import Draft202012Validator
 
 from . import input_output as io
-from . import ast, cli, compiler, inference, utils
+from . import ast, auto_gen_header, cli, compiler, inference, utils
+from .file_watcher import WATCHER_ENGINES, CachedirWatcher
 from .post_compile import stage_input_files
 from .plugins import get_tools_cwl, get_yml_paths, logging_filters
+from .runtime_inputs import normalize_rose_tree_job_inputs
 from .schemas import wic_schema
 from .wic_types import GraphData, GraphReps, Json, StepId, Tools, YamlTree
 
 
-def absolute_paths(config: Json, cachedir_path: Path) -> Json:
-    """Recursively searches for paths in config and makes them absolute by prepending cachedir_path.
+def path_placeholders(config: Json, placeholders: Dict[str, str]) -> Json:
+    """Recursively searches for paths in config and replaces them with (unique) placeholders.\n
+    The paths are glob patterns w.r.t. the --cachedir directory of the main workflow. Each time the
+    workflow is run, the placeholders are replaced with the most recent matching file. See most_recent_file()
 
     Args:
         config (Json): The contents of the YAML cwl_subinterpreter config: tag.
-        cachedir_path (Path): The --cachedir directory of the main workflow.
+        placeholders (Dict[str, str]): The placeholders and their glob patterns (mutated in-place)
 
     Returns:
-        Json: The contents of the YAML cwl_subinterpreter config: tag, with all paths prepended with cachedir_path.
+        Json: The contents of the YAML cwl_subinterpreter config: tag, with all paths replaced with placeholders.
     """
     new_json: Json = {}
     for key, val in config.items():
-        if isinstance(val, dict):
-            new_val = absolute_paths(val, cachedir_path)
-        else:
-            new_val = val
-            # TODO: Improve this heuristic
-            if 'input' in key and 'path' in key:
-                new_val = str(cachedir_path / val)  # type: ignore
-                changed_files = file_watcher_glob(cachedir_path, val, {})
-                # We require unique filenames, so there should only be one file.
-                # (except for files that get created within the cwl_subinterpreter workflow itself)
-                changed_files_lst = list(changed_files.items())
-                if len(changed_files_lst) == 0:
-                    print(f'Warning! Changed files should be length one! {val}\n{changed_files_lst}')
-                else:
-                    if len(changed_files_lst) != 1:
-                        print(f'Warning! Changed files should be length one! {val}\n{changed_files_lst}')
-                    changed_files_lst.sort(key=lambda x: x[1])
-                    file = changed_files_lst[-1][0]  # most recent
-                    new_val = str(Path(file).absolute())  # type: ignore
+        new_val: Any = val
+        # TODO: Improve this heuristic
+        if 'input' in key and 'path' in key and not (isinstance(val, dict) and 'wic_inline_input' not in val):
+            placeholder = f'cwl_subinterpreter_path_{len(placeholders)}'
+            placeholders[placeholder] = val['wic_inline_input'] if isinstance(val, dict) else val
+            new_val = {'wic_inline_input': placeholder}
+        elif isinstance(val, dict):
+            new_val = path_placeholders(val, placeholders)
         new_json[key] = new_val
     return new_json
 
 
-def rerun_cwltool(homedir: str, _directory_realtime: Path, cachedir_path: Path, cwl_tool: str,
-                  args_vals: Json, tools_cwl: Tools, yml_paths: Dict[str, Dict[str, Path]],
-                  validator: Draft202012Validator, root_workflow_yml_path: Path) -> None:
-    """This will speculatively execute cwltool for real-time analysis purposes.\n
-    It will NOT check for return code 0. See docs/userguide.md
+def replace_placeholders(job_inputs: Any, paths: Dict[str, str]) -> Any:
+    """Recursively replaces the placeholders in the job inputs with the given paths.
 
     Args:
-        homedir (str): The users home directory
-        _directory_realtime (Path): The working directory of the main workflow.\n
-        Currently unused to avoid this workflow from overwriting files from the main\n
-        workflow (which by design will likely be running concurrently with this code).
-        cachedir_path (Path): The --cachedir directory of the main workflow.
-        cwl_tool (str): The CWL CommandLineTool or YAML filename (without extension).
-        args_vals (Json): The contents of the YAML cwl_subinterpreter config: tag.
-        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
-        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
-        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
-        root_workflow_yml_path (Path): The full absolute path to the root workflow yml file.
+        job_inputs (Any): The job inputs (or any value within the job inputs)
+        paths (Dict[str, str]): The placeholders and their paths
+
+    Returns:
+        Any: A copy of job_inputs, with the placeholders replaced.
     """
-    try:
-        # Make paths in arguments absolute w.r.t the realtime directory. See below.
-        args_vals_new = absolute_paths(args_vals, cachedir_path)
+    if isinstance(job_inputs, dict):
+        return {key: replace_placeholders(val, paths) for key, val in job_inputs.items()}
+    if isinstance(job_inputs, list):
+        return [replace_placeholders(val, paths) for val in job_inputs]
+    if isinstance(job_inputs, str):
+        return paths.get(job_inputs, job_inputs)
+    return job_inputs
+
+
+def absolute_locations(job_inputs: Any, directory: Path) -> Any:
+    """Recursively makes the relative locations of all File and Directory inputs absolute w.r.t. directory.\n
+    This is what cwltool does when it loads a yml inputs file (which is in directory) from disk.
+
+    Args:
+        job_inputs (Any): The job inputs (or any value within the job inputs)
+        directory (Path): The directory w.r.t. which the locations are relative
+
+    Returns:
+        Any: A copy of job_inputs, with absolute locations.
+    """
+    if isinstance(job_inputs, list):
+        return [absolute_locations(val, directory) for val in job_inputs]
+    if not isinstance(job_inputs, dict):
+        return job_inputs
+    new_json = {key: absolute_locations(val, directory) for key, val in job_inputs.items()}
+    if new_json.get('class') in ['File', 'Directory']:
+        for key in ['location', 'path']:
+            location = new_json.get(key)
+            if isinstance(location, str) and '://' not in location and not Path(location).is_absolute():
+                new_json[key] = str(directory.absolute() / location)
+    return new_json
+
+
+class SpeculativeSession():
+    """Speculatively executes cwl_tool (upto once per changed file) for real-time analysis purposes.\n
+    It will NOT check whether cwl_tool succeeds. See docs/userguide.md
+
+    The single-step workflow is compiled (and written to disk, and loaded by cwltool) only once per
+    session. The only thing which changes between runs are the paths in the config: tag (see
+    path_placeholders()) so for each run, only the job inputs are regenerated, and then cwltool
+    is invoked in-process (reusing the same loading context). Thus, the latency is dominated by
+    the runtime of cwl_tool itself, instead of the compile time (a few seconds) and the startup
+    time of cwltool (i.e. a fresh subprocess which reloads and revalidates the CWL every time).
+    """
+
+    def __init__(self, homedir: str, cachedir_path: Path, cwl_tool: str, args_vals: Json, tools_cwl: Tools,
+                 yml_paths: Dict[str, Dict[str, Path]], validator: Draft202012Validator,
+                 root_workflow_yml_path: Path, watcher_engine: str = 'auto', inputs_file: str = '') -> None:
+        """
+        Args:
+            homedir (str): The users home directory
+            cachedir_path (Path): The --cachedir directory of the main workflow.
+            cwl_tool (str): The CWL CommandLineTool or YAML filename (without extension).
+            args_vals (Json): The contents of the YAML cwl_subinterpreter config: tag.
+            tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+            yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+            validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+            root_workflow_yml_path (Path): The full absolute path to the root workflow yml file.
+            watcher_engine (str): The file watcher engine used to find the paths in the config: tag.
+            inputs_file (str): Optional additional inputs. See --inputs_file
+        """
+        self.homedir = homedir
+        self.cachedir_path = cachedir_path
+        self.cwl_tool = cwl_tool
+        self.tools_cwl = tools_cwl
+        self.yml_paths = yml_paths
+        self.validator = validator
+        self.root_workflow_yml_path = root_workflow_yml_path
+        self.watcher_engine = watcher_engine
+        self.inputs_file = inputs_file
+        self.placeholders: Dict[str, str] = {}
+        self.args_vals = path_placeholders(args_vals, self.placeholders)
+        self.path_watchers: Dict[str, CachedirWatcher] = {}
+        # Use a new working directory.
+        # Can also use the directory of the changed file / Path('autogenerated/') at the risk of overwriting
+        # other files from the main workflow (which by design will likely be running concurrently with this code).
+        self.working_dir = Path('.') / Path('autogenerated/')
+        self.job_inputs: Optional[Json] = None  # With placeholders
+        self.tool: Optional[cwltool.factory.Callable] = None
+
+    def compile(self) -> None:
+        """Compiles the single-step workflow (with placeholders for the paths) and loads it into cwltool."""
+        # Measure compile time
+        time_initial = time.time()
 
         # Construct a single-step workflow and add its arguments
+        # NOTE: The steps use the canonical list syntax, i.e. {'id': cwl_tool}, since the
+        # legacy {cwl_tool: None} syntax is only supported for steps: dictionaries.
+        cwl_tool = self.cwl_tool
         if Path(cwl_tool).suffix == '.wic':
             yaml_path = cwl_tool
-            wic_steps = {'steps': {f'(1, {cwl_tool})': {'wic': {'steps': args_vals_new}}}}
-            root_yaml_tree = {'wic': wic_steps, 'steps': [{cwl_tool: None}]}
+            wic_steps = {'steps': {f'(1, {cwl_tool})': {'wic': {'steps': self.args_vals}}}}
+            root_yaml_tree = {'wic': wic_steps, 'steps': [{'id': cwl_tool}]}
             # TODO: Support other namespaces
             plugin_ns = 'global'  # wic['wic'].get('namespace', 'global')
             step_id = StepId(yaml_path, plugin_ns)
             y_t = YamlTree(step_id, root_yaml_tree)
-            yaml_tree_raw = ast.read_ast_from_disk(homedir, y_t, yml_paths, tools_cwl, validator, True)
-            yaml_tree = ast.merge_yml_trees(yaml_tree_raw, {}, tools_cwl)
-            yaml_tree = ast.python_script_generate_cwl(yaml_tree, Path(''), tools_cwl)
+            yaml_tree = ast.read_ast_fused(self.homedir, y_t, self.yml_paths, self.tools_cwl,
+                                           self.validator, True, Path(''))
             yml = yaml_tree.yml
         else:
-            yml = {'steps': [{cwl_tool: args_vals_new}]}
+            yml = {'steps': [{'id': cwl_tool, 'in': self.args_vals}]}
 
-        # Measure compile time
-        time_initial = time.time()
-
-        # Setup dummy args
-        args = cli.get_args()
         compiler_options, graph_settings, yaml_tag_paths = cli.get_dicts_for_compilation()
+        graph_settings['graph_mode'] = 'none'  # The graphs are never rendered
 
         # TODO: Support other namespaces
         plugin_ns = 'global'  # wic['wic'].get('namespace', 'global')
@@ -108,38 +172,85 @@ def rerun_cwltool(homedir: str, _directory_realtime: Path, cachedir_path: Path,
         yaml_tree = YamlTree(stepid, yml)
         subgraph = GraphReps(graphviz.Digraph(name=yaml_path), nx.DiGraph(), GraphData(yaml_path))
 
+        # NOTE: Use subdirectories (i.e. relative_run_path=True), since with a single directory the run: tags
+        # of the CommandLineTool steps are relative to the current working directory, which cwltool rejects.
+        # All of the files are written to autogenerated/{cwl_tool}_only.cwl or autogenerated/{cwl_tool}_only__*/
+        # so they cannot overwrite the files of the main workflow.
         compiler_info = compiler.compile_workflow(yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
                                                   [], [subgraph], {}, {}, {}, {},
-                                                  tools_cwl, True, relative_run_path=False, testing=False)
+                                                  self.tools_cwl, True, relative_run_path=True, testing=False)
         rose_tree = compiler_info.rose
-        working_dir = Path('.') / Path('autogenerated/')  # Use a new working directory.
-        # Can also use `_directory_realtime` / Path('autogenerated/') at the risk of overwriting other files.
-        io.write_to_disk(rose_tree, working_dir, False, args.inputs_file)
+        io.write_to_disk(rose_tree, self.working_dir, True, self.inputs_file)
+        inputs = io.read_inputs_file(self.inputs_file)
+        job_inputs = normalize_rose_tree_job_inputs(rose_tree, {**rose_tree.data.workflow_inputs_file, **inputs})
+
+        # NOTE: Since we are running cwltool 'within' cwltool, the inner
+        # cwltool will get run from working_dir, but then cwl_tool
+        # will run within some other hashed directory in .../cachedir/
+        # The solution is to make the input paths absolute (for each run).
+        runtime_context = RuntimeContext({'cachedir': str(self.cachedir_path.absolute()),
+                                          'outdir': str(self.working_dir.absolute()),
+                                          # See cwltool.main.main()
+                                          'move_outputs': 'copy',
+                                          'tmp_outdir_prefix': str(self.cachedir_path.absolute()) + '_tmp'})
+        factory = cwltool.factory.Factory(loading_context=LoadingContext(), runtime_context=runtime_context)
+        self.tool = factory.make(str((self.working_dir / f'{cwl_tool}_only.cwl').absolute()))
+        self.job_inputs = job_inputs
 
         time_final = time.time()
         print(f'compile time for {cwl_tool}: {round(time_final - time_initial, 4)} seconds')
 
-        yaml_inputs = rose_tree.data.workflow_inputs_file
-        stage_input_files(yaml_inputs, root_workflow_yml_path, str(working_dir), use_subdirs_cwl=False, throw=False)
-
-        # NOTE: Since we are running cwltool 'within' cwltool, the inner
-        # cwltool command will get run from working_dir, but then cwl_tool
-        # will run within some other hashed directory in .../cachedir/
-        # The solution is to modify the input paths above to be absolute.
-        # The easiest way to do this for now is recompiling. This adds a few
-        # seconds, but most of the time will be CWL validation and runtime.
-        # Alternatively, we could try to compile once in main() and then
-        # make the paths absolute in f'{cwl_tool}_only_inputs.yml' here.
-        cmd: List[str] = ['cwltool', '--cachedir', str(cachedir_path),
-                          f'{cwl_tool}_only.cwl', f'{cwl_tool}_only_inputs.yml']
-        print('Running', cmd)
-        sub.run(cmd, cwd=working_dir, check=False)  # See below!
-        print('inner cwltool completed')
-        # Don't check the return code because the file may not exist yet, or
-        # because speculative execution may fail for any number of reasons.
-    except FileNotFoundError as e:
-        # The file may not exist yet.
-        print(e)
+    def most_recent_file(self, pattern: str) -> str:
+        """Finds the most recent file in the --cachedir directory which matches the glob pattern.
+
+        Args:
+            pattern (str): The glob pattern
+
+        Returns:
+            str: The absolute path of the most recent file.
+        """
+        if pattern not in self.path_watchers:
+            self.path_watchers[pattern] = CachedirWatcher(self.cachedir_path, pattern, self.watcher_engine)
+        watcher = self.path_watchers[pattern]
+        watcher.changed_files()
+        # We require unique filenames, so there should only be one file.
+        # (except for files that get created within the cwl_subinterpreter workflow itself)
+        files = sorted([(mtime, file) for file, mtime in watcher.files.items() if Path(file).exists()])
+        if len(files) != 1:
+            print(f'Warning! Changed files should be length one! {pattern}\n{files}')
+        if len(files) == 0:
+            return str(self.cachedir_path / pattern)
+        return str(Path(files[-1][1]).absolute())  # most recent
+
+    def run(self) -> None:
+        """Speculatively executes cwl_tool, using the most recent files for the paths in the config: tag."""
+        try:
+            if self.tool is None or self.job_inputs is None:
+                self.compile()
+            assert self.tool is not None and self.job_inputs is not None
+
+            paths = {placeholder: self.most_recent_file(pattern) for placeholder, pattern in self.placeholders.items()}
+            job_inputs = replace_placeholders(self.job_inputs, paths)
+            # Also write the job inputs to disk, so that each run can be reproduced with cwltool.
+            inputs_yml = auto_gen_header + io.dump_yaml(job_inputs)
+            io.write_if_changed(self.working_dir / f'{self.cwl_tool}_only_inputs.yml', io.encode(inputs_yml), True)
+            stage_input_files(job_inputs, self.root_workflow_yml_path, str(self.working_dir), throw=False)
+
+            print('Running', self.cwl_tool)
+            self.tool(**absolute_locations(job_inputs, self.working_dir))
+            print('inner cwltool completed')
+        except FileNotFoundError as e:
+            # The file may not exist yet.
+            print(e)
+        except (WorkflowException, WorkflowStatus) as e:
+            # Don't check whether cwl_tool succeeded because the file may not exist yet,
+            # or because speculative execution may fail for any number of reasons.
+            print(e)
+
+    def close(self) -> None:
+        """Closes the file watchers"""
+        for watcher in self.path_watchers.values():
+            watcher.close()
 
 
 # NOTE: You should be very careful when using file watchers! Most libraries
@@ -150,33 +261,8 @@ def rerun_cwltool(homedir: str, _directory_realtime: Path, cachedir_path: Path,
 # I'm 99% sure the same problem happens with Docker containers. Either way, the
 # solution is to use polling. However, for unknown reasons, simply replacing
 # Observer with PollingObserver doesn't seem to work! So we are forced to write
-# our own basic file watcher using glob.
-
-
-def file_watcher_glob(cachedir_path: Path, pattern: str, prev_files: Dict[str, float]) -> Dict[str, float]:
-    """Determines whether files (specified by the given glob pattern) have been either recently created or modified.\n
-    Note that this is a workaround due to an issue with using standard file-watching libraries.
-
-    Args:
-        cachedir_path (Path): The --cachedir directory of the main workflow.
-        pattern (str): The glob pattern which specifies the files to be watched.
-        prev_files (Dict[str, float]): This should be the return value from the previous function call.
-
-    Returns:
-        Dict[str, float]: A dictionary containing the filepaths and last modification times.
-    """
-    changed_files = {}
-    file_pattern = str(cachedir_path / f'**/{pattern}')
-    file_paths = glob.glob(file_pattern, recursive=True)
-    for file in file_paths:
-        mtime = os.path.getmtime(file)
-        if file not in prev_files:
-            # created
-            changed_files[file] = mtime
-        elif mtime > prev_files[file]:
-            # modified
-            changed_files[file] = mtime
-    return changed_files
+# our own basic file watcher using glob. See file_watcher.py, which (by default)
+# only uses inotify on local file systems, and otherwise polls incrementally.
 
 
 def cli_watcher() -> argparse.Namespace:
@@ -200,6 +286,9 @@ def cli_watcher() -> argparse.Namespace:
                         help='The users home directory. This is necessary because CWL clears environment variables (e.g. HOME)')
     parser.add_argument('--root_workflow_yml_path', type=str, required=True,
                         help='The full absolute path to the root workflow yml file.')
+    parser.add_argument('--watcher', type=str, required=False, default='auto', choices=WATCHER_ENGINES,
+                        help='''How to watch --cachedir_path for changes. auto uses inotify on local file systems,
+                        and otherwise polls (i.e. on network file systems, where inotify misses changes).''')
     return parser.parse_args()
 
 
@@ -235,7 +324,7 @@ def main() -> None:
 
     # Generate schemas for validation
     yaml_stems = utils.flatten([list(p) for p in yml_paths.values()])
-    validator = wic_schema.get_validator(tools_cwl, yaml_stems)
+    validator = wic_schema.get_validator(tools_cwl, yaml_stems, wic_schema.get_cached_schemas(yml_paths))
 
     cachedir_hash_path = Path('.').absolute()
     print('cachedir_hash_path', cachedir_hash_path)
@@ -247,23 +336,26 @@ def main() -> None:
     # TODO: Generate a file when the original workflow step finishes, and look
     # for that file here to terminate. Keep max_iters just in case.
     i = 0
-    prev_files: Dict[str, float] = {}
+    watcher = CachedirWatcher(cachedir_path, file_pattern, args.watcher)
+    print('watcher engine', watcher.engine)
+    session = SpeculativeSession(args.homedir, cachedir_path, cwl_tool, args_vals, tools_cwl, yml_paths,
+                                 validator, root_workflow_yml_path, args.watcher, cli.get_args().inputs_file)
     try:
         while i < max_times:
-            # Use our own polling file watcher, see above.
-            changed_files = file_watcher_glob(cachedir_path, file_pattern, prev_files)
+            # Use our own file watcher, see above.
+            changed_files = watcher.changed_files()
             for file in changed_files:
                 if file_pattern[1:] in file:
                     print(file)
-                    rerun_cwltool(args.homedir, Path(file).parent, cachedir_path, cwl_tool,
-                                  args_vals, tools_cwl, yml_paths, validator,
-                                  root_workflow_yml_path)
-            prev_files = {**prev_files, **changed_files}
+                    session.run()
 
             time.sleep(1.0)  # Wait at least 1 second so we don't just spin.
             i += 1
     except KeyboardInterrupt:
         pass
+    finally:
+        watcher.close()
+        session.close()
 
     failed = False  # Your analysis goes here
     if failed:
@@ -0,0 +1,323 @@
+import ctypes
+import errno
+import fnmatch
+import glob
+import os
+import re
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+WATCHER_ENGINES = ['auto', 'inotify', 'poll']
+
+# NOTE: inotify only reports changes which are made through the local kernel, so it silently misses
+# changes made by other hosts (i.e. on network file systems) and by Docker Desktop, etc. (See the NOTE in
+# cwl_subinterpreter.py) Thus, by default, only use inotify on known local file systems and otherwise poll.
+LOCAL_FILESYSTEMS = ['btrfs', 'ext2', 'ext3', 'ext4', 'f2fs', 'jfs', 'reiserfs', 'tmpfs', 'xfs', 'zfs']
+
+# Directory mtimes can have a coarse granularity (i.e. 1 second, or the kernel timer tick) so a directory which
+# changes again shortly after it was scanned might not get a new mtime. Always rescan such (racy) directories.
+RACY_SECONDS = 2.0
+
+# See inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+           | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len (followed by the name)
+
+
+def load_libc_inotify() -> Optional[ctypes.CDLL]:
+    """Loads the inotify functions from libc, if available (i.e. on Linux)
+
+    Returns:
+        Optional[ctypes.CDLL]: libc, or None
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def filesystem_type(path: Path) -> str:
+    """Determines the type of the file system which contains path, using the longest matching mount point.
+
+    Args:
+        path (Path): A path
+
+    Returns:
+        str: The file system type (i.e. ext4, nfs, etc) or the empty string if it cannot be determined.
+    """
+    realpath = os.path.realpath(path)
+    (mount_point_best, fs_type_best) = ('', '')
+    try:
+        with open('/proc/self/mounts', mode='r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # Spaces, etc are octal-escaped
+                mount_point = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m[1], 8)), fields[1])
+                if (realpath == mount_point or realpath.startswith(mount_point.rstrip('/') + '/')) \
+                        and len(mount_point) >= len(mount_point_best):
+                    (mount_point_best, fs_type_best) = (mount_point, fields[2])
+    except OSError:
+        pass
+    return fs_type_best
+
+
+def glob_match(parts: List[str], pattern_parts: List[str]) -> bool:
+    """Determines whether a relative path matches **/pattern, with the same semantics as glob.glob
+
+    Args:
+        parts (List[str]): The components of the relative path
+        pattern_parts (List[str]): The components of the glob pattern
+
+    Returns:
+        bool: True if the path matches.
+    """
+    num_prefix = len(parts) - len(pattern_parts)
+    if num_prefix < 0:
+        return False
+    # NOTE: glob does not match hidden files and directories with wildcards, including **
+    if any(part.startswith('.') for part in parts[:num_prefix]):
+        return False
+    return all(fnmatch.fnmatch(part, pat) and (pat.startswith('.') or not part.startswith('.'))
+               for part, pat in zip(parts[num_prefix:], pattern_parts))
+
+
+class CachedirWatcher():
+    """Finds the files in a cwltool --cachedir which match **/pattern and which have been
+    created or modified since the previous call to changed_files()
+
+    This returns the same changes as repeatedly calling file_watcher_glob(), but without walking
+    the entire cachedir every time. Each directory is only rescanned when it has changed, i.e.
+    when inotify reports an event or (when polling) when the mtime of the directory has changed.
+    Moreover, the hashed directories of completed steps are never rescanned, since cwltool never
+    modifies them after their .status file records success.
+    """
+
+    def __init__(self, cachedir_path: Path, pattern: str, engine: str = 'auto') -> None:
+        """
+        Args:
+            cachedir_path (Path): The --cachedir directory of the main workflow.
+            pattern (str): The glob pattern which specifies the files to be watched.
+            engine (str): One of WATCHER_ENGINES. inotify falls back to polling if it is not available.
+        """
+        if engine not in WATCHER_ENGINES:
+            raise ValueError(f'Unknown watcher engine {engine}. Choose from {WATCHER_ENGINES}')
+        self.root = str(cachedir_path)
+        self.pattern = pattern
+        self.pattern_parts = pattern.split('/')
+        # The incremental scan only supports the simple (and common) patterns.
+        self.use_glob = '**' in pattern or '' in self.pattern_parts
+        self.files: Dict[str, float] = {}  # The mtimes of all of the matching files seen so far
+        self.live_files: Set[str] = set()  # The matching files which are not in completed hashed directories
+        self.dirs: Dict[str, int] = {}  # The directory mtimes (in ns) as of their last scan, or -1 if racy.
+        self.pending: Set[str] = set()  # The hashed directories of running steps
+        self.completed: Set[str] = set()  # The hashed directories of completed steps
+        self.libc: Optional[ctypes.CDLL] = None
+        self.inotify_fd = -1
+        self.watches: Dict[int, str] = {}
+        self.watch_descriptors: Dict[str, int] = {}
+        if engine == 'inotify' or (engine == 'auto' and filesystem_type(cachedir_path) in LOCAL_FILESYSTEMS):
+            self.libc = load_libc_inotify()
+            if self.libc is not None:
+                self.inotify_fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        self.engine = 'inotify' if self.inotify_fd >= 0 else 'poll'
+
+    def close(self) -> None:
+        """Closes the inotify file descriptor (if any)"""
+        if self.inotify_fd >= 0:
+            os.close(self.inotify_fd)
+            self.inotify_fd = -1
+            self.engine = 'poll'
+
+    def changed_files(self) -> Dict[str, float]:
+        """Determines which matching files have been either created or modified since the previous call.
+
+        Returns:
+            Dict[str, float]: A dictionary containing the filepaths and last modification times.
+        """
+        if self.use_glob:
+            changed_files = file_watcher_glob(Path(self.root), self.pattern, self.files)
+            self.files.update(changed_files)
+            return changed_files
+
+        changed: Dict[str, float] = {}
+        if self.root not in self.dirs:
+            self.scan_dir(self.root, changed)
+        else:
+            for path in self.dirty_dirs():
+                # A parent directory may have been forgotten (or completed) in the meantime.
+                if path in self.dirs:
+                    self.scan_dir(path, changed)
+            if self.engine == 'poll':
+                # Files can be modified in-place without changing the mtime of their directory.
+                for file in list(self.live_files):
+                    self.check_file(file, changed)
+
+        for hashed_dir in sorted(self.pending):
+            try:
+                with open(hashed_dir + '.status', mode='r', encoding='utf-8') as f:
+                    status = f.read()
+            except OSError:
+                continue
+            if status == 'success':
+                # Do one last (full) scan, then stop watching it.
+                self.forget(hashed_dir)
+                self.scan_dir(hashed_dir, changed)
+                self.forget(hashed_dir)
+                self.completed.add(hashed_dir)
+        return changed
+
+    def dirty_dirs(self) -> List[str]:
+        """Determines which of the watched directories need to be rescanned.
+
+        Returns:
+            List[str]: The directories, sorted so that parents are scanned before their subdirectories.
+        """
+        dirty: Set[str] = set()
+        if self.engine == 'inotify':
+            while True:
+                try:
+                    buffer = os.read(self.inotify_fd, 1 << 16)
+                except BlockingIOError:
+                    break
+                offset = 0
+                while offset < len(buffer):
+                    (wd, mask, _, length) = INOTIFY_EVENT.unpack_from(buffer, offset)
+                    offset += INOTIFY_EVENT.size + length
+                    if mask & IN_Q_OVERFLOW:
+                        dirty.update(self.dirs)
+                    elif mask & IN_IGNORED:
+                        path = self.watches.pop(wd, None)
+                        if path is not None and self.watch_descriptors.get(path) == wd:
+                            del self.watch_descriptors[path]
+                    elif wd in self.watches:
+                        dirty.add(self.watches[wd])
+        else:
+            for path, mtime in self.dirs.items():
+                try:
+                    if os.stat(path).st_mtime_ns != mtime:
+                        dirty.add(path)
+                except OSError:
+                    dirty.add(path)
+        return sorted(dirty)
+
+    def scan_dir(self, path: str, changed: Dict[str, float]) -> None:
+        """Scans a directory (and any new subdirectories) for matching files.
+
+        Args:
+            path (str): The directory
+            changed (Dict[str, float]): The changed files (mutated in-place)
+        """
+        if self.libc is not None and self.inotify_fd >= 0 and path not in self.watch_descriptors:
+            # NOTE: Add the watch before listing the directory, so that no changes can be missed.
+            wd = self.libc.inotify_add_watch(self.inotify_fd, os.fsencode(path), IN_MASK)
+            if wd >= 0:
+                self.watches[wd] = path
+                self.watch_descriptors[path] = wd
+            elif ctypes.get_errno() in (errno.ENOSPC, errno.ENOMEM):
+                # Out of watches, so fallback to polling. (The directory mtimes are always recorded.)
+                print('Warning! Out of inotify watches. Polling instead.')
+                self.close()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            self.forget(path)
+            return
+        self.dirs[path] = -1 if mtime > (time.time() - RACY_SECONDS) * 1e9 else mtime
+
+        is_root = path == self.root
+        if is_root:
+            # Hashed directories may be deleted (and recreated) if they did not complete.
+            self.completed.intersection_update(entry.path for entry in entries)
+        for entry in entries:
+            parts = entry.path[len(self.root) + 1:].split(os.sep)
+            if glob_match(parts, self.pattern_parts):
+                self.live_files.add(entry.path)
+                self.check_file(entry.path, changed)
+            # NOTE: Symlinked directories are not followed, since they may form cycles.
+            if entry.is_dir(follow_symlinks=False) and entry.path not in self.dirs \
+                    and entry.path not in self.completed:
+                if is_root:
+                    self.pending.add(entry.path)
+                self.scan_dir(entry.path, changed)
+
+    def check_file(self, file: str, changed: Dict[str, float]) -> None:
+        """Checks whether a matching file has been either created or modified.
+
+        Args:
+            file (str): The matching file
+            changed (Dict[str, float]): The changed files (mutated in-place)
+        """
+        try:
+            mtime = os.path.getmtime(file)
+        except OSError:
+            self.live_files.discard(file)
+            return
+        if file not in self.files or mtime > self.files[file]:
+            changed[file] = mtime
+            self.files[file] = mtime
+
+    def forget(self, path: str) -> None:
+        """Stops watching a directory and all of its subdirectories.
+
+        Args:
+            path (str): The directory
+        """
+        prefix = path + os.sep
+        for dir_path in [d for d in self.dirs if d == path or d.startswith(prefix)]:
+            del self.dirs[dir_path]
+            wd = self.watch_descriptors.pop(dir_path, None)
+            if wd is not None and self.libc is not None and self.inotify_fd >= 0:
+                self.libc.inotify_rm_watch(self.inotify_fd, wd)
+        self.live_files.difference_update([f for f in self.live_files if f.startswith(prefix)])
+        self.pending.discard(path)
+
+
+def file_watcher_glob(cachedir_path: Path, pattern: str, prev_files: Dict[str, float]) -> Dict[str, float]:
+    """Determines whether files (specified by the given glob pattern) have been either recently created or modified.\n
+    Note that this is a workaround due to an issue with using standard file-watching libraries.
+
+    Args:
+        cachedir_path (Path): The --cachedir directory of the main workflow.
+        pattern (str): The glob pattern which specifies the files to be watched.
+        prev_files (Dict[str, float]): This should be the return value from the previous function call.
+
+    Returns:
+        Dict[str, float]: A dictionary containing the filepaths and last modification times.
+    """
+    changed_files = {}
+    file_pattern = str(cachedir_path / f'**/{pattern}')
+    file_paths = glob.glob(file_pattern, recursive=True)
+    for file in file_paths:
+        mtime = os.path.getmtime(file)
+        if file not in prev_files:
+            # created
+            changed_files[file] = mtime
+        elif mtime > prev_files[file]:
+            # modified
+            changed_files[file] = mtime
+    return changed_files
@@ -1,5 +1,8 @@
+import bisect
+import heapq
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+import threading
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
 
 from . import utils, utils_cwl, utils_graphs
 from .wic_types import (GraphReps, InternalOutputs, Namespaces, StepId, Tool, Tools,
@@ -8,8 +11,75 @@ from .wic_types import (GraphReps, InternalOutputs, Namespaces, StepId, Tool, To
 # NOTE: This must be initialized in main.py and/or cwl_subinterpreter.py
 renaming_conventions: List[Tuple[str, str]] = []
 
+OutputMatch = Tuple[str, Any]  # (out_key, out_format)
+
+
+# NOTE: CWL types are interned, i.e. each distinct type is assigned a small
+# integer, so that the (memoized) compatibility of two types can be looked up
+# without walking the (nested) unions, arrays, records, etc. every time.
+interned_types: Dict[Hashable, int] = {}
+interned_types_values: List[Any] = []
+types_match_cache: Dict[Tuple[int, int], bool] = {}
+interned_types_lock = threading.Lock()
+
+
+def freeze(val: Any) -> Hashable:
+    """Returns a hashable representation of val such that freeze(x) == freeze(y) iff x == y
+
+    Args:
+        val (Any): A CWL type or format, i.e. a string, list, or dict
+
+    Returns:
+        Hashable: The frozen representation of val
+    """
+    if isinstance(val, str):
+        return val
+    if isinstance(val, list):
+        return ('list', tuple(freeze(x) for x in val))
+    if isinstance(val, dict):
+        return ('dict', tuple(sorted(((k, freeze(v)) for k, v in val.items()), key=lambda kv: str(kv[0]))))
+    frozen: Hashable = val  # i.e. None, bool, int, etc
+    return frozen
+
+
+def intern_type(cwl_type: Any) -> int:
+    """Returns the unique integer associated with the given CWL type
+
+    Args:
+        cwl_type (Any): A CWL type
+
+    Returns:
+        int: The interned type
+    """
+    # Fast path for the most common case (i.e. 'File', 'string', etc)
+    type_id = interned_types.get(cwl_type) if isinstance(cwl_type, str) else None
+    if type_id is not None:
+        return type_id
+    frozen = freeze(cwl_type)
+    type_id = interned_types.get(frozen)
+    if type_id is None:
+        with interned_types_lock:
+            type_id = interned_types.get(frozen)
+            if type_id is None:
+                type_id = len(interned_types_values)
+                interned_types_values.append(cwl_type)
+                interned_types[frozen] = type_id
+    return type_id
+
 
 def types_match(in_type: Any, out_type: Any) -> bool:
+    return types_match_interned(intern_type(in_type), intern_type(out_type))
+
+
+def types_match_interned(in_type_id: int, out_type_id: int) -> bool:
+    match = types_match_cache.get((in_type_id, out_type_id))
+    if match is None:
+        match = types_match_uncached(interned_types_values[in_type_id], interned_types_values[out_type_id])
+        types_match_cache[(in_type_id, out_type_id)] = match
+    return match
+
+
+def types_match_uncached(in_type: Any, out_type: Any) -> bool:
     if in_type == out_type:
         return True
     if isinstance(in_type, list) and not isinstance(out_type, list):
@@ -30,6 +100,184 @@ def types_match(in_type: Any, out_type: Any) -> bool:
     return False
 
 
+def type_keys(cwl_type: Any) -> List[int]:
+    """Returns the keys of cwl_type, such that types_match(x, y) iff type_keys(x) and type_keys(y) intersect.
+
+    Args:
+        cwl_type (Any): A CWL type
+
+    Returns:
+        List[int]: The interned (elements of) cwl_type
+    """
+    if isinstance(cwl_type, list):
+        # NOTE: Empty lists only match themselves (via ==)
+        return [intern_type(x) for x in cwl_type] if cwl_type else [intern_type(cwl_type)]
+    return [intern_type(cwl_type)]
+
+
+class OutputIndex():
+    """An index of the outputs of the previous steps of a workflow, by type and by (type, format)
+
+    This allows perform_edge_inference() to find the most recent compatible
+    output without rescanning every output of every previous step, for every
+    input of every step (which is quadratic in the number of steps).
+
+    The index is a conservative pre-filter: it may return steps which do not
+    actually match (which are then rejected by match_step_outputs()) but it never
+    omits a step which does match. It is updated incrementally as the steps of
+    the workflow are compiled, so there must be one index per (compilation of a) workflow.
+    """
+
+    def __init__(self) -> None:
+        self.num_steps = 0
+        # NOTE: The lists of step indices are always sorted, since steps are added in order.
+        self.steps_by_type: Dict[int, List[int]] = {}
+        self.steps_by_type_format: Dict[Tuple[int, Hashable], List[int]] = {}
+        self.steps_break: List[int] = []
+
+    def update(self, tools_lst: List[Tool], steps_keys: List[str], steps: List[Yaml],
+               wic_steps: Yaml, i: int) -> None:
+        """Adds the outputs of all steps up to (but not including) step i to the index
+
+        Args:
+            tools_lst (List[Tool]): A list of the CWL CommandLineTools or compiled subworkflows for the current workflow.
+            steps_keys (List[str]): The name of each step in the current CWL workflow
+            steps (List[Yaml]): The steps: tag of the current CWL workflow
+            wic_steps (Yaml): The metadata associated with the given workflow.
+            i (int): The (zero-based) step number w.r.t. the current subworkflow.
+        """
+        for j in range(self.num_steps, i):
+            wic_step_j = wic_steps.get(f'({j+1}, {steps_keys[j]})', {})
+            inference_rules = get_inference_rules(wic_step_j, Path(steps_keys[j]).stem)
+            out_tool = tools_lst[j].cwl['outputs']
+            if any(inference_rules.get(out_key, 'default') == 'break' for out_key in out_tool):
+                self.steps_break.append(j)
+
+            for out_key, out_val in out_tool.items():
+                # See the comments on log files in perform_edge_inference()
+                if '_log_' in out_key:
+                    continue
+                out_type = utils_cwl.copy_cwl_input_output_dict(out_val)['type']
+                if 'scatter' in steps[j]:
+                    out_type = {'type': 'array', 'items': out_type}
+                format_key = freeze(out_val.get('format', ''))
+                for type_key in type_keys(out_type):
+                    self._add(self.steps_by_type, type_key, j)
+                    self._add(self.steps_by_type_format, (type_key, format_key), j)
+        self.num_steps = max(self.num_steps, i)
+
+    @staticmethod
+    def _add(index: Dict[Any, List[int]], key: Any, j: int) -> None:
+        steps_j = index.setdefault(key, [])
+        if not steps_j or steps_j[-1] != j:
+            steps_j.append(j)
+
+    def candidates(self, i: int, in_type: Any, in_formats: Any) -> Iterator[int]:
+        """Yields the steps before step i which may have an output compatible with the given input, most recent first.
+
+        Since inference stops at the first step with a 'break' inference rule,
+        no steps before the most recent such step are yielded.
+
+        Args:
+            i (int): The (zero-based) step number w.r.t. the current subworkflow.
+            in_type (Any): The CWL type of the input
+            in_formats (Any): The format(s) of the input (if any)
+
+        Yields:
+            Iterator[int]: The (zero-based) step numbers, in decreasing order
+        """
+        in_type_keys = type_keys(in_type)
+        if isinstance(in_formats, list) and in_formats:
+            format_keys = [freeze(in_formats)] + [freeze(f) for f in in_formats]
+            lists = [self.steps_by_type_format.get((t, f), []) for t in in_type_keys for f in format_keys]
+        else:
+            # NOTE: A single format string matches via substring (!) so we cannot index it.
+            lists = [self.steps_by_type.get(t, []) for t in in_type_keys]
+
+        index_break = bisect.bisect_left(self.steps_break, i)
+        j_min = self.steps_break[index_break - 1] if index_break > 0 else 0
+
+        iters = [reversed(lst[bisect.bisect_left(lst, j_min):bisect.bisect_left(lst, i)]) for lst in lists]
+        j_prev = -1
+        for j in heapq.merge(*iters, reverse=True):
+            if j != j_prev:
+                yield j
+            j_prev = j
+
+
+def match_step_outputs(tools_lst: List[Tool], steps_keys: List[str], steps: List[Yaml], wic_steps: Yaml,
+                       j: int, in_dict: Yaml, in_formats: Any) -> Tuple[List[OutputMatch], List[OutputMatch], bool]:
+    """Attempts to match the given input with the outputs of step j, in reverse order.
+
+    Args:
+        tools_lst (List[Tool]): A list of the CWL CommandLineTools or compiled subworkflows for the current workflow.
+        steps_keys (List[str]): The name of each step in the current CWL workflow
+        steps (List[Yaml]): The steps: tag of the current CWL workflow
+        wic_steps (Yaml): The metadata associated with the given workflow.
+        j (int): The (zero-based) step number of the previous step
+        in_dict (Yaml): The type (and format) of the input
+        in_formats (Any): The format(s) of the input (if any)
+
+    Returns:
+        Tuple[List[OutputMatch], List[OutputMatch], bool]: The matching outputs, all of\n
+        the attempted outputs, and whether an inference rule 'break' was encountered.
+    """
+    wic_step_j = wic_steps.get(f'({j+1}, {steps_keys[j]})', {})
+    tool_j = tools_lst[j]
+    out_tool = tool_j.cwl['outputs']
+    # NOTE: The outputs of a CommandLineTool are all made available
+    # simultaneously. Although that is technically also true for subworkflows,
+    # the CommandLineTools within the subworkflow are certainly ordered,
+    # and so we definitely want to use reverse order here. As mentioned,
+    # it doesn't necessarily make sense for CommandLineTools, but the
+    # important thing is that we just define the order for users some way.
+    out_keys = list(tool_j.cwl['outputs'])[::-1]  # Reverse order!
+    format_matches: List[OutputMatch] = []
+    attempted_matches: List[OutputMatch] = []
+    break_inference = False
+    inference_rules = get_inference_rules(wic_step_j, Path(steps_keys[j]).stem)
+    namespace_emb_last_break = ''
+    in_type_id = intern_type(in_dict['type'])
+    for out_key in out_keys:
+        namespaces_embedded = out_key.split('___')
+        namespace_emb_last = '' if len(namespaces_embedded) <= 1 else namespaces_embedded[:-1][-1]  # -2?
+        if break_inference and namespace_emb_last != namespace_emb_last_break:
+            break  # Only break once the namespace changes, i.e. on the next step
+        inference_rule = inference_rules.get(out_key, 'default')
+        # Apply 'continue' rule before iteration, to prevent matching
+        # TODO: This currently causes an infinite loop.
+        # if inference_rule == 'continue':
+        #    continue
+
+        out_dict = utils_cwl.copy_cwl_input_output_dict(out_tool[out_key])
+
+        if 'scatter' in steps[j]:
+            # Promote scattered output types to arrays
+            out_dict['type'] = {'type': 'array', 'items': out_dict['type']}
+
+        out_format = ''
+        if 'format' in out_tool[out_key]:
+            out_format = out_tool[out_key]['format']
+            out_dict['format'] = out_format
+        attempted_matches.append((out_key, out_format))
+        # Great! We found an 'exact' type and format match.
+        if types_match_interned(in_type_id, intern_type(out_dict['type'])):  # First we have to match the types.
+            if in_formats:
+                # Then, if we have an input format or formats, the output format has to match.
+                if out_format == in_formats or out_format in in_formats:
+                    format_matches.append((out_key, out_format))
+            else:
+                # Otherwise, formats are optional and we match only on type.
+                format_matches.append((out_key, out_format))
+
+        # Apply 'break' rule after iteration, to allow matching
+        if inference_rule == 'break':
+            break_inference = True
+            namespace_emb_last_break = namespace_emb_last
+
+    return format_matches, attempted_matches, break_inference
+
+
 def perform_edge_inference(inference_use_naming_conventions: bool,
                            graph_settings: Dict[str, Any],
                            tools: Tools,
@@ -51,7 +299,8 @@ def perform_edge_inference(inference_use_naming_conventions: bool,
                            arg_key_in_yaml_tree_inputs: bool,
                            insertions: List[StepId],
                            wic_steps: Yaml,
-                           testing: bool) -> Yaml:
+                           testing: bool,
+                           output_index: Optional[OutputIndex] = None) -> Yaml:
     """This function implements the core edge inference feature.
     NOTE: steps[i], vars_workflow_output_internal, inputs_workflow are mutably updated.
 
@@ -82,6 +331,8 @@ def perform_edge_inference(inference_use_naming_conventions: bool,
         insertions (List[StepId]): If exact inference fails, a list of possible steps to automatically insert is stored here.
         wic_steps (Yaml): The metadata associated with the given workflow.
         testing: Used to disable some optional features which are unnecessary for testing.
+        output_index (Optional[OutputIndex]): If given, used to find the most recent\n
+        matching output without scanning all of the previous steps. Defaults to None.
 
     Returns:
         Yaml: steps[i] with the input tag arg_key updated with an inferred input value.
@@ -106,162 +357,131 @@ def perform_edge_inference(inference_use_naming_conventions: bool,
     if 'format' in in_tool[arg_key]:
         in_formats = in_tool[arg_key]['format']
         in_dict['format'] = in_formats
-    format_matches_all = []
-    attempted_matches_all = []
-    break_inference = False
-    for j in range(0, i)[::-1]:  # Reverse order!
-        wic_step_j = wic_steps.get(f'({j+1}, {steps_keys[j]})', {})
+    attempted_matches_all: List[List[OutputMatch]] = []
+    j_match = -1
+    format_matches: List[OutputMatch] = []
+    if output_index is not None:
+        output_index.update(tools_lst, steps_keys, steps, wic_steps, i)
+        for j in output_index.candidates(i, in_dict['type'], in_formats):
+            format_matches = match_step_outputs(tools_lst, steps_keys, steps, wic_steps, j, in_dict, in_formats)[0]
+            format_matches = [x for x in format_matches if not '_log_' in x[0]]
+            if format_matches:
+                j_match = j
+                break
+
+    # If there is no match, we only need to scan all of the previous steps if
+    # we need all of the attempted matches (for insertions and/or error messages).
+    needs_attempted_matches = bool(in_formats) or (is_root and not in_name_in_inputs_file_workflow and not testing)
+    if output_index is None or (j_match == -1 and needs_attempted_matches):
+        for j in range(0, i)[::-1]:  # Reverse order!
+            format_matches, attempted_matches, break_inference = match_step_outputs(
+                tools_lst, steps_keys, steps, wic_steps, j, in_dict, in_formats)
+            attempted_matches_all.append(attempted_matches)
+            # Most log files just have format_2330 "Textual format", but this can
+            # conflict with other structured text files that also have format_2330.
+            # Unfortunately, the edam formats are not very finely curated, so they
+            # are not very 'exact'. For now, we can perform additional matching
+            # based on naming conventions and/or we can simply exclude log files
+            # (which are not usually parsed or otherwise used as inputs).
+            # Eventually, we will want to improve the format curation.
+            # NOTE: Use underscores to prevent excluding e.g. 'topology'
+            # This isn't great, but works for now (until someone uses '_log_' ...)
+            format_matches = [x for x in format_matches if not '_log_' in x[0]]
+            if format_matches:
+                j_match = j
+                break
+
+            # Stop performing inference if the inference rule is 'break'
+            if break_inference:
+                break
+
+    if j_match != -1:
+        j = j_match
         tool_j = tools_lst[j]
-        out_tool = tool_j.cwl['outputs']
-        # NOTE: The outputs of a CommandLineTool are all made available
-        # simultaneously. Although that is technically also true for subworkflows,
-        # the CommandLineTools within the subworkflow are certainly ordered,
-        # and so we definitely want to use reverse order here. As mentioned,
-        # it doesn't necessarily make sense for CommandLineTools, but the
-        # important thing is that we just define the order for users some way.
-        out_keys = list(tool_j.cwl['outputs'])[::-1]  # Reverse order!
-        format_matches = []
-        attempted_matches = []
-        inference_rules = get_inference_rules(wic_step_j, Path(steps_keys[j]).stem)
-        namespace_emb_last_break = ''
-        for out_key in out_keys:
-            namespaces_embedded = out_key.split('___')
-            namespace_emb_last = '' if len(namespaces_embedded) <= 1 else namespaces_embedded[:-1][-1]  # -2?
-            if break_inference and namespace_emb_last != namespace_emb_last_break:
-                break  # Only break once the namespace changes, i.e. on the next step
-            inference_rule = inference_rules.get(out_key, 'default')
-            # Apply 'continue' rule before iteration, to prevent matching
-            # TODO: This currently causes an infinite loop.
-            # if inference_rule == 'continue':
-            #    continue
-
-            out_dict = utils_cwl.copy_cwl_input_output_dict(out_tool[out_key])
-
-            if 'scatter' in steps[j]:
-                # Promote scattered output types to arrays
-                out_dict['type'] = {'type': 'array', 'items': out_dict['type']}
-
-            out_format = ''
-            if 'format' in out_tool[out_key]:
-                out_format = out_tool[out_key]['format']
-                out_dict['format'] = out_format
-            attempted_matches.append((out_key, out_format))
-            # Great! We found an 'exact' type and format match.
-            if types_match(in_dict['type'], out_dict['type']):  # First we have to match the types.
-                if in_formats:
-                    # Then, if we have an input format or formats, the output format has to match.
-                    if out_format == in_formats or out_format in in_formats:
-                        format_matches.append((out_key, out_format))
-                else:
-                    # Otherwise, formats are optional and we match only on type.
-                    format_matches.append((out_key, out_format))
+        # By default, simply choose the first (i.e. most-recent) matching format
+        out_key = format_matches[0][0]
 
-            # Apply 'break' rule after iteration, to allow matching
-            if inference_rule == 'break':
-                break_inference = True
-                namespace_emb_last_break = namespace_emb_last
-
-        format_matches_all.append(format_matches)
-        attempted_matches_all.append(attempted_matches)
-        # Most log files just have format_2330 "Textual format", but this can
-        # conflict with other structured text files that also have format_2330.
-        # Unfortunately, the edam formats are not very finely curated, so they
-        # are not very 'exact'. For now, we can perform additional matching
-        # based on naming conventions and/or we can simply exclude log files
-        # (which are not usually parsed or otherwise used as inputs).
-        # Eventually, we will want to improve the format curation.
-        # NOTE: Use underscores to prevent excluding e.g. 'topology'
-        # This isn't great, but works for now (until someone uses '_log_' ...)
-        format_matches = [x for x in format_matches if not '_log_' in x[0]]
-        if not len(format_matches) == 0:
-            # By default, simply choose the first (i.e. most-recent) matching format
-            out_key = format_matches[0][0]
-
-            if inference_use_naming_conventions:  # default False
-                if len(format_matches) == 1:
-                    # Great! We found a unique format match.
+        if inference_use_naming_conventions:  # default False
+            if len(format_matches) == 1:
+                # Great! We found a unique format match.
+                out_key = format_matches[0][0]
+            else:
+                name_matches = []
+                # NOTE: The biobb CWL files do not use consistent naming
+                # conventions, so we need to perform some renamings here.
+                # Eventually, the CWL files themselves should be fixed.
+                arg_key_no_namespace = arg_key.split('___')[-1]
+                arg_key_renamed = arg_key_no_namespace.replace('input_', '')
+                for name1, name2 in renaming_conventions:
+                    arg_key_renamed = arg_key_renamed.replace(name1, name2)
+
+                for out_key, out_format in format_matches:
+                    out_key_no_namespace = out_key.split('___')[-1]
+                    out_key_renamed = out_key_no_namespace.replace('output_', '')
+                    if arg_key_renamed == out_key_renamed:
+                        name_matches.append((out_key, out_format))
+
+                if len(name_matches) == 0:
                     out_key = format_matches[0][0]
+                elif len(name_matches) == 1:
+                    # NOTE: This clause currently causes problems with insertions.
+                    # Specifically, we want to convert from format A to B, perform the calculation
+                    # in format B, then convert the results back to format A. However, if the
+                    # naming conventions of the result do not match the second insertion
+                    # (but DO match the first insertion), the files will be directly converted
+                    # from A to B to A, thus skipping the calculation in B entirely!
+                    # Great! We found a unique match.
+                    out_key = name_matches[0][0]
                 else:
-                    name_matches = []
-                    # NOTE: The biobb CWL files do not use consistent naming
-                    # conventions, so we need to perform some renamings here.
-                    # Eventually, the CWL files themselves should be fixed.
-                    arg_key_no_namespace = arg_key.split('___')[-1]
-                    arg_key_renamed = arg_key_no_namespace.replace('input_', '')
-                    for name1, name2 in renaming_conventions:
-                        arg_key_renamed = arg_key_renamed.replace(name1, name2)
-
-                    for out_key, out_format in format_matches:
-                        out_key_no_namespace = out_key.split('___')[-1]
-                        out_key_renamed = out_key_no_namespace.replace('output_', '')
-                        if arg_key_renamed == out_key_renamed:
-                            name_matches.append((out_key, out_format))
-
-                    if len(name_matches) == 0:
-                        out_key = format_matches[0][0]
-                    elif len(name_matches) == 1:
-                        # NOTE: This clause currently causes problems with insertions.
-                        # Specifically, we want to convert from format A to B, perform the calculation
-                        # in format B, then convert the results back to format A. However, if the
-                        # naming conventions of the result do not match the second insertion
-                        # (but DO match the first insertion), the files will be directly converted
-                        # from A to B to A, thus skipping the calculation in B entirely!
-                        # Great! We found a unique match.
-                        out_key = name_matches[0][0]
-                    else:
-                        out_key = name_matches[0][0]
-
-            # Generate a new namespace for out_key using the step number and add to inputs
-            step_name_j = utils.step_name_str(yaml_stem, j, steps_keys[j])
-
-            # We also need to keep track of the 'internal' output variables
-            if tool_j.cwl['class'] == 'Workflow':
-                vars_workflow_output_internal.append(out_key)
-            else:
-                vars_workflow_output_internal.append(f'{step_name_j}/{out_key}')
+                    out_key = name_matches[0][0]
 
-            arg_val = f'{step_name_j}/{out_key}'
-            arg_keyval = {arg_key: arg_val}
-            steps_i = utils_cwl.add_yamldict_keyval_in(steps[i], step_key, arg_keyval)
+        # Generate a new namespace for out_key using the step number and add to inputs
+        step_name_j = utils.step_name_str(yaml_stem, j, steps_keys[j])
 
-            arg_keys = [in_name] if in_name in input_mapping else [arg_key]
-            arg_keys = utils.get_input_mappings(input_mapping, arg_keys, arg_key_in_yaml_tree_inputs)
+        # We also need to keep track of the 'internal' output variables
+        if tool_j.cwl['class'] == 'Workflow':
+            vars_workflow_output_internal.append(out_key)
+        else:
+            vars_workflow_output_internal.append(f'{step_name_j}/{out_key}')
 
-            out_key = utils.get_output_mapping(output_mapping, out_key)
+        arg_val = f'{step_name_j}/{out_key}'
+        arg_keyval = {arg_key: arg_val}
+        steps_i = utils_cwl.add_yamldict_keyval_in(steps[i], step_key, arg_keyval)
+
+        arg_keys = [in_name] if in_name in input_mapping else [arg_key]
+        arg_keys = utils.get_input_mappings(input_mapping, arg_keys, arg_key_in_yaml_tree_inputs)
+
+        out_key = utils.get_output_mapping(output_mapping, out_key)
+
+        nss_embedded1 = out_key.split('___')[:-1]
 
-            nss_embedded1 = out_key.split('___')[:-1]
+        # NOTE: This if statement is unmotivated and probably masking some other bug, but it works.
+        if out_key.startswith('___'.join(namespaces + [step_name_j])):
+            nss1 = nss_embedded1
+        elif out_key.startswith(step_name_j):
+            nss1 = namespaces + nss_embedded1
+        else:
+            nss1 = namespaces + [step_name_j] + nss_embedded1
+
+        for arg_key_ in arg_keys:
+            # Determine which head and tail node to use for the new edge
+            # First we need to extract the embedded namespaces
+            nss_embedded2 = arg_key_.split('___')[:-1]
 
             # NOTE: This if statement is unmotivated and probably masking some other bug, but it works.
-            if out_key.startswith('___'.join(namespaces + [step_name_j])):
-                nss1 = nss_embedded1
-            elif out_key.startswith(step_name_j):
-                nss1 = namespaces + nss_embedded1
+            if arg_key_.startswith('___'.join(namespaces + [step_name_i])):
+                nss2 = nss_embedded2
+            elif arg_key_.startswith(step_name_i):
+                nss2 = namespaces + nss_embedded2
             else:
-                nss1 = namespaces + [step_name_j] + nss_embedded1
-
-            for arg_key_ in arg_keys:
-                # Determine which head and tail node to use for the new edge
-                # First we need to extract the embedded namespaces
-                nss_embedded2 = arg_key_.split('___')[:-1]
-
-                # NOTE: This if statement is unmotivated and probably masking some other bug, but it works.
-                if arg_key_.startswith('___'.join(namespaces + [step_name_i])):
-                    nss2 = nss_embedded2
-                elif arg_key_.startswith(step_name_i):
-                    nss2 = namespaces + nss_embedded2
-                else:
-                    nss2 = namespaces + [step_name_i] + nss_embedded2
-
-                # TODO: check this
-                out_key_no_namespace = out_key.split('___')[-1]
-                label = out_key_no_namespace if tool_j.cwl['class'] == 'Workflow' else out_key
-                utils_graphs.add_graph_edge(graph_settings, graph, nss1, nss2, label)
+                nss2 = namespaces + [step_name_i] + nss_embedded2
 
-            return steps_i  # Short circuit
+            # TODO: check this
+            out_key_no_namespace = out_key.split('___')[-1]
+            label = out_key_no_namespace if tool_j.cwl['class'] == 'Workflow' else out_key
+            utils_graphs.add_graph_edge(graph_settings, graph, nss1, nss2, label)
 
-        # Stop performing inference if the inference rule is 'break'
-        if break_inference:
-            break
+        return steps_i  # Short circuit
 
     # If no match yet, we can look for a potential steps to insert automatically.
     # NOTE: PLEASE READ docs/advanced.md#program-synthesis
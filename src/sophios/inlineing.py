@@ -1,7 +1,7 @@
 import copy
 from pathlib import Path
 import re
-from typing import List, Tuple
+from typing import Any, Dict, List, Tuple
 
 from mergedeep import merge, Strategy
 import yaml
@@ -80,10 +80,16 @@ def inline_subworkflow(yaml_tree_tuple: YamlTree, namespaces: Namespaces) -> Tup
     if namespaces == []:
         return yaml_tree_tuple, 0
 
-    (step_id, yaml_tree) = copy.deepcopy(yaml_tree_tuple)
+    # NOTE: Instead of deep copying the entire yml AST, only copy the path from
+    # the root to the subworkflow to be inlined (and the wic: tags, which are
+    # mutably updated). All of the other steps are shared with yaml_tree_tuple.
+    (step_id, yaml_tree) = yaml_tree_tuple
+    yaml_tree = {**yaml_tree}
     yaml_name = step_id.stem
 
-    wic = {'wic': yaml_tree.get('wic', {})}
+    wic = {'wic': copy.deepcopy(yaml_tree.get('wic', {}))}
+    if 'wic' in yaml_tree:
+        yaml_tree['wic'] = wic['wic']
     if 'implementations' in wic['wic']:
         if len(namespaces) == 1:  # and namespaces[0] == yaml_name ?
             (back_name_, yaml_tree) = utils.extract_implementation(yaml_tree, wic['wic'], Path(''))
@@ -99,7 +105,8 @@ def inline_subworkflow(yaml_tree_tuple: YamlTree, namespaces: Namespaces) -> Tup
         yaml_tree['wic']['implementations'] = dict(implementations_trees)
         return YamlTree(step_id, yaml_tree), 0  # choose len_substeps from which implementation?
 
-    steps: List[Yaml] = yaml_tree['steps']
+    steps: List[Yaml] = list(yaml_tree['steps'])
+    yaml_tree['steps'] = steps
     steps_keys = utils.get_steps_keys(steps)
     yaml_stem = Path(yaml_name).stem
     step_names = [utils.step_name_str(yaml_stem, i, step_key)
@@ -121,7 +128,8 @@ def inline_subworkflow(yaml_tree_tuple: YamlTree, namespaces: Namespaces) -> Tup
         steps_inits = steps[:i]  # Exclude step i
         steps_tails = steps[i+1:]  # Exclude step i
         # ~ syntax, specifically apply sub_parentargs to all inputs: call sites in sub_yml_tree
-        sub_yml_tree = apply_args(sub_yml_tree, sub_parentargs)
+        # NOTE: apply_args and merge (below) mutably update sub_yml_tree
+        sub_yml_tree = apply_args(copy.deepcopy(sub_yml_tree), sub_parentargs)
         # Inline sub-steps.
         sub_steps: List[Yaml] = sub_yml_tree['steps']
         yaml_tree['steps'] = steps_inits + sub_steps + steps_tails
@@ -163,9 +171,194 @@ def inline_subworkflow(yaml_tree_tuple: YamlTree, namespaces: Namespaces) -> Tup
     return YamlTree(step_id, yaml_tree), len_substeps
 
 
+def inline_subworkflows_iterative(yaml_tree_tuple: YamlTree, tools: Tools) -> YamlTree:
+    """Inlines all inlineable subworkflows, one at a time.\n
+    NOTE: This re-traverses the entire yml AST after each inlineing operation,
+    so it is quadratic in the number of subworkflows. Use inline_subworkflows() instead.
+
+    Args:
+        yaml_tree_tuple (YamlTree): A tuple of name and yml AST
+        tools (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+
+    Returns:
+        YamlTree: The updated root workflow with all inlineable subworkflows inlined.
+    """
+    yaml_tree = yaml_tree_tuple
+    while True:
+        # Inlineing changes the namespaces, so we have to get new namespaces after each inlineing operation.
+        namespaces_list = get_inlineable_subworkflows(yaml_tree, tools, False, [])
+        if namespaces_list == []:
+            break
+
+        yaml_tree, _len_substeps = inline_subworkflow(yaml_tree, namespaces_list[0])
+    return yaml_tree
+
+
+def inline_subworkflows(yaml_tree_tuple: YamlTree, tools: Tools) -> YamlTree:
+    """Inlines all inlineable subworkflows in a single traversal of the yml AST.\n
+    This performs exactly the same inlineing operations (in exactly the same order) as
+    inline_subworkflows_iterative(), i.e. it always inlines the first inlineable subworkflow
+    in pre-order, so the ~ syntax and the wic: tags are applied identically. However, the
+    yml AST is only copied once (up front) and all of the operations are performed in-place.
+
+    Args:
+        yaml_tree_tuple (YamlTree): A tuple of name and yml AST
+        tools (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+
+    Returns:
+        YamlTree: The updated root workflow with all inlineable subworkflows inlined.
+    """
+    (step_id, yaml_tree) = yaml_tree_tuple
+    if utils.recursively_contains_dict_key('implementations', yaml_tree):
+        # Inlineing (into) an implementation replaces the entire workflow, so just use the iterative algorithm.
+        return inline_subworkflows_iterative(yaml_tree_tuple, tools)
+
+    yaml_tree = copy_yml(yaml_tree)
+    inline_subworkflows_inplace(yaml_tree, [], [])
+    return YamlTree(step_id, yaml_tree)
+
+
+def copy_yml(yml: Any) -> Any:
+    """Recursively copies the dicts and lists of a yml AST.\n
+    NOTE: Unlike copy.deepcopy(), this does NOT preserve aliasing, so the copy can be mutated in-place.
+
+    Args:
+        yml (Any): A yml AST
+
+    Returns:
+        Any: A copy of the yml AST which does not share any dicts or lists with yml (or with itself).
+    """
+    if isinstance(yml, dict):
+        return {key: copy_yml(val) for key, val in yml.items()}
+    if isinstance(yml, list):
+        return [copy_yml(val) for val in yml]
+    return yml
+
+
+def inline_subworkflows_inplace(yaml_tree: Yaml, views: List[Yaml], ancestors: List[Yaml]) -> None:
+    """Mutably inlines all inlineable subworkflows of the given (sub)workflow, in pre-order.\n
+    Inlineing a subworkflow re-indexes all of the subsequent wic: steps: tags (and all of the
+    wic: steps: tags in the parent workflows which refer to them), so instead of re-indexing
+    the tags after each inlineing operation, the tags are temporarily attached to their steps.
+    This is linear (rather than quadratic) in the number of steps.
+
+    Args:
+        yaml_tree (Yaml): The yml AST of the current (sub)workflow, which is mutably updated.
+        views (List[Yaml]): The wic: steps: tags in the parent workflows which refer to the steps of this workflow.
+        ancestors (List[Yaml]): The yml ASTs of the (non-inlineable) parent workflows
+    """
+    steps: List[Yaml] = yaml_tree['steps']
+    wic_steps_self = yaml_tree.get('wic', {}).get('steps')
+    views = [wic_steps_self if isinstance(wic_steps_self, dict) else {}] + views
+
+    # Temporarily detach the wic: steps: tags from each view and attach them to
+    # the steps (by index), or to the end of the workflow (by offset).
+    out: List[Yaml] = []
+    pending: List[Tuple[Yaml, List[Yaml]]] = [(step, [{} for _ in views]) for step in reversed(steps)]
+    end: List[Dict[Tuple[int, str], Yaml]] = [{} for _ in views]
+    # Until the first inlineing operation, the tags are not re-indexed, so keep the keys verbatim.
+    keystrs: Dict[Tuple[int, int, str], str] = {}
+    for v, view in enumerate(views):
+        wic_steps = list(view.items())
+        view.clear()
+        for keystr, val in wic_steps:
+            (index, name) = utils.parse_int_string_tuple(keystr)
+            keystrs[(v, index, name)] = keystr
+            if index < 1:
+                view[keystr] = val  # Never re-indexed
+            else:
+                attach_wic_step(out, pending, end[v], view, v, index, name, val, False)
+
+    inlined = False
+    while pending:
+        (step, step_wic_steps) = pending.pop()
+        i = len(out)
+        step_key = utils.get_steps_keys([step])[0]
+        subtree = step['subtree'] if step_key in utils.get_subkeys([step_key]) else None
+        # All subworkflows are inlineable, except scattered subworkflows.
+        if subtree is not None and subtree.get('wic', {}).get('inlineable', True):
+            inlined = True
+            # ~ syntax, specifically apply sub_parentargs to all inputs: call sites in sub_yml_tree
+            # NOTE: apply_args and merge (below) mutably update sub_yml_tree, which we own.
+            sub_yml_tree = apply_args(subtree, step['parentargs'])
+            # Inline sub-steps. NOTE: Do not emit them yet; the sub-steps themselves may be inlineable.
+            sub_steps: List[Yaml] = sub_yml_tree['steps']
+            pending += [(sub_step, [{} for _ in views]) for sub_step in reversed(sub_steps)]
+
+            for v, view in enumerate(views):
+                wic_steps_i = step_wic_steps[v]
+                sub_wic_tag = wic_steps_i.pop(step_key, {}).get('wic', {})
+                if v == 0:
+                    # Merge parent into child to support overloading.
+                    sub_wic_tag = merge(sub_yml_tree.get('wic', {}), sub_wic_tag, strategy=Strategy.TYPESAFE_REPLACE)
+                for keystr, val in sub_wic_tag.get('steps', {}).items():
+                    (index, name) = utils.parse_int_string_tuple(keystr)
+                    attach_wic_step(out, pending, end[v], view, v, i + index, name, val, True)
+                # Any other tags with the same index are re-indexed to the last sub-step.
+                for name, val in wic_steps_i.items():
+                    attach_wic_step(out, pending, end[v], view, v, i + len(sub_steps), name, val, False)
+            continue
+
+        out.append(step)
+        for v, view in enumerate(views):
+            for name, val in step_wic_steps[v].items():
+                keystr = f'({i + 1}, {name})'
+                view[keystrs.get((v, i + 1, name), keystr) if not inlined else keystr] = val
+
+        if subtree is not None:
+            key = f'({i + 1}, {step_key})'
+            sub_views = [view[key]['wic']['steps'] for view in views
+                         if 'steps' in view.get(key, {}).get('wic', {})]
+            inline_subworkflows_inplace(subtree, sub_views, ancestors + [yaml_tree])
+
+    for v, view in enumerate(views):
+        for (offset, name), val in end[v].items():
+            keystr = f'({len(out) + offset}, {name})'
+            view[keystrs.get((v, len(out) + offset, name), keystr) if not inlined else keystr] = val
+    yaml_tree['steps'] = out
+    if inlined:
+        yaml_tree.setdefault('wic', {})['steps'] = views[0]
+        for ancestor in ancestors:
+            ancestor.setdefault('wic', {})
+
+
+def attach_wic_step(out: List[Yaml], pending: List[Tuple[Yaml, List[Yaml]]], end: Dict[Tuple[int, str], Yaml],
+                    view: Yaml, v: int, index: int, name: str, val: Yaml, overwritten: bool) -> None:
+    """Attaches a wic: steps: tag to the step with the given (one-based) index.
+
+    Args:
+        out (List[Yaml]): The steps which have already been inlined (if necessary)
+        pending (List[Tuple[Yaml, List[Yaml]]]): The remaining steps (in reverse order) and their attached tags
+        end (Dict[Tuple[int, str], Yaml]): The tags after the last step, by offset, which is mutably updated.
+        view (Yaml): The wic: steps: tag (for the steps which have already been inlined)
+        v (int): The index of the view
+        index (int): The (one-based) index of the step
+        name (str): The name of the step
+        val (Yaml): The tag to be attached
+        overwritten (bool): If there is an existing tag, merge it into the given tag (instead of vice versa).
+    """
+    wic_steps: Dict[Any, Yaml]
+    key: Any
+    k = index - 1 - len(out)
+    if k < 0:
+        (wic_steps, key) = (view, f'({index}, {name})')
+    elif k < len(pending):
+        (wic_steps, key) = (pending[-1 - k][1][v], name)
+    else:
+        (wic_steps, key) = (end, (index - len(out) - len(pending), name))
+
+    if key in wic_steps:
+        # Merge parent into child to support overloading.
+        if overwritten:
+            val = merge(val, wic_steps[key], strategy=Strategy.TYPESAFE_REPLACE)
+        else:
+            val = merge(wic_steps[key], val, strategy=Strategy.TYPESAFE_REPLACE)
+    wic_steps[key] = val
+
+
 def apply_args(sub_yml_tree: Yaml, sub_parentargs: Yaml) -> Yaml:
-    # Do we need to deepcopy? We are already deepcopy'ing at the only call site,
-    # so looks like no.
+    # Do we need to deepcopy? We are already deepcopy'ing sub_yml_tree at the
+    # only call site, so looks like no.
     inputs_workflow = sub_yml_tree.get('inputs', {})
     if 'inputs' in sub_yml_tree:
         del sub_yml_tree['inputs']
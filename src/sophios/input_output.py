@@ -1,12 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor
 import copy
+import hashlib
 from shutil import copytree, ignore_patterns
 import json
+import os
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple
 
 import yaml
 
 from . import auto_gen_header
+from . import utils_yaml
+from .utils_yaml import FastSafeDumper, safe_load
 from .runtime_inputs import normalize_rose_tree_cwl, normalize_rose_tree_job_inputs
 from .wic_types import (Namespaces, NodeData, RoseTree, Yaml, ExplicitEdgeCalls, Json)
 
@@ -23,7 +28,28 @@ class NoAliasDumper(yaml.SafeDumper):
         return True
 
 
-def write_to_disk(rose_tree: RoseTree, path: Path, relative_run_path: bool, inputs_file: str = '') -> None:
+class FastNoAliasDumper(FastSafeDumper):
+    def ignore_aliases(self, data: Any) -> bool:
+        return True
+
+
+def dump_yaml(document: Any) -> str:
+    """Dumps a CWL file (or yml inputs file) the way we always write them to disk,
+    using libyaml whenever it emits exactly the same bytes as the pure python emitter.
+
+    Args:
+        document (Any): The CWL file or yml inputs file contents
+
+    Returns:
+        str: The yml string
+    """
+    # Use sort_keys=False to preserve the order of the steps.
+    return utils_yaml.dump(document, NoAliasDumper, FastNoAliasDumper,
+                           sort_keys=False, line_break='\n', indent=2)
+
+
+def write_to_disk(rose_tree: RoseTree, path: Path, relative_run_path: bool, inputs_file: str = '',
+                  incremental: bool = True, write_manifest: bool = False) -> Dict[str, str]:
     """Writes the compiled CWL files and their associated yml inputs files to disk.
 
     NOTE: Only the yml input file associated with the root workflow is
@@ -36,60 +62,75 @@ def write_to_disk(rose_tree: RoseTree, path: Path, relative_run_path: bool, inpu
         path (Path): The directory in which to write the files
         relative_run_path (bool): Controls whether to use subdirectories or just one directory.
         inputs_file (str): Optional additional inputs
+        incremental (bool): Do not rewrite files whose contents have not changed (which preserves their mtimes).
+        write_manifest (bool): Also write the manifest to path / {yaml_stem}_manifest.json
+
+    Returns:
+        Dict[str, str]: The manifest, i.e. the sha256 content hash of every file, keyed by its path relative to path
     """
-    inputs = {}
+    inputs = read_inputs_file(inputs_file)
+    rose_trees_paths = get_rose_trees_paths(rose_tree, path, relative_run_path)
+    with ThreadPoolExecutor() as executor:
+        contents = list(executor.map(lambda rt_paths: serialize(rt_paths[0], inputs), rose_trees_paths))
+        files: Dict[Path, bytes] = {}
+        for (_, path_cwl, path_yml), (content_cwl, content_yml) in zip(rose_trees_paths, contents):
+            # If multiple subworkflows have the same paths, the last one wins (as if we wrote them sequentially).
+            files[path_cwl] = content_cwl
+            files[path_yml] = content_yml
+        for directory in set(file_path.parent for file_path in files):
+            directory.mkdir(parents=True, exist_ok=True)
+        digests = executor.map(lambda item: write_if_changed(item[0], item[1], incremental), files.items())
+        manifest = {file_path.relative_to(path).as_posix(): digest for file_path, digest in zip(files, digests)}
+
+    if write_manifest:
+        manifest_json = json.dumps(manifest, indent=4, sort_keys=True)
+        write_if_changed(path / f'{rose_tree.data.name}_manifest.json', encode(manifest_json), incremental)
+    return manifest
+
+
+def read_inputs_file(inputs_file: str) -> Yaml:
+    """Reads the (optional) additional inputs, i.e. --inputs_file
+
+    Args:
+        inputs_file (str): The path of the additional inputs yml file, or ''
+
+    Returns:
+        Yaml: The additional inputs, with relative locations w.r.t. autogenerated/
+    """
+    inputs: Yaml = {}
     if inputs_file:
         with open(inputs_file, mode='r', encoding='utf-8') as f:
-            inputs = yaml.safe_load(f.read())
+            inputs = safe_load(f.read())
         for val in inputs.values():
             if 'location' in val and not Path(val['location']).is_absolute():
                 # Change relative paths for class: File and class: Dir
                 # to be w.r.t. autogenerated/
                 val['location'] = '../' + val['location']
-    _write_to_disk(rose_tree, path, relative_run_path, inputs)
+    return inputs
 
 
-def _write_to_disk(rose_tree: RoseTree, path: Path, relative_run_path: bool, inputs: Yaml | None = None) -> None:
-    """Writes the compiled CWL files and their associated yml inputs files to disk.
-
-    NOTE: Only the yml input file associated with the root workflow is
-    guaranteed to have all inputs. In other words, subworkflows will all have
-    valid CWL files, but may not be executable due to 'missing' inputs.
-    Additional inputs can be explicitly passed in in this case.
+def get_rose_trees_paths(rose_tree: RoseTree, path: Path, relative_run_path: bool) -> List[Tuple[RoseTree, Path, Path]]:
+    """Determines where the compiled CWL file and yml inputs file of each subworkflow should be written.
 
     Args:
         rose_tree (RoseTree): The data associated with compiled subworkflows
         path (Path): The directory in which to write the files
         relative_run_path (bool): Controls whether to use subdirectories or just one directory.
-        inputs (Yaml): Optional additional inputs
+
+    Returns:
+        List[Tuple[RoseTree, Path, Path]]: The (pre-order) subworkflows, and their CWL file and yml inputs file paths
     """
-    inputs = {} if inputs is None else inputs
     node_data: NodeData = rose_tree.data
     namespaces = node_data.namespaces
     yaml_stem = node_data.name
-    cwl_tree = normalize_rose_tree_cwl(rose_tree)
-    yaml_inputs = normalize_rose_tree_job_inputs(rose_tree, {**node_data.workflow_inputs_file, **inputs})
 
-    path.mkdir(parents=True, exist_ok=True)
     if relative_run_path:
         filename_cwl = f'{yaml_stem}.cwl'
         filename_yml = f'{yaml_stem}_inputs.yml'
     else:
         filename_cwl = '___'.join(namespaces + [f'{yaml_stem}.cwl'])
         filename_yml = '___'.join(namespaces + [f'{yaml_stem}_inputs.yml'])
-
-    # Dump the compiled CWL file contents to disk.
-    # Use sort_keys=False to preserve the order of the steps.
-    yaml_content = yaml.dump(cwl_tree, sort_keys=False, line_break='\n', indent=2, Dumper=NoAliasDumper)
-    with open(path / filename_cwl, mode='w', encoding='utf-8') as w:
-        w.write('#!/usr/bin/env cwl-runner\n')
-        w.write(auto_gen_header)
-        w.write(''.join(yaml_content))
-
-    yaml_content = yaml.dump(yaml_inputs, sort_keys=False, line_break='\n', indent=2, Dumper=NoAliasDumper)
-    with open(path / filename_yml, mode='w', encoding='utf-8') as inp:
-        inp.write(auto_gen_header)
-        inp.write(yaml_content)
+    rose_trees_paths = [(rose_tree, path / filename_cwl, path / filename_yml)]
 
     for sub_rose_tree in rose_tree.sub_trees:
         subpath = path
@@ -97,7 +138,59 @@ def _write_to_disk(rose_tree: RoseTree, path: Path, relative_run_path: bool, inp
             sub_node_data: NodeData = sub_rose_tree.data
             sub_step_name = sub_node_data.namespaces[-1]
             subpath = path / sub_step_name
-        _write_to_disk(sub_rose_tree, subpath, relative_run_path, inputs)
+        rose_trees_paths += get_rose_trees_paths(sub_rose_tree, subpath, relative_run_path)
+    return rose_trees_paths
+
+
+def serialize(rose_tree: RoseTree, inputs: Yaml) -> Tuple[bytes, bytes]:
+    """Serializes the compiled CWL file and the yml inputs file of a single (sub)workflow.\n
+    NOTE: This is called from a thread pool, so it must not have any side effects.
+
+    Args:
+        rose_tree (RoseTree): The data associated with compiled subworkflows
+        inputs (Yaml): Additional inputs
+
+    Returns:
+        Tuple[bytes, bytes]: The contents of the CWL file and the yml inputs file
+    """
+    node_data: NodeData = rose_tree.data
+    cwl_tree = normalize_rose_tree_cwl(rose_tree)
+    yaml_inputs = normalize_rose_tree_job_inputs(rose_tree, {**node_data.workflow_inputs_file, **inputs})
+
+    content_cwl = '#!/usr/bin/env cwl-runner\n' + auto_gen_header + dump_yaml(cwl_tree)
+    content_yml = auto_gen_header + dump_yaml(yaml_inputs)
+    return (encode(content_cwl), encode(content_yml))
+
+
+def encode(content: str) -> bytes:
+    """Encodes content exactly as if it were written to a file in text mode (i.e. with platform line endings).
+
+    Args:
+        content (str): The file contents
+
+    Returns:
+        bytes: The utf-8 encoded file contents
+    """
+    return content.replace('\n', os.linesep).encode('utf-8')
+
+
+def write_if_changed(file_path: Path, content: bytes, incremental: bool) -> str:
+    """Writes content to file_path, unless (incremental and) the file already has exactly the same contents.\n
+    This preserves the mtimes of unchanged files, so cwltool, file watchers, rsync, etc will not consider them changed.
+
+    Args:
+        file_path (Path): The file to write
+        content (bytes): The file contents
+        incremental (bool): Do not rewrite the file if its contents have not changed.
+
+    Returns:
+        str: The sha256 content hash
+    """
+    unchanged = (incremental and file_path.is_file() and file_path.stat().st_size == len(content)
+                 and file_path.read_bytes() == content)
+    if not unchanged:
+        file_path.write_bytes(content)
+    return hashlib.sha256(content).hexdigest()
 
 
 def write_config_to_disk(config: Json, config_file: Path) -> None:
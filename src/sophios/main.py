@@ -10,10 +10,13 @@ import graphviz
 import networkx as nx
 import yaml
 
-from sophios.utils_yaml import wic_loader
+from sophios.utils_yaml import FastDumper, wic_loader
 from . import input_output as io
 from . import post_compile as pc
-from . import ast, cli, compiler, inference, inlineing, plugins, run_local, utils  # , utils_graphs
+from . import ast, cli, compile_batch, compiler, inference, inlineing, plugins, run_local  # , utils_graphs
+from . import utils, utils_yaml
+from .compiler_context import CompilerContextData
+from .runtime_inputs import normalize_rose_tree_cwl, normalize_rose_tree_job_inputs
 from .schemas import wic_schema
 from .wic_types import GraphData, GraphReps, Json, StepId, Yaml, YamlTree
 
@@ -24,7 +27,7 @@ def _write_intermediate_wic(yaml_stem: str, suffix: str, yaml_doc: Yaml, *, enab
         return None
     output_path = Path('autogenerated') / f'{yaml_stem}_{suffix}.wic'
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(yaml.dump(yaml_doc), encoding='utf-8')
+    output_path.write_text(utils_yaml.dump(yaml_doc, yaml.Dumper, FastDumper), encoding='utf-8')
     return output_path
 
 
@@ -46,7 +49,8 @@ def main() -> None:
         sys.exit(0)
     global_config: Json = io.get_config(Path(args.config_file), default_config_file)
 
-    tools_cwl = plugins.get_tools_cwl(global_config, args.validate_plugins, args.quiet)
+    tools_cwl = plugins.get_tools_cwl(global_config, args.validate_plugins, args.quiet,
+                                      use_cache=not args.no_tools_cache)
     # pass around config object instead of reading from the disk!
     yml_paths = plugins.get_yml_paths(global_config)
 
@@ -57,6 +61,9 @@ def main() -> None:
     # Generate schemas for validation and vscode IntelliSense code completion
     yaml_stems = utils.flatten([list(p) for p in yml_paths.values()])
     schema_store: Dict[str, Json] = {}
+    if not args.generate_schemas:
+        # Use the schemas from the last --generate_schemas, but only if they are still up to date.
+        schema_store = wic_schema.get_cached_schemas(yml_paths)
     validator = wic_schema.get_validator(tools_cwl, yaml_stems, schema_store, write_to_disk=False)
 
     # Generating yml schemas every time takes ~20 seconds and guarantees the
@@ -64,19 +71,14 @@ def main() -> None:
     # wic files, if there are any errors in any of the wic files, the user may
     # be confused by an error message when the --yaml file is correct.
     # For now, require the user to update the schemas manually. In the future,
-    # we may use a filewatcher.
+    # we may use a filewatcher. (Only the schemas whose yml and/or cwl files
+    # changed since the last time are regenerated, so this is usually fast.)
     if args.generate_schemas:
-        yml_paths_tuples = [(yml_path_str, yml_path)
-                            for yml_namespace, yml_paths_dict in yml_paths.items()
-                            for yml_path_str, yml_path in yml_paths_dict.items()]
-
-        for yml_path_str, yml_path in yml_paths_tuples:
-            schema = wic_schema.compile_workflow_generate_schema(args.homedir, yml_path_str, yml_path,
-                                                                 tools_cwl, yml_paths, validator,
-                                                                 args.ignore_validation_errors,
-                                                                 args.write_intermediate_wic)
-            # overwrite placeholders in schema_store. See comment in get_validator()
-            schema_store[schema['$id']] = schema
+        schemas = wic_schema.generate_workflow_schemas(args.homedir, tools_cwl, yml_paths, validator,
+                                                       args.ignore_validation_errors,
+                                                       args.write_intermediate_wic)
+        # overwrite placeholders in schema_store. See comment in get_validator()
+        schema_store.update(schemas)
 
         # Now that we compiled all of the subworkflows once with the permissive/weak schema,
         # compile the root yml workflow again with the restrictive/strict schema.
@@ -90,6 +92,11 @@ def main() -> None:
         print('Finished generating schemas. Exiting.')
         sys.exit(0)
 
+    if args.compile_batch:
+        context = CompilerContextData(global_config, tools_cwl, yml_paths, compiler.inference_rules,
+                                      inference.renaming_conventions, validator, '')
+        sys.exit(compile_batch.run_compile_batch(args.compile_batch, context, args, args.compile_max_workers))
+
     yaml_path = args.yaml
     yaml_stem = Path(args.yaml).stem
 
@@ -101,39 +108,23 @@ def main() -> None:
     plugin_ns = wic['wic'].get('namespace', 'global')
     step_id = StepId(yaml_path, plugin_ns)
     y_t = YamlTree(step_id, root_yaml_tree)
-    yaml_tree_raw = ast.read_ast_from_disk(args.homedir, y_t, yml_paths, tools_cwl, validator,
-                                           args.ignore_validation_errors)
-    # Optionally write compiler-internal workflow trees for debugging.
-    _write_intermediate_wic(
-        Path(yaml_path).stem,
-        'tree_raw',
-        yaml_tree_raw.yml,
-        enabled=args.write_intermediate_wic,
-    )
-    yaml_tree = ast.merge_yml_trees(yaml_tree_raw, {}, tools_cwl)
-    _write_intermediate_wic(
-        Path(yaml_path).stem,
-        'tree_merged',
-        yaml_tree.yml,
-        enabled=args.write_intermediate_wic,
-    )
     root_yml_dir_abs = Path(args.yaml).parent.absolute()
-    yaml_tree = ast.python_script_generate_cwl(yaml_tree, root_yml_dir_abs, tools_cwl)
-    _write_intermediate_wic(
-        Path(yaml_path).stem,
-        'tree_python_script',
-        yaml_tree.yml,
-        enabled=args.write_intermediate_wic,
-    )
+    if args.write_intermediate_wic:
+        # Run the front-end passes separately, so we can write each of the
+        # compiler-internal workflow trees to disk for debugging.
+        yaml_tree_raw = ast.read_ast_from_disk(args.homedir, y_t, yml_paths, tools_cwl, validator,
+                                               args.ignore_validation_errors)
+        _write_intermediate_wic(Path(yaml_path).stem, 'tree_raw', yaml_tree_raw.yml, enabled=True)
+        yaml_tree = ast.merge_yml_trees(yaml_tree_raw, {}, tools_cwl)
+        _write_intermediate_wic(Path(yaml_path).stem, 'tree_merged', yaml_tree.yml, enabled=True)
+        yaml_tree = ast.python_script_generate_cwl(yaml_tree, root_yml_dir_abs, tools_cwl)
+        _write_intermediate_wic(Path(yaml_path).stem, 'tree_python_script', yaml_tree.yml, enabled=True)
+    else:
+        yaml_tree = ast.read_ast_fused(args.homedir, y_t, yml_paths, tools_cwl, validator,
+                                       args.ignore_validation_errors, root_yml_dir_abs)
 
     if args.cwl_inline_subworkflows:
-        while True:
-            # Inlineing changes the namespaces, so we have to get new namespaces after each inlineing operation.
-            namespaces_list = inlineing.get_inlineable_subworkflows(yaml_tree, tools_cwl, False, [])
-            if namespaces_list == []:
-                break
-
-            yaml_tree, _len_substeps = inlineing.inline_subworkflow(yaml_tree, namespaces_list[0])
+        yaml_tree = inlineing.inline_subworkflows(yaml_tree, tools_cwl)
 
         # Append _inline here instead of in io.write_to_disk()
         step_id = StepId(yaml_tree.step_id.stem + '_inline', yaml_tree.step_id.plugin_ns)
@@ -170,6 +161,11 @@ def main() -> None:
         subgraph = GraphReps(subgraph_gv, subgraph_nx, graphdata)
 
         compiler_options, graph_settings, yaml_tag_paths = cli.get_dicts_for_compilation()
+        compiler_options['parallel_subworkflows'] = args.parallel_subworkflows
+        compiler.max_workers_subworkflows = args.compile_max_workers
+        if args.graph_mode is None:
+            # Only build the graphs if we are actually going to render them.
+            graph_settings['graph_mode'] = 'full' if args.graphviz else 'none'
 
         try:
             compiler_info = compiler.compile_workflow(yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
@@ -223,13 +219,15 @@ def main() -> None:
         # Only now we need to write the final cwl for docker-extract
         # and then for actually running using a cwl_runner
         basepath = 'autogenerated'
-        io.write_to_disk(rose_tree, Path(basepath), True, args.inputs_file)
+        io.write_to_disk(rose_tree, Path(basepath), True, args.inputs_file,
+                         not args.rewrite_unchanged, args.write_manifest)
         # extract the container images
         pc.cwl_docker_extract(args.container_engine, args.pull_dir, Path(basepath) / f'{yaml_stem}.cwl')
         if args.docker_remove_entrypoints:
             rose_tree = pc.remove_entrypoints(args.container_engine, rose_tree)
         # stage input files for run
-        pc.stage_input_files(rose_tree.data.workflow_inputs_file, Path(args.yaml).parent.absolute(), basepath)
+        pc.stage_input_files(rose_tree.data.workflow_inputs_file, Path(args.yaml).parent.absolute(), basepath,
+                             strategy=args.input_files_strategy)
         # No need to re-write to disk as nothing of the cwl or yaml_inputs has changed!
         # if there are no unknown_args then unkown_args will be an empty list []
         # so no need for a separate check of a particular flag!
@@ -238,14 +236,31 @@ def main() -> None:
         run_args_dict['container_engine'] = args.container_engine
         run_args_dict['cwl_runner'] = args.cwl_runner
         run_args_dict['copy_output_files'] = 'yes' if args.copy_output_files else 'no'
+        run_args_dict['output_files_strategy'] = args.output_files_strategy
         run_args_dict['cachedir'] = args.cachedir
         run_args_dict['outdir'] = args.outdir
         run_args_dict['generate_run_script'] = 'yes' if args.generate_run_script else 'no'
         run_local.run_local(run_args_dict, False,
                             workflow_name=rose_tree.data.name, passthrough_args=unknown_args, basepath=basepath)
 
+    elif args.compute_url:
+        # Compute requires the cwl to be inlined within the 'run' tag.
+        if not args.cwl_inline_runtag:
+            rose_tree = pc.cwl_inline_runtag(rose_tree)
+        workflow_inputs = normalize_rose_tree_job_inputs(rose_tree, rose_tree.data.workflow_inputs_file)
+        job_inputs = []
+        for compute_inputs in args.compute_inputs:
+            with open(compute_inputs, mode='r', encoding='utf-8') as y:
+                job_inputs.append({**workflow_inputs, **yaml.load(y.read(), Loader=wic_loader())})
+        retval = run_local.run_compute_batch(rose_tree.data.name, normalize_rose_tree_cwl(rose_tree),
+                                             job_inputs or [workflow_inputs], args.compute_url,
+                                             args.compute_max_concurrency, args.compute_retries)
+        if retval:
+            sys.exit(retval)
+
     elif args.generate_cwl_workflow:
-        io.write_to_disk(rose_tree, Path('autogenerated/'), True, args.inputs_file)
+        io.write_to_disk(rose_tree, Path('autogenerated/'), True, args.inputs_file,
+                         not args.rewrite_unchanged, args.write_manifest)
     else:
         print('Please specify either --generate_cwl_workflow (compile) or --run_local (run)')
         sys.exit(1)
@@ -1,20 +1,22 @@
 import copy
+import hashlib
 import logging
 import glob
+import json
 import os
 from pathlib import Path
 import re
 import tempfile
-from typing import Any, Dict, Union, List
+from typing import Any, Dict, NamedTuple, Union, List
 
 import cwltool.load_tool
-import yaml
 import podman
 from podman.domain.images_build import BuildMixin
 import docker
 
 
-from . import utils_cwl
+from . import __version__, utils_cwl
+from .utils_yaml import safe_load
 from .wic_types import Cwl, NodeData, RoseTree, StepId, Tool, Tools, Json
 
 
@@ -72,7 +74,104 @@ def validate_cwl(cwl_path_str: str) -> None:
     cwltool.load_tool.make_tool(uri, loading_context)
 
 
-def get_tools_cwl(config: Json, validate_plugins: bool = False, quiet: bool = False) -> Tools:
+# Bump this whenever the canonical form stored in the tools cache changes
+# (i.e. whenever desugar_into_canonical_normal_form changes semantics).
+TOOLS_CACHE_VERSION = 1
+TOOLS_CACHE_PATH = Path('autogenerated/cache/tools_cwl.json')
+
+
+class ToolCacheEntry(NamedTuple):
+    mtime_ns: int
+    size: int
+    digest: str  # sha256 of the raw file contents
+    cwl: Cwl  # i.e. after desugar_into_canonical_normal_form, but before --quiet
+    validated: bool
+
+
+def load_tools_cache(cache_path: Path) -> Dict[str, ToolCacheEntry]:
+    """Loads the on-disk tool registry cache, discarding it if it is unreadable or stale.
+
+    NOTE: The cache is plain JSON (not pickle), so that a tampered cache file can
+    at worst contain bogus tools, but can never execute code.
+
+    Args:
+        cache_path (Path): The path of the tool registry cache
+
+    Returns:
+        Dict[str, ToolCacheEntry]: The cache entries, keyed by absolute cwl path
+    """
+    if not cache_path.exists():
+        return {}
+    try:
+        with open(cache_path, mode='r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if not isinstance(cache, dict) or cache.get('version') != [TOOLS_CACHE_VERSION, __version__]:
+            return {}
+        return {path: ToolCacheEntry(**entry) for path, entry in cache.get('entries', {}).items()}
+    except Exception:
+        # A partially written or otherwise corrupt cache is not an error; just rebuild it.
+        return {}
+
+
+def save_tools_cache(cache_path: Path, entries: Dict[str, ToolCacheEntry]) -> None:
+    """Atomically writes the tool registry cache to disk.
+
+    Args:
+        cache_path (Path): The path of the tool registry cache
+        entries (Dict[str, ToolCacheEntry]): The cache entries, keyed by absolute cwl path
+    """
+    cache = {'version': [TOOLS_CACHE_VERSION, __version__],
+             'entries': {path: entry._asdict() for path, entry in entries.items()}}
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file and rename so that concurrent processes
+    # (i.e. pytest --workers, the REST API) never observe a partial write.
+    fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, prefix=cache_path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode='w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    except (OSError, TypeError, ValueError):
+        # i.e. a tool which is not JSON serializable; just do not cache anything.
+        Path(tmp_path).unlink(missing_ok=True)
+
+
+def load_tool_cached(cwl_path_abs: str, entries_old: Dict[str, ToolCacheEntry],
+                     digests_old: Dict[str, ToolCacheEntry], validate_plugins: bool) -> ToolCacheEntry:
+    """Returns the canonical CWL for the given file, only re-parsing it if its contents changed.
+
+    Args:
+        cwl_path_abs (str): The absolute path to the CWL file.
+        entries_old (Dict[str, ToolCacheEntry]): The previous cache entries, keyed by absolute cwl path
+        digests_old (Dict[str, ToolCacheEntry]): The previous cache entries, keyed by content hash
+        validate_plugins (bool): Performs validation on the CWL CommandLineTool (at most once per content hash).
+
+    Returns:
+        ToolCacheEntry: The (possibly new) cache entry for cwl_path_abs
+    """
+    stat = os.stat(cwl_path_abs)
+    entry = entries_old.get(cwl_path_abs)
+    if not (entry and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size):
+        with open(cwl_path_abs, mode='rb') as f:
+            contents = f.read()
+        digest = hashlib.sha256(contents).hexdigest()
+        entry = digests_old.get(digest)
+        if entry is None:
+            tool: Cwl = safe_load(contents.decode('utf-8'))
+            tool = utils_cwl.desugar_into_canonical_normal_form(tool)
+            entry = ToolCacheEntry(stat.st_mtime_ns, stat.st_size, digest, tool, False)
+        else:
+            # Same contents (i.e. touched, copied, or moved), so just update the stat key.
+            # Copy so that two files with the same contents do not alias each other.
+            entry = entry._replace(mtime_ns=stat.st_mtime_ns, size=stat.st_size, cwl=copy.deepcopy(entry.cwl))
+
+    if validate_plugins and not entry.validated:
+        validate_cwl(cwl_path_abs)
+        entry = entry._replace(validated=True)
+    return entry
+
+
+def get_tools_cwl(config: Json, validate_plugins: bool = False, quiet: bool = False,
+                  use_cache: bool = True, cache_path: Path = TOOLS_CACHE_PATH) -> Tools:
     """Uses glob() to find all of the CWL CommandLineTool definition files within any subdirectory of cwl_dir
 
     Args:
@@ -80,11 +179,17 @@ def get_tools_cwl(config: Json, validate_plugins: bool = False, quiet: bool = Fa
         cwl_dirs_file (Path): The subdirectories in which to search for CWL CommandLineTools
         validate_plugins (bool, optional): Performs validation on all CWL CommandLiineTools. Defaults to False.
         quiet (bool, optional): Determines whether it captures stdout or stderr. Defaults to False.
+        use_cache (bool, optional): Reuse the canonicalized tools from the on-disk tool registry cache.\n
+        Only new or modified files are re-parsed, and deleted files are evicted. Defaults to True.
+        cache_path (Path, optional): The path of the on-disk tool registry cache.
 
     Returns:
         Tools: The CWL CommandLineTool definitions found using glob()
     """
     cwl_dirs_tag = config['search_paths_cwl']
+    entries_old = load_tools_cache(cache_path) if use_cache else {}
+    digests_old = {entry.digest: entry for entry in entries_old.values()}
+    entries_new: Dict[str, ToolCacheEntry] = {}
     # Load ALL of the tools.
     tools_cwl: Tools = {}
     for plugin_ns in cwl_dirs_tag:
@@ -104,14 +209,14 @@ def get_tools_cwl(config: Json, validate_plugins: bool = False, quiet: bool = Fa
             for cwl_path_str in cwl_paths:
                 if 'biobb_md' in cwl_path_str:
                     continue  # biobb_md is deprecated (in favor of biobb_gromacs)
-                with open(cwl_path_str, mode='r', encoding='utf-8') as f:
-                    tool: Cwl = yaml.safe_load(f.read())
                 stem = Path(cwl_path_str).stem
+                cwl_path_abs = os.path.abspath(cwl_path_str)
 
-                if validate_plugins:
-                    validate_cwl(cwl_path_str)
-
-                tool = utils_cwl.desugar_into_canonical_normal_form(tool)
+                entry = load_tool_cached(cwl_path_abs, entries_old, digests_old, validate_plugins)
+                entries_new[cwl_path_abs] = entry
+                # NOTE: Deep copy so that neither the --quiet tags below nor any callers
+                # which mutate the tools (i.e. nested requirements: or inputs:) affect the cache.
+                tool: Cwl = copy.deepcopy(entry.cwl)
 
                 if quiet:
                     # Capture stdout and stderr
@@ -119,8 +224,19 @@ def get_tools_cwl(config: Json, validate_plugins: bool = False, quiet: bool = Fa
                         tool.update({'stdout': f'{stem}.out'})
                     if not 'stderr' in tool:
                         tool.update({'stderr': f'{stem}.err'})
-                cwl_path_abs = os.path.abspath(cwl_path_str)
                 tools_cwl[StepId(stem, plugin_ns)] = Tool(cwl_path_abs, tool)
+
+    if use_cache:
+        # Retain entries for other search paths (i.e. other configs sharing this
+        # directory), but evict any files which have been deleted.
+        entries_kept = {path: entry for path, entry in entries_old.items()
+                        if path not in entries_new and os.path.exists(path)}
+        entries_all = {**entries_kept, **entries_new}
+        # load_tool_cached returns the identical entry object on a cache hit.
+        changed = entries_all.keys() != entries_old.keys() or \
+            any(entry is not entries_old.get(path) for path, entry in entries_new.items())
+        if changed:
+            save_tools_cache(cache_path, entries_all)
     return tools_cwl
 
 
@@ -381,6 +497,29 @@ def get_workflow_paths(config: Json, extension: str) -> Dict[str, Dict[str, Path
     return yml_paths_all
 
 
+def get_search_paths_fingerprint(config: Json) -> str:
+    """Computes a cheap fingerprint of all of the CWL and wic files in search_paths_cwl and search_paths_wic.\n
+    This only uses the file metadata (path, mtime, size), so it does not read any file contents.
+
+    Args:
+        config (Json): The user specified (or default generated) config json object
+
+    Returns:
+        str: A hash which changes whenever a plugin or workflow file is added, removed, or modified.
+    """
+    stats = []
+    for tag, extension in [('search_paths_cwl', 'cwl'), ('search_paths_wic', 'wic')]:
+        for plugin_ns, dirs in config.get(tag, {}).items():
+            for dir_ in dirs:
+                for path_str in glob.glob(str(Path(dir_) / f'**/*.{extension}'), recursive=True):
+                    try:
+                        stat = os.stat(path_str)
+                    except OSError:
+                        continue  # Deleted in the meantime; the next fingerprint will reflect that.
+                    stats.append(f'{plugin_ns}:{path_str}:{stat.st_mtime_ns}:{stat.st_size}')
+    return hashlib.sha256('\n'.join(sorted(stats)).encode('utf-8')).hexdigest()
+
+
 def get_yml_paths(config: Json) -> Dict[str, Dict[str, Path]]:
     return get_workflow_paths(config, 'wic')
 
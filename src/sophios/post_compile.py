@@ -1,10 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import os
 import sys
 import copy
-import shutil
 import subprocess as sub
-from . import plugins
-from .wic_types import RoseTree, NodeData, Yaml
+from typing import Any, List, Optional, Tuple
+from . import plugins, utils
+from .wic_types import Cwl, RoseTree, NodeData, Yaml
 
 
 def verify_container_engine_config(container_engine: str, ignore_container_install: bool) -> None:
@@ -109,19 +111,31 @@ def cwl_inline_runtag(rose_tree: RoseTree) -> RoseTree:
     Returns:
         RoseTree: The updated rose_tree with inline cwl in runtag
     """
-    rose_tree_mod = copy.deepcopy(rose_tree)
-    node_data: NodeData = rose_tree_mod.data
-    cwl_tree = node_data.compiled_cwl
+    # NOTE: Only the compiled CWL of the root node is updated, so instead of
+    # deep copying the entire rose_tree (at every level of the recursion!)
+    # copy each compiled_cwl exactly once and share everything else.
+    node_data: NodeData = rose_tree.data
+    return RoseTree(node_data._replace(compiled_cwl=inline_runtag_cwl(rose_tree)), rose_tree.sub_trees)
+
+
+def inline_runtag_cwl(rose_tree: RoseTree) -> Cwl:
+    """Returns a copy of the compiled CWL of the root of rose_tree with all descendants inlined in the runtag
+    Args:
+        rose_tree (RoseTree): The data associated with compiled subworkflows
+    Returns:
+        Cwl: A copy of the compiled CWL with inline cwl in runtag
+    """
+    node_data: NodeData = rose_tree.data
+    cwl_tree = copy.deepcopy(node_data.compiled_cwl)
 
     if cwl_tree.get('class', '') == 'Workflow':
-        for sub_rose_tree in rose_tree_mod.sub_trees:
+        for sub_rose_tree in rose_tree.sub_trees:
             # Inline descendants before embedding this child into the parent run tag.
-            sub_rose_tree = cwl_inline_runtag(sub_rose_tree)
             sub_node_data: NodeData = sub_rose_tree.data
             sub_step_name = sub_node_data.namespaces[-1]
             step_to_update = next(
                 item for item in cwl_tree['steps'] if item.get('id') == sub_step_name)
-            step_to_update['run'] = sub_node_data.compiled_cwl
+            step_to_update['run'] = inline_runtag_cwl(sub_rose_tree)
             # merge the steps/clt namespaces to global namespaces
             # as the run tag can't have namespaces and schemas
             cwl_tree['$namespaces'] = cwl_tree.get('$namespaces', {}) | step_to_update['run'].get(
@@ -129,7 +143,7 @@ def cwl_inline_runtag(rose_tree: RoseTree) -> RoseTree:
             # and then get rid of $namespaces and $schemas in the run tag
             step_to_update['run'].pop('$namespaces', None)
             step_to_update['run'].pop('$schemas', None)
-    return rose_tree_mod
+    return cwl_tree
 
 
 def remove_entrypoints(container_engine: str, rose_tree: RoseTree) -> RoseTree:
@@ -146,8 +160,10 @@ def stage_input_files(yml_inputs: Yaml,
                       root_yml_dir_abs: Path,
                       basepath: str,
                       use_subdirs_cwl: bool = True,
-                      throw: bool = True) -> None:
-    """Copies the input files in yml_inputs to the working directory.
+                      throw: bool = True,
+                      strategy: str = 'copy',
+                      max_workers: Optional[int] = None) -> None:
+    """Copies (or links) the input files and directories in yml_inputs to the working directory.
 
     Args:
         yml_inputs (Yaml): The yml inputs file for the root workflow.
@@ -156,23 +172,76 @@ def stage_input_files(yml_inputs: Yaml,
         use_subdirs_cwl (bool): Controls whether to use subdirectories or
         just one directory when writing the compiled CWL files to disk
         throw (bool): Controls whether to raise/throw a FileNotFoundError.
+        strategy (str): One of utils.FILE_STRATEGIES. Falls back to copying if linking fails.
+        max_workers (Optional[int]): The maximum number of threads used to stage the files.
 
     Raises:
         FileNotFoundError: If throw and any of the input files do not exist.
     """
-
+    if strategy not in utils.FILE_STRATEGIES:
+        raise ValueError(f'Unknown input files strategy {strategy}. Choose from {utils.FILE_STRATEGIES}')
+    relroot = Path(basepath) if use_subdirs_cwl else Path(".")
+    sources_dests: List[Tuple[Path, Path]] = []
     for val in yml_inputs.values():
-        match val:
-            case {"class": "File", "location": location, **_rest_val}:
-                src_path = root_yml_dir_abs / Path(location)
-                if not src_path.exists() and throw:
+        sources_dests += get_input_files_sources_dests(val, root_yml_dir_abs, relroot, throw)
+
+    for dst_dir in set(dst_path.parent for _, dst_path in sources_dests):
+        dst_dir.mkdir(parents=True, exist_ok=True)
+    # NOTE: Staging is I/O bound, so use threads (i.e. for large files and/or many small files).
+    with ThreadPoolExecutor(max_workers) as executor:
+        list(executor.map(lambda src_dst: stage_input_file(src_dst[0], src_dst[1], strategy), sources_dests))
+
+
+def get_input_files_sources_dests(val: Any, root_yml_dir_abs: Path, relroot: Path,
+                                  throw: bool) -> List[Tuple[Path, Path]]:
+    """Recursively finds the input Files and Directories (and their contents) in an input value, including arrays.
+
+    Args:
+        val (Any): An input value from the yml inputs file
+        root_yml_dir_abs (Path): The absolute path of the root workflow yml file.
+        relroot (Path): The directory to stage the inputs into
+        throw (bool): Controls whether to raise/throw a FileNotFoundError.
+
+    Returns:
+        List[Tuple[Path, Path]]: The source and destination paths
+    """
+    match val:
+        case {"class": "File" | "Directory" as class_, "location": location, **_rest_val}:
+            src_path = root_yml_dir_abs / Path(location)
+            if not src_path.exists():
+                if throw:
                     print(f"Error! {src_path} does not exist!")
                     sys.exit(1)
+                return []
+            dst_path = relroot / Path(location)
+            if class_ == 'File':
+                return [(src_path, dst_path)]
+            return [(src_path, dst_path)] + [(src, dst_path / src.relative_to(src_path))
+                                             for src in sorted(src_path.rglob('*'))]
+        case list():
+            return [src_dst for v in val
+                    for src_dst in get_input_files_sources_dests(v, root_yml_dir_abs, relroot, throw)]
+    return []
+
 
-                relroot = Path(basepath) if use_subdirs_cwl else Path(".")
-                dst_path = relroot / Path(location)
-                dst_path.parent.mkdir(parents=True, exist_ok=True)
+def stage_input_file(src_path: Path, dst_path: Path, strategy: str) -> None:
+    """Copies (or links) a single input file, unless it is already up to date.
 
-                # Avoid unnecessary copy
-                if src_path.resolve() != dst_path.resolve():
-                    shutil.copy2(src_path, dst_path)
+    Args:
+        src_path (Path): The input file (or directory)
+        dst_path (Path): The destination path
+        strategy (str): One of utils.FILE_STRATEGIES
+    """
+    if src_path.is_dir():
+        dst_path.mkdir(parents=True, exist_ok=True)
+        return
+    if dst_path.exists():
+        # Avoid unnecessary copy (i.e. the same file, or a link to it)
+        if os.path.samefile(src_path, dst_path):
+            return
+        # Copies preserve the mtime, so this is (almost certainly) a previously staged copy.
+        src_stat = src_path.stat()
+        dst_stat = dst_path.stat()
+        if src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+            return
+    utils.place_file(src_path, dst_path, strategy, preserve_metadata=True)
@@ -1,19 +1,32 @@
+import ast
+import copy
+from functools import lru_cache
+import hashlib
 import importlib
 import importlib.util
 from pathlib import Path
 import sys
 from types import ModuleType
-from typing import Any
+from typing import Any, NamedTuple, Optional
+
+from . import __version__
 
 DRIVER_SCRIPT = '/python_cwl_driver.py'
 TYPES_SCRIPT = '/workflow_types.py'
 
 TYPES_SCRIPT_REL = '../sophios/examples/scripts/workflow_types.py'
 
+# Bump this whenever generate_CWL_CommandLineTool changes
+# (i.e. so that previously generated CommandLineTools are not reused).
+GENERATED_CWL_VERSION = 1
+# The inputs of the generated CommandLineTools which are not arguments of the python script.
+GENERATED_INPUTS = ['driver_script', 'workflow_types', 'script']
+
 # NOTE: VERY IMPORTANT: Since we have to programmatically import the python file in the compiler,
 # and since the act of importing it executes the entire file (i.e. including import statements),
 
 # USERS SHOULD NOT USE TOP-LEVEL IMPORT STATEMENTS!
+# (Unless the inputs, outputs, and main() can be read statically; see static_script_interface)
 
 # See the following links for a more detailed explanation
 # https://stackoverflow.com/questions/2724260/why-does-pythons-import-require-fromlist
@@ -86,14 +99,24 @@ def check_args_match_inputs(module_: ModuleType, args: dict[str, Any], check: bo
         module_ (ModuleType): A ModuleType object returned from import_python_file
         args (Dict[str, Any]): A dictionary of keys value pairs
     """
+    check_args_match_module_inputs(module_.inputs, args, check)
+
+
+def check_args_match_module_inputs(module_inputs: dict[str, Any], args: dict[str, Any], check: bool = False) -> None:
+    """Checks that the keys (only) of the args dict match the keys of the given module inputs.
+
+    Args:
+        module_inputs (Dict[str, Any]): The top-level inputs attribute of the python module.
+        args (Dict[str, Any]): A dictionary of keys value pairs
+    """
     error = False
     for arg in args:
-        if arg not in module_.inputs:
-            print(f'Error! wic argument {arg} not in python arguments {module_.inputs}')
+        if arg not in module_inputs:
+            print(f'Error! wic argument {arg} not in python arguments {module_inputs}')
             error = True
     # Wait until after inference
     if check:
-        for arg in module_.inputs:
+        for arg in module_inputs:
             if arg not in args:
                 print(f'Error! Python argument {arg} not in wic arguments {args}')
                 error = True
@@ -101,6 +124,26 @@ def check_args_match_inputs(module_: ModuleType, args: dict[str, Any], check: bo
         sys.exit(1)
 
 
+def python_script_digest(python_script_path: Path, python_script_docker_pull: str = '') -> str:
+    """Returns a content hash of everything which determines the CWL CommandLineTool generated for a python script,
+    i.e. the script itself, workflow_types.py, the dockerPull tag, and the version of the generator.
+
+    Args:
+        python_script_path (Path): The path to the given python script.
+        python_script_docker_pull (str): The username/image to use with docker pull ...
+
+    Returns:
+        str: The sha256 hex digest
+    """
+    types_path = Path(TYPES_SCRIPT_REL)
+    types_contents = types_path.read_bytes() if types_path.exists() else b''
+    digest = hashlib.sha256(f'{GENERATED_CWL_VERSION} {__version__} {python_script_docker_pull}'.encode('utf-8'))
+    # NOTE: Hash the individual files so that their boundaries are unambiguous.
+    digest.update(hashlib.sha256(types_contents).digest())
+    digest.update(hashlib.sha256(python_script_path.read_bytes()).digest())
+    return digest.hexdigest()
+
+
 def generate_CWL_CommandLineTool(module_inputs: dict[str, Any], module_outputs: dict[str, Any],
                                  python_script_docker_pull: str = '') -> dict[str, Any]:
     """Generates a CWL CommandLineTool for an arbitrary (annotated) python script.
@@ -170,3 +213,198 @@ def get_module(python_script_mod: str, python_script_path: Path, yml_args: dict[
 
     check_args_match_inputs(module_, yml_args)
     return module_
+
+
+class ScriptInterface(NamedTuple):
+    """The top-level annotations of a python script, i.e. everything needed to generate its CWL."""
+    inputs: dict[str, Any]
+    outputs: dict[str, Any]
+    main_args: dict[str, Any]  # The annotated arguments of main(), as per get_main_args
+
+
+class NotStatic(Exception):
+    """Raised when a value cannot be determined without executing the python script."""
+
+
+def static_eval(node: ast.expr, env: dict[str, Any]) -> Any:
+    """Evaluates a literal expression, which may also refer to the (literal) top-level variables in env.
+
+    Args:
+        node (ast.expr): The expression
+        env (Dict[str, Any]): The statically known top-level variables
+
+    Raises:
+        NotStatic: If the expression cannot be evaluated without executing the script.
+
+    Returns:
+        Any: The value of the expression
+    """
+    match node:
+        case ast.Constant(value=value):
+            return value
+        case ast.Name(id=name) if name in env:
+            return copy.deepcopy(env[name])
+        case ast.Dict(keys=keys, values=values):
+            result: dict[Any, Any] = {}
+            for key, val in zip(keys, values):
+                if key is None:  # i.e. {**val}
+                    unpacked = static_eval(val, env)
+                    if not isinstance(unpacked, dict):
+                        raise NotStatic(ast.unparse(val))
+                    result.update(unpacked)
+                else:
+                    result[static_eval(key, env)] = static_eval(val, env)
+            return result
+        case ast.List(elts=elts):
+            return [static_eval(elt, env) for elt in elts]
+        case ast.Tuple(elts=elts):
+            return tuple(static_eval(elt, env) for elt in elts)
+        case ast.UnaryOp(op=ast.USub(), operand=ast.Constant(value=int() | float() as value)):
+            return -value
+        case _:
+            raise NotStatic(ast.unparse(node))
+
+
+def module_bindings(tree: ast.Module) -> tuple[dict[str, int], set[str]]:
+    """Finds the names which are bound at the top-level of a python module, and the names which may be mutated.
+
+    Args:
+        tree (ast.Module): The parsed python module
+
+    Raises:
+        NotStatic: If the module uses dynamic features (i.e. exec) which make it impossible to tell.
+
+    Returns:
+        Tuple[Dict[str, int], Set[str]]: The number of top-level bindings of each name, and the mutated names.
+    """
+    bindings: dict[str, int] = {}
+    mutated: set[str] = set()
+
+    def bind(name: str) -> None:
+        bindings[name] = bindings.get(name, 0) + 1
+
+    def visit(node: ast.AST, top_level: bool) -> None:
+        match node:
+            case ast.FunctionDef(name=name) | ast.AsyncFunctionDef(name=name) | ast.ClassDef(name=name):
+                if top_level:
+                    bind(name)
+                top_level = False  # i.e. local variables
+            case ast.Import(names=names) | ast.ImportFrom(names=names) if top_level:
+                for alias in names:
+                    bind((alias.asname or alias.name).split('.')[0])
+            case ast.Name(id=name, ctx=ast.Store() | ast.Del()) if top_level:
+                bind(name)
+            case ast.Global(names=names):
+                mutated.update(names)
+            # NOTE: Conservatively assume that any method call or attribute access may mutate the object.
+            case ast.Attribute(value=ast.Name(id=name)) | \
+                    ast.Subscript(value=ast.Name(id=name), ctx=ast.Store() | ast.Del()):
+                mutated.add(name)
+            case ast.Call(func=ast.Name(id='exec' | 'eval' | 'globals' | 'vars' | 'setattr' | '__import__')):
+                raise NotStatic(ast.unparse(node))
+        for child in ast.iter_child_nodes(node):
+            visit(child, top_level)
+
+    visit(tree, True)
+    return bindings, mutated
+
+
+@lru_cache(maxsize=16)
+def static_module_env(source: str, types_source: str = '') -> tuple[dict[str, Any], dict[str, ast.FunctionDef]]:
+    """Determines the values of the literal top-level variables of a python module, without executing it.
+
+    Only variables which are bound exactly once (by an assignment of a literal, or by importing
+    a literal variable from workflow_types.py) and which are never mutated are included.
+
+    Args:
+        source (str): The source code of the python module
+        types_source (str): The source code of workflow_types.py
+
+    Raises:
+        NotStatic: If the module uses dynamic features (i.e. exec) which make it impossible to tell.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, ast.FunctionDef]]: The literal variables and the top-level functions.
+    """
+    types_env = static_module_env(types_source)[0] if types_source else {}
+    tree = ast.parse(source)
+    bindings, mutated = module_bindings(tree)
+    if 'workflow_types' in mutated:
+        types_env = {}
+
+    def is_static(name: str) -> bool:
+        return bindings.get(name) == 1 and name not in mutated
+
+    env: dict[str, Any] = {}
+    functions: dict[str, ast.FunctionDef] = {}
+    for stmt in tree.body:
+        match stmt:
+            case ast.ImportFrom(module='workflow_types', names=names, level=0):
+                for alias in names:
+                    if alias.name == '*':
+                        # i.e. the names are not bound in this module at all
+                        env.update({name: val for name, val in types_env.items()
+                                    if name not in bindings and name not in mutated})
+                    elif alias.name in types_env and is_static(alias.asname or alias.name):
+                        env[alias.asname or alias.name] = types_env[alias.name]
+            case ast.Assign(targets=[ast.Name(id=name)], value=value) if is_static(name):
+                try:
+                    env[name] = static_eval(value, env)
+                except NotStatic:
+                    pass
+            case ast.FunctionDef(name=name) if is_static(name):
+                functions[name] = stmt
+    return env, functions
+
+
+def static_script_interface(python_script_path: Path) -> Optional[ScriptInterface]:
+    """Reads the top-level annotations of a python script straight from its source, without executing it.
+
+    Args:
+        python_script_path (Path): The path to the given python script.
+
+    Returns:
+        Optional[ScriptInterface]: The annotations, or None if they cannot be determined without executing the script.
+    """
+    types_path = Path(TYPES_SCRIPT_REL)
+    try:
+        types_source = types_path.read_text(encoding='utf-8') if types_path.exists() else ''
+        env, functions = static_module_env(python_script_path.read_text(encoding='utf-8'), types_source)
+    except (NotStatic, SyntaxError, OSError, UnicodeDecodeError):
+        return None
+
+    main = functions.get('main')
+    inputs, outputs = env.get('inputs'), env.get('outputs')
+    if main is None or main.decorator_list or not isinstance(inputs, dict) or not isinstance(outputs, dict):
+        return None
+    main_args = {arg.arg: ast.unparse(arg.annotation)
+                 for arg in [*main.args.posonlyargs, *main.args.args, main.args.vararg,
+                             *main.args.kwonlyargs, main.args.kwarg]
+                 if arg is not None and arg.annotation is not None}
+    # NOTE: Return copies, since static_module_env is cached.
+    return ScriptInterface(copy.deepcopy(inputs), copy.deepcopy(outputs), main_args)
+
+
+def get_script_interface(python_script_mod: str, python_script_path: Path, yml_args: dict[str, Any],
+                         static: bool = True) -> ScriptInterface:
+    """Determines and validates the top-level annotations of the given python script.\n
+    If possible, the annotations are read statically, i.e. without importing the script and all of its
+    dependencies (and without adding it to sys.modules). Otherwise, this falls back to get_module.
+
+    Args:
+        python_script_mod (str): The module name of the given python script.
+        python_script_path (Path): The path to the given python script.
+        yml_args (Dict[str, Any]): The contents of the python_script in: yml tag.
+        static (bool): Try to read the annotations statically. Defaults to True.
+
+    Returns:
+        ScriptInterface: The top-level annotations of the given python script.
+    """
+    interface = static_script_interface(python_script_path) if static else None
+    if interface is None:
+        module_ = get_module(python_script_mod, python_script_path, yml_args)
+        return ScriptInterface(module_.inputs, module_.outputs, get_main_args(module_))
+
+    check_args_match_module_inputs(interface.inputs, interface.main_args)
+    check_args_match_module_inputs(interface.inputs, yml_args)
+    return interface
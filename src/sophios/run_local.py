@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 import glob
 import json
 import subprocess as sub
@@ -11,9 +12,9 @@ import shutil
 import traceback
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Iterator, List, Optional, Dict
+from typing import Iterator, List, Optional, Dict, Set, Tuple
 from sophios.wic_types import Json
-from .compute_request import ComputeRequest
+from .compute_request import ComputeRequest, RetryPolicy, submit_batch
 
 try:
     import cwltool.main
@@ -252,7 +253,8 @@ def run_local(run_args_dict: Dict[str, str], use_subprocess: bool,
                     print(
                         f'Final output json metadata blob is in output_{workflow_name}.json')
                     if run_args_dict.get('copy_output_files', 'no') == 'yes':
-                        copy_output_files(workflow_name)
+                        copy_output_files(workflow_name,
+                                          strategy=run_args_dict.get('output_files_strategy', 'copy'))
                 elif cwl_runner == 'toil-cwl-runner':
                     print('via toil.cwl.cwltoil.main python API')
                     retval = toil.cwl.cwltoil.main(cmd[1:])
@@ -322,14 +324,52 @@ def run_compute(workflow_name: str, workflow: Json, workflow_inputs: Json,
     return submission.exit_code
 
 
-def copy_output_files(yaml_stem: str, basepath: str = '') -> None:
+def run_compute_batch(workflow_name: str, workflow: Json, job_inputs: List[Json], submit_url: str,
+                      max_concurrency: int = 16, retries: int = 3) -> int:
+    """Submit one compiled workflow to compute-slurm once per set of job inputs (i.e. a parameter sweep).
+
+    Args:
+        workflow_name (str): The name of the workflow.
+        workflow (Json): The compiled CWL workflow.
+        job_inputs (List[Json]): The inputs for each job.
+        submit_url (str): URL of Compute where the jobs are to be submitted.
+        max_concurrency (int): The maximum number of concurrent HTTP requests to Compute.
+        retries (int): The number of times to retry transient HTTP failures.
+    Returns:
+        int: The return value indicating if all of the submissions succeeded (`0`) or not.
+    """
+    # sanity check if the string has the form of an URL
+    if not utils.is_valid_url(submit_url):
+        print("Ill-formed URL string detected! Please provide a valid URL")
+        return 1
+
+    now = datetime.now()
+    date_time = now.strftime("%Y_%m_%d_%H.%M.%S")
+    compute_requests = [ComputeRequest(_CompiledWorkflowForCompute(workflow_name, workflow, inputs),
+                                       workflow_id=f'{workflow_name}__{date_time}__{i}')
+                        for i, inputs in enumerate(job_inputs)]
+    report = submit_batch(compute_requests, submit_url, max_concurrency=max_concurrency,
+                          retry=RetryPolicy(max_attempts=retries + 1), log_dir='.')
+    print(report.summary())
+    for workflow_id in report.failed + report.timed_out:
+        print('Failed to start', workflow_id)
+    return report.exit_code
+
+
+def copy_output_files(yaml_stem: str, basepath: str = '', strategy: str = 'copy',
+                      max_workers: Optional[int] = None) -> None:
     """Copies output files from the cachedir to outdir/
 
     Args:
         yaml_stem (str): The --yaml filename (without .extension)
+        basepath (str): The directory which contains provenance/ (and outdir/)
+        strategy (str): One of utils.FILE_STRATEGIES. The link strategies fallback to copying when necessary.
+        max_workers (Optional[int]): The maximum number of threads used to copy the files.
     """
-    output_json_file_prov = Path(
-        f'provenance/{yaml_stem}/workflow/primary-output.json')
+    if strategy not in utils.FILE_STRATEGIES:
+        raise ValueError(f'Unknown output files strategy {strategy}. Choose from {utils.FILE_STRATEGIES}')
+    provenance_path = Path(basepath) / 'provenance' / yaml_stem / 'workflow'
+    output_json_file_prov = provenance_path / 'primary-output.json'
     # NOTE: The contents of --write-summary is
     # slightly different than provenance/{yaml_stem}/workflow/primary-output.json!
     # They are NOT the same file!
@@ -338,39 +378,65 @@ def copy_output_files(yaml_stem: str, basepath: str = '') -> None:
             output_json = json.loads(f.read())
         files = utils.parse_provenance_output_files(output_json)
 
-        dests = set()
-        for location, namespaced_output_name, basename in files:
-            try:
-                yaml_stem_init, shortened = utils.shorten_namespaced_output_name(
-                    namespaced_output_name)
-                parentdirs = yaml_stem_init + '/' + \
-                    shortened.replace('___', '/')
-            except:
-                parentdirs = namespaced_output_name  # For --allow_raw_cwl
-            Path('outdir/' + parentdirs).mkdir(parents=True, exist_ok=True)
-            source = f'provenance/{yaml_stem}/workflow/' + location
-            # NOTE: Even though we are using subdirectories (not just a single output directory),
-            # there is still the possibility of filename collisions, i.e. when scattering.
-            # For now, let's use a similar trick as cwltool of append _2, _3 etc.
-            # except do it BEFORE the extension.
-            # This could still cause problems with slicing, i.e. if you scatter across
-            # indices 11-20 first, then 1-10 second, the output file indices will get switched.
-            dest = ''
-            if basepath:
-                dest = basepath + '/' + 'outdir/' + parentdirs + '/' + basename
-            else:
-                dest = 'outdir/' + parentdirs + '/' + basename
-            if dest in dests:
-                idx = 2
-                while Path(dest).exists():
-                    stem = Path(basename).stem
-                    suffix = Path(basename).suffix
-                    dest = 'outdir/' + parentdirs + \
-                        '/' + stem + f'_{idx}' + suffix
-                    idx += 1
-            dests.add(dest)
-            cmd = ['cp', source, dest]
-            sub.run(cmd, check=True)
+        sources_dests = get_output_files_dests(files, provenance_path, Path(basepath) / 'outdir')
+        for directory in set(dest.parent for _, dest in sources_dests):
+            directory.mkdir(parents=True, exist_ok=True)
+        # Copying is I/O bound, so use threads instead of spawning a separate cp process for every file.
+        with ThreadPoolExecutor(max_workers) as executor:
+            list(executor.map(lambda source_dest: utils.place_file(source_dest[0], source_dest[1], strategy),
+                              sources_dests))
+
+
+def get_output_files_dests(files: List[Tuple[str, str, str]], provenance_path: Path,
+                           outdir: Path) -> List[Tuple[Path, Path]]:
+    """Determines the destination of each output file, without any filename collisions.
+
+    Args:
+        files (List[Tuple[str, str, str]]): The (location, parentdirs, basename) of each output file.
+        provenance_path (Path): The directory w.r.t. which the locations are relative
+        outdir (Path): The output directory
+
+    Returns:
+        List[Tuple[Path, Path]]: The (source, destination) of each output file.
+    """
+    sources_dests = []
+    dests: Set[Path] = set()
+    # The names of the files in each directory (before we copy anything), and the next index to try for each name.
+    # This avoids probing the file system in a loop, which is quadratic in the number of collisions.
+    names_existing: Dict[Path, Set[str]] = {}
+    indices: Dict[Path, int] = {}
+    for location, namespaced_output_name, basename in files:
+        try:
+            yaml_stem_init, shortened = utils.shorten_namespaced_output_name(
+                namespaced_output_name)
+            parentdirs = yaml_stem_init + '/' + \
+                shortened.replace('___', '/')
+        except:
+            parentdirs = namespaced_output_name  # For --allow_raw_cwl
+        source = provenance_path / location
+        # NOTE: Even though we are using subdirectories (not just a single output directory),
+        # there is still the possibility of filename collisions, i.e. when scattering.
+        # For now, let's use a similar trick as cwltool of append _2, _3 etc.
+        # except do it BEFORE the extension.
+        # This could still cause problems with slicing, i.e. if you scatter across
+        # indices 11-20 first, then 1-10 second, the output file indices will get switched.
+        dest = outdir / parentdirs / basename
+        if dest in dests:
+            directory = dest.parent
+            if directory not in names_existing:
+                names_existing[directory] = set(os.listdir(directory)) if directory.is_dir() else set()
+            stem = Path(basename).stem
+            suffix = Path(basename).suffix
+            idx = indices.get(dest, 2)
+            dest_idx = directory / (stem + f'_{idx}' + suffix)
+            while dest_idx.name in names_existing[directory] or dest_idx in dests:
+                idx += 1
+                dest_idx = directory / (stem + f'_{idx}' + suffix)
+            indices[dest] = idx + 1
+            dest = dest_idx
+        dests.add(dest)
+        sources_dests.append((source, dest))
+    return sources_dests
 
 
 def cwltool_main() -> int:
@@ -7,9 +7,8 @@ from collections.abc import Mapping, Sequence
 from typing import Any
 
 import aiofiles
-import yaml
 
-from sophios.input_output import NoAliasDumper
+from sophios.input_output import dump_yaml
 from sophios.runtime_inputs import normalize_cwl_document, normalize_job_inputs
 from sophios.wic_types import Json
 
@@ -72,7 +71,8 @@ async def run_cwl_workflow(
         if retval != 0:
             await _print_stderr_tail(workflow_name, retval, stdout_log_path, stderr_log_path)
         elif cwl_runner == "cwltool" and run_args.get("copy_output_files", "no") == "yes":
-            await asyncio.to_thread(copy_output_files, workflow_name, basepath=basepath)
+            await asyncio.to_thread(copy_output_files, workflow_name, basepath=basepath,
+                                    strategy=run_args.get("output_files_strategy", "copy"))
         return retval
 
     except Exception as exc:  # pylint: disable=broad-exception-caught
@@ -135,13 +135,7 @@ async def _stream_to_file(stream: Any, filename: Path) -> None:
 
 
 async def _write_yaml(path: Path, document: Json, *, shebang: bool = False) -> None:
-    yaml_content = yaml.dump(
-        document,
-        sort_keys=False,
-        line_break="\n",
-        indent=2,
-        Dumper=NoAliasDumper,
-    )
+    yaml_content = dump_yaml(document)
     async with aiofiles.open(path, mode="w", encoding="utf-8") as file:
         if shebang:
             await file.write("#!/usr/bin/env cwl-runner\n")
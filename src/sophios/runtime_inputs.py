@@ -100,7 +100,8 @@ def _normalize_workflow(
                     case Mapping() as run:
                         target_inputs = _output_target_inputs(run)
                         if target_inputs:
-                            step_dict["run"] = _normalize_command_line_tool(copy.deepcopy(dict(run)), target_inputs)
+                            # NOTE: cwl_workflow (and thus run) is already a private copy.
+                            step_dict["run"] = _normalize_command_line_tool(dict(run), target_inputs)
                     case _:
                         target_inputs = _output_target_inputs(run_by_step_id.get(str(step_dict.get("id", "")), {}))
                 for source_key in _target_source_keys_for_step(step_dict, target_inputs):
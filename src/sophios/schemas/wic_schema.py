@@ -1,19 +1,24 @@
+import hashlib
 import json
+import os
 from pathlib import Path
 import random
-from typing import Any, Dict, List, Tuple
+import tempfile
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import networkx as nx
 import graphviz
 from jsonschema import Draft202012Validator
 from referencing import Registry, Resource
+from referencing.exceptions import NoSuchResource
 from referencing.jsonschema import DRAFT202012
 import yaml
 
 import sophios
-from sophios import ast, compiler, utils_cwl
+from sophios import ast, compiler, inference, utils, utils_cwl
 from sophios.cli import get_dicts_for_compilation
-from sophios.utils_yaml import wic_loader
+from sophios import utils_yaml
+from sophios.utils_yaml import FastDumper, wic_loader
 from sophios.wic_types import GraphData, GraphReps, NodeData, StepId, Yaml, YamlTree
 from ..wic_types import Json, Tools
 
@@ -24,6 +29,14 @@ if path.exists():
     with open(path, mode='r', encoding='utf-8') as f:
         config_schemas = json.load(f)
 
+# The schemas of the tools, which only need to be regenerated if the tool changes.
+tool_schemas: Dict[StepId, Tuple[Json, Json]] = {}
+# The hashes of the schemas which have already been checked against the meta-schema.
+checked_schemas: Set[str] = set()
+
+SCHEMA_CACHE_VERSION = 2
+SCHEMA_CACHE_PATH = Path('autogenerated/schemas/schema_cache.json')
+
 
 def default_schema(url: bool = False) -> Json:
     """A basic default schema (to avoid copy & paste).
@@ -314,6 +327,39 @@ def cwl_schema(name: str, cwl: Json, id_prefix: str) -> Json:
     return step_props
 
 
+def get_tool_schema(step_id: StepId, cwl: Json) -> Json:
+    """Returns the (cached) schema of the given CWL CommandLineTool. See cwl_schema()
+
+    Args:
+        step_id (StepId): The name of the CWL CommandLineTool
+        cwl (Json): The CWL CommandLineTool
+
+    Returns:
+        Json: An autogenerated, documented schema based on the inputs and outputs of the CWL CommandLineTool.
+    """
+    # NOTE: The tools are never mutated in-place (see get_tools_cwl), so identity suffices.
+    cached = tool_schemas.get(step_id)
+    if cached is not None and cached[0] is cwl:
+        return cached[1]
+    schema = cwl_schema(step_id.stem, cwl, 'tools')
+    tool_schemas[step_id] = (cwl, schema)
+    return schema
+
+
+def check_schema(schema: Json) -> None:
+    """Checks the given schema against the meta-schema, unless it has already been checked.
+
+    Args:
+        schema (Json): The schema to check
+    """
+    schema_str = json.dumps(schema, sort_keys=True)
+    schema_hash = hashlib.sha256(schema_str.encode('utf-8')).hexdigest()
+    if schema_hash in checked_schemas:
+        return
+    Draft202012Validator.check_schema(schema)
+    checked_schemas.add(schema_hash)
+
+
 def wic_tag_schema(hypothesis: bool = False) -> Json:
     """The schema of the (recursive) wic: metadata annotation tag.
 
@@ -404,7 +450,8 @@ def wic_tag_schema(hypothesis: bool = False) -> Json:
     return schema
 
 
-def wic_main_schema(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[str, Json], hypothesis: bool = False) -> Json:
+def wic_main_schema(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[str, Json], hypothesis: bool = False,
+                    lazy: bool = False) -> Json:
     """The main schema which is used to validate yml files.
 
     Args:
@@ -412,6 +459,8 @@ def wic_main_schema(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[s
         yml_stems (List[str]): The names of the yml workflow definitions found using get_yml_paths()
         schema_store (Dict[str, Json]): A global mapping between ids and schemas
         hypothesis (bool): Determines whether we should restrict the search space.
+        lazy (bool): Refer to the tool schemas (instead of inlining them) and only\n
+        follow the references for the steps which actually use the tools. See get_validator()
 
     Returns:
         Json: The main schema which is used to validate yml files.
@@ -435,6 +484,16 @@ def wic_main_schema(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[s
          for step_id in tools_cwl if not step_id.stem.startswith('python_script')]
     schemas_tools_list: List[Json] = [{'anyOf': [schema, schema_id]}
                                       for name, schema, schema_null, schema_id in schemas_tools]
+    if lazy:
+        # Only check (and thus resolve the $ref of) the schema of the tool with the matching id.
+        # NOTE: This does not change which yml files are valid, since all of the
+        # steps which do not match any of these schemas match wildcard_schema below.
+        schemas_tools_list = [{'if': {'properties': {'id': {'const': name}}, 'required': ['id']},
+                               'then': {'anyOf': [{'$ref': f'tools/{name}.json'}, schema_id]},
+                               'else': False}
+                              for name, schema, schema_null, schema_id in schemas_tools]
+        schemas_tools = [(name, {'$ref': f'tools/{name}.json'}, schema_null, schema_id)
+                         for name, schema, schema_null, schema_id in schemas_tools]
     schemas_tools_dict: dict[str, Json] = {name: {'anyOf': [schema, {}]}
                                            for name, schema, schema_null, schema_id in schemas_tools}
 #    tools_schemas: List[Json] = [{'anyOf': [{'$ref': f'tools/{step_id.stem}.json'},
@@ -578,7 +637,8 @@ def compile_workflow_generate_schema(homedir: str,
                                      yml_paths: Dict[str, Dict[str, Path]],
                                      validator: Draft202012Validator,
                                      ignore_validation_errors: bool,
-                                     write_intermediate_wic: bool = False) -> Json:
+                                     write_intermediate_wic: bool = False,
+                                     dependencies: Optional[Set[str]] = None) -> Json:
     """Compiles a workflow and generates a schema which (recursively) includes the inputs/outputs from subworkflows.
 
     Args:
@@ -590,6 +650,8 @@ def compile_workflow_generate_schema(homedir: str,
         validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
         ignore_validation_errors (bool): Temporarily ignore validation errors. Do not use this permanently!
         write_intermediate_wic (bool): Write compiler-internal `.wic` trees to `autogenerated/`.
+        dependencies (Optional[Set[str]]): If given, the paths of all of the (yml and cwl) files\n
+        which the schema depends on are added to this set. Defaults to None.
 
     Returns:
         Json: An autogenerated, documented schema based on the inputs and outputs of the Workflow.
@@ -602,15 +664,13 @@ def compile_workflow_generate_schema(homedir: str,
     plugin_ns = wic_tag['wic'].get('namespace', 'global')
     step_id = StepId(yml_path_str, plugin_ns)
     y_t = YamlTree(step_id, root_yaml_tree)
-    yaml_tree_raw = sophios.ast.read_ast_from_disk(homedir, y_t, yml_paths, tools_cwl, validator,
-                                                   ignore_validation_errors)
-    yaml_tree = sophios.ast.merge_yml_trees(yaml_tree_raw, {}, tools_cwl)
     root_yml_dir_abs = Path(yml_path).parent.absolute()
-    yaml_tree = ast.python_script_generate_cwl(yaml_tree, root_yml_dir_abs, tools_cwl)
+    yaml_tree = sophios.ast.read_ast_fused(homedir, y_t, yml_paths, tools_cwl, validator,
+                                           ignore_validation_errors, root_yml_dir_abs)
     if write_intermediate_wic:
         Path('autogenerated/').mkdir(parents=True, exist_ok=True)
         with open(f'autogenerated/{Path(yml_path).stem}_tree_python_script.wic', mode='w', encoding='utf-8') as f:
-            f.write(yaml.dump(yaml_tree.yml))
+            f.write(utils_yaml.dump(yaml_tree.yml, yaml.Dumper, FastDumper))
 
     graph_gv = graphviz.Digraph(name=f'cluster_{yml_path}')
     graph_gv.attr(newrank='True')
@@ -627,16 +687,226 @@ def compile_workflow_generate_schema(homedir: str,
     # wic.io.write_to_disk(rose_tree, Path('autogenerated/'), relative_run_path=True)
     schema = cwl_schema(step_id.stem, sub_node_data.compiled_cwl, 'workflows')
 
+    if dependencies is not None:
+        dependencies.add(str(yml_path))
+        for node_data in utils.flatten_rose_tree(rose_tree):
+            if node_data.compiled_cwl.get('class', '') == 'Workflow':
+                # NOTE: Conservatively include the subworkflows in all namespaces.
+                dependencies.update(str(paths[node_data.name]) for paths in yml_paths.values()
+                                    if node_data.name in paths)
+            else:
+                dependencies.add(str(node_data.tool.run_path))
+
     # with open(f'autogenerated/schemas/workflows/{step_id.stem}.json', mode='w', encoding='utf-8') as f:
     #    f.write(json.dumps(schema, indent=2))
 
     return schema
 
 
+def file_digest(path: str) -> str:
+    """Returns the sha256 of the contents of the given file, or the empty string if it does not exist.
+
+    Args:
+        path (str): The path of the file
+
+    Returns:
+        str: The sha256 of the contents of the file
+    """
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return ''
+
+
+def file_key(path: str) -> Json:
+    """Returns the (mtime_ns, size) stat key and the sha256 of the given file, or {} if it does not exist.
+
+    Args:
+        path (str): The path of the file
+
+    Returns:
+        Json: The key of the file, i.e. a dependency of a cached schema
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return {}
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': file_digest(path)}
+
+
+def is_dependency_fresh(dep_path: str, dep_key: Json, digests: Dict[str, str]) -> bool:
+    """Checks whether the given file is unchanged, only reading its contents if its stat key changed.
+
+    Args:
+        dep_path (str): The path of the file
+        dep_key (Json): The key of the file when the schema was generated. See file_key()
+        digests (Dict[str, str]): The digests of the files which have already been read (mutably updated)
+
+    Returns:
+        bool: True if the file is unchanged
+    """
+    try:
+        stat = os.stat(dep_path)
+    except OSError:
+        return False
+    if stat.st_mtime_ns == dep_key.get('mtime_ns') and stat.st_size == dep_key.get('size'):
+        return True
+    # Same size but newer (i.e. touched or checked out again), so fall back to comparing the contents.
+    if stat.st_size != dep_key.get('size'):
+        return False
+    if dep_path not in digests:
+        digests[dep_path] = file_digest(dep_path)
+    return digests[dep_path] == dep_key.get('sha256')
+
+
+def schema_cache_key() -> str:
+    """Returns the key of everything other than the yml and cwl files which the workflow schemas depend on.
+
+    Returns:
+        str: The key of the compiler version and global configuration
+    """
+    key = [SCHEMA_CACHE_VERSION, sophios.__version__, compiler.inference_rules, inference.renaming_conventions]
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def load_schema_cache(cache_path: Path = SCHEMA_CACHE_PATH) -> Json:
+    """Loads the on-disk workflow schema cache, discarding it if it is unreadable or stale.
+
+    Args:
+        cache_path (Path): The path of the workflow schema cache
+
+    Returns:
+        Json: The cache entries, keyed by schema id
+    """
+    if not cache_path.exists():
+        return {}
+    try:
+        with open(cache_path, mode='r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except Exception:
+        # A partially written or otherwise corrupt cache is not an error; just rebuild it.
+        return {}
+    if not isinstance(cache, dict) or cache.get('key') != schema_cache_key():
+        return {}
+    entries: Json = cache.get('entries', {})
+    return entries
+
+
+def save_schema_cache(cache_path: Path, entries: Json) -> None:
+    """Atomically writes the workflow schema cache to disk.
+
+    Args:
+        cache_path (Path): The path of the workflow schema cache
+        entries (Json): The cache entries, keyed by schema id
+    """
+    cache = {'key': schema_cache_key(), 'entries': entries}
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, prefix=cache_path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode='w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        Path(tmp_path).unlink(missing_ok=True)
+
+
+def get_cached_schema(entries: Json, yml_path_str: str, yml_path: Path, digests: Dict[str, str]) -> Optional[Json]:
+    """Returns the cached schema of the given workflow, if none of the files it depends on have changed.
+
+    Args:
+        entries (Json): The cache entries, keyed by schema id. See load_schema_cache()
+        yml_path_str (str): The stem of the path to the yml file
+        yml_path (Path): The path to the yml file
+        digests (Dict[str, str]): The digests of the files which have already been read (mutably updated)
+
+    Returns:
+        Optional[Json]: The cached schema, or None if it is missing or stale.
+    """
+    entry = entries.get(f'workflows/{yml_path_str}.json')
+    if entry is None or entry['path'] != str(yml_path):
+        return None
+    for dep_path, dep_key in entry['dependencies'].items():
+        if not is_dependency_fresh(dep_path, dep_key, digests):
+            return None
+    schema: Json = entry['schema']
+    return schema
+
+
+def get_cached_schemas(yml_paths: Dict[str, Dict[str, Path]], cache_path: Path = SCHEMA_CACHE_PATH) -> Dict[str, Json]:
+    """Returns the (up to date!) cached schemas of all of the workflows. See --generate_schemas
+
+    Args:
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        cache_path (Path): The path of the workflow schema cache
+
+    Returns:
+        Dict[str, Json]: A mapping between ids and schemas, i.e. a schema_store.
+    """
+    entries = load_schema_cache(cache_path)
+    digests: Dict[str, str] = {}
+    schema_store: Dict[str, Json] = {}
+    for yml_paths_dict in yml_paths.values():
+        for yml_path_str, yml_path in yml_paths_dict.items():
+            schema = get_cached_schema(entries, yml_path_str, yml_path, digests)
+            if schema is not None:
+                schema_store[schema['$id']] = schema
+    return schema_store
+
+
+def generate_workflow_schemas(homedir: str, tools_cwl: Tools, yml_paths: Dict[str, Dict[str, Path]],
+                              validator: Draft202012Validator, ignore_validation_errors: bool,
+                              write_intermediate_wic: bool = False,
+                              cache_path: Path = SCHEMA_CACHE_PATH) -> Dict[str, Json]:
+    """Generates the schemas of all of the workflows, only recompiling those whose dependencies changed.
+
+    Args:
+        homedir (str): The users home directory
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+        ignore_validation_errors (bool): Temporarily ignore validation errors. Do not use this permanently!
+        write_intermediate_wic (bool): Write compiler-internal `.wic` trees to `autogenerated/`.
+        cache_path (Path): The path of the workflow schema cache
+
+    Returns:
+        Dict[str, Json]: A mapping between ids and schemas, i.e. a schema_store.
+    """
+    entries_old = load_schema_cache(cache_path)
+    entries: Json = {}
+    digests: Dict[str, str] = {}
+    schema_store: Dict[str, Json] = {}
+    for yml_paths_dict in yml_paths.values():
+        for yml_path_str, yml_path in yml_paths_dict.items():
+            schema = get_cached_schema(entries_old, yml_path_str, yml_path, digests)
+            if schema is not None:
+                # Update the stat keys of the files which were touched but not modified,
+                # so that they are not re-read every time.
+                entry = entries_old[schema['$id']]
+                entry['dependencies'] = {dep: {**dep_key, **file_key(dep)} if dep in digests else dep_key
+                                         for dep, dep_key in entry['dependencies'].items()}
+                entries[schema['$id']] = entry
+            else:
+                dependencies: Set[str] = set()
+                schema = compile_workflow_generate_schema(homedir, yml_path_str, yml_path,
+                                                          tools_cwl, yml_paths, validator,
+                                                          ignore_validation_errors,
+                                                          write_intermediate_wic, dependencies)
+                # NOTE: Re-read the files (instead of using digests) in case they changed.
+                entries[schema['$id']] = {'path': str(yml_path), 'schema': schema,
+                                          'dependencies': {dep: file_key(dep) for dep in sorted(dependencies)}}
+            schema_store[schema['$id']] = schema
+    save_schema_cache(cache_path, entries)
+    return schema_store
+
+
 def get_validator(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[str, Json] | None = None,
                   write_to_disk: bool = False, hypothesis: bool = False) -> Draft202012Validator:
     """Generates the main schema used to check the yml files for correctness and returns a validator.
 
+    Unless the schemas are written to disk (i.e. for vscode IntelliSense code
+    completion) or used with hypothesis, the tool schemas are generated lazily,
+    i.e. only for the tools which are actually used in the yml files being validated.
+
     Args:
         tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
         yml_stems (List[str]): The names of the yml workflow definitions found using get_yml_paths()
@@ -648,12 +918,14 @@ def get_validator(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[str
         Draft202012Validator: A validator which is used to check the yml files for correctness.
     """
     schema_store = {} if schema_store is None else schema_store
-    for step_id, tool in tools_cwl.items():
-        schema_tool = cwl_schema(step_id.stem, tool.cwl, 'tools')
-        schema_store[schema_tool['$id']] = schema_tool
-        # if write_to_disk:
-        #    with open(f'autogenerated/schemas/tools/{step_id.stem}.json', mode='w', encoding='utf-8') as f:
-        #        f.write(json.dumps(schema_tool, indent=2))
+    lazy = not write_to_disk and not hypothesis
+    if not lazy:
+        for step_id, tool in tools_cwl.items():
+            schema_tool = get_tool_schema(step_id, tool.cwl)
+            schema_store[schema_tool['$id']] = schema_tool
+            # if write_to_disk:
+            #    with open(f'autogenerated/schemas/tools/{step_id.stem}.json', mode='w', encoding='utf-8') as f:
+            #        f.write(json.dumps(schema_tool, indent=2))
 
     # Add temporary placeholders to the schema_store so we don't get
     # "jsonschema.exceptions.RefResolutionError: unknown url type: 'workflows/*.json'"
@@ -661,25 +933,42 @@ def get_validator(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[str
         if f'workflows/{yml_stem}.json' not in schema_store:
             schema_store[f'workflows/{yml_stem}.json'] = {}
 
-    schema = wic_main_schema(tools_cwl, yml_stems, schema_store, hypothesis)
+    schema = wic_main_schema(tools_cwl, yml_stems, schema_store, hypothesis, lazy)
     schema_store[schema['$id']] = schema
     if write_to_disk:
         with open('autogenerated/schemas/wic.json', mode='w', encoding='utf-8') as f:
             f.write(json.dumps(schema, indent=2))
 
-    # Load cached schema from disk
-    # NOTE: This may or may not be the correct solution. We should double check
-    # all of the call sites of get_validator and the write_to_disk parameters.
-    if Path('autogenerated/schemas/wic.json').exists():
-        with open('autogenerated/schemas/wic.json', mode='r', encoding='utf-8') as r:
-            schema = json.loads(r.read())
+    # NOTE: Do not load autogenerated/schemas/wic.json from disk; it may be stale!
+    # (It is only for vscode.) To validate subworkflows using their up to date
+    # schemas (if any) pass the output of get_cached_schemas() as schema_store.
 
     # See https://stackoverflow.com/questions/53968770/how-to-set-up-local-file-references-in-python-jsonschema-document
     # The $ref tag refers to URIs defined in $id tags, NOT relative paths on
     # the local filesystem! We need to create a global mapping between ids and schemas
     # i.e. schema_store.
+    tools_stems = {step_id.stem: (step_id, tool) for step_id, tool in tools_cwl.items()}
+    resources: Dict[str, Resource] = {}
+
+    def retrieve(uri: str) -> Resource:
+        # Lazily generate the tool schemas, i.e. only when the $ref's are resolved.
+        if uri in resources:
+            return resources[uri]
+        stem = uri.removeprefix('tools/').removesuffix('.json')
+        if uri in schema_store:
+            contents = schema_store[uri]
+        elif uri.startswith('tools/') and stem in tools_stems:
+            step_id, tool = tools_stems[stem]
+            contents = get_tool_schema(step_id, tool.cwl)
+            check_schema(contents)
+        else:
+            raise NoSuchResource(uri)
+        resources[uri] = Resource(contents=contents, specification=DRAFT202012)  # type: ignore
+        return resources[uri]
+
     schema_store_resource: Resource = Resource(contents=schema_store, specification=DRAFT202012)  # type: ignore
-    registry: Registry = Registry().with_resource(uri="wic_schema_store", resource=schema_store_resource)
+    registry: Registry = Registry(retrieve=retrieve)  # type: ignore
+    registry = registry.with_resource(uri="wic_schema_store", resource=schema_store_resource)
     wic_tag_schema_resource: Resource = Resource(contents=wic_tag_schema(
         hypothesis), specification=DRAFT202012)  # type: ignore
     registry = registry.with_resource(uri="wic_tag", resource=wic_tag_schema_resource)
@@ -692,6 +981,6 @@ def get_validator(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[str
     # "jsonschema.exceptions.SchemaError: ... is not valid under any of the given schemas"
     # try temporarily commenting this line out to generate the schema anyway.
     # Then, in any yml file, the very first line should show a "schema stack trace"
-    Draft202012Validator.check_schema(schema)
+    check_schema(schema)
     validator = Draft202012Validator(schema, registry=registry)
     return validator
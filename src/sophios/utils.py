@@ -1,5 +1,7 @@
 import copy
+import os
 from pathlib import Path
+import shutil
 from urllib.parse import urlparse
 from typing import Any, Dict, List, Tuple
 
@@ -8,6 +10,12 @@ import yaml
 from .wic_types import (Namespaces, RoseTree, StepId,
                         Json, Yaml, YamlForest, YamlTree)
 
+# The ways in which files can be placed into another directory (i.e. outdir/ or the working directory)
+FILE_STRATEGIES = ['copy', 'hardlink', 'reflink', 'symlink']
+
+# See /usr/include/linux/fs.h
+FICLONE = 0x40049409
+
 
 def step_name_str(yaml_stem: str, i: int, step_key: str) -> str:
     """Returns a string which uniquely and hierarchically identifies a step in a workflow
@@ -170,7 +178,8 @@ def extract_implementation(yaml_tree: Yaml, wic: Yaml, yaml_path: Path) -> Tuple
     Returns:
         Tuple[str, Yaml]: The Yaml AST dict of the chosen implementation.
     """
-    yaml_tree_copy = copy.deepcopy(yaml_tree)
+    # NOTE: Only the top-level steps: tag is replaced, so a shallow copy suffices.
+    yaml_tree_copy = {**yaml_tree}
     implementation = ''
     if 'implementations' in wic:
         if 'default_implementation' in wic:
@@ -544,3 +553,54 @@ def is_valid_url(url: str) -> bool:
         return all([result.scheme, result.netloc]) and result.scheme in ('http', 'https')
     except ValueError:
         return False
+
+
+def place_file(source: Path, dest: Path, strategy: str, preserve_metadata: bool = False) -> None:
+    """Places a single file at dest (overwriting it), using the given strategy.
+
+    Args:
+        source (Path): The source file
+        dest (Path): The destination file
+        strategy (str): One of FILE_STRATEGIES. The link strategies fallback to copying when necessary.
+        preserve_metadata (bool): Also copy the mtime etc (like shutil.copy2), not just the permissions.
+    """
+    if dest.is_symlink() or dest.exists():
+        dest.unlink()  # i.e. overwrite the file, like cp
+    if strategy == 'symlink':
+        os.symlink(source.absolute(), dest)
+        return
+    try:
+        if strategy == 'hardlink':
+            os.link(source, dest)
+            return
+        if strategy == 'reflink':
+            reflink(source, dest)
+            if preserve_metadata:
+                shutil.copystat(source, dest)
+            else:
+                shutil.copymode(source, dest)
+            return
+    except OSError:
+        pass  # i.e. different file systems, or the file system does not support it, so just copy.
+    if preserve_metadata:
+        shutil.copy2(source, dest)
+    else:
+        shutil.copy(source, dest)
+
+
+def reflink(source: Path, dest: Path) -> None:
+    """Creates a copy-on-write clone of source at dest (i.e. on btrfs or xfs)
+
+    Args:
+        source (Path): The source file
+        dest (Path): The destination file
+
+    Raises:
+        OSError: If the file system (or the operating system) does not support reflinks.
+    """
+    try:
+        import fcntl  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise OSError('reflinks are not supported on this operating system') from exc
+    with open(source, mode='rb') as src, open(dest, mode='wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
@@ -3,7 +3,7 @@ from pathlib import Path
 from typing import Any, Dict, List
 import yaml
 
-from . import utils
+from . import utils, utils_graphs
 from .wic_types import (GraphReps, InternalOutputs, Namespaces, Tool, Tools,
                         WorkflowOutputs, Yaml, StepId)
 
@@ -222,19 +222,19 @@ def get_workflow_outputs(graph_settings: Dict[str, Any],
                     graphdata = graph.graphdata
                     attrs = {'label': out_key_no_namespace, 'shape': 'box',
                              'style': 'rounded, filled', 'fillcolor': 'lightyellow'}
-                    graph_gv.node(namespaced_output_name, **attrs)
-                    font_edge_color = 'black' if graph_settings['graph_dark_theme'] else 'white'
-                    if graph_settings['graph_label_edges']:
-                        graph_gv.edge(step_node_name, namespaced_output_name, color=font_edge_color,
-                                      label=out_key_no_namespace)  # Is labeling necessary?
-                    else:
-                        graph_gv.edge(
-                            step_node_name, namespaced_output_name, color=font_edge_color)
-                    graph_nx.add_node(namespaced_output_name)
-                    graph_nx.add_edge(step_node_name, namespaced_output_name)
-                    graphdata.nodes.append((namespaced_output_name, attrs))
-                    graphdata.edges.append(
-                        (step_node_name, namespaced_output_name, {}))
+                    utils_graphs.add_graph_node(graph_settings, graph, namespaced_output_name, attrs)
+                    if utils_graphs.graph_mode_full(graph_settings):
+                        font_edge_color = 'black' if graph_settings['graph_dark_theme'] else 'white'
+                        if graph_settings['graph_label_edges']:
+                            graph_gv.edge(step_node_name, namespaced_output_name, color=font_edge_color,
+                                          label=out_key_no_namespace)  # Is labeling necessary?
+                        else:
+                            graph_gv.edge(
+                                step_node_name, namespaced_output_name, color=font_edge_color)
+                        graph_nx.add_edge(step_node_name, namespaced_output_name)
+                    if utils_graphs.graph_mode_graphdata(graph_settings):
+                        graphdata.edges.append(
+                            (step_node_name, namespaced_output_name, {}))
             # NOTE: Unless we are in the root workflow, we always need to
             # output everything. This is because while we are within a
             # subworkflow, we do not yet know if a subworkflow output will be used as
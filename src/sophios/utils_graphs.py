@@ -6,6 +6,38 @@ import networkx as nx
 
 from .wic_types import (GraphData, GraphReps, Json, Namespaces, Tool, Tools)
 
+# Which of our graph representations to build during compilation, i.e. graph_settings['graph_mode']
+# 'full': graphviz, networkx, and GraphData
+# 'graphdata': GraphData only (i.e. for cytoscape)
+# 'none': Do not build any graphs
+GRAPH_MODES = ['full', 'graphdata', 'none']
+
+
+def graph_mode_full(graph_settings: Dict[str, Any]) -> bool:
+    """Returns True if the graphviz and networkx graphs should be built."""
+    return bool(graph_settings['graph_mode'] == 'full')
+
+
+def graph_mode_graphdata(graph_settings: Dict[str, Any]) -> bool:
+    """Returns True if the GraphData graphs should be built."""
+    return bool(graph_settings['graph_mode'] != 'none')
+
+
+def add_graph_node(graph_settings: Dict[str, Any], graph: GraphReps, node_name: str, attrs: Dict[str, str]) -> None:
+    """Adds a node to (all of the enabled) graph representations.
+
+    Args:
+        graph_settings (Dict[str, Any]): The settings for graphviz visualization
+        graph (GraphReps): A tuple of a GraphViz DiGraph and a networkx DiGraph
+        node_name (str): The name of the node
+        attrs (Dict[str, str]): The graphviz attributes of the node
+    """
+    if graph_mode_full(graph_settings):
+        graph.graphviz.node(node_name, **attrs)
+        graph.networkx.add_node(node_name)
+    if graph_mode_graphdata(graph_settings):
+        graph.graphdata.nodes.append((node_name, attrs))
+
 
 def add_graph_edge(graph_settings: Dict[str, Any], graph: GraphReps,
                    nss1: Namespaces, nss2: Namespaces,
@@ -26,6 +58,8 @@ def add_graph_edge(graph_settings: Dict[str, Any], graph: GraphReps,
         label (str): The edge label
         color (str, optional): The edge color
     """
+    if not graph_mode_graphdata(graph_settings):
+        return
     if color == '':
         color = 'black' if graph_settings['graph_dark_theme'] else 'white'
     nss1 = nss1[:(1 + graph_settings['graph_inline_depth'])]
@@ -42,8 +76,10 @@ def add_graph_edge(graph_settings: Dict[str, Any], graph: GraphReps,
         if graph_settings['graph_label_edges']:
             attrs['label'] = label
 
-        graph_gv.edge(edge_node1, edge_node2, **attrs)
-    graph_nx.add_edge(edge_node1, edge_node2)
+        if graph_mode_full(graph_settings):
+            graph_gv.edge(edge_node1, edge_node2, **attrs)
+    if graph_mode_full(graph_settings):
+        graph_nx.add_edge(edge_node1, edge_node2)
     graphdata.edges.append((edge_node1, edge_node2, attrs))
 
 
@@ -197,11 +233,14 @@ def add_subgraphs(graph_settings: Dict[str, Any],
         step_1_names (List[str]): The names of the first step
         steps_ranksame (List[str]): Additional node names to be aligned using ranksame
     """
+    if not graph_mode_graphdata(graph_settings):
+        return
+    full = graph_mode_full(graph_settings)
     graph_gv = graph.graphviz
     graph_nx = graph.networkx
     # Add the cluster subgraphs to the main graph, but we need to add them in
     # reverse order to trick the graphviz layout algorithm.
-    for sibling in sibling_subgraphs[::-1]:  # Reverse!
+    for sibling in sibling_subgraphs[::-1] if full else []:  # Reverse!
         sib_graph_gv, sib_graph_nx, _sib_graphdata = sibling
         if len(namespaces) < graph_settings['graph_inline_depth']:
             graph_gv.subgraph(sib_graph_gv)
@@ -216,11 +255,13 @@ def add_subgraphs(graph_settings: Dict[str, Any],
             name.split('___')) < 2 + graph_settings['graph_inline_depth']]
         if len(step_1_names_display) > 1:
             nodes_same_rank = '\t{rank=same; ' + '; '.join(step_1_names_display) + '}\n'
-            graph_gv.body.append(nodes_same_rank)
+            if full:
+                graph_gv.body.append(nodes_same_rank)
             graph.graphdata.ranksame = step_1_names_display
         if len(steps_ranksame) > 1:
             nodes_same_rank = '\t{rank=same; ' + '; '.join(steps_ranksame) + '}\n'
-            graph_gv.body.append(nodes_same_rank)
+            if full:
+                graph_gv.body.append(nodes_same_rank)
             graph.graphdata.ranksame = steps_ranksame
 
 
@@ -1,26 +1,36 @@
-from typing import Any, Dict, Type
+from typing import Any, Dict, Type, Union
 
 import yaml
 
+try:
+    # libyaml is an optional dependency of pyyaml, so fallback to the (much slower) pure python implementations.
+    from yaml import CDumper as FastDumper, CSafeDumper as FastSafeDumper, CSafeLoader as FastSafeLoader
+except ImportError:
+    from yaml import Dumper as FastDumper, SafeDumper as FastSafeDumper, SafeLoader as FastSafeLoader  # type: ignore
+
+# The width at which the emitters start to fold long scalars. (This is the pyyaml and libyaml default.)
+YAML_WIDTH = 80
+
 # NOTE: In the following constructors, you CANNOT return the exact same yaml tag
 # Otherwise, the loader is not idempotent. Specifically, then other tooling
 # (i.e. the python api) cannot simply emit the dictionaries returned here,
 # because then these constructors will fire again.
 
 
-def anchor_constructor(loader: yaml.SafeLoader, node: yaml.nodes.ScalarNode) -> Dict[str, Any]:
+def anchor_constructor(loader: Union[yaml.SafeLoader, FastSafeLoader], node: yaml.nodes.ScalarNode) -> Dict[str, Any]:
     val = loader.construct_scalar(node)
     name = 'wic_anchor'  # NOT '!&'
     return {name: val}
 
 
-def alias_constructor(loader: yaml.SafeLoader, node: yaml.nodes.ScalarNode) -> Dict[str, Any]:
+def alias_constructor(loader: Union[yaml.SafeLoader, FastSafeLoader], node: yaml.nodes.ScalarNode) -> Dict[str, Any]:
     val = loader.construct_scalar(node)
     name = 'wic_alias'  # NOT '!*'
     return {name: val}
 
 
-def inlineinput_constructor(loader: yaml.SafeLoader, node: yaml.nodes.Node) -> Dict[str, Dict[str, Any]]:
+def inlineinput_constructor(loader: Union[yaml.SafeLoader, FastSafeLoader],
+                            node: yaml.nodes.Node) -> Dict[str, Dict[str, Any]]:
     val: Any
     if isinstance(node, yaml.nodes.ScalarNode):
         try:
@@ -28,7 +38,7 @@ def inlineinput_constructor(loader: yaml.SafeLoader, node: yaml.nodes.Node) -> D
             if node.value == "":
                 val = ""
             else:
-                val = yaml.safe_load(node.value)
+                val = yaml.load(node.value, Loader=FastSafeLoader)
             # yaml.safe_load returns the correct primitive types
         except Exception:
             # but fallback to a string if it is not actually a primitive type.
@@ -43,9 +53,94 @@ def inlineinput_constructor(loader: yaml.SafeLoader, node: yaml.nodes.Node) -> D
     return {name: val}
 
 
-def wic_loader() -> Type[yaml.SafeLoader]:
-    loader = yaml.SafeLoader
-    loader.add_constructor("!&", anchor_constructor)
-    loader.add_constructor("!*", alias_constructor)
-    loader.add_constructor("!ii", inlineinput_constructor)
-    return loader
+class WICLoader(yaml.SafeLoader):
+    """The pure python loader, for .wic files (and all other yml files)"""
+
+
+class FastWICLoader(FastSafeLoader):
+    """The libyaml loader (if available), for .wic files (and all other yml files)"""
+
+
+# NOTE: add_constructor copies the constructors into the subclass, so this does not modify yaml.SafeLoader
+for loader_class in [WICLoader, FastWICLoader]:
+    loader_class.add_constructor("!&", anchor_constructor)
+    loader_class.add_constructor("!*", alias_constructor)
+    loader_class.add_constructor("!ii", inlineinput_constructor)
+
+
+def wic_loader() -> Type[FastWICLoader]:
+    return FastWICLoader
+
+
+def safe_load(stream: Any) -> Any:
+    """Equivalent to yaml.safe_load, but uses libyaml (if available)
+
+    Args:
+        stream (Any): A str, bytes, or file
+
+    Returns:
+        Any: The yml contents
+    """
+    return yaml.load(stream, Loader=FastSafeLoader)
+
+
+def scalar_width(val: str) -> int:
+    """An upper bound on the width of a string scalar, as emitted in any style (plain, quoted, escaped, etc)
+
+    Args:
+        val (str): A yml string scalar
+
+    Returns:
+        int: An upper bound on the number of characters
+    """
+    if val.isascii() and val.isprintable():
+        # The quotes, plus escaping (i.e. doubling) any quotes and backslashes
+        return len(val) + 2 + sum(val.count(c) for c in '\'"\\')
+    # Escape sequences are at most 10 characters long, i.e. \U0001F600
+    return 10 * len(val) + 2
+
+
+def fits_on_one_line(data: Any, indent: int, column: int) -> bool:
+    """Determines whether every scalar in data is guaranteed to be emitted without any line folding.\n
+    NOTE: This assumes block style with indent=2 (or less), which is what we always use.
+
+    Args:
+        data (Any): A yml object
+        indent (int): An upper bound on the indentation of data (if data is a mapping or sequence)
+        column (int): An upper bound on the column at which data starts (if data is a scalar)
+
+    Returns:
+        bool: True if no scalars will be folded.
+    """
+    if isinstance(data, str):
+        return column + scalar_width(data) <= YAML_WIDTH
+    if isinstance(data, dict):
+        for key, val in data.items():
+            # NOTE: The emitters also disagree on how to emit empty keys.
+            if not isinstance(key, str) or key == '' or indent + scalar_width(key) > YAML_WIDTH:
+                return False
+            if not fits_on_one_line(val, indent + 2, indent + scalar_width(key) + 2):
+                return False
+        return True
+    if isinstance(data, list):
+        return all(fits_on_one_line(val, indent + 2, indent + 2) for val in data)
+    return data is None or isinstance(data, (bool, int, float))
+
+
+def dump(data: Any, dumper: Any, fast_dumper: Any, **kwargs: Any) -> str:
+    """Dumps data to a string using fast_dumper (i.e. libyaml) whenever it emits exactly the same bytes as dumper.\n
+    libyaml folds long scalars differently than the pure python emitter (and it does not emit the explicit
+    document end marker for top-level scalars), so we can only use it when no scalars will be folded.
+
+    Args:
+        data (Any): The yml object to dump
+        dumper (Any): The pure python Dumper class
+        fast_dumper (Any): The equivalent libyaml Dumper class
+        kwargs (Any): Any additional arguments to yaml.dump
+
+    Returns:
+        str: The yml string
+    """
+    if isinstance(data, (dict, list)) and fits_on_one_line(data, 0, 0):
+        return str(yaml.dump(data, Dumper=fast_dumper, **kwargs))
+    return str(yaml.dump(data, Dumper=dumper, **kwargs))
@@ -0,0 +1,39 @@
+import contextlib
+import time
+from typing import Dict, Iterator
+
+import pytest
+
+
+class BenchmarkTimings:
+    """Records the (best) wall-clock timings of a benchmark.\n
+    NOTE: The benchmarks only report their timings (use pytest -s to see them),
+    since wall-clock comparisons are unreliable on shared CI runners.
+    """
+
+    def __init__(self) -> None:
+        self.times: Dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def time(self, name: str) -> Iterator[None]:
+        """Times the body of the with statement. If the same name is timed repeatedly, the minimum is kept."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        """Records a (i.e. derived or estimated) timing. If the same name is recorded repeatedly, the minimum is kept."""
+        self.times[name] = min(self.times.get(name, seconds), seconds)
+
+    def report(self) -> str:
+        return ', '.join(f'{name}: {seconds:.3f}s' for name, seconds in self.times.items())
+
+
+@pytest.fixture
+def benchmark_timings(request: pytest.FixtureRequest) -> Iterator[BenchmarkTimings]:
+    """Yields a BenchmarkTimings, and prints the timing report after the test."""
+    timings = BenchmarkTimings()
+    yield timings
+    print(f'{request.node.name}: {timings.report()}')
@@ -0,0 +1,201 @@
+import copy
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+import yaml
+
+from sophios import ast, plugins, utils
+from sophios.schemas import wic_schema
+from sophios.utils_yaml import wic_loader
+from sophios.wic_types import StepId, YamlTree
+
+from .conftest import BenchmarkTimings
+
+CWL_TOUCH = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: touch
+inputs:
+  filename:
+    type: string
+    inputBinding:
+      position: 1
+outputs:
+  file:
+    type: File
+    outputBinding:
+      glob: $(inputs.filename)
+"""
+
+INNER_WIC = """steps:
+  - id: touch
+    in:
+      filename: !ii inner.txt
+"""
+
+SUB_WIC = """steps:
+  - id: inner.wic
+  - id: touch
+"""
+
+ROOT_WIC = """steps:
+  - id: sub.wic
+  - id: inner.wic
+  - id: sub.wic
+"""
+
+
+ROOT_WIC_OVERRIDE = """wic:
+  steps:
+    (1, sub.wic):
+      wic:
+        steps:
+          (2, touch):
+            in:
+              filename: !ii override.txt
+steps:
+  - id: sub.wic
+  - id: sub.wic
+"""
+
+
+def read_root(tmp_path: Path, root_wic: str, fused: bool = False) -> YamlTree:
+    tools = plugins.get_tools_cwl({'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}},
+                                  quiet=True, use_cache=False)
+    yml_paths = plugins.get_yml_paths({'search_paths_wic': {'global': [str(tmp_path / 'workflows')]}})
+    yaml_stems = utils.flatten([list(p) for p in yml_paths.values()])
+    validator = wic_schema.get_validator(tools, yaml_stems, write_to_disk=False)
+
+    yaml_tree = YamlTree(StepId('root', 'global'), yaml.load(root_wic, Loader=wic_loader()))
+    if fused:
+        return ast.read_ast_fused('', yaml_tree, yml_paths, tools, validator, False, tmp_path)
+    return ast.read_ast_from_disk('', yaml_tree, yml_paths, tools, validator, False)
+
+
+def write_workflows(tmp_path: Path) -> None:
+    (tmp_path / 'adapters').mkdir()
+    (tmp_path / 'workflows').mkdir()
+    (tmp_path / 'adapters' / 'touch.cwl').write_text(CWL_TOUCH, encoding='utf-8')
+    (tmp_path / 'workflows' / 'inner.wic').write_text(INNER_WIC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'sub.wic').write_text(SUB_WIC, encoding='utf-8')
+
+
+@pytest.mark.fast
+def test_each_wic_file_is_loaded_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    write_workflows(tmp_path)
+
+    loaded: List[str] = []
+    load_wic_file = ast.load_wic_file
+
+    def load_wic_file_spy(yaml_path: Path, *args: Any) -> Any:
+        loaded.append(yaml_path.name)
+        return load_wic_file(yaml_path, *args)
+
+    monkeypatch.setattr(ast, 'load_wic_file', load_wic_file_spy)
+    (_, yaml_tree) = read_root(tmp_path, ROOT_WIC)
+    assert sorted(loaded) == ['inner.wic', 'sub.wic']
+
+    steps = yaml_tree['steps']
+    assert [step['id'] for step in steps] == ['sub.wic', 'inner.wic', 'sub.wic']
+    sub_steps = steps[0]['subtree']['steps']
+    assert sub_steps[0]['subtree'] == steps[1]['subtree'] == yaml.load(INNER_WIC, Loader=wic_loader())
+    assert sub_steps[1] == {'id': 'touch'}
+    # Every reference must get its own (unaliased) copy, because later AST transformations mutate them.
+    assert steps[0]['subtree'] == steps[2]['subtree']
+    assert steps[0]['subtree'] is not steps[2]['subtree']
+    assert sub_steps[0]['subtree'] is not steps[1]['subtree']
+
+
+@pytest.mark.fast
+def test_errors_are_reported_in_order(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    write_workflows(tmp_path)
+
+    (tmp_path / 'workflows' / 'missing.wic').write_text(INNER_WIC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'invalid.wic').write_text('steps:\n  - id: touch\nnot_a_cwl_tag: 1\n', encoding='utf-8')
+    yml_paths_missing = plugins.get_yml_paths({'search_paths_wic': {'global': [str(tmp_path / 'workflows')]}})
+    (tmp_path / 'workflows' / 'missing.wic').unlink()
+    monkeypatch.setattr(plugins, 'get_yml_paths', lambda config: yml_paths_missing)
+
+    with pytest.raises(Exception, match='missing.wic does not exist'):
+        read_root(tmp_path, 'steps:\n  - id: sub.wic\n  - id: missing.wic\n  - id: invalid.wic\n')
+
+    # Even though invalid.wic is validated concurrently, it is reported as usual.
+    with pytest.raises(SystemExit):
+        read_root(tmp_path, 'steps:\n  - id: sub.wic\n  - id: invalid.wic\n  - id: missing.wic\n')
+    assert (tmp_path / 'validation_invalid.txt').exists()
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize('root_wic', [ROOT_WIC, ROOT_WIC_OVERRIDE])
+def test_read_ast_fused(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, root_wic: str) -> None:
+    monkeypatch.chdir(tmp_path)
+    write_workflows(tmp_path)
+
+    loaded: List[str] = []
+    load_wic_file = ast.load_wic_file
+
+    def load_wic_file_spy(yaml_path: Path, *args: Any) -> Any:
+        loaded.append(yaml_path.name)
+        return load_wic_file(yaml_path, *args)
+
+    monkeypatch.setattr(ast, 'load_wic_file', load_wic_file_spy)
+    yaml_tree_fused = read_root(tmp_path, root_wic, fused=True)
+    assert sorted(loaded) == ['inner.wic', 'sub.wic']
+    yaml_tree = ast.merge_yml_trees(read_root(tmp_path, root_wic), {}, {})
+    assert yaml_tree_fused == ast.python_script_generate_cwl(yaml_tree, tmp_path, {})
+
+    steps = yaml_tree_fused.yml['steps']
+    filenames = [step['subtree']['steps'][1].get('in', {}).get('filename') for step in steps if step['id'] == 'sub.wic']
+    if root_wic == ROOT_WIC_OVERRIDE:
+        assert filenames == [{'wic_inline_input': 'override.txt'}, None]
+    # Every reference must get its own (unaliased) copy, because later AST transformations mutate them.
+    assert steps[0]['subtree'] is not steps[1]['subtree']
+
+
+@pytest.mark.fast
+def test_read_ast_fused_errors_are_reported_in_order(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    write_workflows(tmp_path)
+
+    (tmp_path / 'workflows' / 'missing.wic').write_text(INNER_WIC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'invalid.wic').write_text('steps:\n  - id: touch\nnot_a_cwl_tag: 1\n', encoding='utf-8')
+    yml_paths_missing = plugins.get_yml_paths({'search_paths_wic': {'global': [str(tmp_path / 'workflows')]}})
+    (tmp_path / 'workflows' / 'missing.wic').unlink()
+    monkeypatch.setattr(plugins, 'get_yml_paths', lambda config: yml_paths_missing)
+
+    with pytest.raises(Exception, match='missing.wic does not exist'):
+        read_root(tmp_path, 'steps:\n  - id: sub.wic\n  - id: missing.wic\n  - id: invalid.wic\n', fused=True)
+    with pytest.raises(SystemExit):
+        read_root(tmp_path, 'steps:\n  - id: sub.wic\n  - id: invalid.wic\n  - id: missing.wic\n', fused=True)
+    assert (tmp_path / 'validation_invalid.txt').exists()
+
+
+@pytest.mark.slow
+def test_read_ast_fused_scaling(tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+                                benchmark_timings: BenchmarkTimings) -> None:
+    """Benchmark the fused front-end pass versus the separate passes on a workflow with 500 subworkflow steps."""
+    monkeypatch.chdir(tmp_path)
+    write_workflows(tmp_path)
+    tools = plugins.get_tools_cwl({'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}},
+                                  quiet=True, use_cache=False)
+    yml_paths = plugins.get_yml_paths({'search_paths_wic': {'global': [str(tmp_path / 'workflows')]}})
+    validator = wic_schema.get_validator(tools, ['inner', 'sub'], write_to_disk=False)
+    root_yaml_tree = yaml.load('steps:\n' + '  - id: sub.wic\n' * 500, Loader=wic_loader())
+
+    def separate() -> YamlTree:
+        yaml_tree = YamlTree(StepId('root', 'global'), copy.deepcopy(root_yaml_tree))
+        yaml_tree = ast.read_ast_from_disk('', yaml_tree, yml_paths, tools, validator, False)
+        yaml_tree = ast.merge_yml_trees(yaml_tree, {}, tools)
+        return ast.python_script_generate_cwl(yaml_tree, tmp_path, tools)
+
+    def fused() -> YamlTree:
+        yaml_tree = YamlTree(StepId('root', 'global'), copy.deepcopy(root_yaml_tree))
+        return ast.read_ast_fused('', yaml_tree, yml_paths, tools, validator, False, tmp_path)
+
+    assert fused() == separate()
+    for _ in range(5):
+        for name, front_end in [('separate passes', separate), ('fused', fused)]:
+            with benchmark_timings.time(name):
+                front_end()
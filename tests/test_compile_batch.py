@@ -0,0 +1,78 @@
+import json
+from pathlib import Path
+import subprocess as sub
+import sys
+
+import pytest
+
+from sophios import cli, compile_batch
+from sophios.compiler_context import CompilerContext
+
+from .conftest import BenchmarkTimings
+from .test_compiler_context import make_config
+
+TUTORIALS = Path(__file__).parent.parent / 'docs' / 'tutorials'
+
+
+def write_workflows(tmp_path: Path, num_workflows: int) -> None:
+    (tmp_path / 'batch').mkdir()
+    for i in range(num_workflows):
+        (tmp_path / 'batch' / f'touch_{i}.wic').write_text(
+            f'steps:\n  - id: touch\n    in:\n      filename: !ii {i}.txt\n', encoding='utf-8')
+    (tmp_path / 'batch' / 'missing.wic').write_text('steps:\n  - id: touch\n  - id: missing\n', encoding='utf-8')
+    (tmp_path / 'batch' / 'invalid.wic').write_text('steps:\n  - id: touch\nnot_a_cwl_tag: 1\n', encoding='utf-8')
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_compile_batch(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, max_workers: int) -> None:
+    monkeypatch.chdir(tmp_path)
+    config_file = make_config(tmp_path)
+    write_workflows(tmp_path, 4)
+    context = CompilerContext(config_file, config_file).get()
+    args = cli.get_args('', ['--config_file', str(config_file), '--homedir', str(tmp_path)])
+
+    yaml_paths = compile_batch.find_yaml_files(['batch/touch_0.wic', 'batch/touch_*.wic', 'batch'])
+    assert [p.name for p in yaml_paths] == ['touch_0.wic', 'touch_1.wic', 'touch_2.wic', 'touch_3.wic',
+                                            'invalid.wic', 'missing.wic']
+    report = compile_batch.compile_batch(yaml_paths, context, args, max_workers)
+    assert [result.yaml_path for result in report.results] == [str(p) for p in yaml_paths]
+    assert report.failed == ['batch/invalid.wic', 'batch/missing.wic'] and not report.ok
+    assert report.results[4].error == 'Failed to validate'
+    assert report.results[5].error == 'See autogenerated/error_missing.txt'
+    assert (tmp_path / 'autogenerated' / 'error_missing.txt').exists()
+    for i in range(4):
+        assert (tmp_path / 'autogenerated' / f'touch_{i}.cwl').exists()
+        assert f'{i}.txt' in (tmp_path / 'autogenerated' / f'touch_{i}_inputs.yml').read_text(encoding='utf-8')
+    assert 'Compiled 4/6 workflows' in report.summary()
+
+    assert compile_batch.run_compile_batch(['batch/touch_*.wic'], context, args, max_workers) == 0
+    report_json = json.loads((tmp_path / 'autogenerated' / 'compile_batch_report.json').read_text(encoding='utf-8'))
+    assert [result['ok'] for result in report_json['results']] == [True] * 4
+    assert compile_batch.run_compile_batch(['batch/*.yml'], context, args, max_workers) == 1
+
+    (tmp_path / 'batch' / 'sub').mkdir()
+    (tmp_path / 'batch' / 'sub' / 'touch_0.wic').write_text('steps:\n  - id: touch\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='would both be compiled to'):
+        compile_batch.find_yaml_files(['batch'])
+
+
+@pytest.mark.slow
+def test_compile_batch_scaling(tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+                               benchmark_timings: BenchmarkTimings) -> None:
+    """Benchmark compiling the tutorials with one process per workflow versus --compile_batch."""
+    monkeypatch.chdir(tmp_path)
+    yaml_paths = [str(TUTORIALS / f'{stem}.wic')
+                  for stem in ['helloworld', 'multistep1', 'multistep2', 'multistep3', 'append_twice']]
+
+    with benchmark_timings.time('one process per workflow'):
+        for yaml_path in yaml_paths:
+            sub.run([sys.executable, '-m', 'sophios.main', '--yaml', yaml_path, '--generate_cwl_workflow'],
+                    capture_output=True, check=True)
+
+    with benchmark_timings.time('compile_batch'):
+        sub.run([sys.executable, '-m', 'sophios.main', '--compile_batch', *yaml_paths, '--compile_max_workers', '4'],
+                capture_output=True, check=True)
+    report_json = json.loads((tmp_path / 'autogenerated' / 'compile_batch_report.json').read_text(encoding='utf-8'))
+    assert [result['ok'] for result in report_json['results']] == [True] * len(yaml_paths)
+    benchmark_timings.record('sum of compile times', sum(result['seconds'] for result in report_json['results']))
@@ -0,0 +1,98 @@
+import json
+from pathlib import Path
+import threading
+import time
+from typing import List
+
+import pytest
+
+from sophios import compiler
+from sophios.compiler_context import CompilerContext
+from sophios.wic_types import StepId
+
+CWL_TOUCH = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: touch
+inputs:
+  filename:
+    type: string
+    inputBinding:
+      position: 1
+outputs:
+  file:
+    type: File
+    outputBinding:
+      glob: $(inputs.filename)
+"""
+
+
+def make_config(tmp_path: Path) -> Path:
+    (tmp_path / 'adapters').mkdir()
+    (tmp_path / 'workflows').mkdir()
+    (tmp_path / 'adapters' / 'touch.cwl').write_text(CWL_TOUCH, encoding='utf-8')
+    config_file = tmp_path / 'global_config.json'
+    config = {'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]},
+              'search_paths_wic': {'global': [str(tmp_path / 'workflows')]},
+              'inference_rules': {'edam:format_2330': 'continue'}}
+    config_file.write_text(json.dumps(config), encoding='utf-8')
+    return config_file
+
+
+@pytest.mark.fast
+def test_compiler_context_refreshes_on_plugin_change(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    config_file = make_config(tmp_path)
+    context = CompilerContext(config_file, config_file, refresh_interval=3600)
+
+    data = context.get()
+    assert set(data.tools) == {StepId('touch', 'global')}
+    assert compiler.inference_rules == {'edam:format_2330': 'continue'}
+
+    # Nothing changed, so the state must be reused as-is.
+    assert not context.refresh(force=True)
+    assert context.get() is data
+
+    (tmp_path / 'adapters' / 'touch2.cwl').write_text(CWL_TOUCH, encoding='utf-8')
+    # Within refresh_interval, changes are not (yet) picked up.
+    assert not context.refresh()
+    assert context.refresh(force=True)
+    assert set(context.get().tools) == {StepId('touch', 'global'), StepId('touch2', 'global')}
+
+
+@pytest.mark.fast
+def test_compiler_context_tools_copy_is_isolated(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    config_file = make_config(tmp_path)
+    context = CompilerContext(config_file, config_file)
+
+    tools = context.tools_copy()
+    tools[StepId('inline', 'global')] = tools[StepId('touch', 'global')]
+    assert StepId('inline', 'global') not in context.get().tools
+
+
+@pytest.mark.fast
+def test_compiler_context_watcher(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    config_file = make_config(tmp_path)
+    context = CompilerContext(config_file, config_file, refresh_interval=0.05, with_validator=False)
+    assert context.get().validator is None
+
+    refresh = context.refresh
+    refresh_threads: List[str] = []
+
+    def refresh_spy(force: bool = False) -> bool:
+        refresh_threads.append(threading.current_thread().name)
+        return refresh(force)
+
+    monkeypatch.setattr(context, 'refresh', refresh_spy)
+    context.start_watcher()
+    try:
+        (tmp_path / 'adapters' / 'touch2.cwl').write_text(CWL_TOUCH, encoding='utf-8')
+        deadline = time.monotonic() + 10
+        while StepId('touch2', 'global') not in context.get().tools and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert StepId('touch2', 'global') in context.get().tools
+    finally:
+        context.stop_watcher()
+    # The changes are only ever detected by the watcher, never on the caller's thread.
+    assert refresh_threads and set(refresh_threads) == {'compiler-context-watcher'}
@@ -0,0 +1,126 @@
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+import yaml
+
+from sophios import ast, cli, compiler, plugins, utils
+from sophios.schemas import wic_schema
+from sophios.utils_graphs import get_graph_reps
+from sophios.utils_yaml import wic_loader
+from sophios.wic_types import CompilerInfo, GraphData, NodeData, RoseTree, StepId, YamlTree
+
+CWL_TOUCH = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: touch
+inputs:
+  filename:
+    type: string
+    inputBinding:
+      position: 1
+outputs:
+  file:
+    type: File
+    outputBinding:
+      glob: $(inputs.filename)
+"""
+
+CWL_WC = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: wc
+inputs:
+  file:
+    type: File
+    inputBinding:
+      position: 1
+outputs:
+  stdout:
+    type: stdout
+"""
+
+SUB_WIC = """steps:
+  - id: touch
+    in:
+      filename: !ii sub.txt
+  - id: wc
+"""
+
+ROOT_WIC = """steps:
+  - id: sub.wic
+  - id: touch
+    in:
+      filename: !ii root.txt
+  - id: sub.wic
+  - id: wc
+"""
+
+
+def compile_root(tmp_path: Path, memoize: bool, graph_mode: str) -> CompilerInfo:
+    tools = plugins.get_tools_cwl({'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}},
+                                  quiet=True, use_cache=False)
+    yml_paths = plugins.get_yml_paths({'search_paths_wic': {'global': [str(tmp_path / 'workflows')]}})
+    yaml_stems = utils.flatten([list(p) for p in yml_paths.values()])
+    validator = wic_schema.get_validator(tools, yaml_stems, write_to_disk=False)
+
+    root_yml = yaml.load((tmp_path / 'root.wic').read_text(encoding='utf-8'), Loader=wic_loader())
+    yaml_tree = YamlTree(StepId('root', 'global'), root_yml)
+    yaml_tree = ast.read_ast_from_disk('', yaml_tree, yml_paths, tools, validator, False)
+    yaml_tree = ast.merge_yml_trees(yaml_tree, {}, tools)
+
+    compiler_options, graph_settings, yaml_tag_paths = cli.get_dicts_for_compilation()
+    compiler_options['memoize_subworkflows'] = memoize
+    graph_settings['graph_mode'] = graph_mode
+    graph = get_graph_reps('root')
+    return compiler.compile_workflow(yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
+                                     [], [graph], {}, {}, {}, {}, tools, True, True, True)
+
+
+def graphdata_to_list(graphdata: GraphData) -> List[Any]:
+    return [graphdata.name, graphdata.nodes, graphdata.edges, graphdata.ranksame,
+            [graphdata_to_list(subgraph) for subgraph in graphdata.subgraphs]]
+
+
+def rose_tree_to_list(rose_tree: RoseTree) -> List[Any]:
+    n_d: NodeData = rose_tree.data
+    graph = [n_d.graph.graphviz.body, sorted(n_d.graph.networkx.nodes), sorted(n_d.graph.networkx.edges),
+             graphdata_to_list(n_d.graph.graphdata)]
+    return [n_d.namespaces, n_d.name, n_d.yml, n_d.compiled_cwl, n_d.workflow_inputs_file,
+            n_d.inputs_workflow, n_d.step_name_1, graph,
+            [rose_tree_to_list(sub_tree) for sub_tree in rose_tree.sub_trees]]
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize('graph_mode', ['graphdata', 'full'])
+def test_memoized_subworkflows_match_unmemoized(tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+                                                graph_mode: str) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'adapters').mkdir()
+    (tmp_path / 'workflows').mkdir()
+    (tmp_path / 'adapters' / 'touch.cwl').write_text(CWL_TOUCH, encoding='utf-8')
+    (tmp_path / 'adapters' / 'wc.cwl').write_text(CWL_WC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'sub.wic').write_text(SUB_WIC, encoding='utf-8')
+    (tmp_path / 'root.wic').write_text(ROOT_WIC, encoding='utf-8')
+
+    compiler_info = compile_root(tmp_path, False, graph_mode)
+
+    calls: List[StepId] = []
+    compile_workflow_once = compiler.compile_workflow_once
+
+    def compile_workflow_once_spy(yaml_tree_ast: YamlTree, *args: Any) -> CompilerInfo:
+        calls.append(yaml_tree_ast.step_id)
+        return compile_workflow_once(yaml_tree_ast, *args)
+
+    monkeypatch.setattr(compiler, 'compile_workflow_once', compile_workflow_once_spy)
+    compiler_info_memo = compile_root(tmp_path, True, graph_mode)
+
+    # The second sub.wic is identical to the first (modulo namespaces), so it must be reused,
+    # unless the graphviz graphs (which cannot be moved to other namespaces) are built.
+    assert calls.count(StepId('sub.wic', 'global')) == (1 if graph_mode == 'graphdata' else 2)
+    assert rose_tree_to_list(compiler_info_memo.rose) == rose_tree_to_list(compiler_info.rose)
+    assert compiler_info_memo.env == compiler_info.env
+
+    # The memo is scoped to each root compilation, so nothing is reused across compilations.
+    assert compiler.memoized_subworkflows.get() is None
+    calls.clear()
+    compile_root(tmp_path, True, graph_mode)
+    assert calls.count(StepId('sub.wic', 'global')) == (1 if graph_mode == 'graphdata' else 2)
@@ -0,0 +1,251 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import re
+import threading
+import time
+from typing import Any, Iterator
+
+import pytest
+
+from sophios.api.python.workflow import CompiledWorkflow
+from sophios import run_local
+from sophios.compute_request import (ComputeRequest, ComputeSubmission, PollingPolicy, RetryPolicy,
+                                     ThreadedComputeClient, submit_batch, submit_batch_async)
+
+from .conftest import BenchmarkTimings
+
+EMPTY_WORKFLOW = {"class": "Workflow", "inputs": {}, "outputs": {}, "steps": []}
+
+
+class FakeCompute(ThreadingHTTPServer):
+    """A local stand-in for the Compute service.
+
+    Workflow `wf-{i}` (or any id ending in `i`) starts after `i % 4` pending status polls,
+    `never-*` workflows never start, `reject-*` workflows are rejected on submission,
+    and the first submission of `flaky-{i}` workflows fails with 503 Service Unavailable.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency_seconds: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", 0), FakeComputeHandler)
+        self.latency_seconds = latency_seconds
+        self.lock = threading.Lock()
+        self.pending: dict[str, int] = {}
+        self.status_polls: dict[str, int] = {}
+        self.submits: dict[str, int] = {}
+        self.connections: set[tuple[str, int]] = set()
+        self.active = 0
+        self.max_active = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/compute"
+
+
+class FakeComputeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # i.e. keep-alive
+    wbufsize = -1  # Send the headers and the body together (i.e. avoid delayed ACKs)
+    server: FakeCompute
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+        del format, args
+
+    def reply(self, status_code: int, body: Any) -> None:
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        time.sleep(self.server.latency_seconds)
+        with self.server.lock:
+            self.server.active -= 1
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        workflow_id = request["id"]
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+            self.server.submits[workflow_id] = self.server.submits.get(workflow_id, 0) + 1
+            if workflow_id.startswith("reject-"):
+                status_code = 400
+            elif workflow_id.startswith("flaky-") and self.server.submits[workflow_id] == 1:
+                status_code = 503
+            else:
+                status_code = 200
+                pending = 10**9 if workflow_id.startswith("never-") else int(re.findall(r"\d+$", workflow_id)[0]) % 4
+                self.server.pending[workflow_id] = pending
+        self.reply(status_code, {"id": workflow_id})
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        (_, _, workflow_id, endpoint, _) = self.path.split("/")
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+            if endpoint == "logs":
+                body: Any = {"log": workflow_id}
+            else:
+                self.server.status_polls[workflow_id] = self.server.status_polls.get(workflow_id, 0) + 1
+                started = self.server.pending[workflow_id] == 0
+                self.server.pending[workflow_id] -= 0 if started else 1
+                body = {"status": "RUNNING" if started else "PENDING"}
+        self.reply(200, body)
+
+
+@pytest.fixture
+def fake_compute() -> Iterator[FakeCompute]:
+    server = FakeCompute()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def compute_request(workflow_id: str) -> ComputeRequest:
+    return ComputeRequest(CompiledWorkflow(workflow_id, EMPTY_WORKFLOW, {}))
+
+
+@pytest.mark.fast
+def test_threaded_compute_client(fake_compute: FakeCompute, tmp_path: Path) -> None:
+    workflow_ids = [f"wf-{i}" for i in range(200)] + ["reject-0"]
+    polling = PollingPolicy(initial_interval_seconds=0.01, max_interval_seconds=0.04, deadline_seconds=None)
+
+    async def submit_all() -> list[ComputeSubmission]:
+        async with ThreadedComputeClient(fake_compute.url, max_connections=8, polling=polling) as client:
+            submissions = await asyncio.gather(*(compute_request(workflow_id).submit_async(client)
+                                                 for workflow_id in workflow_ids))
+            assert not client.in_flight
+            log_path = tmp_path / "compute.log"
+            await compute_request("wf-200").submit_async(client, log_path=log_path)
+            assert log_path.read_text(encoding="utf-8") == "{'log': 'wf-200'}"
+            return submissions
+
+    submissions = asyncio.run(submit_all())
+    for i, submission in enumerate(submissions[:200]):
+        assert submission == ComputeSubmission(f"wf-{i}", "RUNNING", True, {"id": f"wf-{i}"}, {"status": "RUNNING"},
+                                               {"log": f"wf-{i}"})
+        # Each workflow is polled until it starts, and no more.
+        assert fake_compute.status_polls[f"wf-{i}"] == i % 4 + 1
+    assert submissions[200] == ComputeSubmission("reject-0", None, False, submit_response={"id": "reject-0"})
+
+    # All of the requests share a few pooled (keep-alive) connections.
+    assert len(fake_compute.connections) <= 8
+
+
+@pytest.mark.fast
+def test_threaded_compute_client_deadline(fake_compute: FakeCompute) -> None:
+    polling = PollingPolicy(initial_interval_seconds=0.01, max_interval_seconds=0.04, deadline_seconds=0.3)
+
+    async def submit() -> ComputeSubmission:
+        async with ThreadedComputeClient(fake_compute.url, polling=polling) as client:
+            return await compute_request("never-0").submit_async(client)
+
+    submission = asyncio.run(submit())
+    assert submission.timed_out and not submission.accepted and submission.phase == "PENDING"
+    # Exponential backoff, i.e. 0.01, 0.02, 0.04, 0.04, ... (+/- jitter) within the deadline,
+    # and (however slow the server is) at least one poll before and one poll at the deadline.
+    assert 2 <= fake_compute.status_polls["never-0"] <= 12
+
+
+@pytest.mark.slow
+def test_threaded_compute_client_throughput(fake_compute: FakeCompute, benchmark_timings: BenchmarkTimings) -> None:
+    """Benchmark submitting many workflows with the shared client versus one blocking submit() at a time."""
+    fake_compute.latency_seconds = 0.005
+    num_workflows = 64
+
+    with benchmark_timings.time("submit"):
+        for i in range(num_workflows):
+            assert compute_request(f"wf-{i}").submit(fake_compute.url, poll_interval_seconds=0).accepted
+
+    async def submit_all() -> list[ComputeSubmission]:
+        polling = PollingPolicy(initial_interval_seconds=0.0, max_interval_seconds=0.0)
+        async with ThreadedComputeClient(fake_compute.url, polling=polling) as client:
+            return await asyncio.gather(*(compute_request(f"wf-{i}").submit_async(client)
+                                          for i in range(num_workflows, 2 * num_workflows)))
+
+    with benchmark_timings.time("submit_async"):
+        assert all(submission.accepted for submission in asyncio.run(submit_all()))
+
+
+@pytest.mark.fast
+def test_submit_batch(fake_compute: FakeCompute, tmp_path: Path) -> None:
+    fake_compute.latency_seconds = 0.002
+    workflow_ids = [f"wf-{i}" for i in range(100)] + [f"flaky-{i}" for i in range(10)] + ["reject-0"]
+    polling = PollingPolicy(initial_interval_seconds=0.01, max_interval_seconds=0.04, deadline_seconds=None)
+    retry = RetryPolicy(initial_backoff_seconds=0.01)
+
+    report = submit_batch([compute_request(workflow_id) for workflow_id in workflow_ids], fake_compute.url,
+                          max_concurrency=4, polling=polling, retry=retry, log_dir=tmp_path / "logs")
+    assert [submission.workflow_id for submission in report.submissions] == workflow_ids
+    assert report.accepted == workflow_ids[:110]
+    assert report.failed == ["reject-0"] and not report.timed_out
+    assert not report.ok and report.exit_code == 1
+    # Transient failures are retried, and rejections are not.
+    assert all(fake_compute.submits[f"flaky-{i}"] == 2 for i in range(10))
+    assert fake_compute.submits["reject-0"] == 1
+    assert (tmp_path / "logs" / "compute_logs_flaky-3.txt").read_text(encoding="utf-8") == "{'log': 'flaky-3'}"
+    # The concurrency limit bounds the load on the server, regardless of the size of the batch.
+    assert fake_compute.max_active <= 4
+
+    # Workflows which have not started by the deadline are reported as timed out.
+    polling = PollingPolicy(initial_interval_seconds=0.01, max_interval_seconds=0.04, deadline_seconds=0.1)
+    report = submit_batch([compute_request("never-0")], fake_compute.url, polling=polling)
+    assert report.timed_out == ["never-0"] and not report.failed
+
+    # Unreachable servers are retried, then reported as failed submissions.
+    report = submit_batch([compute_request("wf-0")], "http://127.0.0.1:9/compute",
+                          retry=RetryPolicy(max_attempts=2, initial_backoff_seconds=0.01))
+    assert report.failed == ["wf-0"] and "ConnectionError" in str(report.submissions[0].submit_response)
+
+    with pytest.raises(ValueError, match="unique workflow ids"):
+        submit_batch([compute_request("wf-0"), compute_request("wf-0")], fake_compute.url)
+
+
+@pytest.mark.fast
+def test_submit_batch_running_loop(fake_compute: FakeCompute) -> None:
+    polling = PollingPolicy(initial_interval_seconds=0.01)
+
+    async def submit_all() -> None:
+        with pytest.raises(RuntimeError, match="await submit_batch_async"):
+            submit_batch([compute_request("wf-0")], fake_compute.url, polling=polling)
+        report = await submit_batch_async([compute_request("wf-1")], fake_compute.url, polling=polling)
+        assert report.ok
+
+    asyncio.run(submit_all())
+
+
+@pytest.mark.fast
+def test_run_compute_batch(fake_compute: FakeCompute, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(run_local, "submit_batch", lambda compute_requests, submit_url, **kwargs: submit_batch(
+        compute_requests, submit_url, **{**kwargs, "polling": PollingPolicy(initial_interval_seconds=0.01)}))
+    job_inputs = [{"message": str(i)} for i in range(8)]
+    assert run_local.run_compute_batch("wf", EMPTY_WORKFLOW, job_inputs, fake_compute.url, max_concurrency=2) == 0
+    assert len(fake_compute.submits) == 8 and len(list(tmp_path.glob("compute_logs_wf__*.txt"))) == 8
+    assert run_local.run_compute_batch("wf", EMPTY_WORKFLOW, job_inputs, "not a url") == 1
+
+
+@pytest.mark.slow
+def test_submit_batch_scaling(fake_compute: FakeCompute, benchmark_timings: BenchmarkTimings) -> None:
+    """Benchmark submitting a sweep of 1000 jobs in one batch versus one blocking submit() at a time."""
+    fake_compute.latency_seconds = 0.002
+    num_sequential = 50
+    num_batch = 1000
+
+    start = time.perf_counter()
+    for i in range(num_sequential):
+        assert compute_request(f"wf-{4 * i}").submit(fake_compute.url, poll_interval_seconds=0).accepted
+    benchmark_timings.record("submit (per job)", (time.perf_counter() - start) / num_sequential)
+
+    start = time.perf_counter()
+    polling = PollingPolicy(initial_interval_seconds=0.01, max_interval_seconds=0.01, deadline_seconds=None)
+    report = submit_batch([compute_request(f"wf-{4 * i}") for i in range(num_sequential, num_sequential + num_batch)],
+                          fake_compute.url, max_concurrency=16, polling=polling)
+    assert report.ok
+    benchmark_timings.record("submit_batch (per job)", (time.perf_counter() - start) / num_batch)
@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+import subprocess as sub
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+from sophios import run_local, utils
+
+from .conftest import BenchmarkTimings
+
+
+def write_provenance(tmp_path: Path, num_files: int, num_basenames: int) -> List[Any]:
+    """Writes a synthetic provenance directory with a scattered output (and a Directory output)."""
+    data = tmp_path / 'provenance' / 'wf' / 'data'
+    data.mkdir(parents=True)
+    outputs = []
+    for i in range(num_files):
+        (data / f'{i}').write_text(str(i), encoding='utf-8')
+        outputs.append({'class': 'File', 'location': f'../data/{i}', 'basename': f'out{i % num_basenames}.txt'})
+    (data / 'log').write_text('log', encoding='utf-8')
+    listing = [{'class': 'File', 'location': '../data/log', 'basename': 'log.txt'}]
+    output_json = {'wf__step__1__scatter___out': outputs,
+                   'wf__step__2__dir___out': {'class': 'Directory', 'basename': 'logs', 'listing': listing}}
+    workflow = tmp_path / 'provenance' / 'wf' / 'workflow'
+    workflow.mkdir()
+    (workflow / 'primary-output.json').write_text(json.dumps(output_json), encoding='utf-8')
+    return utils.parse_provenance_output_files(output_json)
+
+
+def copy_output_files_cp(files: List[Any]) -> None:
+    """The original implementation, which spawns a cp process for every file."""
+    dests = set()
+    for location, namespaced_output_name, basename in files:
+        yaml_stem_init, shortened = utils.shorten_namespaced_output_name(namespaced_output_name)
+        parentdirs = yaml_stem_init + '/' + shortened.replace('___', '/')
+        Path('outdir/' + parentdirs).mkdir(parents=True, exist_ok=True)
+        source = 'provenance/wf/workflow/' + location
+        dest = 'outdir/' + parentdirs + '/' + basename
+        if dest in dests:
+            idx = 2
+            while Path(dest).exists():
+                stem = Path(basename).stem
+                suffix = Path(basename).suffix
+                dest = 'outdir/' + parentdirs + '/' + stem + f'_{idx}' + suffix
+                idx += 1
+        dests.add(dest)
+        sub.run(['cp', source, dest], check=True)
+
+
+def read_outdir(tmp_path: Path) -> Dict[str, str]:
+    return {p.relative_to(tmp_path).as_posix(): p.read_text(encoding='utf-8')
+            for p in (tmp_path / 'outdir').rglob('*') if p.is_file()}
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize('strategy', utils.FILE_STRATEGIES)
+def test_copy_output_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, strategy: str) -> None:
+    monkeypatch.chdir(tmp_path)
+    files = write_provenance(tmp_path, 20, 3)
+    scatter_dir = tmp_path / 'outdir' / 'wf' / 'step 1 scatter' / 'out'
+
+    def run_twice(copy_output_files: Callable[[], None]) -> Dict[str, str]:
+        shutil.rmtree(tmp_path / 'outdir', ignore_errors=True)
+        # Files from a previous run are skipped when resolving collisions (but are otherwise overwritten).
+        scatter_dir.mkdir(parents=True)
+        (scatter_dir / 'out0.txt').write_text('old', encoding='utf-8')
+        (scatter_dir / 'out0_3.txt').write_text('old', encoding='utf-8')
+        copy_output_files()
+        outdir = read_outdir(tmp_path)
+        copy_output_files()
+        return {**outdir, **{'2nd run/' + file: val for file, val in read_outdir(tmp_path).items()}}
+
+    expected = run_twice(lambda: copy_output_files_cp(files))
+    assert expected['outdir/wf/step 1 scatter/out/out0_4.txt'] == '6'
+    assert expected['outdir/wf/step 2 dir/out/logs/log.txt'] == 'log'
+    assert run_twice(lambda: run_local.copy_output_files('wf', strategy=strategy)) == expected
+
+    dest = scatter_dir / 'out1.txt'
+    source = tmp_path / 'provenance' / 'wf' / 'data' / '1'
+    assert dest.is_symlink() == (strategy == 'symlink')
+    if strategy == 'hardlink':
+        assert os.path.samefile(dest, source)
+
+
+@pytest.mark.fast
+def test_copy_output_files_basepath(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """With a basepath, the provenance is read from (and the outputs are written to) the basepath,
+    i.e. where build_cmd tells cwltool to write the provenance."""
+    monkeypatch.chdir(tmp_path)
+    basepath = tmp_path / 'autogenerated'
+    write_provenance(basepath, 4, 2)
+    cmd = run_local.build_cmd('wf', str(basepath), 'cwltool', 'docker', [])
+    assert cmd[cmd.index('--provenance') + 1] == str(basepath / 'provenance' / 'wf')
+
+    run_local.copy_output_files('wf', basepath=str(basepath))
+    assert not (tmp_path / 'outdir').exists()
+    assert (basepath / 'outdir' / 'wf' / 'step 1 scatter' / 'out' / 'out0_2.txt').read_text(encoding='utf-8') == '2'
+
+
+@pytest.mark.slow
+def test_copy_output_files_scaling(tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+                                   benchmark_timings: BenchmarkTimings) -> None:
+    """Benchmark collecting 10k (scattered) output files, versus spawning a cp process per file."""
+    monkeypatch.chdir(tmp_path)
+    num_files = 10000
+    files = write_provenance(tmp_path, num_files, 100)
+
+    for strategy in utils.FILE_STRATEGIES:
+        with benchmark_timings.time(strategy):
+            run_local.copy_output_files('wf', strategy=strategy)
+        assert len(list((tmp_path / 'outdir' / 'wf' / 'step 1 scatter' / 'out').iterdir())) == num_files
+        (tmp_path / 'outdir').rename(tmp_path / f'outdir_{strategy}')
+
+    # Only time a subset of the files, since spawning 10k processes is very slow.
+    num_files_cp = 1000
+    with benchmark_timings.time(f'cp ({num_files_cp} files)'):
+        copy_output_files_cp(files[:num_files_cp])
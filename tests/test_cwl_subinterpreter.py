@@ -0,0 +1,118 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from sophios import compiler, cwl_subinterpreter, plugins
+from sophios.schemas import wic_schema
+from sophios.wic_types import Json
+
+from .conftest import BenchmarkTimings
+
+CWL_CAT = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: cat
+inputs:
+  input_log_path:
+    type: File
+    inputBinding:
+      position: 1
+outputs:
+  output:
+    type: File
+    outputBinding:
+      glob: output.txt
+stdout: output.txt
+"""
+
+
+def write_log(cachedir: Path, hashed_dir: str, text: str, mtime: float) -> None:
+    (cachedir / hashed_dir).mkdir(parents=True, exist_ok=True)
+    (cachedir / hashed_dir / 'step.log').write_text(text, encoding='utf-8')
+    os.utime(cachedir / hashed_dir / 'step.log', (mtime, mtime))
+
+
+def new_session(tmp_path: Path, cwl_tool: str, args_vals: Json, inputs_file: str = '',
+                wic_files: Dict[str, str] | None = None) -> cwl_subinterpreter.SpeculativeSession:
+    (tmp_path / 'adapters').mkdir()
+    (tmp_path / 'adapters' / 'cat.cwl').write_text(CWL_CAT, encoding='utf-8')
+    (tmp_path / 'workflows').mkdir()
+    for name, contents in (wic_files or {}).items():
+        (tmp_path / 'workflows' / name).write_text(contents, encoding='utf-8')
+    tools = plugins.get_tools_cwl({'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}},
+                                  quiet=True, use_cache=False)
+    yml_paths = plugins.get_yml_paths({'search_paths_wic': {'global': [str(tmp_path / 'workflows')]}})
+    validator = wic_schema.get_validator(tools, list(yml_paths['global']), write_to_disk=False)
+    return cwl_subinterpreter.SpeculativeSession('', tmp_path / 'cachedir', cwl_tool, args_vals, tools, yml_paths,
+                                                 validator, tmp_path, 'poll', inputs_file)
+
+
+@pytest.mark.fast
+def test_speculative_session(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """The workflow is only compiled once per session, and each run uses the most recent file."""
+    monkeypatch.chdir(tmp_path)
+
+    compile_workflow = compiler.compile_workflow
+    compiles: List[Any] = []
+
+    def compile_workflow_spy(*args: Any, **kwargs: Any) -> Any:
+        compiles.append(args)
+        return compile_workflow(*args, **kwargs)
+
+    monkeypatch.setattr(compiler, 'compile_workflow', compile_workflow_spy)
+
+    cachedir = tmp_path / 'cachedir'
+    session = new_session(tmp_path, 'cat', {'input_log_path': '*.log'})
+    try:
+        for i in range(3):
+            write_log(cachedir, f'{i:032x}', f'log {i}', 10**6 + i)
+            session.run()
+            assert (tmp_path / 'autogenerated' / 'output.txt').read_text(encoding='utf-8') == f'log {i}'
+    finally:
+        session.close()
+    assert len(compiles) == 1
+    inputs_yml = (tmp_path / 'autogenerated' / 'cat_only_inputs.yml').read_text(encoding='utf-8')
+    assert str(cachedir / f'{2:032x}' / 'step.log') in inputs_yml
+
+
+@pytest.mark.fast
+def test_speculative_session_wic_and_inputs_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """A .wic workflow (i.e. with the canonical {'id': ...} step syntax) with additional --inputs_file inputs.
+    The compiled files only use the {cwl_tool}_only prefix, so they do not overwrite the main workflow."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'autogenerated').mkdir()
+    (tmp_path / 'autogenerated' / 'cat.cwl').write_text('main workflow', encoding='utf-8')
+    (tmp_path / 'extra_inputs.yml').write_text('extra_message: hello\n', encoding='utf-8')
+    args_vals = {'(1, cat)': {'in': {'input_log_path': '*.log'}}}
+    session = new_session(tmp_path, 'cat_log.wic', args_vals, str(tmp_path / 'extra_inputs.yml'),
+                          {'cat_log.wic': 'steps:\n  - id: cat\n'})
+    try:
+        write_log(tmp_path / 'cachedir', f'{0:032x}', 'log 0', 10**6)
+        session.run()
+    finally:
+        session.close()
+    assert (tmp_path / 'autogenerated' / 'output.txt').read_text(encoding='utf-8') == 'log 0'
+    inputs_yml = (tmp_path / 'autogenerated' / 'cat_log.wic_only_inputs.yml').read_text(encoding='utf-8')
+    assert 'extra_message: hello' in inputs_yml
+    assert (tmp_path / 'autogenerated' / 'cat.cwl').read_text(encoding='utf-8') == 'main workflow'
+    written = [p.relative_to(tmp_path / 'autogenerated').parts[0] for p in (tmp_path / 'autogenerated').rglob('*')
+               if p.suffix == '.cwl']
+    assert set(written) - {'cat.cwl'}
+    assert all(name.startswith('cat_log.wic_only') for name in set(written) - {'cat.cwl'})
+
+
+@pytest.mark.slow
+def test_speculative_session_latency(tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+                                     benchmark_timings: BenchmarkTimings) -> None:
+    """Benchmark the first run (which compiles the workflow and loads it into cwltool) versus the later runs."""
+    monkeypatch.chdir(tmp_path)
+    session = new_session(tmp_path, 'cat', {'input_log_path': '*.log'})
+    try:
+        for i in range(3):
+            write_log(tmp_path / 'cachedir', f'{i:032x}', f'log {i}', 10**6 + i)
+            with benchmark_timings.time(f'run {i}'):
+                session.run()
+            assert (tmp_path / 'autogenerated' / 'output.txt').read_text(encoding='utf-8') == f'log {i}'
+    finally:
+        session.close()
@@ -1,3 +1,4 @@
+import copy
 import json
 import subprocess as sub
 from pathlib import Path
@@ -199,13 +200,7 @@ def run_workflows(
     yaml_tree = sophios.ast.python_script_generate_cwl(yaml_tree, root_yml_dir_abs, tools_cwl)
 
     if args.cwl_inline_subworkflows:
-        while True:
-            # Inlineing changes the namespaces, so we have to get new namespaces after each inlineing operation.
-            namespaces_list = sophios.inlineing.get_inlineable_subworkflows(yaml_tree, tools_cwl, False, [])
-            if namespaces_list == []:
-                break
-
-            yaml_tree, _len_substeps = sophios.inlineing.inline_subworkflow(yaml_tree, namespaces_list[0])
+        yaml_tree = sophios.inlineing.inline_subworkflows(yaml_tree, tools_cwl)
 
         # Append _inline here instead of in input_output.write_to_disk()
         step_id = StepId(yaml_tree.step_id.stem + '_inline', yaml_tree.step_id.plugin_ns)
@@ -416,3 +411,29 @@ def test_inline_subworkflows(yml_path_str: str, yml_path: Path) -> None:
         sub_graph_fakeroot_nx = inline_sub_node_data.graph.networkx
         g_m = isomorphism.DiGraphMatcher(sub_graph_nx, sub_graph_fakeroot_nx)
         is_isomorphic_with_timeout(g_m, yml_path_str)
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize("yml_path_str, yml_path", yml_paths_tuples_not_large)
+def test_read_ast_fused(yml_path_str: str, yml_path: Path) -> None:
+    """Tests that the fused front-end pass is equivalent to read_ast_from_disk,
+    merge_yml_trees, and python_script_generate_cwl (run separately)."""
+    args = get_args(str(yml_path))
+    with open(yml_path, mode='r', encoding='utf-8') as y:
+        root_yaml_tree: Yaml = yaml.load(y.read(), Loader=wic_loader())
+    Path('autogenerated/').mkdir(parents=True, exist_ok=True)
+    wic_tag = {'wic': root_yaml_tree.get('wic', {})}
+    plugin_ns = wic_tag['wic'].get('namespace', 'global')
+    step_id = StepId(yml_path_str, plugin_ns)
+    root_yml_dir_abs = Path(args.yaml).parent.absolute()
+
+    y_t = YamlTree(step_id, copy.deepcopy(root_yaml_tree))
+    yaml_tree_raw = sophios.ast.read_ast_from_disk(args.homedir, y_t, yml_paths, tools_cwl, validator,
+                                                   args.ignore_validation_errors)
+    yaml_tree = sophios.ast.merge_yml_trees(yaml_tree_raw, {}, tools_cwl)
+    yaml_tree = sophios.ast.python_script_generate_cwl(yaml_tree, root_yml_dir_abs, tools_cwl)
+
+    y_t = YamlTree(step_id, copy.deepcopy(root_yaml_tree))
+    yaml_tree_fused = sophios.ast.read_ast_fused(args.homedir, y_t, yml_paths, tools_cwl, validator,
+                                                 args.ignore_validation_errors, root_yml_dir_abs)
+    assert yaml_tree_fused == yaml_tree
@@ -0,0 +1,94 @@
+import os
+import random
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from sophios.file_watcher import CachedirWatcher, file_watcher_glob
+
+from .conftest import BenchmarkTimings
+
+ENGINES = ['poll'] + (['inotify'] if sys.platform.startswith('linux') else [])
+
+
+def write_file(path: Path, text: str, mtime: float) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding='utf-8')
+    os.utime(path, (mtime, mtime))
+
+
+def mutate_cachedir(rng: random.Random, cachedir: Path, hashes: List[str], mtime: float) -> None:
+    """Randomly simulates cwltool running (and completing) steps with --cachedir"""
+    choice = rng.random()
+    running = [h for h in hashes if (cachedir / h).exists() and not (cachedir / f'{h}.status').read_text()]
+    if choice < 0.3 or not running:
+        h = f'{len(hashes):032x}'
+        hashes.append(h)
+        (cachedir / h).mkdir()
+        (cachedir / f'{h}.status').write_text('', encoding='utf-8')
+    elif choice < 0.8:
+        # Create or modify (i.e. append to) a file, maybe in a (hidden) subdirectory
+        subdir = rng.choice(['', 'sub', 'sub/subsub', '.hidden'])
+        name = rng.choice(['a.log', 'b.log', '.c.log', 'd.txt'])
+        write_file(cachedir / rng.choice(running) / subdir / name, str(rng.random()), mtime)
+    elif choice < 0.9:
+        (cachedir / f'{rng.choice(running)}.status').write_text('success', encoding='utf-8')
+    else:
+        # Failed steps are deleted and rerun.
+        shutil.rmtree(cachedir / rng.choice(running))
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('pattern', ['*.log', 'sub/*.log', '.*.log', '*/a.log'])
+def test_cachedir_watcher_matches_glob(tmp_path: Path, engine: str, pattern: str) -> None:
+    cachedir = tmp_path / 'cachedir'
+    rng = random.Random(0)
+    hashes: List[str] = []
+    watcher = CachedirWatcher(cachedir, pattern, engine)
+    assert watcher.engine == engine
+    prev_files: Dict[str, float] = {}
+    try:
+        # The cachedir may not exist yet.
+        assert watcher.changed_files() == file_watcher_glob(cachedir, pattern, prev_files) == {}
+        cachedir.mkdir()
+        for i in range(300):
+            mutate_cachedir(rng, cachedir, hashes, 10**6 + i)
+            expected = file_watcher_glob(cachedir, pattern, prev_files)
+            assert watcher.changed_files() == expected, i
+            prev_files = {**prev_files, **expected}
+    finally:
+        watcher.close()
+    assert prev_files
+    # Completed steps are no longer watched.
+    completed = [h for h in hashes if (cachedir / f'{h}.status').read_text() == 'success']
+    assert completed
+    assert not any(str(cachedir / h) in watcher.dirs for h in completed)
+
+
+@pytest.mark.slow
+def test_cachedir_watcher_scaling(tmp_path: Path, benchmark_timings: BenchmarkTimings) -> None:
+    """Benchmark polling a large cachedir (of mostly completed steps) versus globbing the entire cachedir."""
+    cachedir = tmp_path / 'cachedir'
+    for i in range(2000):
+        h = f'{i:032x}'
+        for name in ['a.log', 'b.txt', 'sub/c.txt', 'sub/subsub/d.txt']:
+            write_file(cachedir / h / name, name, 10**6)
+        (cachedir / f'{h}.status').write_text('success' if i > 0 else '', encoding='utf-8')
+
+    for k, engine in enumerate(ENGINES + ['glob']):
+        watcher = CachedirWatcher(cachedir, '*.log', engine if engine != 'glob' else 'poll')
+        prev_files = watcher.changed_files()
+        with benchmark_timings.time(engine):
+            for i in range(10):
+                write_file(cachedir / f'{0:032x}' / 'a.log', str(i), 10**6 + 100 * k + i + 1)
+                if engine == 'glob':
+                    changed_files = file_watcher_glob(cachedir, '*.log', prev_files)
+                    prev_files = {**prev_files, **changed_files}
+                else:
+                    changed_files = watcher.changed_files()
+                assert list(changed_files) == [str(cachedir / f'{0:032x}' / 'a.log')]
+        watcher.close()
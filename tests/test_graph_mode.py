@@ -0,0 +1,127 @@
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pytest
+
+from sophios import ast, cli, compiler, plugins
+from sophios.schemas import wic_schema
+from sophios.utils_graphs import get_graph_reps
+from sophios.wic_types import CompilerInfo, GraphReps, StepId, Tools, Yaml, YamlTree
+
+from .conftest import BenchmarkTimings
+
+CWL_TOUCH = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: touch
+inputs:
+  filename:
+    type: string
+    inputBinding:
+      position: 1
+outputs:
+  file:
+    type: File
+    outputBinding:
+      glob: $(inputs.filename)
+"""
+
+CWL_WC = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: wc
+inputs:
+  file:
+    type: File
+    inputBinding:
+      position: 1
+outputs:
+  stdout:
+    type: stdout
+"""
+
+
+def load_steps(tmp_path: Path, yml: Yaml) -> Tuple[YamlTree, Tools]:
+    tools = plugins.get_tools_cwl({'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}},
+                                  quiet=True, use_cache=False)
+    validator = wic_schema.get_validator(tools, [], write_to_disk=False)
+    yaml_tree = YamlTree(StepId('steps', 'global'), yml)
+    yaml_tree = ast.read_ast_from_disk('', yaml_tree, {}, tools, validator, False)
+    yaml_tree = ast.merge_yml_trees(yaml_tree, {}, tools)
+    return (yaml_tree, tools)
+
+
+def compile_steps(yaml_tree: YamlTree, tools: Tools, graph_mode: str) -> Tuple[CompilerInfo, GraphReps]:
+    compiler_options, graph_settings, yaml_tag_paths = cli.get_dicts_for_compilation()
+    graph_settings['graph_mode'] = graph_mode
+    # Show the inputs and outputs so that every kind of node and edge is created.
+    graph_settings['graph_show_inputs'] = True
+    graph_settings['graph_show_outputs'] = True
+    graph = get_graph_reps('steps')
+    compiler_info = compiler.compile_workflow(yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
+                                              [], [graph], {}, {}, {}, {}, dict(tools), True, True, True)
+    return (compiler_info, graph)
+
+
+def write_adapters(tmp_path: Path) -> None:
+    (tmp_path / 'adapters').mkdir()
+    (tmp_path / 'adapters' / 'touch.cwl').write_text(CWL_TOUCH, encoding='utf-8')
+    (tmp_path / 'adapters' / 'wc.cwl').write_text(CWL_WC, encoding='utf-8')
+
+
+def touch_wc_steps(n: int) -> Yaml:
+    steps: List[Yaml] = []
+    for i in range(n):
+        steps += [{'id': 'touch', 'in': {'filename': {'wic_inline_input': f'file{i}.txt'}}}, {'id': 'wc'}]
+    return {'steps': steps}
+
+
+@pytest.mark.fast
+def test_graph_modes(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """The graph mode must only affect the graphs, and never the compiled CWL."""
+    monkeypatch.chdir(tmp_path)
+    write_adapters(tmp_path)
+
+    (yaml_tree, tools) = load_steps(tmp_path, touch_wc_steps(3))
+    (compiler_info_full, graph_full) = compile_steps(yaml_tree, tools, 'full')
+    (compiler_info_graphdata, graph_graphdata) = compile_steps(yaml_tree, tools, 'graphdata')
+    (compiler_info_none, graph_none) = compile_steps(yaml_tree, tools, 'none')
+
+    compiled_cwl = compiler_info_full.rose.data.compiled_cwl
+    assert compiler_info_graphdata.rose.data.compiled_cwl == compiled_cwl
+    assert compiler_info_none.rose.data.compiled_cwl == compiled_cwl
+
+    assert len(graph_full.networkx.nodes) > 0 and len(graph_full.graphdata.edges) > 0
+    assert graph_graphdata.graphdata.nodes == graph_full.graphdata.nodes
+    assert graph_graphdata.graphdata.edges == graph_full.graphdata.edges
+    assert len(graph_graphdata.networkx.nodes) == 0
+    assert graph_graphdata.graphviz.body == get_graph_reps('steps').graphviz.body
+
+    assert len(graph_none.networkx.nodes) == 0
+    assert not graph_none.graphdata.nodes and not graph_none.graphdata.edges
+    assert graph_none.graphviz.body == get_graph_reps('steps').graphviz.body
+
+
+@pytest.mark.slow
+def test_graph_mode_savings(tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+                            benchmark_timings: BenchmarkTimings) -> None:
+    """Benchmark the compile time and the peak memory usage of each graph mode on a large workflow."""
+    monkeypatch.chdir(tmp_path)
+    write_adapters(tmp_path)
+
+    (yaml_tree, tools) = load_steps(tmp_path, touch_wc_steps(200))
+    compile_steps(yaml_tree, tools, 'none')  # warm up (i.e. the caches)
+    peaks: Dict[str, int] = {}
+    for graph_mode in ['full', 'graphdata', 'none']:
+        for _ in range(3):
+            with benchmark_timings.time(graph_mode):
+                compile_steps(yaml_tree, tools, graph_mode)
+        tracemalloc.start()
+        compile_steps(yaml_tree, tools, graph_mode)
+        (_, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks[graph_mode] = peak
+
+    # Unlike the timings, the allocations are deterministic.
+    report = ', '.join(f'{mode}: {peak / 2**20:.1f}MiB' for mode, peak in peaks.items())
+    print(report)
+    assert peaks['none'] < peaks['graphdata'] < peaks['full'], report
@@ -0,0 +1,170 @@
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from sophios import ast, cli, compiler, inference, plugins
+from sophios.schemas import wic_schema
+from sophios.utils_graphs import get_graph_reps
+from sophios.wic_types import CompilerInfo, NodeData, StepId, Yaml, YamlTree
+
+CWL_PRODUCE = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: touch
+arguments: [a.txt, b.txt, c.log]
+inputs: {}
+outputs:
+  output_file:
+    type: File
+    format: edam:format_1000
+    outputBinding:
+      glob: a.txt
+  output_aux_file:
+    type: File
+    format: edam:format_2000
+    outputBinding:
+      glob: b.txt
+  output_log_file:
+    type: File
+    outputBinding:
+      glob: c.log
+"""
+
+CWL_CONSUME = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: cp
+arguments: [c.txt]
+inputs:
+  input_file:
+    type: File
+    format: [edam:format_1000]
+    inputBinding:
+      position: 1
+  input_any:
+    type: File
+    inputBinding:
+      position: 2
+  input_aux:
+    type: File
+    format: [edam:format_2000]
+    inputBinding:
+      position: 3
+outputs:
+  output_other:
+    type: File
+    format: edam:format_3000
+    outputBinding:
+      glob: c.txt
+"""
+
+
+def compile_steps(tmp_path: Path, yml: Yaml) -> CompilerInfo:
+    tools = plugins.get_tools_cwl({'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}},
+                                  quiet=True, use_cache=False)
+    validator = wic_schema.get_validator(tools, [], write_to_disk=False)
+    yaml_tree = YamlTree(StepId('steps', 'global'), yml)
+    # NOTE: The schema does not (yet) allow user-supplied wic: inference: tags.
+    yaml_tree = ast.read_ast_from_disk('', yaml_tree, {}, tools, validator, True)
+    yaml_tree = ast.merge_yml_trees(yaml_tree, {}, tools)
+
+    compiler_options, graph_settings, yaml_tag_paths = cli.get_dicts_for_compilation()
+    graph = get_graph_reps('steps')
+    return compiler.compile_workflow(yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
+                                     [], [graph], {}, {}, {}, {}, tools, True, True, True)
+
+
+def write_adapters(tmp_path: Path) -> None:
+    (tmp_path / 'adapters').mkdir()
+    (tmp_path / 'adapters' / 'produce.cwl').write_text(CWL_PRODUCE, encoding='utf-8')
+    (tmp_path / 'adapters' / 'consume.cwl').write_text(CWL_CONSUME, encoding='utf-8')
+
+
+def summarize(compiler_info: CompilerInfo) -> List[Any]:
+    n_d: NodeData = compiler_info.rose.data
+    return [n_d.compiled_cwl, n_d.inputs_workflow, list(n_d.graph.networkx.edges), compiler_info.env]
+
+
+@pytest.mark.fast
+def test_output_index_matches_linear_scan(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Inference with the index must give exactly the same results as scanning all of the previous steps."""
+    monkeypatch.chdir(tmp_path)
+    write_adapters(tmp_path)
+    steps = [{'id': 'produce'}, {'id': 'consume'}, {'id': 'consume'}, {'id': 'produce'},
+             {'id': 'consume'}, {'id': 'consume'}, {'id': 'consume'}]
+    # Prevent inference from matching anything before the 5th step.
+    wic_steps = {'(5, consume)': {'wic': {'inference': {'output_other': 'break'}}}}
+    yml = {'steps': steps, 'wic': {'steps': wic_steps}}
+
+    compiler_info = compile_steps(tmp_path, yml)
+    monkeypatch.setattr(inference, 'OutputIndex', lambda: None)
+    compiler_info_linear = compile_steps(tmp_path, yml)
+    assert summarize(compiler_info) == summarize(compiler_info_linear)
+
+    # Due to the break, the inputs of the 6th step cannot be matched with the produce step.
+    steps_cwl = compiler_info.rose.data.compiled_cwl['steps']
+    assert steps_cwl[5]['in']['input_any'] == 'steps__step__5__consume/output_other'
+    assert steps_cwl[5]['in']['input_file'] == 'steps__step__6__consume___input_file'
+    assert steps_cwl[4]['in']['input_file'] == 'steps__step__4__produce/output_file'
+
+
+@pytest.mark.fast
+def test_output_index_candidates() -> None:
+    index = inference.OutputIndex()
+    file_id, string_id = inference.intern_type('File'), inference.intern_type('string')
+    index.steps_by_type = {file_id: [0, 2, 5], string_id: [1, 3]}
+    index.steps_by_type_format = {(file_id, 'edam:format_1000'): [0, 5], (file_id, 'edam:format_2000'): [2]}
+    index.num_steps = 6
+
+    assert list(index.candidates(6, 'File', [])) == [5, 2, 0]
+    assert list(index.candidates(5, ['null', 'File', 'string'], [])) == [3, 2, 1, 0]
+    assert list(index.candidates(6, 'File', ['edam:format_2000'])) == [2]
+    assert list(index.candidates(6, 'File', ['edam:format_2000', 'edam:format_1000'])) == [5, 2, 0]
+    # A single format string is not indexed, so only filter on the type.
+    assert list(index.candidates(6, 'File', 'edam:format_2000')) == [5, 2, 0]
+
+    index.steps_break = [2]
+    assert list(index.candidates(6, 'File', [])) == [5, 2]
+    assert list(index.candidates(2, 'File', [])) == [0]
+
+
+@pytest.mark.fast
+def test_types_match_interned() -> None:
+    types = ['File', 'string', ['null', 'File'], ['File', 'null'], ['null', 'string'], [],
+             {'type': 'array', 'items': 'File'}, {'items': 'File', 'type': 'array'},
+             {'type': 'array', 'items': ['null', 'File']}, ['null', {'type': 'array', 'items': 'File'}]]
+    for in_type in types:
+        for out_type in types:
+            expected = inference.types_match_uncached(in_type, out_type)
+            assert inference.types_match(in_type, out_type) == expected
+            # The second time, the result is cached.
+            assert inference.types_match(in_type, out_type) == expected
+            # Every type with intersecting keys must match (so that OutputIndex is conservative).
+            keys_intersect = bool(set(inference.type_keys(in_type)) & set(inference.type_keys(out_type)))
+            assert keys_intersect == expected
+
+    # Equal types must be interned to the same integer, regardless of key order.
+    assert inference.intern_type(types[6]) == inference.intern_type(types[7])
+    assert inference.intern_type(types[2]) != inference.intern_type(types[3])
+    assert inference.types_match_cache[(inference.intern_type('File'), inference.intern_type(['null', 'File']))]
+
+
+def test_output_index_scaling(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """The number of previous steps scanned per inference should not depend on the number of steps."""
+    monkeypatch.chdir(tmp_path)
+    write_adapters(tmp_path)
+
+    calls = [0]
+    match_step_outputs = inference.match_step_outputs
+
+    def match_step_outputs_counter(*args: Any) -> Any:
+        calls[0] += 1
+        return match_step_outputs(*args)
+
+    monkeypatch.setattr(inference, 'match_step_outputs', match_step_outputs_counter)
+
+    for n in (16, 64, 256):
+        calls[0] = 0
+        # Every consume step matches two of its three inputs with the produce step at the very beginning.
+        # (The third input is matched with the immediately preceding step.)
+        compile_steps(tmp_path, {'steps': [{'id': 'produce'}] + [{'id': 'consume'} for _ in range(n)]})
+        assert calls[0] == 3 * n
@@ -0,0 +1,100 @@
+import copy
+import random
+from typing import Dict, List
+
+import pytest
+import yaml
+
+from sophios import inlineing
+from sophios.wic_types import StepId, Yaml, YamlTree
+
+from .conftest import BenchmarkTimings
+
+
+def random_workflow(rng: random.Random, depth: int, names: List[str]) -> Yaml:
+    """Generates a random yml AST (as returned by merge_yml_trees) with nested subworkflows,
+    non-inlineable subworkflows, ~ syntax, and wic: tags which refer to (nested) steps."""
+    steps: List[Yaml] = []
+    wic_steps: Dict[str, Yaml] = {}
+    for i in range(rng.randint(1, 4)):
+        if depth > 0 and rng.random() < 0.6:
+            step_key = f'sub{len(names)}.wic'
+            names.append(step_key)
+            subtree = random_workflow(rng, depth - 1, names)
+            parentargs = {'in': {'x': rng.choice(['~x', f'val{i}'])}}
+            steps.append({'id': step_key, 'subtree': subtree, 'parentargs': parentargs})
+        else:
+            step_key = rng.choice(['touch', 'wc'])
+            steps.append({'id': step_key, 'in': {'file': rng.choice(['~x', f'file{i}.txt'])}})
+        if rng.random() < 0.5:
+            wic_steps[f'({i+1}, {step_key})'] = {'wic': {'graphviz': {'label': f'{step_key} {i}'}}}
+        if rng.random() < 0.3 and 'subtree' in steps[-1]:
+            sub_steps = steps[-1]['subtree']['steps']
+            j = rng.randrange(len(sub_steps))
+            wic_steps.setdefault(f'({i+1}, {step_key})', {}).setdefault('wic', {})['steps'] = \
+                {f'({j+1}, {sub_steps[j]["id"]})': {'wic': {'graphviz': {'label': 'overridden'}}}}
+    if rng.random() < 0.2:
+        # Tags which do not refer to any step are still re-indexed.
+        index = rng.randint(1, len(steps) + 2)
+        wic_steps[f'({index},other)'] = {'wic': {'graphviz': {'label': 'dangling'}}}
+    yml: Yaml = {'inputs': {'x': {'type': 'string'}}, 'steps': steps}
+    wic: Yaml = {'steps': wic_steps} if wic_steps else {}
+    if rng.random() < 0.2:
+        wic['inlineable'] = False
+    if wic:
+        yml['wic'] = wic
+    return yml
+
+
+@pytest.mark.fast
+def test_inline_subworkflows_matches_iterative() -> None:
+    rng = random.Random(0)
+    for _ in range(200):
+        yml = random_workflow(rng, 3, [])
+        del yml['inputs']
+        yaml_tree = YamlTree(StepId('root', 'global'), yml)
+        yaml_tree_orig = copy.deepcopy(yaml_tree)
+
+        inline_yaml_tree = inlineing.inline_subworkflows(yaml_tree, {})
+        assert yaml_tree == yaml_tree_orig
+        inline_yaml_tree_iterative = inlineing.inline_subworkflows_iterative(yaml_tree, {})
+        # Compare the serialized yml, since the order of the wic: steps: tags matters.
+        assert yaml.dump(inline_yaml_tree.yml) == yaml.dump(inline_yaml_tree_iterative.yml)
+        assert inline_yaml_tree.step_id == inline_yaml_tree_iterative.step_id
+
+
+@pytest.mark.fast
+def test_inline_subworkflows_shared_subtrees() -> None:
+    """Subtrees may be shared (i.e. by the compiler), so they must not be mutated in-place."""
+    sub: Yaml = {'inputs': {'x': {'type': 'string'}}, 'steps': [{'id': 'touch', 'in': {'file': '~x'}}]}
+    steps = [{'id': 'sub.wic', 'subtree': sub, 'parentargs': {'in': {'x': f'{i}.txt'}}} for i in range(3)]
+    yaml_tree = YamlTree(StepId('root', 'global'), {'steps': steps})
+
+    (_, yml) = inlineing.inline_subworkflows(yaml_tree, {})
+    assert [step['in']['file'] for step in yml['steps']] == ['0.txt', '1.txt', '2.txt']
+    assert sub['steps'][0]['in']['file'] == '~x'
+
+
+def chain_workflow(n: int) -> YamlTree:
+    """A workflow with n (non-nested) subworkflows, each of which contains a nested subworkflow."""
+    def sub(depth: int) -> Yaml:
+        steps: List[Yaml] = [{'id': 'touch'}, {'id': 'wc'}]
+        if depth > 0:
+            steps.append({'id': 'sub.wic', 'subtree': sub(depth - 1), 'parentargs': {}})
+        return {'steps': steps}
+    steps = [{'id': 'sub.wic', 'subtree': sub(1), 'parentargs': {}} for _ in range(n)]
+    wic_steps = {f'({i+1}, sub.wic)': {'wic': {'graphviz': {'label': str(i)}}} for i in range(n)}
+    return YamlTree(StepId('root', 'global'), {'steps': steps, 'wic': {'steps': wic_steps}})
+
+
+@pytest.mark.slow
+def test_inline_subworkflows_scaling(benchmark_timings: BenchmarkTimings) -> None:
+    """Benchmark the bulk inliner against the (quadratic) iterative inliner on increasingly large workflows."""
+    for n in (8, 32, 128):
+        yaml_tree = chain_workflow(n)
+        with benchmark_timings.time(f'{n} bulk'):
+            inline_yaml_tree = inlineing.inline_subworkflows(yaml_tree, {})
+        with benchmark_timings.time(f'{n} iterative'):
+            inline_yaml_tree_iterative = inlineing.inline_subworkflows_iterative(yaml_tree, {})
+        assert len(inline_yaml_tree.yml['steps']) == 4 * n
+        assert inline_yaml_tree == inline_yaml_tree_iterative
@@ -0,0 +1,167 @@
+from pathlib import Path
+import time
+from typing import Any, Dict, List
+
+import networkx as nx
+import pytest
+
+from sophios import ast, cli, compiler, inference, plugins, utils
+from sophios.schemas import wic_schema
+from sophios.utils_graphs import get_graph_reps
+from sophios.wic_types import CompilerInfo, NodeData, StepId, Yaml, YamlTree
+
+# NOTE: Include a chain which needs more than 100 insertions (the former fixed iteration limit).
+CHAIN_SIZES = (8, 16, 32, 64, 128)
+
+CWL_SOURCE = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: touch
+arguments: [a.txt]
+inputs: {}
+outputs:
+  out:
+    type: File
+    format: edam:format_1000
+    outputBinding:
+      glob: a.txt
+"""
+
+CWL_CONSUME = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: cp
+arguments: [a.txt]
+inputs:
+  file:
+    type: File
+    format: [edam:format_2000]
+    inputBinding:
+      position: 1
+outputs:
+  out:
+    type: File
+    format: edam:format_1000
+    outputBinding:
+      glob: a.txt
+"""
+
+CWL_CONVERT = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: cp
+arguments: [b.txt]
+inputs:
+  file:
+    type: File
+    format: [edam:format_1000]
+    inputBinding:
+      position: 1
+outputs:
+  out:
+    type: File
+    format: edam:format_2000
+    outputBinding:
+      glob: b.txt
+"""
+
+
+def chain_yml(n: int) -> Yaml:
+    """A chain of n steps, each of which (except the first) needs a conversion step inserted before it."""
+    steps = [{'id': 'source'}] + [{'id': 'consume'} for _ in range(n - 1)]
+    # Prevent inference from matching the output of an earlier (inserted) conversion step.
+    wic_steps = {f'({i+1}, consume)': {'wic': {'inference': {'out': 'break'}}} for i in range(1, n)}
+    return {'steps': steps, 'wic': {'steps': wic_steps}}
+
+
+def compile_chain(tmp_path: Path, yml: Yaml, insert_steps_automatically: bool) -> CompilerInfo:
+    tools = plugins.get_tools_cwl({'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}},
+                                  quiet=True, use_cache=False)
+    validator = wic_schema.get_validator(tools, [], write_to_disk=False)
+    yaml_tree = YamlTree(StepId('chain', 'global'), yml)
+    # NOTE: The schema does not (yet) allow user-supplied wic: inference: tags.
+    yaml_tree = ast.read_ast_from_disk('', yaml_tree, {}, tools, validator, True)
+    yaml_tree = ast.merge_yml_trees(yaml_tree, {}, tools)
+
+    compiler_options, graph_settings, yaml_tag_paths = cli.get_dicts_for_compilation()
+    compiler_options['insert_steps_automatically'] = insert_steps_automatically
+    graph = get_graph_reps('chain')
+    return compiler.compile_workflow(yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
+                                     [], [graph], {}, {}, {}, {}, tools, True, True, True)
+
+
+def write_adapters(tmp_path: Path) -> None:
+    (tmp_path / 'adapters').mkdir()
+    (tmp_path / 'adapters' / 'source.cwl').write_text(CWL_SOURCE, encoding='utf-8')
+    (tmp_path / 'adapters' / 'consume.cwl').write_text(CWL_CONSUME, encoding='utf-8')
+    (tmp_path / 'adapters' / 'insert_steps_automatically_convert.cwl').write_text(CWL_CONVERT, encoding='utf-8')
+
+
+def summarize(compiler_info: CompilerInfo) -> List[Any]:
+    n_d: NodeData = compiler_info.rose.data
+    graph = n_d.graph
+    return [n_d.compiled_cwl, n_d.inputs_workflow, graph.graphviz.body,
+            list(graph.networkx.nodes), list(graph.networkx.edges),
+            graph.graphdata.nodes, graph.graphdata.edges, compiler_info.env]
+
+
+@pytest.mark.fast
+def test_incremental_insertions_match_full_compilation(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Resuming after each insertion must give the same result as compiling the final workflow from scratch."""
+    monkeypatch.chdir(tmp_path)
+    write_adapters(tmp_path)
+
+    compiler_info = compile_chain(tmp_path, chain_yml(4), True)
+    yml_inserted = compiler_info.rose.data.yml
+    assert utils.get_steps_keys(yml_inserted['steps']) == ['source'] + \
+        ['insert_steps_automatically_convert', 'consume'] * 3
+
+    compiler_info_full = compile_chain(tmp_path, yml_inserted, False)
+    assert summarize(compiler_info) == summarize(compiler_info_full)
+
+
+def test_insertion_scaling(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Compile an n-step chain which needs n-1 insertions at increasing sizes and guard scaling behavior.
+
+    Each insertion used to recompile the entire workflow from scratch, so the
+    total amount of work was quadratic in the number of insertions. Since
+    compilation now resumes from the step at which the insertion occurred, the
+    number of edge inference calls should be linear in the number of steps.
+    Similarly, the checkpoints before each step must not copy the graphs.
+    """
+    monkeypatch.chdir(tmp_path)
+    write_adapters(tmp_path)
+
+    calls = [0]
+    perform_edge_inference = inference.perform_edge_inference
+
+    def perform_edge_inference_counter(*args: Any) -> Yaml:
+        calls[0] += 1
+        return perform_edge_inference(*args)
+
+    monkeypatch.setattr(inference, 'perform_edge_inference', perform_edge_inference_counter)
+
+    graph_copies = [0]
+    digraph_copy = nx.DiGraph.copy
+
+    def digraph_copy_counter(self: nx.DiGraph, as_view: bool = False) -> nx.DiGraph:
+        graph_copies[0] += 1
+        return digraph_copy(self, as_view)
+
+    monkeypatch.setattr(nx.DiGraph, 'copy', digraph_copy_counter)
+
+    counts: Dict[int, int] = {}
+    times: Dict[int, float] = {}
+    for n in CHAIN_SIZES:
+        calls[0] = 0
+        start = time.perf_counter()
+        compiler_info = compile_chain(tmp_path, chain_yml(n), True)
+        times[n] = time.perf_counter() - start
+        counts[n] = calls[0]
+        assert len(compiler_info.rose.data.yml['steps']) == 2 * n - 1
+
+    # Each of the n-1 consume steps and n-1 inserted steps performs inference
+    # once, plus once more for each consume step which triggers an insertion.
+    timing_report = ', '.join(f'{n}: {counts[n]} calls {times[n]:.3f}s ({1000 * times[n] / n:.2f}ms/step)'
+                              for n in CHAIN_SIZES)
+    print(timing_report)
+    for n in CHAIN_SIZES:
+        assert counts[n] == 3 * (n - 1), timing_report
+    assert graph_copies[0] == 0, timing_report
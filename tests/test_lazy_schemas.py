@@ -0,0 +1,76 @@
+from pathlib import Path
+from typing import Any, List
+
+import jsonschema
+import pytest
+
+from sophios import plugins
+from sophios.schemas import wic_schema
+from sophios.wic_types import Json, StepId
+
+CWL_TOUCH = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: touch
+inputs:
+  filename:
+    type: string
+    inputBinding:
+      position: 1
+outputs:
+  file:
+    type: File
+    outputBinding:
+      glob: $(inputs.filename)
+"""
+
+VALID_YMLS: List[Json] = [{'steps': [{'id': 'touch0', 'in': {'filename': 'a.txt'}}]},
+                          {'steps': [{'id': 'touch1'}, {'id': 'touch2', 'in': {'filename': 'b.txt'}}]},
+                          {'steps': [{'id': 'unknown', 'in': {'anything': 1}}]}]
+INVALID_YMLS: List[Json] = [{'steps': ['touch0']},
+                            {'steps': [{'id': 'touch0'}], 'not_a_cwl_tag': 1}]
+
+
+@pytest.mark.fast
+def test_lazy_validator(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Only the schemas of the tools which are actually used should be generated."""
+    monkeypatch.chdir(tmp_path)
+    for i in range(10):
+        (tmp_path / 'adapters' / f'touch{i}.cwl').parent.mkdir(exist_ok=True)
+        (tmp_path / 'adapters' / f'touch{i}.cwl').write_text(CWL_TOUCH, encoding='utf-8')
+    tools = plugins.get_tools_cwl({'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}},
+                                  quiet=True, use_cache=False)
+    monkeypatch.setattr(wic_schema, 'tool_schemas', {})
+
+    calls: List[str] = []
+    cwl_schema = wic_schema.cwl_schema
+
+    def cwl_schema_spy(name: str, *args: Any) -> Json:
+        calls.append(name)
+        return cwl_schema(name, *args)
+
+    monkeypatch.setattr(wic_schema, 'cwl_schema', cwl_schema_spy)
+
+    validator = wic_schema.get_validator(tools, [], write_to_disk=False)
+    assert not calls
+    for yml in VALID_YMLS:
+        validator.validate(yml)
+    assert sorted(set(calls)) == ['touch0', 'touch1', 'touch2']
+    for yml in INVALID_YMLS:
+        with pytest.raises(jsonschema.ValidationError):
+            validator.validate(yml)
+
+    # The eager (i.e. inlined) schema must accept and reject exactly the same yml files.
+    (tmp_path / 'autogenerated' / 'schemas').mkdir(parents=True, exist_ok=True)
+    validator_eager = wic_schema.get_validator(tools, [], write_to_disk=True)
+    for yml in VALID_YMLS:
+        validator_eager.validate(yml)
+    for yml in INVALID_YMLS:
+        with pytest.raises(jsonschema.ValidationError):
+            validator_eager.validate(yml)
+
+    # The tool schemas are cached (until the tools change).
+    assert calls.count('touch0') == 1
+    touch0 = StepId('touch0', 'global')
+    tools[touch0] = tools[touch0]._replace(cwl=dict(tools[touch0].cwl))
+    wic_schema.get_validator(tools, [], write_to_disk=True)
+    assert calls.count('touch0') == 2
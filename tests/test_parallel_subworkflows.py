@@ -0,0 +1,164 @@
+import os
+from pathlib import Path
+import threading
+from typing import Any, List, Tuple
+
+import pytest
+import yaml
+
+from sophios import ast, cli, compiler, plugins, utils
+from sophios.schemas import wic_schema
+from sophios.utils_graphs import get_graph_reps
+from sophios.utils_yaml import wic_loader
+from sophios.wic_types import CompilerInfo, StepId, Yaml, YamlTree
+
+from .conftest import BenchmarkTimings
+from .test_ast_loading import CWL_TOUCH
+from .test_cwl_subinterpreter import CWL_CAT
+
+SUB_WIC = """steps:
+  - id: touch
+    in:
+      filename: !ii sub.txt
+  - id: cat
+"""
+
+INNER_WIC = """steps:
+  - id: sub.wic
+  - id: cat
+"""
+
+
+def root_wic(num_subworkflows: int, explicit_edges: bool = False) -> str:
+    steps = ['  - id: touch\n    in:\n      filename: !ii root.txt\n' + ('    out:\n      - file: !& file\n'
+                                                                         if explicit_edges else '')]
+    steps += ['  - id: inner.wic\n' if i % 3 == 2 else '  - id: sub.wic\n' for i in range(num_subworkflows)]
+    if explicit_edges:
+        steps.append('  - id: cat\n    in:\n      input_log_path: !* file\n')
+    return 'steps:\n' + ''.join(steps)
+
+
+def write_workflows(tmp_path: Path) -> None:
+    (tmp_path / 'adapters').mkdir()
+    (tmp_path / 'workflows').mkdir()
+    (tmp_path / 'adapters' / 'touch.cwl').write_text(CWL_TOUCH, encoding='utf-8')
+    (tmp_path / 'adapters' / 'cat.cwl').write_text(CWL_CAT, encoding='utf-8')
+    (tmp_path / 'workflows' / 'sub.wic').write_text(SUB_WIC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'inner.wic').write_text(INNER_WIC, encoding='utf-8')
+
+
+def compile_root(tmp_path: Path, root_wic_str: str, parallel: bool) -> CompilerInfo:
+    tools = plugins.get_tools_cwl({'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}},
+                                  quiet=True, use_cache=False)
+    yml_paths = plugins.get_yml_paths({'search_paths_wic': {'global': [str(tmp_path / 'workflows')]}})
+    validator = wic_schema.get_validator(tools, utils.flatten([list(p) for p in yml_paths.values()]),
+                                         write_to_disk=False)
+    yaml_tree = YamlTree(StepId('root', 'global'), yaml.load(root_wic_str, Loader=wic_loader()))
+    yaml_tree = ast.read_ast_fused('', yaml_tree, yml_paths, tools, validator, False, tmp_path)
+
+    compiler_options, graph_settings, yaml_tag_paths = cli.get_dicts_for_compilation()
+    compiler_options['parallel_subworkflows'] = parallel
+    compiler_options['memoize_subworkflows'] = False
+    return compiler.compile_workflow(yaml_tree, compiler_options, graph_settings, yaml_tag_paths, [],
+                                     [get_graph_reps('root')], {}, {}, {}, {}, tools, True,
+                                     relative_run_path=True, testing=True)
+
+
+def summarize(compiler_info: CompilerInfo) -> Tuple[Any, ...]:
+    """Everything observable about the compiled workflow (except for object identities)"""
+    node_data_lst = utils.flatten_rose_tree(compiler_info.rose)
+    nodes: List[Any] = [(n.namespaces, n.name, n.compiled_cwl, n.workflow_inputs_file, n.explicit_edge_defs,
+                         n.explicit_edge_calls, n.inputs_workflow, n.step_name_1) for n in node_data_lst]
+    graph = compiler_info.rose.data.graph
+    return (nodes, compiler_info.env, graph.graphviz.body, list(graph.networkx.edges),
+            graph.graphdata.nodes, graph.graphdata.edges)
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize('explicit_edges', [False, True])
+def test_parallel_subworkflows(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, explicit_edges: bool) -> None:
+    monkeypatch.chdir(tmp_path)
+    write_workflows(tmp_path)
+    monkeypatch.setattr(compiler, 'max_workers_subworkflows', 2)
+
+    precompiled: List[List[int]] = []
+    precompile_subworkflows = compiler.precompile_subworkflows
+
+    def precompile_subworkflows_spy(independent: List[int], *args: Any) -> Any:
+        precompiled.append(independent)
+        return precompile_subworkflows(independent, *args)
+
+    monkeypatch.setattr(compiler, 'precompile_subworkflows', precompile_subworkflows_spy)
+    root_wic_str = root_wic(6, explicit_edges)
+    compiler_info_parallel = compile_root(tmp_path, root_wic_str, True)
+    compiler_info = compile_root(tmp_path, root_wic_str, False)
+    # Explicit edges can connect any of the subworkflows, so they are compiled sequentially.
+    assert precompiled == ([] if explicit_edges else [[1, 2, 3, 4, 5, 6]])
+    assert summarize(compiler_info_parallel) == summarize(compiler_info)
+
+    # The worker processes are forked, so if there are other threads, compile sequentially instead.
+    precompiled.clear()
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        assert summarize(compile_root(tmp_path, root_wic_str, True)) == summarize(compiler_info)
+    finally:
+        stop.set()
+        thread.join()
+    assert not precompiled
+
+
+@pytest.mark.fast
+def test_independent_subworkflows() -> None:
+    yaml_tree: Yaml = {'inputs': {'message': {'type': 'string'}},
+                       'steps': [{'id': 'a.wic', 'subtree': {'steps': [{'id': 'touch'}]}},
+                                 {'id': 'touch'},
+                                 {'id': 'b.wic', 'subtree': {'steps': [{'id': 'echo', 'in': {'message': 'message'}}]}},
+                                 {'id': 'c.wic', 'subtree': {'steps': [{'id': 'root.wic'}]}},
+                                 {'id': 'd.wic', 'subtree': {'doc': 'message', 'steps': [
+                                     {'id': 'touch', 'in': {'filename': {'wic_inline_input': 'message'}}}]}}]}
+    compiler_options, _, _ = cli.get_dicts_for_compilation()
+
+    def independent(**kwargs: Any) -> List[int]:
+        steps_keys = utils.get_steps_keys(yaml_tree['steps'])
+        subkeys = utils.get_subkeys(steps_keys)
+        return compiler.get_independent_subworkflows(yaml_tree, steps_keys, subkeys, {}, 'root',
+                                                     {**compiler_options, **kwargs}, {}, {})
+
+    # b.wic references a workflow input of root (which could be mapped by touch),
+    # and c.wic references the variables namespaced by root (i.e. root.wic).
+    # d.wic only mentions the workflow input in literals (i.e. not in its in: edges).
+    assert independent() == [0, 4]
+    assert independent(insert_steps_automatically=True) == []
+    assert independent(allow_raw_cwl=True) == []
+
+    # The explicit edges of each step are passed to all of the later steps, but
+    # the explicit edges within a subworkflow do not depend on the previous steps.
+    anchored_sub = {'steps': [{'id': 'touch', 'out': [{'file': {'wic_anchor': 'file'}}]},
+                              {'id': 'cat', 'in': {'input_log_path': {'wic_alias': 'file'}}}]}
+    yaml_tree['steps'] = [{'id': 'a.wic', 'subtree': anchored_sub},
+                          {'id': 'b.wic', 'subtree': {'steps': [{'id': 'touch'}]}}]
+    assert independent() == [0]
+    aliased_sub = {'steps': [{'id': 'cat', 'in': {'input_log_path': {'wic_alias': 'file'}}}]}
+    yaml_tree['steps'] = [{'id': 'a.wic', 'subtree': {'steps': [{'id': 'touch'}]}},
+                          {'id': 'b.wic', 'subtree': aliased_sub}]
+    assert independent() == [0]
+
+
+@pytest.mark.slow
+@pytest.mark.skipif((os.cpu_count() or 1) < 4, reason='Requires multiple cpus')
+def test_parallel_subworkflows_scaling(tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+                                       benchmark_timings: BenchmarkTimings) -> None:
+    """Benchmark compiling 24 independent subworkflows sequentially versus concurrently."""
+    monkeypatch.chdir(tmp_path)
+    write_workflows(tmp_path)
+    (tmp_path / 'workflows' / 'sub.wic').write_text(SUB_WIC + '  - id: touch\n  - id: cat\n' * 20, encoding='utf-8')
+    root_wic_str = root_wic(24)
+
+    with benchmark_timings.time('sequential'):
+        compiler_info = compile_root(tmp_path, root_wic_str, False)
+    with benchmark_timings.time('parallel_subworkflows'):
+        compiler_info_parallel = compile_root(tmp_path, root_wic_str, True)
+
+    assert summarize(compiler_info_parallel) == summarize(compiler_info)
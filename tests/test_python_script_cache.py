@@ -0,0 +1,238 @@
+import copy
+import shutil
+import sys
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from sophios import ast, python_cwl_adapter
+from sophios.wic_types import StepId, Tools, Yaml, YamlTree
+
+from .conftest import BenchmarkTimings
+
+TYPES_SCRIPT = Path(__file__).parent.parent / 'examples' / 'scripts' / 'workflow_types.py'
+
+PYTHON_SCRIPT = """import time
+with open('imports.log', mode='a', encoding='utf-8') as f:
+    f.write('x')
+time.sleep({import_seconds})  # i.e. heavy top-level imports
+
+inputs = {{'message': {{'type': 'string', 'format': 'edam:format_2330'}}}}
+outputs = {{'output': ('output.txt', {{'type': 'File', 'format': 'edam:format_2330'}})}}
+
+
+def main(message: str) -> None:
+    print(message)
+"""
+
+
+def generate_cwl(tmp_path: Path, num_steps: int, **yml_args: Any) -> tuple[list[str], Tools]:
+    yaml_tree: Yaml = {'steps': [{'id': 'python_script',
+                                  'in': {'script': 'script.py', 'message': 'hello', **yml_args}}
+                                 for _ in range(num_steps)]}
+    tools: Tools = {}
+    (_, yaml_tree) = ast.python_script_generate_cwl(YamlTree(StepId('wf', 'global'), yaml_tree), tmp_path, tools)
+    return [step['id'] for step in yaml_tree['steps']], tools
+
+
+@pytest.fixture
+def script_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(python_cwl_adapter, 'TYPES_SCRIPT_REL', str(TYPES_SCRIPT))
+    monkeypatch.setattr(ast, 'python_script_tools', {})
+    return tmp_path
+
+
+def num_imports(tmp_path: Path) -> int:
+    imports_log = tmp_path / 'imports.log'
+    return len(imports_log.read_text(encoding='utf-8')) if imports_log.exists() else 0
+
+
+@pytest.mark.fast
+def test_python_script_cache(script_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    interfaces: list[Path] = []
+    get_script_interface = python_cwl_adapter.get_script_interface
+
+    def get_script_interface_spy(mod: str, path: Path, yml_args: dict[str, Any]) -> Any:
+        interfaces.append(path)
+        return get_script_interface(mod, path, yml_args)
+
+    monkeypatch.setattr(python_cwl_adapter, 'get_script_interface', get_script_interface_spy)
+
+    (script_dir / 'script.py').write_text(PYTHON_SCRIPT.format(import_seconds=0), encoding='utf-8')
+    step_ids, tools = generate_cwl(script_dir, 3)
+    # The script is introspected once, and all of the steps share one deterministic tool.
+    assert len(interfaces) == 1
+    assert len(set(step_ids)) == 1 and len(tools) == 1
+    (step_id, tool) = next(iter(tools.items()))
+    assert step_ids[0] == step_id.stem and tool.run_path == f'autogenerated/{step_id.stem}.cwl'
+    assert Path(tool.run_path).exists()
+    assert list(tool.cwl['inputs']) == python_cwl_adapter.GENERATED_INPUTS + ['message']
+
+    # Recompiling (in this process, or in a new process) reuses the generated tool.
+    assert generate_cwl(script_dir, 1) == (step_ids[:1], tools)
+    ast.python_script_tools.clear()
+    assert generate_cwl(script_dir, 1) == (step_ids[:1], tools)
+    assert len(interfaces) == 1
+    # The arguments are still checked against the script inputs.
+    with pytest.raises(SystemExit):
+        generate_cwl(script_dir, 1, not_an_input='hello')
+
+    # Changing the script or the dockerPull tag generates a new tool.
+    (script_dir / 'script.py').write_text(PYTHON_SCRIPT.format(import_seconds=0) + '\n', encoding='utf-8')
+    (step_ids_changed, _) = generate_cwl(script_dir, 1)
+    (step_ids_docker, tools_docker) = generate_cwl(script_dir, 1, dockerPull='python:3.11')
+    assert len(set(step_ids + step_ids_changed + step_ids_docker)) == 3
+    assert len(interfaces) == 3
+    # NOTE: The script inputs and outputs are literals, so the script is never actually imported.
+    assert num_imports(script_dir) == 0
+    docker_requirement = next(iter(tools_docker.values())).cwl['requirements']['DockerRequirement']
+    assert docker_requirement == {'dockerPull': 'python:3.11'}
+    # The generated files are written atomically, i.e. no temporary files are left behind.
+    assert sorted(path.suffix for path in (script_dir / 'autogenerated').iterdir()) == ['.cwl'] * 3
+
+    # The in-memory cache is bounded; evicted tools are re-read from autogenerated/ (not regenerated).
+    monkeypatch.setattr(ast, 'PYTHON_SCRIPT_TOOLS_MAXSIZE', 2)
+    ast.python_script_tools.clear()
+    generate_cwl(script_dir, 1)
+    generate_cwl(script_dir, 1, dockerPull='python:3.11')
+    generate_cwl(script_dir, 1, dockerPull='python:3.12')
+    assert len(ast.python_script_tools) == 2 and len(interfaces) == 4
+    assert generate_cwl(script_dir, 1)[0] == step_ids_changed
+    assert len(ast.python_script_tools) == 2 and len(interfaces) == 4
+
+
+@pytest.mark.slow
+def test_python_script_cache_scaling(script_dir: Path, monkeypatch: pytest.MonkeyPatch,
+                                     benchmark_timings: BenchmarkTimings) -> None:
+    """Benchmark compiling a workflow with 30 python_script steps (with slow imports)
+    by importing the scripts, by reading them statically, and with the cache."""
+    for i in range(30):
+        script = PYTHON_SCRIPT.format(import_seconds=0.02).replace('print(message)', f'print(message, {i})')
+        (script_dir / f'script_{i}.py').write_text(script, encoding='utf-8')
+    yaml_tree = {'steps': [{'id': 'python_script', 'in': {'script': f'script_{i}.py', 'message': 'hello'}}
+                           for i in range(30)]}
+
+    def compile_steps(name: str, clear_cache: bool) -> None:
+        if clear_cache:
+            ast.python_script_tools.clear()
+            shutil.rmtree(script_dir / 'autogenerated', ignore_errors=True)
+        with benchmark_timings.time(name):
+            # NOTE: The python_script steps are replaced in-place.
+            ast.python_script_generate_cwl(YamlTree(StepId('wf', 'global'), copy.deepcopy(yaml_tree)),
+                                           script_dir, {})
+
+    def static_script_interface_disabled(path: Path) -> None:
+        del path
+
+    with monkeypatch.context() as m:
+        m.setattr(python_cwl_adapter, 'static_script_interface', static_script_interface_disabled)
+        compile_steps('import', True)
+    assert num_imports(script_dir) == 30
+    # Neither reading the scripts statically nor the cache imports the scripts.
+    compile_steps('static', True)
+    compile_steps('cached', False)
+    assert num_imports(script_dir) == 30
+
+
+STATIC_SCRIPTS = {
+    'literal': """import json
+
+inputs = {'message': {'type': 'string', 'format': 'edam:format_2330'}, 'count': {'type': 'int', 'default': -1}}
+outputs = {'output': ('output.txt', {'type': 'File', 'format': 'edam:format_2330'})}
+
+
+def main(message: str, *, count: int = 1, **kwargs) -> None:
+    print(json.dumps([message] * count))
+""",
+    'star_import': """from workflow_types import *
+
+inputs = {'input_path': textfile, 'scale': {**floating, 'doc': 'scaling factor'}}
+outputs = {'output_png_path': ('*.png', pngfile), 'output_paths': ('*.pdb', pdbfiles)}
+
+
+def main(input_path: str, scale: float) -> None:
+    pass
+""",
+}
+
+DYNAMIC_SCRIPTS = {
+    'computed': """from workflow_types import string
+
+inputs = {f'message_{i}': string for i in range(2)}
+outputs = {}
+
+
+def main(message_0: str, message_1: str) -> None:
+    pass
+""",
+    'mutated': """from workflow_types import textfile, string
+
+inputs = {'message': string}
+inputs['input_path'] = textfile
+outputs = {}
+
+
+def main(message: str, input_path: str) -> None:
+    pass
+""",
+    'rebound': """inputs = {'message': {'type': 'string'}}
+outputs = {}
+if True:
+    inputs = {}
+
+
+def main() -> None:
+    pass
+""",
+}
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize('name', list(STATIC_SCRIPTS) + list(DYNAMIC_SCRIPTS))
+def test_static_script_interface(script_dir: Path, name: str) -> None:
+    script_path = script_dir / f'{name}.py'
+    script_path.write_text({**STATIC_SCRIPTS, **DYNAMIC_SCRIPTS}[name], encoding='utf-8')
+    interface = python_cwl_adapter.static_script_interface(script_path)
+    if name in DYNAMIC_SCRIPTS:
+        # i.e. fall back to importing the script
+        assert interface is None
+        return
+    assert interface is not None
+    assert f'static_{name}' not in sys.modules
+
+    module = python_cwl_adapter.import_python_file('workflow_types', TYPES_SCRIPT) and \
+        python_cwl_adapter.import_python_file(f'static_{name}', script_path)
+    assert interface.inputs == module.inputs
+    assert interface.outputs == module.outputs
+    assert interface.main_args.keys() == python_cwl_adapter.get_main_args(module).keys()
+    del sys.modules[f'static_{name}']
+
+
+@pytest.mark.fast
+def test_get_script_interface(script_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    imports: list[Path] = []
+    import_python_file = python_cwl_adapter.import_python_file
+
+    def import_python_file_spy(name: str, path: Path) -> Any:
+        imports.append(path)
+        return import_python_file(name, path)
+
+    monkeypatch.setattr(python_cwl_adapter, 'import_python_file', import_python_file_spy)
+
+    for name, source in {**STATIC_SCRIPTS, **DYNAMIC_SCRIPTS}.items():
+        (script_dir / f'{name}.py').write_text(source, encoding='utf-8')
+        static = python_cwl_adapter.get_script_interface(name, script_dir / f'{name}.py', {})
+        imported = python_cwl_adapter.get_script_interface(name, script_dir / f'{name}.py', {}, static=False)
+        assert (static.inputs, static.outputs) == (imported.inputs, imported.outputs)
+    assert [path.stem for path in imports if path != TYPES_SCRIPT] == \
+        list(STATIC_SCRIPTS) + [name for name in DYNAMIC_SCRIPTS for _ in range(2)]
+
+    # The arguments of main() and the yml arguments are still checked against the inputs.
+    with pytest.raises(SystemExit):
+        python_cwl_adapter.get_script_interface('literal', script_dir / 'literal.py', {'not_an_input': 'hello'})
+    (script_dir / 'bad_main.py').write_text(STATIC_SCRIPTS['literal'].replace('count:', 'other:'),
+                                            encoding='utf-8')
+    with pytest.raises(SystemExit):
+        python_cwl_adapter.get_script_interface('bad_main', script_dir / 'bad_main.py', {})
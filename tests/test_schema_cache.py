@@ -0,0 +1,158 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from sophios import plugins, utils
+from sophios.schemas import wic_schema
+from sophios.wic_types import Json
+
+CWL_TOUCH = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: touch
+inputs:
+  filename:
+    type: string
+    inputBinding:
+      position: 1
+outputs:
+  file:
+    type: File
+    outputBinding:
+      glob: $(inputs.filename)
+"""
+
+CWL_WC = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: wc
+inputs:
+  file:
+    type: File
+    inputBinding:
+      position: 1
+outputs:
+  stdout:
+    type: stdout
+"""
+
+SUB_WIC = """steps:
+  - id: touch
+  - id: wc
+"""
+
+ROOT_WIC = """steps:
+  - id: sub.wic
+  - id: wc
+"""
+
+OTHER_WIC = """steps:
+  - id: touch
+"""
+
+
+def generate(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    """Generates the workflow schemas and returns the workflows which were actually compiled."""
+    config = {'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]},
+              'search_paths_wic': {'global': [str(tmp_path / 'workflows')]}}
+    tools = plugins.get_tools_cwl(config, quiet=True, use_cache=False)
+    yml_paths = plugins.get_yml_paths(config)
+    yaml_stems = utils.flatten([list(p) for p in yml_paths.values()])
+    validator = wic_schema.get_validator(tools, yaml_stems, write_to_disk=False)
+
+    compiled: List[str] = []
+    compile_workflow_generate_schema = wic_schema.compile_workflow_generate_schema
+
+    def compile_spy(homedir: str, yml_path_str: str, *args: Any) -> Json:
+        compiled.append(yml_path_str)
+        return compile_workflow_generate_schema(homedir, yml_path_str, *args)
+
+    with monkeypatch.context() as m:
+        m.setattr(wic_schema, 'compile_workflow_generate_schema', compile_spy)
+        schema_store = wic_schema.generate_workflow_schemas('', tools, yml_paths, validator, False)
+
+    assert set(schema_store) == {'workflows/root.json', 'workflows/sub.json', 'workflows/other.json'}
+    assert schema_store == wic_schema.get_cached_schemas(yml_paths)
+    return sorted(compiled)
+
+
+@pytest.mark.fast
+def test_schema_cache_regenerates_only_stale_schemas(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'adapters').mkdir()
+    (tmp_path / 'workflows').mkdir()
+    (tmp_path / 'adapters' / 'touch.cwl').write_text(CWL_TOUCH, encoding='utf-8')
+    (tmp_path / 'adapters' / 'wc.cwl').write_text(CWL_WC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'sub.wic').write_text(SUB_WIC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'root.wic').write_text(ROOT_WIC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'other.wic').write_text(OTHER_WIC, encoding='utf-8')
+
+    assert generate(tmp_path, monkeypatch) == ['other', 'root', 'sub']
+    assert generate(tmp_path, monkeypatch) == []
+
+    # wc is used (only) by sub.wic and (transitively) by root.wic
+    (tmp_path / 'adapters' / 'wc.cwl').write_text(CWL_WC.replace('baseCommand: wc', 'baseCommand: [wc, -l]'),
+                                                  encoding='utf-8')
+    assert generate(tmp_path, monkeypatch) == ['root', 'sub']
+
+    (tmp_path / 'workflows' / 'other.wic').write_text(OTHER_WIC + '  - id: wc\n', encoding='utf-8')
+    assert generate(tmp_path, monkeypatch) == ['other']
+    assert generate(tmp_path, monkeypatch) == []
+
+
+@pytest.mark.fast
+def test_stale_schemas_are_never_loaded(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    yml_path = tmp_path / 'workflows' / 'sub.wic'
+    yml_path.parent.mkdir()
+    yml_path.write_text(SUB_WIC, encoding='utf-8')
+    yml_paths = {'global': {'sub': yml_path}}
+    schema = {'$id': 'workflows/sub.json', 'type': 'object'}
+    entries = {'workflows/sub.json': {'path': str(yml_path), 'schema': schema,
+                                      'dependencies': {str(yml_path): wic_schema.file_key(str(yml_path))}}}
+    wic_schema.save_schema_cache(wic_schema.SCHEMA_CACHE_PATH, entries)
+    assert wic_schema.get_cached_schemas(yml_paths) == {'workflows/sub.json': schema}
+
+    yml_path.write_text(SUB_WIC + '  - id: touch\n', encoding='utf-8')
+    assert not wic_schema.get_cached_schemas(yml_paths)
+
+    # get_validator must not use a (possibly stale) wic.json which rejects everything.
+    (tmp_path / 'autogenerated' / 'schemas' / 'wic.json').write_text(json.dumps({'not': {}}), encoding='utf-8')
+    validator = wic_schema.get_validator({}, ['sub'], write_to_disk=False)
+    validator.validate({'steps': [{'id': 'sub.wic'}]})
+
+
+@pytest.mark.fast
+def test_schema_cache_only_reads_touched_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'adapters').mkdir()
+    (tmp_path / 'workflows').mkdir()
+    (tmp_path / 'adapters' / 'touch.cwl').write_text(CWL_TOUCH, encoding='utf-8')
+    (tmp_path / 'adapters' / 'wc.cwl').write_text(CWL_WC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'sub.wic').write_text(SUB_WIC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'root.wic').write_text(ROOT_WIC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'other.wic').write_text(OTHER_WIC, encoding='utf-8')
+    assert generate(tmp_path, monkeypatch) == ['other', 'root', 'sub']
+
+    digested: List[str] = []
+    file_digest = wic_schema.file_digest
+
+    def file_digest_spy(path: str) -> str:
+        digested.append(path)
+        return file_digest(path)
+
+    monkeypatch.setattr(wic_schema, 'file_digest', file_digest_spy)
+    # Unchanged files are only stat'ed.
+    assert generate(tmp_path, monkeypatch) == []
+    assert not digested
+
+    # Touched (but unmodified) files are hashed once, and then their new stat keys are cached.
+    wc_path = tmp_path / 'adapters' / 'wc.cwl'
+    stat = os.stat(wc_path)
+    os.utime(wc_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert generate(tmp_path, monkeypatch) == []
+    assert str(wc_path) in digested
+    digested.clear()
+    assert generate(tmp_path, monkeypatch) == []
+    assert not digested
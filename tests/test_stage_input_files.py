@@ -0,0 +1,100 @@
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from sophios import post_compile, utils
+from sophios.wic_types import Yaml
+
+from .conftest import BenchmarkTimings
+
+
+def write_inputs(tmp_path: Path, num_files: int) -> Yaml:
+    """Writes File, Directory, and array inputs (and returns the corresponding yml inputs)."""
+    inputs = tmp_path / 'inputs'
+    (inputs / 'dir' / 'sub').mkdir(parents=True)
+    (inputs / 'dir' / 'a.txt').write_text('a', encoding='utf-8')
+    (inputs / 'dir' / 'sub' / 'b.txt').write_text('b', encoding='utf-8')
+    for i in range(num_files):
+        (inputs / f'{i}.txt').write_text(str(i), encoding='utf-8')
+    return {'file': {'class': 'File', 'location': 'inputs/0.txt'},
+            'dir': {'class': 'Directory', 'location': 'inputs/dir'},
+            'files': [{'class': 'File', 'location': f'inputs/{i}.txt'} for i in range(1, num_files)],
+            'string': 'inputs/0.txt'}
+
+
+def read_dir(path: Path) -> Dict[str, str]:
+    return {p.relative_to(path).as_posix(): p.read_text(encoding='utf-8') for p in path.rglob('*') if p.is_file()}
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize('strategy', utils.FILE_STRATEGIES)
+def test_stage_input_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, strategy: str) -> None:
+    monkeypatch.chdir(tmp_path)
+    yml_inputs = write_inputs(tmp_path, 5)
+    root = tmp_path / 'root'
+    root.mkdir()
+    for file in (tmp_path / 'inputs').rglob('*'):
+        os.utime(file, ns=(10**9, 10**9))
+    shutil.move(tmp_path / 'inputs', root / 'inputs')
+
+    post_compile.stage_input_files(yml_inputs, root, 'autogenerated', strategy=strategy)
+    staged = tmp_path / 'autogenerated' / 'inputs'
+    assert read_dir(staged) == read_dir(root / 'inputs')
+    assert len(read_dir(staged)) == 7
+    dest = staged / 'dir' / 'sub' / 'b.txt'
+    source = root / 'inputs' / 'dir' / 'sub' / 'b.txt'
+    assert dest.is_symlink() == (strategy == 'symlink')
+    if strategy == 'hardlink':
+        assert os.path.samefile(dest, source)
+    if strategy in ['copy', 'reflink']:
+        assert dest.stat().st_mtime_ns == 10**9
+
+    # Unchanged files are skipped, and changed files are restaged.
+    mtime = (staged / '0.txt').lstat().st_mtime_ns
+    (root / 'inputs' / '1.txt').write_text('changed', encoding='utf-8')
+    time.sleep(0.01)
+    post_compile.stage_input_files(yml_inputs, root, 'autogenerated', strategy=strategy)
+    assert (staged / '0.txt').lstat().st_mtime_ns == mtime
+    assert (staged / '1.txt').read_text(encoding='utf-8') == 'changed'
+
+    # Missing inputs are skipped (i.e. when they are generated later).
+    yml_inputs['missing'] = {'class': 'File', 'location': 'inputs/missing.txt'}
+    post_compile.stage_input_files(yml_inputs, root, 'autogenerated', throw=False, strategy=strategy)
+    assert not (staged / 'missing.txt').exists()
+    with pytest.raises(SystemExit):
+        post_compile.stage_input_files(yml_inputs, root, 'autogenerated', strategy=strategy)
+
+
+@pytest.mark.slow
+def test_stage_input_files_scaling(tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+                                   benchmark_timings: BenchmarkTimings) -> None:
+    """Benchmark staging 2000 inputs the first time, and again when they are unchanged."""
+    monkeypatch.chdir(tmp_path)
+    yml_inputs = write_inputs(tmp_path, 2000)
+
+    placed: List[Path] = []
+    place_file = utils.place_file
+
+    def place_file_spy(src_path: Path, dst_path: Path, *args: Any, **kwargs: Any) -> None:
+        placed.append(dst_path)
+        place_file(src_path, dst_path, *args, **kwargs)
+
+    monkeypatch.setattr(utils, 'place_file', place_file_spy)
+
+    def stage(name: str, strategy: str, max_workers: int) -> None:
+        with benchmark_timings.time(name):
+            post_compile.stage_input_files(yml_inputs, tmp_path, f'{strategy}_{max_workers}',
+                                           strategy=strategy, max_workers=max_workers)
+
+    stage('copy (1 thread)', 'copy', 1)
+    for strategy in utils.FILE_STRATEGIES:
+        stage(strategy, strategy, 8)
+    num_placed = len(placed)
+    assert num_placed > 0
+    # Unchanged files are skipped.
+    stage('unchanged', 'copy', 8)
+    assert len(placed) == num_placed
@@ -0,0 +1,139 @@
+import copy
+from pathlib import Path
+
+import pytest
+import yaml
+
+from sophios import ast, cli, compiler, inlineing, plugins, utils
+from sophios import post_compile as pc
+from sophios.schemas import wic_schema
+from sophios.utils_graphs import get_graph_reps
+from sophios.utils_yaml import wic_loader
+from sophios.wic_types import CompilerInfo, NodeData, RoseTree, StepId, YamlTree
+
+CWL_TOUCH = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: touch
+inputs:
+  filename:
+    type: string
+    inputBinding:
+      position: 1
+outputs:
+  file:
+    type: File
+    outputBinding:
+      glob: $(inputs.filename)
+"""
+
+CWL_WC = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: wc
+inputs:
+  file:
+    type: File
+    inputBinding:
+      position: 1
+outputs:
+  stdout:
+    type: stdout
+"""
+
+INNER_WIC = """steps:
+  - id: touch
+    in:
+      filename: !ii inner.txt
+  - id: wc
+"""
+
+SUB_WIC = """steps:
+  - id: inner.wic
+  - id: wc
+"""
+
+ROOT_WIC = """steps:
+  - id: sub.wic
+  - id: touch
+    in:
+      filename: !ii root.txt
+  - id: wc
+"""
+
+
+def load_root(tmp_path: Path) -> YamlTree:
+    (tmp_path / 'adapters').mkdir()
+    (tmp_path / 'workflows').mkdir()
+    (tmp_path / 'adapters' / 'touch.cwl').write_text(CWL_TOUCH, encoding='utf-8')
+    (tmp_path / 'adapters' / 'wc.cwl').write_text(CWL_WC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'inner.wic').write_text(INNER_WIC, encoding='utf-8')
+    (tmp_path / 'workflows' / 'sub.wic').write_text(SUB_WIC, encoding='utf-8')
+
+    tools = plugins.get_tools_cwl({'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}},
+                                  quiet=True, use_cache=False)
+    yml_paths = plugins.get_yml_paths({'search_paths_wic': {'global': [str(tmp_path / 'workflows')]}})
+    yaml_stems = utils.flatten([list(p) for p in yml_paths.values()])
+    validator = wic_schema.get_validator(tools, yaml_stems, write_to_disk=False)
+
+    root_yml = yaml.load(ROOT_WIC, Loader=wic_loader())
+    yaml_tree = YamlTree(StepId('root', 'global'), root_yml)
+    yaml_tree = ast.read_ast_from_disk('', yaml_tree, yml_paths, tools, validator, False)
+    return ast.merge_yml_trees(yaml_tree, {}, tools)
+
+
+def compile_root(tmp_path: Path, yaml_tree: YamlTree) -> CompilerInfo:
+    tools = plugins.get_tools_cwl({'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}},
+                                  quiet=True, use_cache=False)
+    compiler_options, graph_settings, yaml_tag_paths = cli.get_dicts_for_compilation()
+    graph = get_graph_reps('root')
+    return compiler.compile_workflow(yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
+                                     [], [graph], {}, {}, {}, {}, tools, True, True, True)
+
+
+@pytest.mark.fast
+def test_compiler_does_not_modify_call_sites(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Subtrees are shared (not copied) during compilation, so make sure they are never modified."""
+    monkeypatch.chdir(tmp_path)
+    yaml_tree = load_root(tmp_path)
+    yaml_tree_orig = copy.deepcopy(yaml_tree)
+
+    compiler_info = compile_root(tmp_path, yaml_tree)
+    assert yaml_tree == yaml_tree_orig
+    assert compiler_info.rose.data.yml == yaml_tree_orig.yml
+
+
+@pytest.mark.fast
+def test_inline_subworkflow_does_not_modify_input(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    yaml_tree = load_root(tmp_path)
+    yaml_tree_orig = copy.deepcopy(yaml_tree)
+
+    namespaces_list = inlineing.get_inlineable_subworkflows(yaml_tree, {}, False, [])
+    assert len(namespaces_list) == 2
+    for namespaces in namespaces_list:
+        inline_yaml_tree, _len_substeps = inlineing.inline_subworkflow(yaml_tree, namespaces)
+        assert yaml_tree == yaml_tree_orig
+        # Inlineing a copy must give the same result as inlineing the (shared) original.
+        assert inlineing.inline_subworkflow(copy.deepcopy(yaml_tree), namespaces)[0] == inline_yaml_tree
+
+
+def rose_tree_cwl(rose_tree: RoseTree) -> list:
+    n_d: NodeData = rose_tree.data
+    return [n_d.compiled_cwl, [rose_tree_cwl(sub_tree) for sub_tree in rose_tree.sub_trees]]
+
+
+@pytest.mark.fast
+def test_cwl_inline_runtag_does_not_modify_input(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    compiler_info = compile_root(tmp_path, load_root(tmp_path))
+    rose_tree_orig = rose_tree_cwl(compiler_info.rose)
+
+    rose_tree = pc.cwl_inline_runtag(compiler_info.rose)
+    assert rose_tree_cwl(compiler_info.rose) == rose_tree_orig
+
+    # Every subworkflow (at every depth) must be inlined into the root workflow.
+    step_sub = next(step for step in rose_tree.data.compiled_cwl['steps'] if step['id'].endswith('sub.wic'))
+    assert step_sub['run']['class'] == 'Workflow'
+    step_inner = next(step for step in step_sub['run']['steps'] if step['id'].endswith('inner.wic'))
+    assert step_inner['run']['class'] == 'Workflow'
+    assert all(isinstance(step['run'], dict) for step in step_inner['run']['steps'])
+    assert '$namespaces' not in step_sub['run']
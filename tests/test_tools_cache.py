@@ -0,0 +1,85 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from sophios import plugins
+from sophios.wic_types import StepId
+
+CWL_ECHO = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: echo
+inputs:
+  message:
+    type: string
+    inputBinding:
+      position: 1
+outputs:
+  stdout:
+    type: stdout
+"""
+
+
+def write_cwl(path: Path, contents: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(contents, encoding='utf-8')
+
+
+@pytest.mark.fast
+def test_tools_cache_matches_uncached(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    write_cwl(tmp_path / 'adapters' / 'echo.cwl', CWL_ECHO)
+    write_cwl(tmp_path / 'adapters' / 'sub' / 'echo2.cwl', CWL_ECHO.replace('echo', 'printf'))
+    config = {'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}}
+    cache_path = tmp_path / 'tools_cwl.json'
+
+    tools_uncached = plugins.get_tools_cwl(config, quiet=True, use_cache=False)
+    tools_cold = plugins.get_tools_cwl(config, quiet=True, cache_path=cache_path)
+    tools_warm = plugins.get_tools_cwl(config, quiet=True, cache_path=cache_path)
+
+    assert tools_uncached == tools_cold == tools_warm
+    assert cache_path.exists()
+    # --quiet must only affect the returned tools, never the cached canonical form.
+    entries = plugins.load_tools_cache(cache_path)
+    assert all('stdout' not in entry.cwl for entry in entries.values())
+    assert tools_warm[StepId('echo', 'global')].cwl['stdout'] == 'echo.out'
+
+    # Mutating the returned tools must not affect the cached entries.
+    tools_warm[StepId('echo', 'global')].cwl['inputs']['message']['type'] = 'int'
+    assert plugins.get_tools_cwl(config, quiet=True, cache_path=cache_path) == tools_uncached
+
+
+@pytest.mark.fast
+def test_tools_cache_reparses_changed_and_evicts_deleted(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    echo_path = tmp_path / 'adapters' / 'echo.cwl'
+    other_path = tmp_path / 'adapters' / 'other.cwl'
+    write_cwl(echo_path, CWL_ECHO)
+    write_cwl(other_path, CWL_ECHO)
+    config = {'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}}
+    cache_path = tmp_path / 'tools_cwl.json'
+    plugins.get_tools_cwl(config, cache_path=cache_path)
+
+    # Modify one file (and bump its mtime in case the filesystem has coarse timestamps)
+    write_cwl(echo_path, CWL_ECHO.replace('baseCommand: echo', 'baseCommand: printf'))
+    stat = os.stat(echo_path)
+    os.utime(echo_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    other_path.unlink()
+
+    tools = plugins.get_tools_cwl(config, cache_path=cache_path)
+    assert tools[StepId('echo', 'global')].cwl['baseCommand'] == 'printf'
+    assert StepId('other', 'global') not in tools
+    assert set(plugins.load_tools_cache(cache_path)) == {str(echo_path)}
+
+
+@pytest.mark.fast
+def test_tools_cache_ignores_corrupt_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    write_cwl(tmp_path / 'adapters' / 'echo.cwl', CWL_ECHO)
+    config = {'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}}
+    cache_path = tmp_path / 'tools_cwl.json'
+    cache_path.write_text('not json', encoding='utf-8')
+
+    tools = plugins.get_tools_cwl(config, cache_path=cache_path)
+    assert StepId('echo', 'global') in tools
+    assert set(plugins.load_tools_cache(cache_path)) == {str(tmp_path / 'adapters' / 'echo.cwl')}
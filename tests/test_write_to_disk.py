@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict
+
+import pytest
+import yaml
+
+from sophios import ast, cli, compiler, input_output, plugins, utils
+from sophios.schemas import wic_schema
+from sophios.utils_graphs import get_graph_reps
+from sophios.utils_yaml import wic_loader
+from sophios.wic_types import RoseTree, StepId, YamlTree
+
+CWL_TOUCH = """cwlVersion: v1.2
+class: CommandLineTool
+baseCommand: touch
+inputs:
+  filename:
+    type: string
+    inputBinding:
+      position: 1
+outputs:
+  file:
+    type: File
+    outputBinding:
+      glob: $(inputs.filename)
+"""
+
+SUB_WIC = """steps:
+  - id: touch
+    in:
+      filename: !ii sub.txt
+"""
+
+
+def compile_root(tmp_path: Path, num_subworkflows: int) -> RoseTree:
+    (tmp_path / 'adapters').mkdir(exist_ok=True)
+    (tmp_path / 'workflows').mkdir(exist_ok=True)
+    (tmp_path / 'adapters' / 'touch.cwl').write_text(CWL_TOUCH, encoding='utf-8')
+    (tmp_path / 'workflows' / 'sub.wic').write_text(SUB_WIC, encoding='utf-8')
+    root_wic = 'steps:\n' + '  - id: sub.wic\n' * num_subworkflows
+
+    tools = plugins.get_tools_cwl({'search_paths_cwl': {'global': [str(tmp_path / 'adapters')]}},
+                                  quiet=True, use_cache=False)
+    yml_paths = plugins.get_yml_paths({'search_paths_wic': {'global': [str(tmp_path / 'workflows')]}})
+    yaml_stems = utils.flatten([list(p) for p in yml_paths.values()])
+    validator = wic_schema.get_validator(tools, yaml_stems, write_to_disk=False)
+    yaml_tree = YamlTree(StepId('root', 'global'), yaml.load(root_wic, Loader=wic_loader()))
+    yaml_tree = ast.read_ast_from_disk('', yaml_tree, yml_paths, tools, validator, False)
+    yaml_tree = ast.merge_yml_trees(yaml_tree, {}, tools)
+
+    compiler_options, graph_settings, yaml_tag_paths = cli.get_dicts_for_compilation()
+    compiler_info = compiler.compile_workflow(yaml_tree, compiler_options, graph_settings, yaml_tag_paths,
+                                              [], [get_graph_reps('root')], {}, {}, {}, {}, tools, True, True, False)
+    return compiler_info.rose
+
+
+def get_mtimes(path: Path) -> Dict[str, int]:
+    return {p.relative_to(path).as_posix(): p.stat().st_mtime_ns for p in path.rglob('*') if p.is_file()}
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize('relative_run_path', [True, False])
+def test_write_to_disk_incremental(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, relative_run_path: bool) -> None:
+    monkeypatch.chdir(tmp_path)
+    rose_tree = compile_root(tmp_path, 3)
+    path = tmp_path / 'autogenerated'
+
+    manifest = input_output.write_to_disk(rose_tree, path, relative_run_path, write_manifest=True)
+    # The root workflow, 3 subworkflows, and 3 touch CommandLineTools.
+    # NOTE: Without subdirectories, the touch files all have the same paths, so they are only written once.
+    assert len(manifest) == 2 * (7 if relative_run_path else 5)
+    for file, digest in manifest.items():
+        assert hashlib.sha256((path / file).read_bytes()).hexdigest() == digest
+    assert json.loads((path / 'root_manifest.json').read_text(encoding='utf-8')) == manifest
+    cwl_file = 'root.cwl'
+    assert (path / cwl_file).read_text(encoding='utf-8').startswith('#!/usr/bin/env cwl-runner\n')
+
+    # Pretend the files were written a long time ago.
+    for written_path in path.rglob('*'):
+        if written_path.is_file():
+            os.utime(written_path, ns=(10**9, 10**9))
+    mtimes = get_mtimes(path)
+    assert input_output.write_to_disk(rose_tree, path, relative_run_path, write_manifest=True) == manifest
+    assert get_mtimes(path) == mtimes
+
+    # Only the changed files are rewritten.
+    (path / cwl_file).write_text('modified', encoding='utf-8')
+    os.utime(path / cwl_file, ns=(10**9, 10**9))
+    assert input_output.write_to_disk(rose_tree, path, relative_run_path, write_manifest=True) == manifest
+    mtimes_new = get_mtimes(path)
+    assert mtimes_new.pop(cwl_file) != mtimes.pop(cwl_file)
+    assert mtimes_new == mtimes
+    assert hashlib.sha256((path / cwl_file).read_bytes()).hexdigest() == manifest[cwl_file]
+
+    # ... unless we explicitly rewrite everything.
+    input_output.write_to_disk(rose_tree, path, relative_run_path, incremental=False)
+    mtimes_new = get_mtimes(path)
+    assert all(mtimes_new[file] != 10**9 for file in manifest)
@@ -0,0 +1,80 @@
+import random
+import time
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+import yaml
+
+from sophios import input_output
+from sophios.input_output import FastNoAliasDumper
+from sophios.utils_yaml import FastWICLoader, WICLoader, fits_on_one_line, wic_loader
+
+ROOT = Path(__file__).parent.parent
+YML_PATHS = sorted(list((ROOT / 'cwl_adapters').glob('*.cwl')) + list((ROOT / 'docs' / 'tutorials').glob('*.wic'))
+                   + list((ROOT / 'examples').glob('*.wic')))
+
+
+def random_yml(rng: random.Random, alphabet: str, depth: int) -> Any:
+    def random_str() -> str:
+        return ''.join(rng.choice(alphabet) for _ in range(rng.choice([rng.randint(0, 12), rng.randint(0, 90)])))
+    if depth == 0 or rng.random() < 0.3:
+        return rng.choice([random_str(), rng.randint(0, 9), None, True, 1.5])
+    if rng.random() < 0.5:
+        return [random_yml(rng, alphabet, depth - 1) for _ in range(rng.randint(0, 3))]
+    return {random_str(): random_yml(rng, alphabet, depth - 1) for _ in range(rng.randint(0, 3))}
+
+
+def dump(doc: Any, dumper: Any = input_output.NoAliasDumper) -> str:
+    """yaml.dump with the same arguments as input_output.dump_yaml"""
+    return yaml.dump(doc, Dumper=dumper, sort_keys=False, line_break='\n', indent=2)
+
+
+@pytest.mark.fast
+def test_fast_loader_matches_pure_python() -> None:
+    assert YML_PATHS
+    for yml_path in YML_PATHS:
+        yml_str = yml_path.read_text(encoding='utf-8')
+        assert yaml.load(yml_str, Loader=wic_loader()) == yaml.load(yml_str, Loader=WICLoader)
+    yml_str = 'in:\n  a: !ii 1\n  b: !ii\n    c: d\n  e: !* f\nout:\n- g: !& h\n'
+    yml = {'in': {'a': {'wic_inline_input': 1}, 'b': {'wic_inline_input': {'c': 'd'}}, 'e': {'wic_alias': 'f'}},
+           'out': [{'g': {'wic_anchor': 'h'}}]}
+    assert yaml.load(yml_str, Loader=FastWICLoader) == yaml.load(yml_str, Loader=WICLoader) == yml
+    # The custom tags must not leak into yaml.safe_load
+    assert '!ii' not in yaml.SafeLoader.yaml_constructors
+
+
+@pytest.mark.fast
+def test_fast_dumper_is_byte_identical() -> None:
+    docs: List[Any] = [yaml.load(p.read_text(encoding='utf-8'), Loader=WICLoader) for p in YML_PATHS]
+    rng = random.Random(0)
+    for alphabet in ['ab -:#', 'a b\'"\\{}[],&*!|>%@`?', 'a b\n\té\U0001F600\x85']:
+        docs += [{'a': random_yml(rng, alphabet, 6)} for _ in range(2000)]
+    for doc in docs:
+        expected = dump(doc)
+        assert input_output.dump_yaml(doc) == expected
+        if fits_on_one_line(doc, 0, 0):
+            assert dump(doc, FastNoAliasDumper) == expected
+
+
+def test_fast_yaml_throughput() -> None:
+    """Benchmark parsing and emitting the adapters and workflows with libyaml vs pure python.
+
+    NOTE: This only reports the throughput, since wall-clock comparisons are unreliable on shared CI runners.
+    """
+    yml_strs = [p.read_text(encoding='utf-8') for p in YML_PATHS] * 5
+    docs = [yaml.load(yml_str, Loader=WICLoader) for yml_str in yml_strs]
+
+    def throughput(func: Any, objs: List[Any]) -> float:
+        start = time.perf_counter()
+        for obj in objs:
+            func(obj)
+        return len(objs) / (time.perf_counter() - start)
+
+    load_pure = throughput(lambda s: yaml.load(s, Loader=WICLoader), yml_strs)
+    load_fast = throughput(lambda s: yaml.load(s, Loader=wic_loader()), yml_strs)
+    dump_pure = throughput(dump, docs)
+    dump_fast = throughput(input_output.dump_yaml, docs)
+
+    print(f'libyaml: {yaml.__with_libyaml__}, load: {load_pure:.0f}/s vs {load_fast:.0f}/s, '
+          f'dump: {dump_pure:.0f}/s vs {dump_fast:.0f}/s')